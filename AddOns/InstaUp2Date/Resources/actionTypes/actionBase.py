@@ -10,6 +10,7 @@ class actionBase(object):
 	container				= None
 	
 	matchScoreIncrement		= 5
+	scoreItemMatchCost		= 1			# relative cost of scoreItemMatch: 1 for a stat, 10 or more for running a command
 
 	# -------- class methods
 	
@@ -66,6 +67,11 @@ class actionBase(object):
 		'''All classes should impliment this method to help figure out which type should be used for each item'''
 		raise NotImplementedError('This method is virtual, and should be implimented in the subclasses')
 	
+	@classmethod
+	def couldMatchItem(myClass, inputItem, **kwargs):
+		'''A check cheaper than scoreItemMatch, returning False if this class can not match the item'''
+		return True
+	
 	@classmethod
 	def getMatchScore(myClass):
 		if myClass not in myClass.__mro__[-2:]: # this is not the base class or 'object'
@@ -6,6 +6,8 @@ import actionBase
 
 class nakedApplication(actionBase.actionBase):
 	
+	scoreItemMatchCost			= 2		# lists the top level of the container
+	
 	@classmethod
 	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
 		
@@ -6,6 +6,8 @@ import actionBase
 
 class pkgInstaller(actionBase.actionBase):
 	
+	scoreItemMatchCost			= 2		# lists the top level of the container
+	
 	installerChoicesFilePath	= None
 	
 	@classmethod
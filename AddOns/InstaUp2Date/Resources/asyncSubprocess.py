@@ -0,0 +1,298 @@
+#!/usr/bin/python
+
+import os, errno, signal, subprocess, threading, Queue
+
+from managedSubprocess		import managedSubprocess
+from commonExceptions		import ProcessTimeoutException, ProcessCancelledException
+
+class asyncSubprocess(object):
+	'''Run a process without blocking on it. Its output is read by background threads and handed to the callbacks a line at a time as it arrives, it can be given a timeout or cancelled, and gather runs a list of commands at the same time. Once it is done result() raises the same errors as managedSubprocess.'''
+	
+	#---------------------Class Variables-----------------------------
+	
+	killDelay				= 5			# seconds between asking a process to stop (SIGTERM) and making it (SIGKILL)
+	
+	#--------------------Instance Variables---------------------------
+	
+	command					= None
+	process					= None		# the subprocess.Popen object, once started
+	kwargs					= None		# passed on to subprocess.Popen
+	
+	stdoutCallback			= None		# called with each line of stdout, without the line ending
+	stderrCallback			= None		# called with each line of stderr, without the line ending
+	finishCallback			= None		# called with this object once the process has exited and its output has been read
+	
+	stdoutLines				= None
+	stderrLines				= None
+	
+	timeout					= None		# seconds the process is given to finish
+	timedOut				= False
+	cancelled				= False
+	callbackError			= None		# the first exception raised by a callback, which stops the process
+	
+	finished				= None		# an Event, set once the process has exited and its output has been read
+	
+	processAsPlist			= False
+	_plistObject			= None
+	
+	_readerThreads			= None
+	_stopTimers				= None
+	
+	#--------------------- Class Methods -----------------------------
+	
+	@classmethod
+	def gather(myClass, commands, maxConcurrent=None, returnExceptions=False, **kwargs):
+		'''Run each of the commands (lists of arguments) at the same time, or at most maxConcurrent at a time, with the other arguments given to each. Returns the finished asyncSubprocess objects in the same order as the commands. If one fails the ones still running are cancelled, the rest are not started, and its error is raised, unless returnExceptions is True, in which case every command is run and the error is returned in its place.'''
+		
+		if maxConcurrent is not None and (not isinstance(maxConcurrent, int) or maxConcurrent < 1):
+			raise ValueError('gather requires a number that is 1 or more, or None, as a maxConcurrent, got: ' + str(maxConcurrent))
+		
+		finishedQueue = Queue.Queue()
+		
+		processes = [myClass(thisCommand, finishCallback=finishedQueue.put, start=False, **kwargs) for thisCommand in commands]
+		positions = dict([(id(thisProcess), position) for position, thisProcess in enumerate(processes)])
+		results = [None] * len(processes)
+		
+		waitingProcesses = list(processes)
+		runningProcesses = []
+		
+		while len(waitingProcesses) > 0 or len(runningProcesses) > 0:
+			
+			while len(waitingProcesses) > 0 and (maxConcurrent is None or len(runningProcesses) < maxConcurrent):
+				thisProcess = waitingProcesses.pop(0)
+				try:
+					thisProcess.start()
+				except Exception, error:
+					if returnExceptions is True:
+						results[positions[id(thisProcess)]] = error
+						continue
+					myClass.cancelAll(runningProcesses)
+					raise
+				runningProcesses.append(thisProcess)
+			
+			# a timeout lets KeyboardInterrupt through
+			try:
+				finishedProcess = finishedQueue.get(True, 1)
+			except Queue.Empty:
+				continue
+			runningProcesses.remove(finishedProcess)
+			
+			try:
+				results[positions[id(finishedProcess)]] = finishedProcess.result()
+			except Exception, error:
+				if returnExceptions is True:
+					results[positions[id(finishedProcess)]] = error
+					continue
+				
+				myClass.cancelAll(runningProcesses)
+				raise
+		
+		return results
+	
+	@classmethod
+	def cancelAll(myClass, processes):
+		'''Cancel the processes, and wait for them to exit'''
+		
+		for thisProcess in processes:
+			thisProcess.cancel()
+		for thisProcess in processes:
+			thisProcess.wait()
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, command, stdoutCallback=None, stderrCallback=None, finishCallback=None, timeout=None, processAsPlist=False, start=True, **kwargs):
+		
+		if 'stdout' in kwargs or 'stderr' in kwargs:
+			raise NotImplementedError(self.__class__.__name__ + ' reads stdout and stderr itself, use stdoutCallback and stderrCallback')
+		
+		if not hasattr(command, '__iter__') and not hasattr(command, 'capitalize'):
+			raise TypeError('%s requires a command, got: %s' % (self.__class__.__name__, str(command)))
+		
+		if timeout is not None and (not isinstance(timeout, (int, long, float)) or timeout <= 0):
+			raise ValueError('%s requires a number of seconds above 0, or None, as a timeout, got: %s' % (self.__class__.__name__, str(timeout)))
+		
+		self.command = command
+		self.kwargs = kwargs
+		
+		self.stdoutCallback = stdoutCallback
+		self.stderrCallback = stderrCallback
+		self.finishCallback = finishCallback
+		
+		self.timeout = timeout
+		self.processAsPlist = processAsPlist
+		
+		self.stdoutLines = []
+		self.stderrLines = []
+		
+		self.finished = threading.Event()
+		self._stopTimers = []
+		
+		if start is True:
+			self.start()
+	
+	def start(self):
+		'''Start the process, and the threads that read its output'''
+		
+		if self.process is not None:
+			raise RuntimeError('The process "%s" was already started' % self.commandString())
+		
+		self.process = subprocess.Popen(self.command, close_fds=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **self.kwargs)
+		
+		self._readerThreads = [
+			threading.Thread(target=self.readStream, args=(self.process.stdout, self.stdoutLines, self.stdoutCallback)),
+			threading.Thread(target=self.readStream, args=(self.process.stderr, self.stderrLines, self.stderrCallback))
+		]
+		for thisThread in self._readerThreads:
+			thisThread.setDaemon(True)
+			thisThread.start()
+		
+		if self.timeout is not None:
+			timeoutTimer = threading.Timer(self.timeout, self.timeoutExpired)
+			timeoutTimer.setDaemon(True)
+			timeoutTimer.start()
+			self._stopTimers.append(timeoutTimer)
+		
+		watcherThread = threading.Thread(target=self.watchProcess)
+		watcherThread.setDaemon(True)
+		watcherThread.start()
+	
+	def readStream(self, stream, lines, callback):
+		
+		for thisLine in iter(stream.readline, ''):
+			lines.append(thisLine)
+			
+			if callback is not None and self.callbackError is None:
+				try:
+					callback(thisLine.rstrip('\r\n'))
+				except Exception, error:
+					self.callbackError = error
+					self.stop()
+		
+		stream.close()
+	
+	def watchProcess(self):
+		
+		self.process.wait()
+		
+		# the output is only complete once the readers reach the end of it
+		for thisThread in self._readerThreads:
+			thisThread.join()
+		
+		for thisTimer in self._stopTimers:
+			thisTimer.cancel()
+		
+		self.finished.set()
+		
+		if self.finishCallback is not None:
+			self.finishCallback(self)
+	
+	def timeoutExpired(self):
+		if not self.finished.isSet():
+			self.timedOut = True
+			self.stop()
+	
+	def cancel(self):
+		'''Stop the process, without waiting for it to exit'''
+		
+		if self.process is None or self.finished.isSet():
+			return
+		
+		self.cancelled = True
+		self.stop()
+	
+	def stop(self):
+		'''Ask the process to exit, and make it if it has not after killDelay seconds'''
+		
+		self.sendSignal(signal.SIGTERM)
+		
+		killTimer = threading.Timer(self.killDelay, self.sendSignal, args=(signal.SIGKILL,))
+		killTimer.setDaemon(True)
+		killTimer.start()
+		self._stopTimers.append(killTimer)
+	
+	def sendSignal(self, signalNumber):
+		
+		# once it has been waited on the pid could belong to another process
+		if self.process is None or self.process.returncode is not None:
+			return
+		
+		try:
+			os.kill(self.process.pid, signalNumber)
+		except OSError, error:
+			if error.errno != errno.ESRCH:
+				raise # it already exited otherwise
+	
+	def isRunning(self):
+		return self.process is not None and not self.finished.isSet()
+	
+	def wait(self, timeout=None):
+		'''Wait for the process to exit and its output to be read, for up to timeout seconds. Returns the return code, or None if it is still running.'''
+		
+		if self.process is None:
+			raise RuntimeError('The process "%s" was never started' % self.commandString())
+		
+		if timeout is None:
+			# a timeout lets KeyboardInterrupt through
+			while not self.finished.isSet():
+				self.finished.wait(1)
+		else:
+			self.finished.wait(timeout)
+		
+		if not self.finished.isSet():
+			return None
+		return self.returncode
+	
+	@property
+	def returncode(self):
+		if self.process is None:
+			return None
+		return self.process.returncode
+	
+	def getStdout(self):
+		return ''.join(self.stdoutLines)
+	
+	def getStderr(self):
+		return ''.join(self.stderrLines)
+	
+	def commandString(self):
+		if hasattr(self.command, 'capitalize'):
+			return self.command
+		return ' '.join(self.command)
+	
+	def result(self):
+		'''Wait for the process and return this object, raising a ProcessTimeoutException if it timed out, a ProcessCancelledException if it was cancelled, the exception from a callback that failed, or a RuntimeError if it exited with a non-zero return code'''
+		
+		self.wait()
+		
+		if self.callbackError is not None:
+			raise self.callbackError
+		
+		if self.timedOut is True:
+			raise ProcessTimeoutException('The process "%s" did not finish within %s seconds' % (self.commandString(), self.timeout))
+		
+		if self.cancelled is True:
+			raise ProcessCancelledException('The process "%s" was cancelled' % self.commandString())
+		
+		if self.returncode != 0:
+			errorString = 'The process "%s" failed with error: %s' % (self.commandString(), self.returncode)
+			
+			# add the stdout, if any
+			if len(self.stdoutLines) > 0:
+				errorString += '\nStdout: ' + self.getStdout().strip()
+			
+			# add the stderr, if any
+			if len(self.stderrLines) > 0:
+				errorString += '\nStderr: ' + self.getStderr().strip()
+			
+			raise RuntimeError(errorString)
+		
+		if self.processAsPlist is True and self._plistObject is None:
+			self._plistObject = managedSubprocess.plistFromOutput(self.command, self.getStdout())
+		
+		return self
+	
+	def getPlistObject(self):
+		if self._plistObject is None:
+			raise RuntimeError('This %s object does not have a deserialized plist to return' % self.__class__.__name__)
+		
+		return self._plistObject
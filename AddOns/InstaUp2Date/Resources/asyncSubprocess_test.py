@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+import os, stat, time, unittest
+
+from tempFolderManager		import tempFolderManager
+from commonExceptions		import ProcessTimeoutException, ProcessCancelledException
+
+from asyncSubprocess		import asyncSubprocess
+
+class asyncSubprocessTests(unittest.TestCase):
+	'''Test running processes without blocking on them, using stub executables'''
+	
+	stubFolderPath			= None
+	
+	def setUp(self):
+		self.stubFolderPath = tempFolderManager.getNewTempFolder()
+	
+	def tearDown(self):
+		asyncSubprocess.killDelay = 5
+		tempFolderManager.cleanupForExit()
+	
+	def makeStub(self, name, script):
+		'''Write a shell script to stand in for a real executable, returning its path'''
+		
+		stubPath = os.path.join(self.stubFolderPath, name)
+		stubFile = open(stubPath, 'w')
+		stubFile.write('#!/bin/sh\n' + script + '\n')
+		stubFile.close()
+		os.chmod(stubPath, stat.S_IRWXU)
+		
+		return stubPath
+	
+	def test_lineCallbacks(self):
+		'''Each line should be handed to the callbacks as it is written, not once the process is done'''
+		
+		stubPath = self.makeStub('lines', 'echo one; echo "to stderr" 1>&2; sleep 1; echo two')
+		
+		receivedLines = []
+		process = asyncSubprocess([stubPath], stdoutCallback=lambda thisLine: receivedLines.append((time.time(), thisLine)), stderrCallback=lambda thisLine: receivedLines.append((time.time(), 'stderr: ' + thisLine)))
+		self.assertTrue(process.isRunning(), 'The process was not left running in the background')
+		
+		process.result()
+		finishTime = time.time()
+		
+		self.assertEqual(sorted([thisLine for lineTime, thisLine in receivedLines]), ['one', 'stderr: to stderr', 'two'], 'The callbacks did not get the right lines: ' + str(receivedLines))
+		self.assertTrue(dict([(thisLine, lineTime) for lineTime, thisLine in receivedLines])['one'] < finishTime - 0.5, 'The first line was not handed over until the process finished')
+		self.assertEqual(process.getStdout(), 'one\ntwo\n', 'The stdout was not kept')
+		self.assertEqual(process.getStderr(), 'to stderr\n', 'The stderr was not kept')
+		self.assertEqual(process.returncode, 0, 'The return code was not kept')
+	
+	def test_failingCommand(self):
+		'''A non-zero return code should raise the same RuntimeError as managedSubprocess'''
+		
+		stubPath = self.makeStub('failing', 'echo "bad things" 1>&2; exit 3')
+		
+		process = asyncSubprocess([stubPath, 'argument'])
+		self.assertEqual(process.wait(), 3, 'wait did not return the return code')
+		try:
+			process.result()
+		except RuntimeError, error:
+			self.assertEqual(str(error), 'The process "%s argument" failed with error: 3\nStderr: bad things' % stubPath, 'A failing process did not raise the expected message, got: ' + str(error))
+		else:
+			self.fail('A failing process did not raise a RuntimeError')
+		
+		self.assertRaises(OSError, asyncSubprocess, ['/this-should-not-exist'])
+	
+	def test_timeout(self):
+		'''A process that runs past its timeout should be stopped, and a process that ignores SIGTERM killed'''
+		
+		stubPath = self.makeStub('slow', 'exec sleep 30')
+		startTime = time.time()
+		process = asyncSubprocess([stubPath], timeout=0.5)
+		self.assertRaises(ProcessTimeoutException, process.result)
+		self.assertTrue(time.time() - startTime < 5, 'The process was not stopped at its timeout')
+		
+		asyncSubprocess.killDelay = 0.5
+		stubPath = self.makeStub('stubborn', 'trap "" TERM; while true; do sleep 0.1; done')
+		startTime = time.time()
+		process = asyncSubprocess([stubPath], timeout=0.5)
+		self.assertRaises(ProcessTimeoutException, process.result)
+		self.assertTrue(time.time() - startTime < 5, 'The process ignoring SIGTERM was not killed')
+		self.assertEqual(process.returncode, -9, 'The process ignoring SIGTERM did not exit from SIGKILL, got: ' + str(process.returncode))
+	
+	def test_cancel(self):
+		'''A cancelled process should stop, and a callback that fails should stop its process'''
+		
+		stubPath = self.makeStub('slow', 'echo started; exec sleep 30')
+		
+		process = asyncSubprocess([stubPath])
+		self.assertEqual(process.wait(0.2), None, 'wait with a timeout did not return None for a running process')
+		process.cancel()
+		self.assertNotEqual(process.wait(5), None, 'A cancelled process did not stop')
+		self.assertRaises(ProcessCancelledException, process.result)
+		
+		def failingCallback(thisLine):
+			raise ValueError('callback failed')
+		
+		process = asyncSubprocess([stubPath], stdoutCallback=failingCallback)
+		self.assertNotEqual(process.wait(5), None, 'A process with a failing callback did not stop')
+		self.assertRaises(ValueError, process.result)
+	
+	def test_gather(self):
+		'''Commands should run at the same time, no more than maxConcurrent at once, with their results in order'''
+		
+		stubPath = self.makeStub('numbered', 'sleep 0.5; echo $1')
+		commands = [[stubPath, str(i)] for i in range(4)]
+		
+		startTime = time.time()
+		results = asyncSubprocess.gather(commands)
+		self.assertTrue(time.time() - startTime < 1.5, 'The commands were not run at the same time, they took %.1f seconds' % (time.time() - startTime))
+		self.assertEqual([thisProcess.getStdout() for thisProcess in results], ['0\n', '1\n', '2\n', '3\n'], 'The results were not in the order of the commands')
+		
+		startTime = time.time()
+		results = asyncSubprocess.gather(commands, maxConcurrent=2)
+		self.assertTrue(time.time() - startTime >= 1, 'More than maxConcurrent commands were run at once')
+		self.assertEqual([thisProcess.getStdout() for thisProcess in results], ['0\n', '1\n', '2\n', '3\n'], 'The results with a maxConcurrent were not in the order of the commands')
+	
+	def test_gatherFailure(self):
+		'''When one command fails the others should be cancelled, unless returnExceptions is True'''
+		
+		slowPath = self.makeStub('slow', 'exec sleep 30')
+		failingPath = self.makeStub('failing', 'exit 1')
+		workingPath = self.makeStub('working', 'echo worked')
+		
+		startTime = time.time()
+		self.assertRaises(RuntimeError, asyncSubprocess.gather, [[slowPath], [failingPath], [slowPath]])
+		self.assertTrue(time.time() - startTime < 5, 'The other commands were not cancelled when one failed')
+		
+		results = asyncSubprocess.gather([[failingPath], [workingPath], ['/this-should-not-exist']], returnExceptions=True)
+		self.assertTrue(isinstance(results[0], RuntimeError), 'A failing command did not have its error returned, got: ' + str(results[0]))
+		self.assertEqual(results[1].getStdout(), 'worked\n', 'A working command alongside failing ones did not finish')
+		self.assertTrue(isinstance(results[2], OSError), 'A missing command did not have its error returned, got: ' + str(results[2]))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+
+import sys, threading, Queue
+
+class buildPipeline:
+	'''Resolve jobs one after another on a background thread, building each job on the calling thread as soon as its own inputs are resolved rather than waiting on every job. Only one build runs at a time.'''
+	
+	#--------------------Instance Variables---------------------------
+	
+	resolveFunction			= None		# called with each job in order on the resolver thread
+	buildFunction			= None		# called with each resolved job in order on the calling thread
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, resolveFunction, buildFunction):
+		
+		if not hasattr(resolveFunction, '__call__') or not hasattr(buildFunction, '__call__'):
+			raise ValueError('%s requires a resolve and a build function' % self.__class__.__name__)
+		
+		self.resolveFunction = resolveFunction
+		self.buildFunction = buildFunction
+	
+	def run(self, jobs):
+		'''Resolve and build all of the jobs, in the order they were given. After the first error nothing new is resolved or built, and the error is re-raised once the resolver has stopped.'''
+		
+		jobs = list(jobs)
+		
+		resolvedQueue = Queue.Queue()	# (job, sys.exc_info() or None)
+		stopEvent = threading.Event()
+		
+		def resolveWorker():
+			for thisJob in jobs:
+				if stopEvent.isSet():
+					return
+				try:
+					self.resolveFunction(thisJob)
+					resolvedQueue.put((thisJob, None))
+				except Exception:
+					resolvedQueue.put((thisJob, sys.exc_info()))
+					return
+		
+		resolver = threading.Thread(target=resolveWorker)
+		resolver.setDaemon(True)
+		resolver.start()
+		
+		try:
+			for builtCount in range(len(jobs)):
+				
+				while True:
+					try:
+						# a timeout keeps the wait interruptible
+						thisJob, errorInfo = resolvedQueue.get(True, 0.5)
+						break
+					except Queue.Empty:
+						continue
+				
+				if errorInfo is not None:
+					raise errorInfo[0], errorInfo[1], errorInfo[2]
+				
+				self.buildFunction(thisJob)
+		
+		finally:
+			stopEvent.set()
+			resolver.join()
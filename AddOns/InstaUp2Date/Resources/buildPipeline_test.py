@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+import time, threading, unittest
+
+from buildPipeline import buildPipeline
+
+class buildPipelineTests(unittest.TestCase):
+	'''Test that builds start as soon as their own jobs are resolved, one at a time'''
+	
+	eventLog		= None
+	eventLock		= None
+	runningBuilds	= None
+	mostBuilds		= None
+	
+	def setUp(self):
+		self.eventLog = []
+		self.eventLock = threading.Lock()
+		self.runningBuilds = 0
+		self.mostBuilds = 0
+	
+	def logEvent(self, eventName, job):
+		self.eventLock.acquire()
+		try:
+			self.eventLog.append((eventName, job))
+		finally:
+			self.eventLock.release()
+	
+	def resolveJob(self, job):
+		time.sleep(0.05)
+		self.logEvent('resolved', job)
+	
+	def buildJob(self, job):
+		self.eventLock.acquire()
+		try:
+			self.runningBuilds += 1
+			self.mostBuilds = max(self.mostBuilds, self.runningBuilds)
+			self.eventLog.append(('build started', job))
+		finally:
+			self.eventLock.release()
+		
+		time.sleep(0.2)
+		
+		self.eventLock.acquire()
+		try:
+			self.runningBuilds -= 1
+		finally:
+			self.eventLock.release()
+	
+	def test_pipelined(self):
+		'''The first build should start before the later jobs are resolved'''
+		
+		buildPipeline(self.resolveJob, self.buildJob).run(['a', 'b', 'c'])
+		
+		self.assertTrue(self.eventLog.index(('build started', 'a')) < self.eventLog.index(('resolved', 'c')), 'The first build waited on every job being resolved: %s' % self.eventLog)
+		self.assertEqual([job for eventName, job in self.eventLog if eventName == 'build started'], ['a', 'b', 'c'], 'The builds did not start in order: %s' % self.eventLog)
+		self.assertEqual(self.mostBuilds, 1, 'More than one build ran at once')
+	
+	def test_errors(self):
+		'''An error resolving a job should stop later jobs, but not the build already running, and an error building one should stop the resolving'''
+		
+		def failingResolve(job):
+			if job == 'b':
+				# let the first build get going
+				startTime = time.time()
+				while ('build started', 'a') not in self.eventLog and time.time() - startTime < 5:
+					time.sleep(0.01)
+				raise ValueError('Unable to resolve: ' + job)
+			self.resolveJob(job)
+		
+		myPipeline = buildPipeline(failingResolve, self.buildJob)
+		self.assertRaises(ValueError, myPipeline.run, ['a', 'b', 'c'])
+		
+		self.assertTrue(('build started', 'a') in self.eventLog, 'The build for the job resolved before the error did not run')
+		self.assertTrue(('resolved', 'c') not in self.eventLog, 'A job after the error was still resolved')
+		self.assertEqual(self.runningBuilds, 0, 'A build was still running when the error was raised')
+		
+		def failingBuild(job):
+			self.logEvent('build started', job)
+			raise ValueError('Unable to build: ' + job)
+		
+		self.setUp()
+		self.assertRaises(ValueError, buildPipeline(self.resolveJob, failingBuild).run, ['a', 'b', 'c'])
+		self.assertEqual([job for eventName, job in self.eventLog if eventName == 'build started'], ['a'], 'Jobs were still built after a build failed: %s' % self.eventLog)
+		self.assertTrue(('resolved', 'c') not in self.eventLog, 'The resolving went on after a build failed: %s' % self.eventLog)
+		
+		self.assertRaises(ValueError, buildPipeline, self.resolveJob, None)
+
+if __name__ == "__main__":
+	unittest.main()
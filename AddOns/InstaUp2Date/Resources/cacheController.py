@@ -1,9 +1,13 @@
 #!/usr/bin/python
 
-import os, re, urlparse, time, urllib, urllib2, hashlib
+import os, re, urlparse, time, urllib, urllib2, hashlib, threading, json, math, shutil, Queue
 
 import pathHelpers, displayTools, checksum
-from commonExceptions		import FileNotFoundException
+from httpClient				import httpClient
+from commonExceptions		import FileNotFoundException, CatalogNotFoundException, SizeMismatchException
+from checksumIndex			import checksumIndex
+from downloadLock			import downloadLock
+from cacheQuota				import cacheQuota
 
 class cacheController:
 	
@@ -14,8 +18,36 @@ class cacheController:
 	
 	verifiedFiles			= {}		# collection of items that have already been found indexed by checksum
 	
+	folderIndexes			= {}		# per local source folder: the items in it by the checksum in their names, and by name
+	folderIndexesLock		= threading.RLock()
+	useFolderIndex			= True		# False re-scans the folders for every lookup
+	
 	fileNameChecksumRegex	= re.compile('^(.+?/)?(?P<fileName>.*)( (?P<checksumType>\S+)-(?P<checksumValue>[^\.]+))(?P<fileExtension>\.[^\.]+)?$')
 	
+	maxConnectionsPerHost	= 2			# limit on simultaneous downloads from any one server when items are found in parallel
+	hostSemaphores			= {}		# one semaphore per host, created as needed
+	hostSemaphoresLock		= threading.Lock()
+	heldHostConnections		= threading.local()	# per-thread counts, so nested lookups against the same host do not deadlock
+	
+	partialDownloadSuffix	= '.partial'		# downloads in progress, kept after a failure so they can be resumed
+	partialSidecarSuffix	= '.partial.json'	# what is needed to resume: url, ETag, Last-Modified, and how much we have
+	
+	downloadSegmentCount	= 1					# above 1 large downloads are split into this many ranges fetched at the same time
+	minimumSegmentedLength	= 16*1024*1024		# items smaller than this are not worth splitting up
+	
+	remoteManifestName		= 'index.json'		# optional list of items at the root of a web cache, by checksum
+	remoteManifestFolder	= '.remoteManifests'	# copies kept in the cache folder, so later runs only have to revalidate them
+	remoteManifests			= {}				# manifest items by web cache url, None for ones without a manifest, fetched once per run
+	remoteManifestsLock		= threading.Lock()
+	
+	contentStoreFolder		= '.objects'			# items by checksum: <type>/<first 2 characters>/<checksum>/<name>, with the cache folder holding links to them by name
+	
+	evictionLock			= threading.Lock()	# so parallel downloads do not make room by evicting the same items
+	
+	remoteCatalogFolder		= '.remoteCatalogs'	# copies of catalog files from web servers, revalidated rather than downloaded again
+	remoteCatalogs			= {}				# local copy path by catalog url, fetched once per run
+	remoteCatalogsLock		= threading.Lock()
+	
 	# ------ class methods
 	
 	# ---- cacheFolder methods
@@ -41,6 +73,10 @@ class cacheController:
 		# set the cache folder
 		myClass.writeableCacheFolder = newCacheFolder
 		
+		# keep the checksum index with the cache so it survives between runs
+		checksumIndex.setIndexFolder(newCacheFolder)
+		cacheQuota.setUsageFolder(newCacheFolder)
+		
 		# make sure it is in the list of source folders
 		myClass.addSourceFolders(newCacheFolder)
 	
@@ -57,6 +93,8 @@ class cacheController:
 		
 		myClass.removeSourceFolders(myClass.writeableCacheFolder)
 		myClass.writeableCacheFolder = None
+		checksumIndex.closeIndex()
+		cacheQuota.closeUsage()
 	
 	# ---- sourceFolder methods
 	
@@ -95,22 +133,19 @@ class cacheController:
 			if parsedLocation.scheme in ['http', 'https']:
 				# web caches
 				
-				# open a connection, and see if we get a responce
+				# probe with a HEAD request, and see if we get a responce
 				
 				try:
-					readFile = urllib2.urlopen(thisFolder)
-					readFile.close()
+					httpClient.head(thisFolder)
 				except urllib2.HTTPError, error:
-					if error.code in [403]: # these might mean that the directory can't be listed
-						myClass.sourceFolders.append(thisFolder)
-					else:
+					if error.code not in [403]: # these might mean that the directory can't be listed
 						raise Exception('Got status code: %s while trying to connect to remote url: %s' % (str(error.code), thisFolder))
 				
 				except urllib2.URLError, error:
 					# a bad network connection, or url
 					raise Exception('Unable to connect to remote url: %s got error: %s' % (thisFolder, error.reason))
 				
-				# a 200 responce
+				# a 200 responce, or a folder that can not be listed
 				myClass.sourceFolders.append(thisFolder)	
 			
 			elif parsedLocation.scheme == '':
@@ -160,14 +195,958 @@ class cacheController:
 			if thisFolder in myClass.sourceFolders:
 				myClass.sourceFolders.remove(thisFolder)
 			
+			myClass.folderIndexesLock.acquire()
+			try:
+				myClass.folderIndexes.pop(thisFolder, None)
+			finally:
+				myClass.folderIndexesLock.release()
+			
 			if thisFolder == myClass.writeableCacheFolder:
 				myClass.writeableCacheFolder = None
+				checksumIndex.closeIndex()
+				cacheQuota.closeUsage()
+	
+	# ---- connection methods
+	
+	@classmethod
+	def acquireHostConnection(myClass, location, blocking=True):
+		'''Wait for a free connection slot for the host in this url, or with blocking False only take one if it is free. A thread that already holds a slot for the host does not take a second one. Returns True if a slot is held.'''
+		
+		hostName = urlparse.urlparse(location).netloc.lower()
+		
+		myClass.hostSemaphoresLock.acquire()
+		try:
+			if hostName not in myClass.hostSemaphores:
+				myClass.hostSemaphores[hostName] = threading.BoundedSemaphore(max(1, int(myClass.maxConnectionsPerHost)))
+			hostSemaphore = myClass.hostSemaphores[hostName]
+		finally:
+			myClass.hostSemaphoresLock.release()
+		
+		heldConnections = myClass.heldHostConnections.__dict__.setdefault('counts', {})
+		if heldConnections.get(hostName, 0) == 0 and not hostSemaphore.acquire(blocking):
+			return False
+		heldConnections[hostName] = heldConnections.get(hostName, 0) + 1
+		
+		return True
+	
+	@classmethod
+	def holdsHostConnection(myClass, location):
+		'''If this thread holds a connection slot for the host in this url'''
+		
+		hostName = urlparse.urlparse(location).netloc.lower()
+		return myClass.heldHostConnections.__dict__.setdefault('counts', {}).get(hostName, 0) > 0
+	
+	@classmethod
+	def releaseHostConnection(myClass, location):
+		
+		hostName = urlparse.urlparse(location).netloc.lower()
+		
+		heldConnections = myClass.heldHostConnections.__dict__.setdefault('counts', {})
+		if heldConnections.get(hostName, 0) < 1:
+			raise RuntimeError('releaseHostConnection called for a host this thread does not hold a connection to: ' + hostName)
+		
+		heldConnections[hostName] -= 1
+		if heldConnections[hostName] == 0:
+			myClass.hostSemaphores[hostName].release()
+	
+	# ---- folder index methods
+	
+	@classmethod
+	def indexFolder(myClass, folderPath):
+		'''Walk a local folder once, returning an index of the items in it: {'checksums':{'checksumType-checksumValue':[(order, path)]}, 'names':{name:[(order, path)]}, 'count':items}'''
+		
+		folderIndex = {'checksums':{}, 'names':{}, 'count':0}
+		
+		for currentFolder, dirs, files in os.walk(folderPath, topdown=True):
+			for thisItemName in files + dirs:
+				thisItemPath = os.path.join(currentFolder, thisItemName)
+				
+				# saved copies of remote manifests and catalogs, and the download locks, are never the answer, and the content store is reached through its links
+				if thisItemName in (myClass.remoteManifestFolder, myClass.remoteCatalogFolder, downloadLock.lockFolderName, myClass.contentStoreFolder) and thisItemName in dirs:
+					dirs.remove(thisItemName)
+					continue
+				
+				myClass.addItemToFolderIndex(folderIndex, thisItemPath)
+				
+				# don't decend into folders that look like bundles or sparce dmg's
+				if thisItemName in dirs:
+					folderContents = os.listdir(thisItemPath)
+					if folderContents == ["Contents"] or folderContents == ["Info.bckup", "Info.plist", "bands", "token"]:
+						dirs.remove(thisItemName)
+		
+		return folderIndex
+	
+	@classmethod
+	def addItemToFolderIndex(myClass, folderIndex, itemPath):
+		
+		itemName = os.path.basename(itemPath)
+		
+		# downloads in progress are never the answer
+		if itemName.endswith(myClass.partialDownloadSuffix) or itemName.endswith(myClass.partialSidecarSuffix):
+			return
+		
+		folderIndex['count'] += 1
+		indexEntry = (folderIndex['count'], itemPath)
+		
+		# checksum in name
+		fileNameSearchResults = myClass.fileNameChecksumRegex.search(itemName)
+		if fileNameSearchResults is not None and fileNameSearchResults.group('checksumType') is not None and fileNameSearchResults.group('checksumValue') is not None:
+			folderIndex['checksums'].setdefault('%s-%s' % (fileNameSearchResults.group('checksumType').lower(), fileNameSearchResults.group('checksumValue')), []).append(indexEntry)
+		
+		# file name, with and without the extension
+		for thisName in set([itemName, os.path.splitext(itemName)[0]]):
+			folderIndex['names'].setdefault(thisName, []).append(indexEntry)
+	
+	@classmethod
+	def getFolderIndex(myClass, folderPath):
+		'''Return the index for a local folder, only walking it the first time it is asked for'''
+		
+		if myClass.useFolderIndex is False:
+			return myClass.indexFolder(folderPath)
+		
+		myClass.folderIndexesLock.acquire()
+		try:
+			if folderPath not in myClass.folderIndexes:
+				myClass.folderIndexes[folderPath] = myClass.indexFolder(folderPath)
+			return myClass.folderIndexes[folderPath]
+		finally:
+			myClass.folderIndexesLock.release()
+	
+	@classmethod
+	def addItemToFolderIndexes(myClass, itemPath):
+		'''Add a new item, such as a finished download, to the indexes of any folders it is in'''
+		
+		myClass.folderIndexesLock.acquire()
+		try:
+			for thisFolder, thisFolderIndex in myClass.folderIndexes.items():
+				if itemPath.startswith(thisFolder.rstrip(os.sep) + os.sep):
+					myClass.addItemToFolderIndex(thisFolderIndex, itemPath)
+		finally:
+			myClass.folderIndexesLock.release()
+	
+	@classmethod
+	def forgetFolderIndexes(myClass):
+		'''Throw away the indexes so the folders are walked again, usefull mostly in testing'''
+		
+		myClass.folderIndexesLock.acquire()
+		try:
+			myClass.folderIndexes = {}
+		finally:
+			myClass.folderIndexesLock.release()
+	
+	@classmethod
+	def findInFolderIndex(myClass, folderPath, nameOrLocation, checksumType, checksumValue):
+		'''Return the paths in a local folder that might be the item, in the order they were found in the folder'''
+		
+		folderIndex = myClass.getFolderIndex(folderPath)
+		
+		candidates = list(folderIndex['checksums'].get('%s-%s' % (checksumType.lower(), checksumValue), []))
+		if nameOrLocation is not None:
+			for thisName in set([nameOrLocation, os.path.splitext(nameOrLocation)[0]]):
+				candidates += folderIndex['names'].get(thisName, [])
+		
+		candidatePaths = []
+		for order, thisItemPath in sorted(set(candidates)):
+			# items can be removed during a run
+			if os.path.exists(thisItemPath):
+				candidatePaths.append(thisItemPath)
+		
+		return candidatePaths
+	
+	# ---- content store methods
+	
+	@classmethod
+	def hasContentStore(myClass, folderPath):
+		return os.path.isdir(os.path.join(folderPath, myClass.contentStoreFolder))
+	
+	@classmethod
+	def contentStoreObjectFolder(myClass, folderPath, checksumType, checksumValue):
+		return os.path.join(folderPath, myClass.contentStoreFolder, checksumType.lower(), checksumValue[:2], checksumValue)
+	
+	@classmethod
+	def findInContentStore(myClass, folderPath, checksumType, checksumValue):
+		'''Return the path of the item with this checksum in a folder's content store, or None. This is a single lookup, and folders without a content store cost no more.'''
+		
+		objectFolder = myClass.contentStoreObjectFolder(folderPath, checksumType, checksumValue)
+		try:
+			objectNames = [thisName for thisName in os.listdir(objectFolder) if not thisName.startswith('.')]
+		except OSError:
+			return None
+		
+		if len(objectNames) == 0:
+			return None
+		return os.path.join(objectFolder, sorted(objectNames)[0])
+	
+	@classmethod
+	def linkToContentStore(myClass, objectPath, linkPath):
+		'''Put a link to an object at linkPath, a hard link for files when possible, otherwise a relative symlink'''
+		
+		if os.path.isfile(objectPath):
+			try:
+				os.link(objectPath, linkPath)
+				return
+			except OSError:
+				pass # on another volume, or a file system without hard links
+		
+		os.symlink(os.path.relpath(objectPath, os.path.dirname(linkPath)), linkPath)
+	
+	@classmethod
+	def addItemToContentStore(myClass, itemPath, checksumType, checksumValue):
+		'''Move an item that has been verified against its checksum into the content store of the folder it is in, leaving a link under its name. Returns the path of the stored item.'''
+		
+		folderPath = os.path.dirname(itemPath)
+		
+		storedPath = myClass.findInContentStore(folderPath, checksumType, checksumValue)
+		if storedPath is not None:
+			if os.path.samefile(storedPath, itemPath):
+				return storedPath # already stored
+			
+			# a second copy of a stored file is replaced with a link, folders are left alone
+			if os.path.isfile(itemPath) and not os.path.islink(itemPath):
+				temporaryPath = itemPath + '.link'
+				myClass.linkToContentStore(storedPath, temporaryPath)
+				os.rename(temporaryPath, itemPath)
+			return storedPath
+		
+		objectFolder = myClass.contentStoreObjectFolder(folderPath, checksumType, checksumValue)
+		if not os.path.isdir(objectFolder):
+			try:
+				os.makedirs(objectFolder)
+			except OSError:
+				if not os.path.isdir(objectFolder):
+					raise # not just another thread getting there first
+		
+		storedPath = os.path.join(objectFolder, os.path.basename(itemPath))
+		os.rename(itemPath, storedPath)
+		myClass.linkToContentStore(storedPath, itemPath)
+		
+		return storedPath
+	
+	@classmethod
+	def migrateToContentStore(myClass, folderPath, progressReporter=None):
+		'''Move the items at the top of a cache folder that have a checksum in their name into its content store, creating it if needed. Each item is verified first, and ones that do not match their name are left in place. Returns the paths that were stored and the ones that were not.'''
+		
+		storeFolder = os.path.join(folderPath, myClass.contentStoreFolder)
+		if not os.path.isdir(storeFolder):
+			os.mkdir(storeFolder)
+		
+		storedPaths = []
+		skippedPaths = []
+		
+		for thisItemName in sorted(os.listdir(folderPath)):
+			thisItemPath = os.path.join(folderPath, thisItemName)
+			
+			if thisItemName.startswith('.') or thisItemName.endswith(myClass.partialDownloadSuffix) or thisItemName.endswith(myClass.partialSidecarSuffix):
+				continue
+			
+			fileNameSearchResults = myClass.fileNameChecksumRegex.search(thisItemName)
+			if fileNameSearchResults is None or fileNameSearchResults.group('checksumType') is None:
+				skippedPaths.append(thisItemPath)
+				continue
+			checksumType = fileNameSearchResults.group('checksumType').lower()
+			checksumValue = fileNameSearchResults.group('checksumValue')
+			
+			# migrated on an earlier run
+			storedPath = myClass.findInContentStore(folderPath, checksumType, checksumValue)
+			if storedPath is not None and os.path.samefile(storedPath, thisItemPath):
+				continue
+			
+			if progressReporter is not None:
+				progressReporter.update(statusMessage=' verifying %s' % thisItemName)
+			
+			if checksumValue != checksum.checksum(thisItemPath, checksumType=checksumType, progressReporter=None)['checksum']:
+				skippedPaths.append(thisItemPath)
+				continue
+			
+			storedPaths.append(myClass.addItemToContentStore(thisItemPath, checksumType, checksumValue))
+		
+		return storedPaths, skippedPaths
+	
+	# ---- quota methods
+	
+	@classmethod
+	def listCacheItems(myClass, folderPath):
+		'''Return the items at the top of a cache folder and in its content store, as dicts with: checksum (None if it is not in the name), paths (every name for it, including links), size, and mtime. Downloads in progress are included, without a checksum.'''
+		
+		itemsByIdentity = {}
+		
+		def addItemPath(itemPath, checksumString):
+			try:
+				itemStat = os.stat(itemPath)
+			except OSError:
+				return # a broken link
+			
+			# links to a stored item are the same item
+			thisItem = itemsByIdentity.setdefault((itemStat.st_dev, itemStat.st_ino), {'checksum':None, 'paths':[], 'size':None, 'mtime':itemStat.st_mtime})
+			thisItem['paths'].append(itemPath)
+			if thisItem['checksum'] is None:
+				thisItem['checksum'] = checksumString
+			if thisItem['size'] is None:
+				thisItem['size'] = checksumIndex.getFingerprint(itemPath)[0]
+		
+		for thisItemName in os.listdir(folderPath):
+			if thisItemName.startswith('.'):
+				continue # indexes, locks, and saved copies of remote files
+			
+			checksumString = None
+			fileNameSearchResults = myClass.fileNameChecksumRegex.search(thisItemName)
+			if fileNameSearchResults is not None and fileNameSearchResults.group('checksumType') is not None and not thisItemName.endswith(myClass.partialDownloadSuffix) and not thisItemName.endswith(myClass.partialSidecarSuffix):
+				checksumString = '%s-%s' % (fileNameSearchResults.group('checksumType').lower(), fileNameSearchResults.group('checksumValue'))
+			
+			addItemPath(os.path.join(folderPath, thisItemName), checksumString)
+		
+		# <type>/<first 2 characters>/<checksum>/<name>
+		storeFolder = os.path.join(folderPath, myClass.contentStoreFolder)
+		if os.path.isdir(storeFolder):
+			for checksumType in os.listdir(storeFolder):
+				for prefixName in os.listdir(os.path.join(storeFolder, checksumType)):
+					for checksumValue in os.listdir(os.path.join(storeFolder, checksumType, prefixName)):
+						objectFolder = os.path.join(storeFolder, checksumType, prefixName, checksumValue)
+						for thisItemName in os.listdir(objectFolder):
+							addItemPath(os.path.join(objectFolder, thisItemName), '%s-%s' % (checksumType, checksumValue))
+		
+		return itemsByIdentity.values()
+	
+	@classmethod
+	def removeCacheItem(myClass, cacheItem):
+		'''Delete an item from listCacheItems, along with every link to it and the records kept about it'''
+		
+		for thisPath in cacheItem['paths']:
+			if os.path.isdir(thisPath) and not os.path.islink(thisPath):
+				shutil.rmtree(thisPath)
+			elif os.path.lexists(thisPath):
+				os.unlink(thisPath)
+			checksumIndex.forgetItem(thisPath)
+			
+			# the folder for the checksum in the content store, <store>/<type>/<first 2 characters>/<checksum>, is only there to hold the item
+			objectFolder = os.path.dirname(thisPath)
+			if os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(objectFolder)))) == myClass.contentStoreFolder and os.listdir(objectFolder) == []:
+				os.rmdir(objectFolder)
+				if os.listdir(os.path.dirname(objectFolder)) == []:
+					os.rmdir(os.path.dirname(objectFolder))
+		
+		if cacheItem['checksum'] is not None:
+			cacheQuota.forgetUse(cacheItem['checksum'])
+			if myClass.verifiedFiles.get(cacheItem['checksum']) in cacheItem['paths']:
+				del myClass.verifiedFiles[cacheItem['checksum']]
+	
+	@classmethod
+	def makeRoomInCache(myClass, neededBytes=0, progressReporter=None):
+		'''Evict items from the writeable cache folder until neededBytes more fit under the quota, leaving the ones pinned by catalogs and the ones already found in this run. Returns the items evicted.'''
+		
+		if not cacheQuota.hasQuota():
+			return []
+		
+		myClass.evictionLock.acquire()
+		try:
+			cacheFolder = myClass.getCacheFolder()
+			evictions = cacheQuota.chooseEvictions(myClass.listCacheItems(cacheFolder), cacheQuota.getQuotaBytes(cacheFolder), neededBytes, protectedChecksums=myClass.verifiedFiles.keys())
+			
+			for thisItem in evictions:
+				if progressReporter is not None:
+					progressReporter.update(statusMessage=' evicting %s from the cache' % os.path.basename(thisItem['paths'][0]))
+				myClass.removeCacheItem(thisItem)
+			
+			return evictions
+		finally:
+			myClass.evictionLock.release()
+	
+	# ---- download methods
+	
+	@classmethod
+	def readPartialSidecar(myClass, sidecarPath):
+		'''Return the contents of a partial download's sidecar file, or None if there is not a useable one'''
+		
+		if not os.path.isfile(sidecarPath):
+			return None
+		
+		try:
+			sidecarFile = open(sidecarPath, 'r')
+			try:
+				sidecar = json.load(sidecarFile)
+			finally:
+				sidecarFile.close()
+		except (IOError, ValueError):
+			return None
+		
+		if not isinstance(sidecar, dict):
+			return None
+		
+		return sidecar
+	
+	@classmethod
+	def writePartialSidecar(myClass, sidecarPath, sidecar):
+		
+		sidecarFile = open(sidecarPath, 'w')
+		try:
+			json.dump(sidecar, sidecarFile)
+		finally:
+			sidecarFile.close()
+	
+	@classmethod
+	def openLocation(myClass, location, headers=None):
+		'''Open a url, turning connection failures into readable exceptions'''
+		
+		try:
+			return httpClient.urlopen(location, headers=headers)
+		except IOError, error:
+			if hasattr(error, 'reason'):
+				raise Exception('Unable to connect to remote url: %s got error: %s' % (location, error.reason))
+			elif hasattr(error, 'code'):
+				raise Exception('Got status code: %s while trying to connect to remote url: %s' % (str(error.code), location))
+			raise
+	
+	@classmethod
+	def newPartialSidecar(myClass, location, checksumType, readFile):
+		'''Return a sidecar for a download starting from the beginning with this response'''
+		
+		httpHeader = readFile.info()
+		
+		expectedLength = None
+		if httpHeader.has_key("content-length"):
+			try:
+				expectedLength = int(httpHeader.getheader("content-length"))
+			except:
+				pass
+		
+		return {'url':location, 'checksumType':checksumType, 'etag':httpHeader.getheader('etag'), 'lastModified':httpHeader.getheader('last-modified'), 'expectedLength':expectedLength, 'bytesSoFar':0, 'resumePolicy':'rehash'}
+	
+	@classmethod
+	def downloadItem(myClass, location, targetFilePath, checksumType, checksumValue=None, readFile=None, progressReporter=None, keepMismatchedFile=False, expectedSize=None):
+		'''Download an item to targetFilePath via a .partial file, resuming an earlier partial download with a Range request when the server supports it. Returns the hash generator, the bytes downloaded, and the seconds it took. If the checksum does not match checksumValue the file is removed, unless keepMismatchedFile is True. With an expectedSize the file is preallocated, and the download is given up with a SizeMismatchException as soon as it is clear the size is wrong.'''
+		
+		startTime = time.time()
+		
+		partialPath = targetFilePath + myClass.partialDownloadSuffix
+		sidecarPath = targetFilePath + myClass.partialSidecarSuffix
+		
+		hashGenerator = checksum.newHashGenerator(checksumType)
+		
+		# -- see if there is a partial download we can pick up from
+		
+		resumeFrom = 0
+		segmented = False
+		sidecar = myClass.readPartialSidecar(sidecarPath)
+		if sidecar is not None and sidecar.get('url') == location and sidecar.get('checksumType') == checksumType and os.path.isfile(partialPath) and (sidecar.get('etag') or sidecar.get('lastModified')) and not sidecar.get('preallocated') and (expectedSize is None or sidecar.get('expectedLength') in [None, expectedSize]):
+			if sidecar.get('segments'):
+				segmented = True # segments leave holes in the file, so only the sidecar knows how much we have
+			else:
+				resumeFrom = os.path.getsize(partialPath)
+		
+		if segmented is True or (resumeFrom > 0 and resumeFrom == sidecar.get('expectedLength')):
+			# the segments pick up where they left off, or the download finished but was never moved into place
+			if readFile is not None:
+				readFile.close()
+				readFile = None
+		
+		elif resumeFrom > 0:
+			# only resume if the item is still the same one, otherwise the server should send the whole thing
+			rangeFile = None
+			try:
+				rangeFile = httpClient.urlopen(location, headers={'Range':'bytes=%i-' % resumeFrom, 'If-Range':sidecar.get('etag') or sidecar.get('lastModified')})
+			except IOError:
+				pass
+			
+			contentRange = None
+			if rangeFile is not None:
+				contentRange = rangeFile.info().getheader('content-range')
+			
+			if rangeFile is not None and rangeFile.getcode() == 206 and contentRange is not None and contentRange.strip().startswith('bytes %i-' % resumeFrom):
+				if readFile is not None:
+					readFile.close()
+				readFile = rangeFile
+			
+			else:
+				# the server ignored the range, or the item changed
+				resumeFrom = 0
+				if rangeFile is not None and rangeFile.getcode() == 200 and readFile is None:
+					readFile = rangeFile
+				elif rangeFile is not None:
+					rangeFile.close()
+		
+		# -- open the connection if we have not already
+		
+		if readFile is None and (segmented is True or resumeFrom > 0):
+			pass # everything we need is in the sidecar
+		
+		else:
+			if readFile is None:
+				readFile = myClass.openLocation(location)
+			
+			if resumeFrom == 0:
+				sidecar = myClass.newPartialSidecar(location, checksumType, readFile)
+				
+				# the size from the catalog stands in for a missing content-length, and rules out the wrong item before any of it is downloaded
+				if expectedSize is not None and sidecar['expectedLength'] is None:
+					sidecar['expectedLength'] = expectedSize
+				elif expectedSize is not None and sidecar['expectedLength'] != expectedSize:
+					readFile.close()
+					raise SizeMismatchException('The server says %s is %i bytes, but %i bytes were expected' % (location, sidecar['expectedLength'], expectedSize))
+				
+				# large items can be fetched over several connections at once, if the server says it takes ranges
+				acceptRanges = readFile.info().getheader('accept-ranges') or ''
+				if myClass.downloadSegmentCount > 1 and sidecar['expectedLength'] is not None and sidecar['expectedLength'] >= max(myClass.minimumSegmentedLength, 1) and acceptRanges.strip().lower() == 'bytes' and (sidecar['etag'] or sidecar['lastModified']):
+					readFile.close()
+					readFile = None
+					
+					segmentLength = int(math.ceil(float(sidecar['expectedLength']) / myClass.downloadSegmentCount))
+					sidecar['segments'] = [[startByte, min(startByte + segmentLength, sidecar['expectedLength']) - 1, 0] for startByte in range(0, sidecar['expectedLength'], segmentLength)]
+					
+					# preallocate the file, each segment writes into its own part of it
+					partialFile = open(partialPath, 'wb')
+					partialFile.truncate(sidecar['expectedLength'])
+					partialFile.close()
+					
+					segmented = True
+			
+			myClass.writePartialSidecar(sidecarPath, sidecar)
+		
+		expectedLength = sidecar.get('expectedLength')
+		processedBytes = 0
+		
+		# make room for the rest of the item before downloading it, when the cache folder has a quota
+		if expectedLength is not None and cacheQuota.hasQuota() and os.path.dirname(targetFilePath) == myClass.writeableCacheFolder:
+			partialLength = 0
+			if os.path.isfile(partialPath):
+				partialLength = os.path.getsize(partialPath)
+			myClass.makeRoomInCache(max(expectedLength - partialLength, 0), progressReporter=progressReporter)
+		processSeconds = time.time() - startTime
+		
+		# -- download in segments, the checksum is worked out once they are all in
+		
+		if segmented is True:
+			processedBytes, processSeconds = myClass.downloadItemSegments(location, partialPath, sidecarPath, sidecar, progressReporter=progressReporter)
+			
+			if processedBytes is None:
+				# the server did not honor the ranges after all, so start over with a single stream
+				readFile = myClass.openLocation(location)
+				sidecar = myClass.newPartialSidecar(location, checksumType, readFile)
+				myClass.writePartialSidecar(sidecarPath, sidecar)
+				
+				expectedLength = sidecar['expectedLength']
+				processedBytes = 0
+			
+			else:
+				if progressReporter is not None:
+					progressReporter.update(statusMessage=' verifying ', progressTemplate='%(progressPercentage)i%% (%(recentRateInBytes)s)', expectedLength=expectedLength, value=0)
+				
+				partialFile = open(partialPath, 'rb')
+				try:
+					checksum.checksumFileObject(hashGenerator, partialFile, os.path.basename(partialPath), expectedLength, progressReporter=progressReporter)
+				finally:
+					partialFile.close()
+		
+		# -- the hash state can not be saved, so re-read the part we already have
+		
+		if resumeFrom > 0:
+			if progressReporter is not None:
+				progressReporter.update(statusMessage=' re-reading %s already downloaded ' % displayTools.bytesToRedableSize(resumeFrom))
+			
+			partialFile = open(partialPath, 'rb')
+			try:
+				checksum.checksumFileObject(hashGenerator, partialFile, os.path.basename(partialPath), resumeFrom)
+			finally:
+				partialFile.close()
+		
+		# -- download the rest
+		
+		if readFile is not None:
+			if progressReporter is not None and resumeFrom > 0:
+				progressReporter.update(statusMessage=' resuming download at %s ' % displayTools.bytesToRedableSize(resumeFrom))
+			
+			remainingLength = None
+			if expectedLength is not None:
+				remainingLength = expectedLength - resumeFrom
+			
+			maxLength = None
+			preallocateLength = None
+			if expectedSize is not None:
+				maxLength = expectedSize - resumeFrom
+				if resumeFrom == 0:
+					# until the file is trimmed the sidecar marks it as not resumable, its size is not what we have
+					preallocateLength = expectedSize
+					sidecar['preallocated'] = True
+					myClass.writePartialSidecar(sidecarPath, sidecar)
+			
+			sizeMismatch = False
+			try:
+				processedBytes, processSeconds = checksum.checksumFileObject(hashGenerator, readFile, os.path.basename(targetFilePath), remainingLength, copyToPath=partialPath, appendToCopy=(resumeFrom > 0), progressReporter=progressReporter, maxLength=maxLength, preallocateLength=preallocateLength)
+			except SizeMismatchException:
+				sizeMismatch = True
+				raise
+			finally:
+				readFile.close()
+				sidecar['preallocated'] = False
+				
+				if sizeMismatch is True:
+					# this is not the item, so there is nothing worth resuming
+					for thisPath in [partialPath, sidecarPath]:
+						if os.path.exists(thisPath):
+							os.unlink(thisPath)
+				
+				# keep the sidecar up to date so a later run knows what we have
+				elif os.path.isfile(partialPath):
+					sidecar['bytesSoFar'] = os.path.getsize(partialPath)
+					myClass.writePartialSidecar(sidecarPath, sidecar)
+			
+			if expectedLength is not None and resumeFrom + processedBytes < expectedLength:
+				raise Exception('The download of %s stopped after %i of %i bytes, it will be resumed on the next run' % (location, resumeFrom + processedBytes, expectedLength))
+		
+		# -- move the finished item into place
+		
+		if checksumValue is None or hashGenerator.hexdigest() == checksumValue or keepMismatchedFile is True:
+			os.rename(partialPath, targetFilePath)
+			myClass.addItemToFolderIndexes(targetFilePath)
+		else:
+			os.unlink(partialPath)
+		os.unlink(sidecarPath)
+		
+		return hashGenerator, processedBytes, processSeconds
+	
+	@classmethod
+	def downloadItemSegments(myClass, location, partialPath, sidecarPath, sidecar, progressReporter=None):
+		'''Fetch the unfinished segments listed in the sidecar, writing them into their parts of the preallocated partial file. Each connection takes one of the host's connection slots, the first using the caller's if it has one, and more are only opened while slots are free, so the segments share what --connections-per-host allows. Returns the bytes downloaded and the seconds it took, or (None, None) if the server did not honor the ranges.'''
+		
+		startTime = time.time()
+		
+		segments = sidecar['segments']
+		validator = sidecar.get('etag') or sidecar.get('lastModified')
+		
+		stopEvent = threading.Event()
+		segmentErrors = []
+		rangesIgnored = []
+		downloadedBytes = [0] * len(segments)
+		
+		segmentQueue = Queue.Queue()
+		for segmentIndex in range(len(segments)):
+			if segments[segmentIndex][0] + segments[segmentIndex][2] <= segments[segmentIndex][1]:
+				segmentQueue.put(segmentIndex)
+		
+		callerHoldsConnection = myClass.holdsHostConnection(location)
+		
+		def connectionWorker(firstWorker):
+			# the first worker can always go ahead, on the caller's slot or by waiting for one, the rest never wait so they can not deadlock against other items
+			if firstWorker is True and callerHoldsConnection is True:
+				pass
+			elif not myClass.acquireHostConnection(location, blocking=firstWorker):
+				return
+			
+			try:
+				while not stopEvent.isSet():
+					try:
+						segmentIndex = segmentQueue.get_nowait()
+					except Queue.Empty:
+						break
+					segmentWorker(segmentIndex)
+			finally:
+				if firstWorker is not True or callerHoldsConnection is not True:
+					myClass.releaseHostConnection(location)
+		
+		def segmentWorker(segmentIndex):
+			segment = segments[segmentIndex]
+			startByte = segment[0] + segment[2]
+			endByte = segment[1]
+			
+			try:
+				segmentFile = httpClient.urlopen(location, headers={'Range':'bytes=%i-%i' % (startByte, endByte), 'If-Range':validator})
+				try:
+					contentRange = segmentFile.info().getheader('content-range')
+					if segmentFile.getcode() != 206 or contentRange is None or not contentRange.strip().startswith('bytes %i-' % startByte):
+						rangesIgnored.append(segmentIndex)
+						stopEvent.set()
+						return
+					
+					partialFile = open(partialPath, 'r+b')
+					try:
+						partialFile.seek(startByte)
+						while not stopEvent.isSet() and segment[0] + segment[2] <= endByte:
+							thisChunk = segmentFile.read(min(256*1024, endByte - (segment[0] + segment[2]) + 1))
+							if not thisChunk:
+								break
+							partialFile.write(thisChunk)
+							segment[2] += len(thisChunk)
+							downloadedBytes[segmentIndex] += len(thisChunk)
+					finally:
+						partialFile.close()
+				finally:
+					segmentFile.close()
+				
+				if segment[0] + segment[2] <= endByte and not stopEvent.isSet():
+					raise Exception('bytes %i-%i stopped after %i bytes' % (startByte, endByte, segment[0] + segment[2] - startByte))
+			
+			except Exception, error:
+				segmentErrors.append(error)
+		
+		workers = []
+		for workerIndex in range(min(segmentQueue.qsize(), max(1, int(myClass.maxConnectionsPerHost)))):
+			thisWorker = threading.Thread(target=connectionWorker, args=(workerIndex == 0,))
+			thisWorker.setDaemon(True)
+			thisWorker.start()
+			workers.append(thisWorker)
+		
+		# report on the segments as they go, and keep the sidecar current in case we get stopped
+		lastDownloadedBytes = list(downloadedBytes)
+		lastReportTime = time.time()
+		while True in [thisWorker.isAlive() for thisWorker in workers]:
+			# wait on the first one still going, but wake up regularly to report
+			for thisWorker in workers:
+				if thisWorker.isAlive():
+					thisWorker.join(0.5)
+					break
+			
+			currentTime = time.time()
+			sidecar['bytesSoFar'] = sum([thisSegment[2] for thisSegment in segments])
+			myClass.writePartialSidecar(sidecarPath, sidecar)
+			
+			if progressReporter is not None:
+				segmentRates = []
+				for segmentIndex in range(len(segments)):
+					segmentRates.append(displayTools.bytesToRedableSize((downloadedBytes[segmentIndex] - lastDownloadedBytes[segmentIndex]) / max(currentTime - lastReportTime, 0.001)) + '/sec')
+				progressReporter.update(progressTemplate='%(progressPercentage)i%% (%(recentRateInBytes)s) segments: ' + ', '.join(segmentRates), expectedLength=sidecar['expectedLength'], value=sidecar['bytesSoFar'])
+			
+			lastDownloadedBytes = list(downloadedBytes)
+			lastReportTime = currentTime
+		
+		sidecar['bytesSoFar'] = sum([thisSegment[2] for thisSegment in segments])
+		myClass.writePartialSidecar(sidecarPath, sidecar)
+		
+		if len(rangesIgnored) > 0:
+			return None, None
+		
+		if len(segmentErrors) > 0:
+			raise Exception('%i of the %i segments of %s failed, the download will be resumed on the next run: %s' % (len(segmentErrors), len(segments), location, str(segmentErrors[0])))
+		
+		return sum(downloadedBytes), time.time() - startTime
+	
+	# ---- remote manifest methods
+	
+	@classmethod
+	def generateManifest(myClass, folderPath, checksumTypes=['sha1'], progressReporter=None):
+		'''Checksum all of the files in a folder, returning a manifest for serving it as a web cache: {'version':1, 'items':{'checksumType-checksumValue':{'path':relative path, 'size':bytes}}}'''
+		
+		if not hasattr(folderPath, 'capitalize') or not os.path.isdir(folderPath):
+			raise ValueError('generateManifest requires a folder, got: ' + str(folderPath))
+		
+		if hasattr(checksumTypes, 'capitalize'):
+			checksumTypes = [checksumTypes]
+		if len(checksumTypes) == 0:
+			raise ValueError('generateManifest requires at least one checksum type')
+		
+		folderPath = pathHelpers.normalizePath(folderPath, followSymlink=True)
+		
+		items = {}
+		for currentFolder, dirs, files in os.walk(folderPath, topdown=True):
+			
+			# hidden items and downloads in progress are not part of the cache
+			for thisFolderName in [thisFolderName for thisFolderName in dirs if thisFolderName.startswith('.')]:
+				dirs.remove(thisFolderName)
+			
+			for thisFileName in sorted(files):
+				if thisFileName.startswith('.') or thisFileName.endswith(myClass.partialDownloadSuffix) or thisFileName.endswith(myClass.partialSidecarSuffix):
+					continue
+				
+				thisFilePath = os.path.join(currentFolder, thisFileName)
+				relativePath = os.path.relpath(thisFilePath, folderPath).replace(os.sep, '/')
+				if relativePath == myClass.remoteManifestName or not os.path.isfile(thisFilePath):
+					continue
+				
+				if progressReporter is not None:
+					progressReporter.update(statusMessage=' checksumming %s ' % relativePath)
+				
+				result = checksum.checksum(thisFilePath, checksumType=checksumTypes[0], additionalChecksumTypes=checksumTypes[1:], progressReporter=None)
+				for thisChecksumType in checksumTypes:
+					items['%s-%s' % (thisChecksumType, result['checksums'][thisChecksumType])] = {'path':relativePath, 'size':os.path.getsize(thisFilePath)}
+		
+		return {'version':1, 'items':items}
+	
+	@classmethod
+	def parseManifest(myClass, manifestData, manifestURL):
+		'''Return the items from the text of a manifest, raising a ValueError if it is not useable'''
+		
+		try:
+			manifest = json.loads(manifestData)
+		except ValueError, error:
+			raise ValueError('The manifest at %s was not valid json: %s' % (manifestURL, str(error)))
+		
+		if not isinstance(manifest, dict) or not isinstance(manifest.get('items'), dict):
+			raise ValueError('The manifest at %s did not have a dictionary of items' % manifestURL)
+		
+		for thisKey, thisItem in manifest['items'].items():
+			if thisKey.count('-') != 1 or not isinstance(thisItem, dict) or not hasattr(thisItem.get('path'), 'capitalize'):
+				raise ValueError('The manifest at %s had an entry that was not understandable: %s' % (manifestURL, thisKey))
+		
+		return manifest['items']
+	
+	@classmethod
+	def getRemoteManifest(myClass, cacheFolderURL):
+		'''Return the manifest items for a web cache, or None if it does not have a manifest. This is fetched once per run, and copies saved by earlier runs are revalidated with their ETag.'''
+		
+		myClass.remoteManifestsLock.acquire()
+		try:
+			if cacheFolderURL in myClass.remoteManifests:
+				return myClass.remoteManifests[cacheFolderURL]
+			
+			manifestURL = urlparse.urljoin(cacheFolderURL.rstrip('/') + '/', myClass.remoteManifestName)
+			
+			# a copy from an earlier run
+			savedManifestPath = None
+			savedManifest = None
+			if myClass.writeableCacheFolder is not None:
+				savedManifestPath = os.path.join(myClass.writeableCacheFolder, myClass.remoteManifestFolder, hashlib.md5(manifestURL).hexdigest() + '.json')
+				if os.path.isfile(savedManifestPath):
+					try:
+						savedManifestFile = open(savedManifestPath)
+						try:
+							savedManifest = json.load(savedManifestFile)
+						finally:
+							savedManifestFile.close()
+					except ValueError:
+						savedManifest = None # a damaged copy is just fetched again
+			
+			headers = {}
+			if savedManifest is not None and savedManifest.get('etag') is not None:
+				headers['If-None-Match'] = savedManifest['etag']
+			
+			manifestItems = None
+			try:
+				readFile = httpClient.urlopen(manifestURL, headers=headers)
+			except urllib2.HTTPError, error:
+				readFile = None
+				if error.code == 304 and savedManifest is not None:
+					manifestItems = savedManifest['items'] # through a proxy urllib2 raises the 304
+			except IOError:
+				readFile = None # no manifest, or no server, either way fall back to guessing
+			
+			if readFile is not None:
+				try:
+					if readFile.getcode() == 304:
+						manifestItems = savedManifest['items']
+					else:
+						manifestItems = myClass.parseManifest(readFile.read(), manifestURL)
+						
+						if savedManifestPath is not None:
+							if not os.path.isdir(os.path.dirname(savedManifestPath)):
+								os.mkdir(os.path.dirname(savedManifestPath))
+							savedManifestFile = open(savedManifestPath, 'w')
+							try:
+								json.dump({'url':manifestURL, 'etag':readFile.info().getheader('etag'), 'items':manifestItems}, savedManifestFile)
+							finally:
+								savedManifestFile.close()
+				finally:
+					readFile.close()
+			
+			myClass.remoteManifests[cacheFolderURL] = manifestItems
+			return manifestItems
+		
+		finally:
+			myClass.remoteManifestsLock.release()
+	
+	# ---- remote catalog methods
+	
+	@classmethod
+	def normalizeCatalogURL(myClass, catalogURL):
+		'''Return a url in a single form, so the same catalog is always given the same local copy'''
+		
+		parsedURL = urlparse.urlparse(catalogURL)
+		
+		scheme = parsedURL.scheme.lower()
+		netloc = parsedURL.netloc.lower()
+		if (scheme, parsedURL.port) in (('http', 80), ('https', 443)):
+			netloc = netloc.rsplit(':', 1)[0]
+		
+		return urlparse.urlunparse((scheme, netloc, parsedURL.path or '/', parsedURL.params, parsedURL.query, ''))
+	
+	@classmethod
+	def getRemoteCatalog(myClass, catalogURL):
+		'''Return the path to a local copy of a catalog file on a web server, fetched once per run. The copy from an earlier run is revalidated with its ETag and Last-Modified date, so an unchanged catalog costs a single 304. If the server can not be reached the earlier copy is used.'''
+		
+		if myClass.writeableCacheFolder is None:
+			raise ValueError('The cache folder must be set before remote catalog files can be used')
+		
+		catalogURL = myClass.normalizeCatalogURL(catalogURL)
+		
+		myClass.remoteCatalogsLock.acquire()
+		try:
+			if catalogURL in myClass.remoteCatalogs:
+				return myClass.remoteCatalogs[catalogURL]
+			
+			# the copy keeps the name from the url, as the catalog name is used for the output image
+			catalogFolder = os.path.join(myClass.writeableCacheFolder, myClass.remoteCatalogFolder, hashlib.md5(catalogURL).hexdigest())
+			catalogName = os.path.basename(urllib.unquote(urlparse.urlparse(catalogURL).path)) or 'index.catalog'
+			catalogPath = os.path.join(catalogFolder, catalogName)
+			headersPath = os.path.join(catalogFolder, '.headers.json')
+			
+			savedHeaders = {}
+			if os.path.isfile(catalogPath) and os.path.isfile(headersPath):
+				try:
+					headersFile = open(headersPath)
+					try:
+						savedHeaders = json.load(headersFile)
+					finally:
+						headersFile.close()
+				except ValueError:
+					savedHeaders = {} # a damaged copy is just fetched again
+			
+			headers = {}
+			if savedHeaders.get('etag') is not None:
+				headers['If-None-Match'] = str(savedHeaders['etag'])
+			if savedHeaders.get('lastModified') is not None:
+				headers['If-Modified-Since'] = str(savedHeaders['lastModified'])
+			
+			try:
+				readFile = httpClient.urlopen(catalogURL, headers=headers)
+			except IOError, error:
+				if not os.path.isfile(catalogPath):
+					raise CatalogNotFoundException('Unable to download the catalog file %s: %s' % (catalogURL, str(error)))
+				readFile = None # the server is not reachable, so the last copy will have to do
+			
+			if readFile is not None:
+				try:
+					if readFile.getcode() != 304:
+						if not os.path.isdir(catalogFolder):
+							os.makedirs(catalogFolder)
+						
+						# write next to the final location then move into place, so a failed download does not replace the last copy
+						catalogFile = open(catalogPath + '.tmp', 'w')
+						try:
+							catalogFile.write(readFile.read())
+						finally:
+							catalogFile.close()
+						os.rename(catalogPath + '.tmp', catalogPath)
+						
+						headersFile = open(headersPath, 'w')
+						try:
+							json.dump({'url':catalogURL, 'etag':readFile.info().getheader('etag'), 'lastModified':readFile.info().getheader('last-modified')}, headersFile)
+						finally:
+							headersFile.close()
+				finally:
+					readFile.close()
+			
+			myClass.remoteCatalogs[catalogURL] = catalogPath
+			return catalogPath
+		
+		finally:
+			myClass.remoteCatalogsLock.release()
+	
+	@classmethod
+	def getRemoteCatalogURL(myClass, catalogPath):
+		'''Return the url a local copy of a remote catalog came from, or None for other files'''
+		
+		myClass.remoteCatalogsLock.acquire()
+		try:
+			for thisURL, thisPath in myClass.remoteCatalogs.items():
+				if os.path.realpath(thisPath) == os.path.realpath(catalogPath):
+					return thisURL
+		finally:
+			myClass.remoteCatalogsLock.release()
+		
+		return None
 	
 	# ---- item methods
 	
 	@classmethod
-	def findItem(myClass, nameOrLocation, checksumType, checksumValue, displayName=None, additionalSourceFolders=None, progressReporter=True):
-		'''Find an item locally, or download it'''
+	def findItem(myClass, nameOrLocation, checksumType, checksumValue, displayName=None, additionalSourceFolders=None, progressReporter=True, expectedSize=None):
+		'''Find an item locally, or download it. With an expectedSize in bytes, candidates of the wrong size are passed over without being read.'''
 		
 		# ---- validate input
 		
@@ -189,6 +1168,10 @@ class cacheController:
 		if not hasattr(displayName, 'capitalize') and not displayName is None:
 			raise ValueError('findItem requires a string or None as a displayName, but got: ' + displayName)
 		
+		# expectedSize
+		if expectedSize is not None and (not isinstance(expectedSize, (int, long)) or expectedSize < 0):
+			raise ValueError('findItem requires a number of bytes or None as an expectedSize, but got: ' + str(expectedSize))
+		
 		# additionalSourceFolders
 		if additionalSourceFolders is None:
 			pass # nothing to do
@@ -217,7 +1200,7 @@ class cacheController:
 		if os.path.isabs(nameOrLocation):
 			if progressReporter is not None:
 				progressReporter.update(statusMessage=' looking at an absolute location')
-			resultPath, reportCompleted = myClass.findItemInCaches(None, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter)
+			resultPath, reportCompleted = myClass.findItemInCaches(None, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, expectedSize=expectedSize)
 			if resultPath is not None:
 				# note: if there is nothing at this path, we will get an error before this
 				if progressReporter is not None and reportCompleted is False:
@@ -230,7 +1213,7 @@ class cacheController:
 		if parsedNameOrLocation.scheme == '' and nameOrLocation.count(os.sep) > 0:
 			if progressReporter is not None:
 				progressReporter.update(statusMessage=' looking at relative locations')
-			resultPath, reportCompleted = myClass.findItemInCaches(nameOrLocation, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True)
+			resultPath, reportCompleted = myClass.findItemInCaches(nameOrLocation, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True, expectedSize=expectedSize)
 			if resultPath is not None:
 				
 				# note: if there is nothing at this path, we will get an error before this
@@ -244,7 +1227,7 @@ class cacheController:
 		# first see if we already found this item
 		# check the already verified items for this checksum
 		checksumString = '%s-%s' % (checksumType, checksumValue)
-		if checksumString in myClass.verifiedFiles:
+		if checksumString in myClass.verifiedFiles and not myClass.isWrongSize(myClass.verifiedFiles[checksumString], expectedSize):
 			if progressReporter is not None:
 				progressReporter.update(statusMessage=' found previously')
 				progressReporter.finishLine()
@@ -253,7 +1236,7 @@ class cacheController:
 		# look through the caches
 		if progressReporter is not None:
 			progressReporter.update(statusMessage=' looking based on checksum')
-		resultPath, reportCompleted = myClass.findItemInCaches(None, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter)
+		resultPath, reportCompleted = myClass.findItemInCaches(None, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, expectedSize=expectedSize)
 		if resultPath is not None:
 			myClass.addItemToVerifiedFiles(checksumString, resultPath)
 			if progressReporter is not None and reportCompleted is False:
@@ -269,7 +1252,7 @@ class cacheController:
 			locallyGuessedName = os.path.basename(parsedNameOrLocation.path)
 		else:
 			locallyGuessedName = os.path.basename(nameOrLocation)
-		resultPath, reportCompleted = myClass.findItemInCaches(locallyGuessedName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True)
+		resultPath, reportCompleted = myClass.findItemInCaches(locallyGuessedName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True, expectedSize=expectedSize)
 		if resultPath is not None:
 			myClass.addItemToVerifiedFiles(checksumString, resultPath)
 			if progressReporter is not None and reportCompleted is False:
@@ -281,7 +1264,7 @@ class cacheController:
 		if displayName is not None:
 			if progressReporter is not None:
 				progressReporter.update(statusMessage=' looking based on display name')
-			resultPath, reportCompleted = myClass.findItemInCaches(displayName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter)
+			resultPath, reportCompleted = myClass.findItemInCaches(displayName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, expectedSize=expectedSize)
 			if resultPath is not None:
 				myClass.addItemToVerifiedFiles(checksumString, resultPath)
 				if progressReporter is not None and reportCompleted is False:
@@ -292,87 +1275,124 @@ class cacheController:
 		# ---- look remotely over http/https
 		if parsedNameOrLocation.scheme in ['http', 'https']:
 			
-			remoteGuessedName = locallyGuessedName
-			
-			# -- open a connection and get information to guess the name
-			
-			# open the connection
-			readFile = None
+			# only a few connections to any one server at a time
+			myClass.acquireHostConnection(nameOrLocation)
+			holdingConnection = True
 			try:
-				readFile = urllib2.urlopen(nameOrLocation)
-			except IOError, error:
-				if hasattr(error, 'reason'):
-					raise Exception('Unable to connect to remote url: %s got error: %s' % (nameOrLocation, error.reason))
-				elif hasattr(error, 'code'):
-					raise Exception('Got status code: %s while trying to connect to remote url: %s' % (str(error.code), nameOrLocation))
-			
-			# try reading out the content-disposition header
-			httpHeader = readFile.info()
-			if httpHeader.has_key("content-disposition"):
-				remoteGuessedName = httpHeader.getheader("content-disposition").strip()
+				remoteGuessedName = locallyGuessedName
+				
+				# -- open a connection and get information to guess the name
+				
+				readFile = myClass.openRemoteItem(nameOrLocation)
+				
+				# try reading out the content-disposition header
+				guessedNames = []
+				httpHeader = readFile.info()
+				if httpHeader.has_key("content-disposition"):
+					remoteGuessedName = httpHeader.getheader("content-disposition").strip()
+					
+					if remoteGuessedName is not locallyGuessedName:
+						guessedNames.append(('name from content-disposition', remoteGuessedName))
+				
+				# try the name in the final URL
+				secondRemoteGuessedName = os.path.basename( urllib.unquote(urlparse.urlparse(readFile.geturl()).path) )
+				if secondRemoteGuessedName not in [locallyGuessedName, remoteGuessedName]:
+					guessedNames.append(('name in final URL', secondRemoteGuessedName))
+				
+				if len(guessedNames) > 0:
+					# the web caches take their own host slots, so this one is given up while they are asked, otherwise two items could each wait on the other's host
+					readFile.close()
+					myClass.releaseHostConnection(nameOrLocation)
+					holdingConnection = False
+					
+					for nameSource, guessedName in guessedNames:
+						if progressReporter is not None:
+							progressReporter.update(statusMessage=' looking based on ' + nameSource)
+						resultPath, reportCompleted = myClass.findItemInCaches(guessedName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True, expectedSize=expectedSize)
+						if resultPath is not None:
+							if progressReporter is not None and reportCompleted is False:
+								progressReporter.update(statusMessage=' found based on %s and verified in %s' % (nameSource, displayTools.secondsToReadableTime(time.time() - startTime)))
+								progressReporter.finishLine()
+							return resultPath
+					
+					myClass.acquireHostConnection(nameOrLocation)
+					holdingConnection = True
+					readFile = myClass.openRemoteItem(nameOrLocation)
+					httpHeader = readFile.info()
+				
+				# -- download file
+				
+				# try to get the expected file length
+				expectedLength = None
+				if httpHeader.has_key("content-length"):
+					try:
+						expectedLength = int(httpHeader.getheader("content-length"))
+					except:
+						pass
 				
-				if remoteGuessedName is not locallyGuessedName:
-					if progressReporter is not None:
-						progressReporter.update(statusMessage=' looking based on name from content-disposition')
-					resultPath, reportCompleted = myClass.findItemInCaches(remoteGuessedName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True)
-					if resultPath is not None:
-						if progressReporter is not None and reportCompleted is False:
-							progressReporter.update(statusMessage=' found based on name from content-disposition and verified in %s' % (displayTools.secondsToReadableTime(time.time() - startTime)))
-							progressReporter.finishLine()
-						readFile.close()
-						return resultPath
-			
-			# try the name in the final URL
-			secondRemoteGuessedName = os.path.basename( urllib.unquote(urlparse.urlparse(readFile.geturl()).path) )
-			if secondRemoteGuessedName not in [locallyGuessedName, remoteGuessedName]:
 				if progressReporter is not None:
-					progressReporter.update(statusMessage=' looking based on name in final URL')
-				resultPath, reportCompleted = myClass.findItemInCaches(secondRemoteGuessedName, checksumType, checksumValue, displayName, additionalSourceFolders, progressReporter, includeRemoteCaches=True)
+					if expectedLength is None:
+						progressReporter.update(statusMessage=' downloading ')
+					else:
+						progressReporter.update(statusMessage=' downloading %s ' % displayTools.bytesToRedableSize(expectedLength))
+				
+				downloadTargetPath = os.path.join(myClass.getCacheFolder(), os.path.splitext(secondRemoteGuessedName)[0] + " " + checksumString + os.path.splitext(secondRemoteGuessedName)[1])
+				
+				# only one process sharing the cache folder downloads it
+				thisLock, resultPath = myClass.lockDownload(checksumType, checksumValue, downloadTargetPath, expectedSize=expectedSize, progressReporter=progressReporter, idleFile=readFile)
 				if resultPath is not None:
-					if progressReporter is not None and reportCompleted is False:
-						progressReporter.update(statusMessage=' found based on name in final URL and verified in %s' % (displayTools.secondsToReadableTime(time.time() - startTime)))
+					if progressReporter is not None:
+						progressReporter.update(statusMessage=' downloaded by another process and verified in %s' % (displayTools.secondsToReadableTime(time.time() - startTime)))
 						progressReporter.finishLine()
 					readFile.close()
 					return resultPath
-			
-			# -- download file
-			
-			# try to get the expected file length
-			expectedLength = None
-			if httpHeader.has_key("content-length"):
+				
 				try:
-					expectedLength = int(httpHeader.getheader("content-length"))
-				except:
-					pass
-			
-			if progressReporter is not None:
-				if expectedLength is None:
-					progressReporter.update(statusMessage=' downloading ')
-				else:
-					progressReporter.update(statusMessage=' downloading %s ' % displayTools.bytesToRedableSize(expectedLength))
-			
-			hashGenerator = hashlib.new(checksumType)
-			downloadTargetPath = os.path.join(myClass.getCacheFolder(), os.path.splitext(secondRemoteGuessedName)[0] + " " + checksumString + os.path.splitext(secondRemoteGuessedName)[1])
-			processedBytes, processSeconds = checksum.checksumFileObject(hashGenerator, readFile, secondRemoteGuessedName, expectedLength, copyToPath=downloadTargetPath, progressReporter=progressReporter)
-			
-			if hashGenerator.hexdigest() != checksumValue:
-#				os.unlink(downloadTargetPath) # Why would we throw the file away just because of a hash mismatch?
+					if thisLock.lastOwnerInfo is not None:
+						# the response was closed while we waited
+						readFile = httpClient.urlopen(nameOrLocation)
+					
+					hashGenerator, processedBytes, processSeconds = myClass.downloadItem(nameOrLocation, downloadTargetPath, checksumType, checksumValue, readFile=readFile, progressReporter=progressReporter, keepMismatchedFile=True, expectedSize=expectedSize) # Why would we throw the file away just because of a hash mismatch?
+				finally:
+					thisLock.release()
+				
+				if hashGenerator.hexdigest() != checksumValue:
+					readFile.close()
+					raise FileNotFoundException("Downloaded file did not match checksum: %s (Find this: %s and replace it with this: %s)" % (nameOrLocation, checksumValue, hashGenerator.hexdigest()))
+				
+				if progressReporter is not None:
+					progressReporter.update(statusMessage=' downloaded and verified %s in %s (%s/sec)' % (displayTools.bytesToRedableSize(processedBytes), displayTools.secondsToReadableTime(time.time() - startTime), displayTools.bytesToRedableSize(processedBytes/processSeconds)))
+					progressReporter.finishLine()
+				
+				if myClass.hasContentStore(myClass.getCacheFolder()):
+					downloadTargetPath = myClass.addItemToContentStore(downloadTargetPath, checksumType, checksumValue)
+				
+				checksumIndex.recordChecksums(downloadTargetPath, hashGenerator.hexdigests())
+				myClass.addItemToVerifiedFiles(checksumString, downloadTargetPath)
 				readFile.close()
-				raise FileNotFoundException("Downloaded file did not match checksum: %s (Find this: %s and replace it with this: %s)" % (nameOrLocation, checksumValue, hashGenerator.hexdigest()))
-			
-			if progressReporter is not None:
-				progressReporter.update(statusMessage=' downloaded and verified %s in %s (%s/sec)' % (displayTools.bytesToRedableSize(processedBytes), displayTools.secondsToReadableTime(time.time() - startTime), displayTools.bytesToRedableSize(processedBytes/processSeconds)))
-				progressReporter.finishLine()
-			
-			myClass.addItemToVerifiedFiles(checksumString, downloadTargetPath)
-			readFile.close()
-			return downloadTargetPath
+				return downloadTargetPath
+			finally:
+				if holdingConnection is True:
+					myClass.releaseHostConnection(nameOrLocation)
 		
 		# if we have not found anything, then we are out of luck
 		raise FileNotFoundException('Could not locate the item: ' + nameOrLocation)
 	
 	@classmethod
-	def findItemInCaches(myClass, nameOrLocation, checksumType, checksumValue, displayName=None, additionalSourceFolders=None, progressReporter=True, includeRemoteCaches=False): 
+	def openRemoteItem(myClass, location):
+		'''Open an http(s) url to download it, turning connection errors into readable ones'''
+		
+		try:
+			return httpClient.urlopen(location)
+		except IOError, error:
+			if hasattr(error, 'reason'):
+				raise Exception('Unable to connect to remote url: %s got error: %s' % (location, error.reason))
+			elif hasattr(error, 'code'):
+				raise Exception('Got status code: %s while trying to connect to remote url: %s' % (str(error.code), location))
+			raise
+	
+	@classmethod
+	def findItemInCaches(myClass, nameOrLocation, checksumType, checksumValue, displayName=None, additionalSourceFolders=None, progressReporter=True, includeRemoteCaches=False, expectedSize=None): 
 		
 		# ---- validate input
 		
@@ -423,7 +1443,9 @@ class cacheController:
 		# absolute paths
 		if nameOrLocation is not None and os.path.isabs(nameOrLocation):
 			if os.path.exists(nameOrLocation):
-				if checksumValue == checksum.checksum(nameOrLocation, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
+				if myClass.isWrongSize(nameOrLocation, expectedSize):
+					raise FileNotFoundException('The item at the path given is not the size given (%i bytes): %s' % (expectedSize, nameOrLocation))
+				elif checksumValue == checksum.checksum(nameOrLocation, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
 					return nameOrLocation, False
 				else:
 					raise FileNotFoundException('The item at the path given does not match the checksum given: ' + nameOrLocation)
@@ -431,7 +1453,7 @@ class cacheController:
 				raise FileNotFoundException('No file/folder existed at the absolute path: ' + nameOrLocation)
 		
 		# relative path
-		elif nameOrLocation is not None and os.path.exists(nameOrLocation):
+		elif nameOrLocation is not None and os.path.exists(nameOrLocation) and not myClass.isWrongSize(nameOrLocation, expectedSize):
 			if checksumValue == checksum.checksum(nameOrLocation, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
 				return pathHelpers.normalizePath(nameOrLocation, followSymlink=True), False
 		
@@ -447,107 +1469,179 @@ class cacheController:
 			
 			elif parsedLocation.scheme in ['http', 'https'] and includeRemoteCaches is True:
 				
-				# -- try different paths on the server
-				urlsToTry = {}
-				
-				(scheme, netloc, path, params, query, fragment) = urlparse.urlparse(thisCacheFolder)
-				
-				# simple name
-				urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, nameOrLocation), params, query, fragment))] = True
-				urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, urllib.quote(nameOrLocation)), params, query, fragment))] = True
-				
-				# name including checksum
-				nameWithChecksum = os.path.splitext(nameOrLocation)[0] + " " + checksumType + "-" + checksumValue + os.path.splitext(nameOrLocation)[1]
-				urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, nameWithChecksum), params, query, fragment))] = True
-				urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, urllib.quote(nameWithChecksum)), params, query, fragment))] = True
-				
-				for thisURL in urlsToTry.keys():
-					try:
-						readFile = urllib2.urlopen(thisURL)
-					except IOError, error:
-						continue
-					
-					remoteGuessedName	= os.path.basename(urllib.unquote(urlparse.urlparse(thisURL).path))
-					targetFileName		= remoteGuessedName
-					if checksumType + "-" + checksumValue not in targetFileName:
-						targetFileName = os.path.splitext(remoteGuessedName)[0] + " " + checksumType + "-" + checksumValue + os.path.splitext(remoteGuessedName)[1]
-					
-					# try to get the expected file length
-					httpHeader = readFile.info()
-					expectedLength = None
-					if httpHeader.has_key("content-length"):
-						try:
-							expectedLength = int(httpHeader.getheader("content-length"))
-						except:
-							pass
-					
-					if progressReporter is not None:
-						if expectedLength is None:
-							progressReporter.update(statusMessage=' downloading from local web cache ')
-						else:
-							progressReporter.update(statusMessage=' downloading %s from local web cache ' % displayTools.bytesToRedableSize(expectedLength))
+				myClass.acquireHostConnection(thisCacheFolder)
+				try:
+					urlsToTry = {}
 					
-					# download file
-					hashGenerator = hashlib.new(checksumType)
-					startTime = time.time()
-					targetFilePath = os.path.join(myClass.getCacheFolder(), targetFileName)
-					processedBytes, processSeconds = checksum.checksumFileObject(hashGenerator, readFile, remoteGuessedName, expectedLength, copyToPath=targetFilePath, progressReporter=progressReporter)
+					(scheme, netloc, path, params, query, fragment) = urlparse.urlparse(thisCacheFolder)
 					
-					if hashGenerator.hexdigest() != checksumValue:
-						os.unlink(targetFilePath)
+					manifestItems = myClass.getRemoteManifest(thisCacheFolder)
+					if manifestItems is not None:
+						# the manifest lists everything on the server, so there is no need to guess
+						manifestEntry = manifestItems.get(checksumType + "-" + checksumValue)
+						if manifestEntry is None or (expectedSize is not None and manifestEntry.get('size') not in [None, expectedSize]):
+							continue
+						urlsToTry[urlparse.urljoin(thisCacheFolder.rstrip('/') + '/', urllib.quote(manifestEntry['path']))] = True
 					
 					else:
+						# -- try different paths on the server
+						
+						# simple name
+						urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, nameOrLocation), params, query, fragment))] = True
+						urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, urllib.quote(nameOrLocation)), params, query, fragment))] = True
+						
+						# name including checksum
+						nameWithChecksum = os.path.splitext(nameOrLocation)[0] + " " + checksumType + "-" + checksumValue + os.path.splitext(nameOrLocation)[1]
+						urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, nameWithChecksum), params, query, fragment))] = True
+						urlsToTry[urlparse.urlunparse((scheme, netloc, os.path.join(path, urllib.quote(nameWithChecksum)), params, query, fragment))] = True
+					
+					for thisURL in urlsToTry.keys():
+						# a HEAD request on the shared connection is enough to rule out the names that are not there
+						try:
+							if manifestItems is None:
+								headFile = httpClient.head(thisURL)
+								if myClass.isWrongSize(headFile, expectedSize):
+									continue
+							readFile = httpClient.urlopen(thisURL)
+						except IOError, error:
+							continue
+						
+						remoteGuessedName	= os.path.basename(urllib.unquote(urlparse.urlparse(thisURL).path))
+						targetFileName		= remoteGuessedName
+						if checksumType + "-" + checksumValue not in targetFileName:
+							targetFileName = os.path.splitext(remoteGuessedName)[0] + " " + checksumType + "-" + checksumValue + os.path.splitext(remoteGuessedName)[1]
+						
+						# try to get the expected file length
+						httpHeader = readFile.info()
+						expectedLength = None
+						if httpHeader.has_key("content-length"):
+							try:
+								expectedLength = int(httpHeader.getheader("content-length"))
+							except:
+								pass
+						
 						if progressReporter is not None:
-							progressReporter.update(statusMessage=' downloaded from local web cache and verified %s in %s (%s/sec)' % (displayTools.bytesToRedableSize(processedBytes), displayTools.secondsToReadableTime(time.time() - startTime), displayTools.bytesToRedableSize(processedBytes/processSeconds)))
-							progressReporter.finishLine()
+							if expectedLength is None:
+								progressReporter.update(statusMessage=' downloading from local web cache ')
+							else:
+								progressReporter.update(statusMessage=' downloading %s from local web cache ' % displayTools.bytesToRedableSize(expectedLength))
+						
+						# download file
+						startTime = time.time()
+						targetFilePath = os.path.join(myClass.getCacheFolder(), targetFileName)
+						
+						# only one process sharing the cache folder downloads it
+						thisLock, resultPath = myClass.lockDownload(checksumType, checksumValue, targetFilePath, expectedSize=expectedSize, progressReporter=progressReporter, idleFile=readFile)
+						if resultPath is not None:
+							readFile.close()
+							return resultPath, False
+						
+						try:
+							if thisLock.lastOwnerInfo is not None:
+								# the response was closed while we waited
+								readFile = httpClient.urlopen(thisURL)
+							
+							hashGenerator, processedBytes, processSeconds = myClass.downloadItem(thisURL, targetFilePath, checksumType, checksumValue, readFile=readFile, progressReporter=progressReporter, expectedSize=expectedSize)
+						finally:
+							thisLock.release()
+						
+						if hashGenerator.hexdigest() == checksumValue:
+							if progressReporter is not None:
+								progressReporter.update(statusMessage=' downloaded from local web cache and verified %s in %s (%s/sec)' % (displayTools.bytesToRedableSize(processedBytes), displayTools.secondsToReadableTime(time.time() - startTime), displayTools.bytesToRedableSize(processedBytes/processSeconds)))
+								progressReporter.finishLine()
+							
+							if myClass.hasContentStore(myClass.getCacheFolder()):
+								targetFilePath = myClass.addItemToContentStore(targetFilePath, checksumType, checksumValue)
+							
+							checksumIndex.recordChecksums(targetFilePath, hashGenerator.hexdigests())
+							myClass.addItemToVerifiedFiles('%s-%s' % (checksumType, checksumValue), targetFilePath)
+							readFile.close()
+							return targetFilePath, True
 						
-						myClass.addItemToVerifiedFiles('%s-%s' % (checksumType, checksumValue), targetFilePath)
 						readFile.close()
-						return targetFilePath, True
-					
-					readFile.close()
+				finally:
+					myClass.releaseHostConnection(thisCacheFolder)
 			
 			elif parsedLocation.scheme == '':
 			
 				# relative paths from the source folders
-				if nameOrLocation is not None and nameOrLocation.count(os.sep) > 0 and os.path.exists(os.path.join(thisCacheFolder, nameOrLocation)):
+				if nameOrLocation is not None and nameOrLocation.count(os.sep) > 0 and os.path.exists(os.path.join(thisCacheFolder, nameOrLocation)) and not myClass.isWrongSize(os.path.join(thisCacheFolder, nameOrLocation), expectedSize):
 					if checksumValue == checksum.checksum(os.path.join(thisCacheFolder, nameOrLocation), checksumType=checksumType, progressReporter=progressReporter)['checksum']:
 						return pathHelpers.normalizePath(os.path.join(thisCacheFolder, nameOrLocation), followSymlink=True), False
 				
-				# walk up through the whole set
-				for currentFolder, dirs, files in os.walk(thisCacheFolder, topdown=True):
-					
-					# check each file to see if it is what we are looking for
-					for thisItemPath, thisItemName in [[os.path.join(currentFolder, internalName), internalName] for internalName in (files + dirs)]:
-						
-						# checksum in name
-						fileNameSearchResults = myClass.fileNameChecksumRegex.search(thisItemName)
-						
-						nameChecksumType = None
-						nameChecksumValue = None
-						if fileNameSearchResults is not None:
-							nameChecksumType = fileNameSearchResults.group('checksumType')
-							nameChecksumValue = fileNameSearchResults.group('checksumValue')
-						
-							if nameChecksumType is not None and nameChecksumType.lower() == checksumType.lower() and nameChecksumValue is not None and nameChecksumValue == checksumValue:
-								if checksumValue == checksum.checksum(thisItemPath, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
-									return thisItemPath, False
-						
-						# file name
-						if nameOrLocation is not None:
-							if nameOrLocation in [thisItemName, os.path.splitext(thisItemName)[0]] or os.path.splitext(nameOrLocation)[0] in [thisItemName, os.path.splitext(thisItemName)[0]]:
-								if checksumValue == checksum.checksum(thisItemPath, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
-									return thisItemPath, False
-						
-						# don't decend into folders that look like bundles or sparce dmg's
-						if os.path.isdir(thisItemPath):
-							if os.listdir(thisItemPath) == ["Contents"] or os.listdir(thisItemPath) == ["Info.bckup", "Info.plist", "bands", "token"]:
-								dirs.remove(thisItemName)
+				# items in a content store are found by checksum without any searching
+				storedPath = myClass.findInContentStore(thisCacheFolder, checksumType, checksumValue)
+				if storedPath is not None and not myClass.isWrongSize(storedPath, expectedSize):
+					if checksumValue == checksum.checksum(storedPath, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
+						return storedPath, False
+				
+				# items named for this checksum, or with the name, from an index that is built once per run
+				for thisItemPath in myClass.findInFolderIndex(thisCacheFolder, nameOrLocation, checksumType, checksumValue):
+					if myClass.isWrongSize(thisItemPath, expectedSize):
+						continue # a stat is enough to rule it out
+					if checksumValue == checksum.checksum(thisItemPath, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
+						return thisItemPath, False
 			else:
 				raise ValueError('The cache folder "%s" was not a format that findItemInCaches understood' % thisCacheFolder)
 			
 		return None, False
 	
+	@classmethod
+	def isWrongSize(myClass, item, expectedSize):
+		'''True if a local file, or the content-length of an http response, shows that this can not be an item of expectedSize bytes. Folders, and responses without a length, are never ruled out.'''
+		
+		if expectedSize is None:
+			return False
+		
+		if hasattr(item, 'capitalize'):
+			if not os.path.isfile(item):
+				return False
+			return os.path.getsize(item) != expectedSize
+		
+		contentLength = item.info().getheader('content-length')
+		if contentLength is None or not contentLength.strip().isdigit():
+			return False
+		return int(contentLength) != expectedSize
+	
+	@classmethod
+	def lockDownload(myClass, checksumType, checksumValue, targetFilePath, expectedSize=None, progressReporter=None, idleFile=None):
+		'''Take the lock on downloading an item into the writeable cache folder, so that other processes using the same folder do not download it at the same time, reporting the progress of the other download while waiting on it. An idleFile response is closed if we have to wait, rather than leaving the server sending it. Returns the held lock and None, or None and the path of the item if it turned up in the cache folder in the meantime.'''
+		
+		checksumString = '%s-%s' % (checksumType, checksumValue)
+		thisLock = downloadLock(myClass.getCacheFolder(), checksumString)
+		
+		def reportWaiting(ownerInfo):
+			if idleFile is not None:
+				idleFile.close()
+			
+			if progressReporter is None:
+				return
+			
+			ownerPartialPath = os.path.join(myClass.getCacheFolder(), os.path.basename(ownerInfo.get('targetPath') or '') + myClass.partialDownloadSuffix)
+			statusMessage = ' waiting on the download by %s:%s' % (ownerInfo.get('host'), ownerInfo.get('pid'))
+			if os.path.isfile(ownerPartialPath):
+				statusMessage += ' (%s so far)' % displayTools.bytesToRedableSize(os.path.getsize(ownerPartialPath))
+			progressReporter.update(statusMessage=statusMessage)
+		
+		thisLock.acquire(targetPath=targetFilePath, waitCallback=reportWaiting)
+		
+		# the other process may have finished it, and another run may have done so since the cache folder was indexed
+		candidatePaths = [myClass.findInContentStore(myClass.getCacheFolder(), checksumType, checksumValue), targetFilePath]
+		if thisLock.lastOwnerInfo is not None and thisLock.lastOwnerInfo.get('targetPath'):
+			# the cache folder could be mounted somewhere else on the other host
+			candidatePaths.append(os.path.join(myClass.getCacheFolder(), os.path.basename(thisLock.lastOwnerInfo['targetPath'])))
+		
+		for thisPath in candidatePaths:
+			if thisPath is None or not os.path.isfile(thisPath) or myClass.isWrongSize(thisPath, expectedSize):
+				continue
+			if checksumValue == checksum.checksum(thisPath, checksumType=checksumType, progressReporter=progressReporter)['checksum']:
+				thisLock.release()
+				myClass.addItemToFolderIndexes(thisPath)
+				myClass.addItemToVerifiedFiles(checksumString, thisPath)
+				return None, thisPath
+		
+		return thisLock, None
+	
 	@classmethod
 	def addItemToVerifiedFiles(myClass, checksumString, itemPath):
 		
@@ -557,4 +1651,8 @@ class cacheController:
 		if not os.path.exists(itemPath):
 			raise ValueError('Item does not exist: ' + itemPath)
 		
-		myClass.verifiedFiles[checksumString] = itemPath
\ No newline at end of file
+		myClass.verifiedFiles[checksumString] = itemPath
+		
+		# only items in the writeable cache folder are ever evicted
+		if myClass.writeableCacheFolder is not None and itemPath.startswith(myClass.writeableCacheFolder.rstrip(os.sep) + os.sep):
+			cacheQuota.recordUse(checksumString)
\ No newline at end of file
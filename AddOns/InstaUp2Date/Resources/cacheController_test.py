@@ -1,11 +1,15 @@
 #!/usr/bin/python
 
-import os, unittest
+import os, sys, unittest, threading, hashlib, time, json, subprocess, urlparse, urllib2
 
 from tempFolderManager 		import tempFolderManager
-from commonExceptions		import FileNotFoundException
+from testingHelpers			import startTestHTTPServer
+from commonExceptions		import FileNotFoundException, CatalogNotFoundException, SizeMismatchException
 
+from httpClient				import httpClient
 from cacheController		import cacheController
+from downloadLock			import downloadLock
+from cacheQuota				import cacheQuota
 
 class cacheControllerTest(unittest.TestCase):
 	'''Common setup and tearDown routines'''
@@ -145,6 +149,7 @@ class cacheControllerTest(unittest.TestCase):
 		
 		# verified files
 		cacheController.verifiedFiles = {}
+		cacheController.forgetFolderIndexes()
 		
 		self.cacheFolderPath = None
 		self.firstSourceFolderPath = None
@@ -165,6 +170,83 @@ class cacheControllerTests(cacheControllerTest):
 			thisTest['resultPath'] = resultPath
 			self.assertEqual(thisTest['filePath'], resultPath, thisTest['errorMessage'] + ', should have been "%(filePath)s" but was: %(resultPath)s' % thisTest)
 	
+	def test_folderIndex(self):
+		'''Source folders should only be walked once, with items added through addItemToFolderIndexes being found after that'''
+		
+		aFileTest = self.testMaterials[0]
+		self.assertEqual(cacheController.findItemInCaches(aFileTest['fileName'], aFileTest['checksumType'], aFileTest['checksumValue'], progressReporter=None)[0], aFileTest['filePath'], aFileTest['errorMessage'])
+		
+		# an item added behind the index's back is not seen
+		newFilePath = os.path.join(self.firstSourceFolderPath, 'subfolder', 'hFile sha1-a29099822219b798b29bbbe68f7539b79c67f927.txt')
+		testFile = open(newFilePath, 'w')
+		testFile.write("h" * 20) # sha1 checksum: a29099822219b798b29bbbe68f7539b79c67f927
+		testFile.close()
+		self.assertEqual(cacheController.findItemInCaches(None, 'sha1', 'a29099822219b798b29bbbe68f7539b79c67f927', progressReporter=None)[0], None, 'A source folder was walked again rather than using its index')
+		
+		cacheController.addItemToFolderIndexes(newFilePath)
+		self.assertEqual(cacheController.findItemInCaches(None, 'sha1', 'a29099822219b798b29bbbe68f7539b79c67f927', progressReporter=None)[0], newFilePath, 'An item added to the folder indexes was not found')
+		
+		# items removed during a run are skipped
+		os.unlink(aFileTest['filePath'])
+		self.assertEqual(cacheController.findItemInCaches(aFileTest['fileName'], aFileTest['checksumType'], aFileTest['checksumValue'], progressReporter=None)[0], None, 'An item removed from a source folder was still found')
+		
+		# without the index every lookup walks the folders
+		cacheController.useFolderIndex = False
+		try:
+			renamedFilePath = os.path.join(self.firstSourceFolderPath, 'iFile.txt')
+			os.rename(newFilePath, renamedFilePath)
+			self.assertEqual(cacheController.findItemInCaches('iFile', 'sha1', 'a29099822219b798b29bbbe68f7539b79c67f927', progressReporter=None)[0], renamedFilePath, 'A renamed item was not found when not using the folder index')
+		finally:
+			cacheController.useFolderIndex = True
+	
+	def test_expectedSize(self):
+		'''Candidates of the wrong size should be passed over, with a stat being enough to rule them out'''
+		
+		aFileTest = self.testMaterials[0]
+		self.assertEqual(cacheController.findItemInCaches(aFileTest['fileName'], aFileTest['checksumType'], aFileTest['checksumValue'], progressReporter=None, expectedSize=400)[0], aFileTest['filePath'], aFileTest['errorMessage'] + ' with the right expectedSize')
+		self.assertEqual(cacheController.findItemInCaches(aFileTest['fileName'], aFileTest['checksumType'], aFileTest['checksumValue'], progressReporter=None, expectedSize=401)[0], None, 'An item of the wrong size was found')
+		
+		self.assertRaises(FileNotFoundException, cacheController.findItemInCaches, aFileTest['filePath'], aFileTest['checksumType'], aFileTest['checksumValue'], progressReporter=None, expectedSize=401)
+		self.assertRaises(ValueError, cacheController.findItem, aFileTest['fileName'], aFileTest['checksumType'], aFileTest['checksumValue'], progressReporter=None, expectedSize=-1)
+	
+	def test_contentStore(self):
+		'''Items migrated into the content store should be found by checksum, with links left under their old names'''
+		
+		checksumValue = hashlib.sha1('h' * 500).hexdigest()
+		itemPath = os.path.join(self.cacheFolderPath, 'hFile sha1-%s.txt' % checksumValue)
+		testFile = open(itemPath, 'w')
+		testFile.write('h' * 500)
+		testFile.close()
+		
+		mismatchedPath = os.path.join(self.cacheFolderPath, 'iFile sha1-%s.txt' % hashlib.sha1('not i').hexdigest())
+		testFile = open(mismatchedPath, 'w')
+		testFile.write('i' * 20)
+		testFile.close()
+		
+		self.assertEqual(cacheController.findInContentStore(self.cacheFolderPath, 'sha1', checksumValue), None, 'An item was found in a content store that does not exist')
+		
+		storedPaths, skippedPaths = cacheController.migrateToContentStore(self.cacheFolderPath)
+		storedPath = os.path.join(cacheController.contentStoreObjectFolder(self.cacheFolderPath, 'sha1', checksumValue), os.path.basename(itemPath))
+		self.assertEqual(storedPaths, [storedPath], 'The item was not moved into the content store, got: ' + str(storedPaths))
+		self.assertEqual(skippedPaths, [mismatchedPath], 'The item that did not match its name was not left in place, got: ' + str(skippedPaths))
+		self.assertTrue(os.path.samefile(itemPath, storedPath), 'A link to the stored item was not left under its old name')
+		self.assertTrue(os.path.isfile(mismatchedPath) and not os.path.samefile(mismatchedPath, itemPath), 'The item that did not match its name was moved')
+		
+		# found by checksum, and the old name still works
+		cacheController.forgetFolderIndexes()
+		self.assertEqual(cacheController.findInContentStore(self.cacheFolderPath, 'sha1', checksumValue), storedPath, 'The stored item was not found by checksum')
+		self.assertEqual(cacheController.findItemInCaches(None, 'sha1', checksumValue, progressReporter=None), (storedPath, False), 'findItemInCaches did not use the content store')
+		self.assertEqual(cacheController.findItemInCaches(os.path.basename(itemPath), 'md5', hashlib.md5('h' * 500).hexdigest(), progressReporter=None), (itemPath, False), 'The link under the old name was not found for another checksum type')
+		
+		# migrating again changes nothing
+		self.assertEqual(cacheController.migrateToContentStore(self.cacheFolderPath), ([], [mismatchedPath]), 'A second migration moved items again')
+		
+		# folders are linked with a symlink
+		folderPath = os.path.join(self.cacheFolderPath, 'jFolder sha1-abcd.pkg')
+		os.mkdir(folderPath)
+		storedFolderPath = cacheController.addItemToContentStore(folderPath, 'sha1', 'abcd')
+		self.assertTrue(os.path.islink(folderPath) and os.path.samefile(folderPath, storedFolderPath), 'A folder was not linked to the content store with a symlink')
+	
 	def test_findItem(self):
 		'''Test out both local files and downloads with the findItem method'''
 		
@@ -336,3 +418,443 @@ class cacheControllerSetupTests(unittest.TestCase):
 
 	
 
+
+class cacheControllerConnectionTests(unittest.TestCase):
+	'''Test the per-host limits on simultaneous connections'''
+	
+	def test_hostConnectionLimit(self):
+		'''Only maxConnectionsPerHost threads should hold a connection to a host at once, and nested holds in one thread should not take a second slot'''
+		
+		testURL = 'http://connectionlimit.example.com/some/item.pkg'
+		
+		startingLimit = cacheController.maxConnectionsPerHost
+		cacheController.maxConnectionsPerHost = 1
+		try:
+			cacheController.acquireHostConnection(testURL)
+			# a nested lookup against the same host should not block
+			cacheController.acquireHostConnection('http://connectionlimit.example.com/other/item.pkg')
+			
+			otherThreadHeld = threading.Event()
+			def otherThread():
+				cacheController.acquireHostConnection(testURL)
+				otherThreadHeld.set()
+				cacheController.releaseHostConnection(testURL)
+			
+			thisThread = threading.Thread(target=otherThread)
+			thisThread.setDaemon(True)
+			thisThread.start()
+			
+			otherThreadHeld.wait(0.2)
+			self.assertFalse(otherThreadHeld.isSet(), 'A second thread got a connection to a host while the limit was already used up')
+			
+			cacheController.releaseHostConnection(testURL)
+			otherThreadHeld.wait(0.2)
+			self.assertFalse(otherThreadHeld.isSet(), 'A second thread got a connection to a host while a nested hold was still outstanding')
+			
+			cacheController.releaseHostConnection(testURL)
+			otherThreadHeld.wait(5)
+			self.assertTrue(otherThreadHeld.isSet(), 'A second thread did not get a connection to a host once it was released')
+			thisThread.join()
+			
+			self.assertRaises(RuntimeError, cacheController.releaseHostConnection, testURL)
+		
+		finally:
+			cacheController.maxConnectionsPerHost = startingLimit
+			cacheController.hostSemaphores.pop('connectionlimit.example.com', None)
+
+class cacheControllerDownloadTests(unittest.TestCase):
+	'''Test downloading items, including resuming partial downloads'''
+	
+	cacheFolderPath			= None
+	servedFolderPath		= None
+	server					= None
+	
+	sampleContents			= None
+	sampleURL				= None
+	targetFilePath			= None
+	
+	def setUp(self):
+		self.cacheFolderPath = tempFolderManager.getNewTempFolder()
+		cacheController.setCacheFolder(self.cacheFolderPath)
+		
+		self.servedFolderPath = tempFolderManager.getNewTempFolder()
+		self.sampleContents = os.urandom(300 * 1024)
+		sampleFile = open(os.path.join(self.servedFolderPath, 'sample.dmg'), 'wb')
+		sampleFile.write(self.sampleContents)
+		sampleFile.close()
+		
+		self.server = startTestHTTPServer(self.servedFolderPath)
+		self.sampleURL = self.server.baseURL + 'sample.dmg'
+		self.targetFilePath = os.path.join(self.cacheFolderPath, 'sample sha1-%s.dmg' % hashlib.sha1(self.sampleContents).hexdigest())
+	
+	def tearDown(self):
+		httpClient.closeAll()
+		self.server.shutdown()
+		self.server.server_close()
+		
+		if self.server.baseURL in cacheController.sourceFolders:
+			cacheController.removeSourceFolders(self.server.baseURL)
+		cacheController.remoteManifests = {}
+		cacheController.remoteCatalogs = {}
+		cacheController.downloadSegmentCount = 1
+		cacheController.minimumSegmentedLength = 16*1024*1024
+		cacheController.verifiedFiles = {}
+		
+		cacheQuota.setQuota(None)
+		cacheQuota.pinnedChecksums = set()
+		
+		if cacheController.writeableCacheFolder == self.cacheFolderPath:
+			cacheController.removeCacheFolder()
+		tempFolderManager.cleanupForExit()
+	
+	def interruptedDownload(self):
+		'''Start a download that the server cuts off part way through, leaving a partial file'''
+		
+		self.server.failAfterBytes = 100 * 1024
+		self.assertRaises(Exception, cacheController.downloadItem, self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		self.server.failAfterBytes = None
+		
+		self.assertFalse(os.path.exists(self.targetFilePath), 'An interrupted download was moved into place')
+		self.assertEqual(os.path.getsize(self.targetFilePath + cacheController.partialDownloadSuffix), 100 * 1024, 'An interrupted download did not leave the partial file')
+		
+		sidecar = cacheController.readPartialSidecar(self.targetFilePath + cacheController.partialSidecarSuffix)
+		self.assertEqual(sidecar['url'], self.sampleURL, 'The sidecar for an interrupted download did not have the url, got: ' + str(sidecar))
+		self.assertEqual(sidecar['bytesSoFar'], 100 * 1024, 'The sidecar for an interrupted download did not have the bytes so far, got: ' + str(sidecar))
+	
+	def test_resumeDownload(self):
+		'''A second download should pick up where an interrupted one left off'''
+		
+		self.interruptedDownload()
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		
+		self.assertEqual(hashGenerator.hexdigest(), hashlib.sha1(self.sampleContents).hexdigest(), 'A resumed download did not have the right checksum')
+		self.assertEqual(processedBytes, 200 * 1024, 'A resumed download did not only download the remaining bytes, got: %i' % processedBytes)
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), self.sampleContents, 'A resumed download did not have the right contents')
+		self.assertEqual(self.server.requestLog[-1][2].get('range'), 'bytes=%i-' % (100 * 1024), 'A resumed download did not use a Range request')
+		
+		self.assertFalse(os.path.exists(self.targetFilePath + cacheController.partialDownloadSuffix), 'A finished download left the partial file behind')
+		self.assertFalse(os.path.exists(self.targetFilePath + cacheController.partialSidecarSuffix), 'A finished download left the sidecar behind')
+	
+	def test_rangesNotSupported(self):
+		'''When the server ignores the Range request the download should start over'''
+		
+		self.interruptedDownload()
+		self.server.supportRanges = False
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		
+		self.assertEqual(processedBytes, len(self.sampleContents), 'A download from a server that ignored the Range request was not started over')
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), self.sampleContents, 'A download from a server that ignored the Range request did not have the right contents')
+	
+	def test_changedItem(self):
+		'''When the item on the server has changed the If-Range check should make the download start over'''
+		
+		self.interruptedDownload()
+		
+		time.sleep(0.01) # make sure the mtime, and so the ETag, changes
+		newContents = os.urandom(250 * 1024)
+		sampleFile = open(os.path.join(self.servedFolderPath, 'sample.dmg'), 'wb')
+		sampleFile.write(newContents)
+		sampleFile.close()
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(newContents).hexdigest())
+		
+		self.assertEqual(processedBytes, len(newContents), 'A download of an item that changed on the server was not started over')
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), newContents, 'A download of an item that changed on the server did not have the new contents')
+	
+	def test_mismatchedDownload(self):
+		'''A download that does not match the checksum should be removed, along with its partial files'''
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', 'notTheRightChecksum')
+		
+		self.assertEqual(hashGenerator.hexdigest(), hashlib.sha1(self.sampleContents).hexdigest(), 'A download did not return the real checksum of the item')
+		for thisPath in [self.targetFilePath, self.targetFilePath + cacheController.partialDownloadSuffix, self.targetFilePath + cacheController.partialSidecarSuffix]:
+			self.assertFalse(os.path.exists(thisPath), 'A download that did not match its checksum left behind: ' + thisPath)
+	
+	def test_segmentedDownload(self):
+		'''With downloadSegmentCount set the item should be fetched as that many ranges'''
+		
+		cacheController.downloadSegmentCount = 4
+		cacheController.minimumSegmentedLength = 0
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		
+		self.assertEqual(hashGenerator.hexdigest(), hashlib.sha1(self.sampleContents).hexdigest(), 'A segmented download did not have the right checksum')
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), self.sampleContents, 'A segmented download did not have the right contents')
+		
+		rangeHeaders = sorted([thisRequest[2]['range'] for thisRequest in self.server.requestLog if 'range' in thisRequest[2]])
+		self.assertEqual(rangeHeaders, ['bytes=0-76799', 'bytes=153600-230399', 'bytes=230400-307199', 'bytes=76800-153599'], 'A segmented download did not ask for the expected ranges, got: ' + str(rangeHeaders))
+	
+	def test_segmentedResume(self):
+		'''An interrupted segmented download should only fetch what each segment is missing'''
+		
+		cacheController.downloadSegmentCount = 4
+		cacheController.minimumSegmentedLength = 0
+		
+		self.server.failAfterBytes = 10 * 1024
+		self.assertRaises(Exception, cacheController.downloadItem, self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		self.server.failAfterBytes = None
+		
+		sidecar = cacheController.readPartialSidecar(self.targetFilePath + cacheController.partialSidecarSuffix)
+		self.assertEqual([thisSegment[2] for thisSegment in sidecar['segments']], [10 * 1024] * 4, 'The sidecar for an interrupted segmented download did not have the progress of each segment, got: ' + str(sidecar))
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		
+		self.assertEqual(processedBytes, len(self.sampleContents) - (40 * 1024), 'A resumed segmented download did not only download the missing bytes, got: %i' % processedBytes)
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), self.sampleContents, 'A resumed segmented download did not have the right contents')
+	
+	def test_segmentedConnectionLimit(self):
+		'''The segments should share the host's connection slots with the caller, rather than opening a connection each'''
+		
+		cacheController.downloadSegmentCount = 4
+		cacheController.minimumSegmentedLength = 0
+		
+		startingLimit = cacheController.maxConnectionsPerHost
+		cacheController.maxConnectionsPerHost = 1
+		cacheController.acquireHostConnection(self.sampleURL)
+		try:
+			hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		finally:
+			cacheController.releaseHostConnection(self.sampleURL)
+			cacheController.maxConnectionsPerHost = startingLimit
+			cacheController.hostSemaphores.pop(urlparse.urlparse(self.sampleURL).netloc.lower(), None)
+		
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), self.sampleContents, 'A segmented download limited to one connection did not have the right contents')
+		self.assertEqual(len([thisRequest for thisRequest in self.server.requestLog if 'range' in thisRequest[2]]), 4, 'A segmented download limited to one connection did not fetch every segment')
+		self.assertEqual(self.server.connectionCount, 2, 'A segmented download limited to one connection opened %i connections, rather than one besides the first request' % self.server.connectionCount)
+	
+	def test_segmentedFallback(self):
+		'''A server that claims to take ranges but ignores them should get a single stream download'''
+		
+		cacheController.downloadSegmentCount = 4
+		cacheController.minimumSegmentedLength = 0
+		self.server.supportRanges = False
+		self.server.advertiseRanges = True
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest())
+		
+		self.assertEqual(processedBytes, len(self.sampleContents), 'A download that fell back to a single stream did not download the whole item')
+		self.assertEqual(open(self.targetFilePath, 'rb').read(), self.sampleContents, 'A download that fell back to a single stream did not have the right contents')
+	
+	def test_webCacheProbes(self):
+		'''Web caches should be probed with HEAD requests, over a single kept-alive connection'''
+		
+		cacheController.addSourceFolders(self.server.baseURL)
+		self.assertEqual(self.server.requestLog[-1][0], 'HEAD', 'A web cache was not probed with a HEAD request')
+		
+		resultPath, wasDownloaded = cacheController.findItemInCaches('sample.dmg', 'sha1', hashlib.sha1(self.sampleContents).hexdigest(), progressReporter=None, includeRemoteCaches=True)
+		
+		self.assertEqual(resultPath, self.targetFilePath, 'An item from a web cache was not downloaded to the expected path: ' + str(resultPath))
+		self.assertEqual([thisRequest[1] for thisRequest in self.server.requestLog if thisRequest[0] == 'GET'], ['/' + cacheController.remoteManifestName, '/sample.dmg'], 'Only the manifest and the item found should have been downloaded, got: ' + str(self.server.requestLog))
+		self.assertEqual(self.server.connectionCount, 1, 'Probing and downloading from a web cache used %i connections rather than 1' % self.server.connectionCount)
+	
+	def test_findItemReleasesHost(self):
+		'''The item's host slot should be given up while web caches are asked about the name it was redirected to, so two items can not each hold the host the other is waiting on'''
+		
+		self.server.redirects['/download'] = '/sample.dmg'
+		checksumValue = hashlib.sha1(self.sampleContents).hexdigest()
+		downloadURL = self.server.baseURL + 'download'
+		
+		heldWhileProbing = []
+		originalMethod = cacheController.__dict__['findItemInCaches']
+		originalFindItemInCaches = cacheController.findItemInCaches
+		def findItemInCaches(*args, **kwargs):
+			if kwargs.get('includeRemoteCaches') is True:
+				heldWhileProbing.append((args[0], cacheController.holdsHostConnection(downloadURL)))
+			return originalFindItemInCaches(*args, **kwargs)
+		
+		cacheController.findItemInCaches = staticmethod(findItemInCaches)
+		try:
+			resultPath = cacheController.findItem(downloadURL, 'sha1', checksumValue, progressReporter=False)
+		finally:
+			cacheController.findItemInCaches = originalMethod
+		
+		self.assertTrue(('sample.dmg', False) in heldWhileProbing, 'The web caches were not asked about the final URL name without the host slot held, got: ' + str(heldWhileProbing))
+		self.assertFalse(True in [thisHeld for thisName, thisHeld in heldWhileProbing], 'The web caches were asked while the host slot was held, got: ' + str(heldWhileProbing))
+		self.assertEqual(open(resultPath, 'rb').read(), self.sampleContents, 'The redirected item was not downloaded after the web caches were asked')
+		self.assertFalse(cacheController.holdsHostConnection(downloadURL), 'The host slot was still held after the download')
+	
+	def test_expectedSize(self):
+		'''Downloads of the wrong size should be given up before any of the item is saved, and web caches skipped on their content-length'''
+		
+		checksumValue = hashlib.sha1(self.sampleContents).hexdigest()
+		
+		self.assertRaises(SizeMismatchException, cacheController.downloadItem, self.sampleURL, self.targetFilePath, 'sha1', checksumValue, expectedSize=len(self.sampleContents) - 1)
+		for thisPath in [self.targetFilePath, self.targetFilePath + cacheController.partialDownloadSuffix, self.targetFilePath + cacheController.partialSidecarSuffix]:
+			self.assertFalse(os.path.exists(thisPath), 'A download of the wrong size left behind: ' + thisPath)
+		
+		cacheController.addSourceFolders(self.server.baseURL)
+		requestCount = len(self.server.requestLog)
+		self.assertEqual(cacheController.findItemInCaches('sample.dmg', 'sha1', checksumValue, progressReporter=None, includeRemoteCaches=True, expectedSize=len(self.sampleContents) + 1)[0], None, 'An item of the wrong size was downloaded from a web cache')
+		self.assertFalse('/sample.dmg' in [thisRequest[1] for thisRequest in self.server.requestLog[requestCount:] if thisRequest[0] == 'GET'], 'An item of the wrong size was downloaded rather than ruled out with a HEAD request')
+		
+		hashGenerator, processedBytes, processSeconds = cacheController.downloadItem(self.sampleURL, self.targetFilePath, 'sha1', checksumValue, expectedSize=len(self.sampleContents))
+		self.assertEqual(hashGenerator.hexdigest(), checksumValue, 'A download of the right size did not match its checksum')
+		self.assertEqual(os.path.getsize(self.targetFilePath), len(self.sampleContents), 'A preallocated download was not the right size')
+	
+	def test_sharedDownload(self):
+		'''Two processes finding the same item into one cache folder should only download it once'''
+		
+		checksumValue = hashlib.sha1(self.sampleContents).hexdigest()
+		self.server.chunkDelay = 0.3 # long enough for the second process to find the first one downloading
+		
+		childScript = 'import sys; from cacheController import cacheController; cacheController.setCacheFolder(sys.argv[1]); sys.stdout.write(cacheController.findItem(sys.argv[2], "sha1", sys.argv[3], progressReporter=False))'
+		childCommand = [sys.executable, '-c', childScript, self.cacheFolderPath, self.sampleURL, checksumValue]
+		childFolder = os.path.dirname(os.path.abspath(__file__))
+		
+		firstProcess = subprocess.Popen(childCommand, cwd=childFolder, stdout=subprocess.PIPE)
+		
+		lockFilePath = downloadLock(self.cacheFolderPath, 'sha1-' + checksumValue).lockFilePath
+		startTime = time.time()
+		while not os.path.exists(lockFilePath) and firstProcess.poll() is None and time.time() - startTime < 10:
+			time.sleep(0.05)
+		self.assertTrue(os.path.exists(lockFilePath), 'The first process did not take the download lock')
+		
+		secondProcess = subprocess.Popen(childCommand, cwd=childFolder, stdout=subprocess.PIPE)
+		
+		firstResult = firstProcess.communicate()[0]
+		secondResult = secondProcess.communicate()[0]
+		
+		self.assertEqual(firstProcess.returncode, 0, 'The first process failed')
+		self.assertEqual(secondProcess.returncode, 0, 'The second process failed')
+		self.assertEqual(firstResult, self.targetFilePath, 'The first process did not download to the expected path, got: ' + firstResult)
+		self.assertEqual(secondResult, self.targetFilePath, 'The second process did not find the item the first one downloaded, got: ' + secondResult)
+		
+		# the second process opens the url before it finds the download in progress, but gives up on it without reading
+		self.assertTrue(self.server.bytesSent < 2 * len(self.sampleContents), 'The item was downloaded more than once, %i bytes were sent' % self.server.bytesSent)
+		self.assertFalse(os.path.exists(lockFilePath), 'The download lock was left behind')
+	
+	def test_contentStoreDownload(self):
+		'''Downloads into a cache folder with a content store should go into the store'''
+		
+		os.mkdir(os.path.join(self.cacheFolderPath, cacheController.contentStoreFolder))
+		checksumValue = hashlib.sha1(self.sampleContents).hexdigest()
+		
+		resultPath = cacheController.findItem(self.sampleURL, 'sha1', checksumValue, progressReporter=False)
+		self.assertEqual(resultPath, cacheController.findInContentStore(self.cacheFolderPath, 'sha1', checksumValue), 'The download was not put in the content store, got: ' + str(resultPath))
+		self.assertTrue(os.path.samefile(resultPath, self.targetFilePath), 'The download was not linked under its name')
+	
+	def test_cacheQuota(self):
+		'''Downloads that would go over the quota should first evict the items used longest ago, but not pinned ones or ones in use'''
+		
+		os.mkdir(os.path.join(self.cacheFolderPath, cacheController.contentStoreFolder))
+		
+		cachedItems = {}
+		for thisName in ['old', 'stored', 'pinned']:
+			thisContents = os.urandom(200 * 1024)
+			cachedItems[thisName] = (os.path.join(self.cacheFolderPath, '%s sha1-%s.dmg' % (thisName, hashlib.sha1(thisContents).hexdigest())), hashlib.sha1(thisContents).hexdigest())
+			testFile = open(cachedItems[thisName][0], 'wb')
+			testFile.write(thisContents)
+			testFile.close()
+			os.utime(cachedItems[thisName][0], (time.time() - 1000, time.time() - 1000))
+		
+		storedPath = cacheController.addItemToContentStore(cachedItems['stored'][0], 'sha1', cachedItems['stored'][1])
+		cacheQuota.recordUse('sha1-' + cachedItems['stored'][1])
+		cacheQuota.pinnedChecksums.add('sha1-' + cachedItems['pinned'][1])
+		
+		# 600KB cached, and 300KB to download, with room for the sidecar of the download
+		cacheQuota.setQuota(710 * 1024)
+		resultPath = cacheController.findItem(self.sampleURL, 'sha1', hashlib.sha1(self.sampleContents).hexdigest(), progressReporter=False)
+		
+		self.assertEqual(resultPath, cacheController.findInContentStore(self.cacheFolderPath, 'sha1', hashlib.sha1(self.sampleContents).hexdigest()), 'The item was not downloaded')
+		self.assertFalse(os.path.exists(cachedItems['old'][0]), 'The item used longest ago was not evicted')
+		self.assertTrue(os.path.exists(cachedItems['stored'][0]) and os.path.exists(cachedItems['pinned'][0]), 'More items were evicted than needed')
+		
+		# the pinned item and the one just downloaded stay, even when that is not enough
+		cacheQuota.setQuota(100 * 1024)
+		evictions = cacheController.makeRoomInCache()
+		self.assertEqual([thisItem['checksum'] for thisItem in evictions], ['sha1-' + cachedItems['stored'][1]], 'The wrong items were evicted, got: ' + str(evictions))
+		self.assertFalse(os.path.lexists(cachedItems['stored'][0]) or os.path.exists(os.path.dirname(storedPath)), 'An item in the content store was not removed along with its link')
+		self.assertTrue(os.path.exists(cachedItems['pinned'][0]) and os.path.exists(resultPath), 'A pinned item, or one found in this run, was evicted')
+	
+	def test_remoteManifest(self):
+		'''A web cache with a manifest should have it read once, and items found through it without guessing'''
+		
+		os.mkdir(os.path.join(self.servedFolderPath, 'some folder'))
+		os.rename(os.path.join(self.servedFolderPath, 'sample.dmg'), os.path.join(self.servedFolderPath, 'some folder', 'renamed item.dmg'))
+		
+		manifest = cacheController.generateManifest(self.servedFolderPath, checksumTypes=['sha1', 'md5'])
+		self.assertEqual(manifest['items']['sha1-' + hashlib.sha1(self.sampleContents).hexdigest()], {'path':'some folder/renamed item.dmg', 'size':len(self.sampleContents)}, 'The generated manifest did not have the right entry for the sample item, got: ' + str(manifest))
+		self.assertTrue('md5-' + hashlib.md5(self.sampleContents).hexdigest() in manifest['items'], 'The generated manifest did not have an entry for the second checksum type')
+		
+		manifestFile = open(os.path.join(self.servedFolderPath, cacheController.remoteManifestName), 'w')
+		json.dump(manifest, manifestFile)
+		manifestFile.close()
+		
+		cacheController.addSourceFolders(self.server.baseURL)
+		resultPath, wasDownloaded = cacheController.findItemInCaches('sample.dmg', 'sha1', hashlib.sha1(self.sampleContents).hexdigest(), progressReporter=None, includeRemoteCaches=True)
+		
+		self.assertEqual(resultPath, os.path.join(self.cacheFolderPath, 'renamed item sha1-%s.dmg' % hashlib.sha1(self.sampleContents).hexdigest()), 'An item listed in a manifest was not downloaded to the expected path: ' + str(resultPath))
+		self.assertEqual(open(resultPath, 'rb').read(), self.sampleContents, 'An item listed in a manifest did not have the right contents')
+		
+		self.assertEqual(cacheController.findItemInCaches('missing.dmg', 'sha1', 'notInTheManifest', progressReporter=None, includeRemoteCaches=True), (None, False), 'An item that was not in the manifest was found')
+		
+		requestsMade = [(thisRequest[0], thisRequest[1]) for thisRequest in self.server.requestLog[1:]]
+		self.assertEqual(requestsMade, [('GET', '/' + cacheController.remoteManifestName), ('GET', '/some%20folder/renamed%20item.dmg')], 'Lookups with a manifest made unexpected requests: ' + str(requestsMade))
+	
+	def test_remoteManifestRevalidation(self):
+		'''A manifest saved by an earlier run should be revalidated with its ETag rather than downloaded again'''
+		
+		manifestFile = open(os.path.join(self.servedFolderPath, cacheController.remoteManifestName), 'w')
+		json.dump(cacheController.generateManifest(self.servedFolderPath), manifestFile)
+		manifestFile.close()
+		
+		firstItems = cacheController.getRemoteManifest(self.server.baseURL)
+		self.assertEqual(firstItems.keys(), ['sha1-' + hashlib.sha1(self.sampleContents).hexdigest()], 'The manifest did not have the expected items, got: ' + str(firstItems))
+		
+		# a new run
+		cacheController.remoteManifests = {}
+		
+		self.assertEqual(cacheController.getRemoteManifest(self.server.baseURL), firstItems, 'A revalidated manifest did not have the same items')
+		self.assertTrue('if-none-match' in self.server.requestLog[-1][2], 'A saved manifest was not revalidated with If-None-Match')
+		self.assertEqual(len(self.server.requestLog), 2, 'The manifest was fetched more than once per run')
+		
+		# through a proxy the 304 comes back from urllib2 as an HTTPError, the test server answers proxy requests as well
+		cacheController.remoteManifests = {}
+		startingProxy = os.environ.get('http_proxy')
+		os.environ['http_proxy'] = self.server.baseURL
+		urllib2.install_opener(None) # urllib2 reads the proxies when it builds its opener
+		try:
+			self.assertEqual(cacheController.getRemoteManifest(self.server.baseURL), firstItems, 'A manifest revalidated through a proxy did not have the same items')
+		finally:
+			if startingProxy is None:
+				del os.environ['http_proxy']
+			else:
+				os.environ['http_proxy'] = startingProxy
+			urllib2.install_opener(None)
+		self.assertTrue(self.server.requestLog[-1][1].startswith('http://'), 'The manifest was not requested through the proxy')
+		self.assertEqual(len(self.server.requestLog), 3, 'A manifest revalidated through a proxy was not requested')
+		
+		# a web cache without a manifest
+		os.unlink(os.path.join(self.servedFolderPath, cacheController.remoteManifestName))
+		cacheController.remoteManifests = {}
+		self.assertEqual(cacheController.getRemoteManifest(self.server.baseURL), None, 'A web cache without a manifest returned manifest items')
+	
+	def test_remoteCatalog(self):
+		'''A remote catalog should be copied into the cache once per run, and later runs should only revalidate the copy'''
+		
+		catalogContents = 'Third Party Software:\n\tSample\tsample.dmg\tsha1:%s\n' % hashlib.sha1(self.sampleContents).hexdigest()
+		catalogFile = open(os.path.join(self.servedFolderPath, 'shared.catalog'), 'w')
+		catalogFile.write(catalogContents)
+		catalogFile.close()
+		
+		catalogURL = self.server.baseURL + 'shared.catalog'
+		catalogPath = cacheController.getRemoteCatalog(catalogURL)
+		self.assertEqual(os.path.basename(catalogPath), 'shared.catalog', 'The local copy of a remote catalog did not keep its name: ' + catalogPath)
+		self.assertEqual(open(catalogPath).read(), catalogContents, 'The local copy of a remote catalog did not have the same contents')
+		self.assertEqual(cacheController.getRemoteCatalogURL(catalogPath), cacheController.normalizeCatalogURL(catalogURL), 'The local copy of a remote catalog did not map back to its url')
+		
+		# the same catalog by another form of its url
+		self.assertEqual(cacheController.getRemoteCatalog(catalogURL.replace('http://', 'HTTP://') + '#fragment'), catalogPath, 'Two forms of the same url got different local copies')
+		self.assertEqual(len(self.server.requestLog), 1, 'A remote catalog was fetched more than once per run')
+		
+		# a new run
+		cacheController.remoteCatalogs = {}
+		self.assertEqual(cacheController.getRemoteCatalog(catalogURL), catalogPath, 'A revalidated catalog got a different local copy')
+		self.assertEqual(len(self.server.requestLog), 2, 'A remote catalog was not revalidated once in a new run')
+		self.assertTrue('if-none-match' in self.server.requestLog[-1][2] and 'if-modified-since' in self.server.requestLog[-1][2], 'A saved catalog was not revalidated with If-None-Match and If-Modified-Since')
+		self.assertEqual(open(catalogPath).read(), catalogContents, 'A revalidated catalog was changed')
+		
+		# a missing catalog
+		self.assertRaises(CatalogNotFoundException, cacheController.getRemoteCatalog, self.server.baseURL + 'missing.catalog')
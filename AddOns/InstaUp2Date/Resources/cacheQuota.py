@@ -0,0 +1,219 @@
+#!/usr/bin/python
+
+import os, re, time, sqlite3, threading
+
+import pathHelpers
+
+class cacheQuota:
+	'''A limit on the size of the writeable cache folder, and a persistent record of when and how often each item in it was used, so the ones used least recently (or least often) can be evicted first. Items referenced by a catalog file are pinned and never evicted.'''
+	
+	# ------ class variables
+	
+	usageFileName			= '.cacheUsage.sqlite'
+	usageFilePath			= None		# the database in use, normally inside the writeable cache folder
+	
+	quotaBytes				= None		# a fixed limit
+	quotaPercent			= None		# or a percentage of the volume the cache folder is on
+	
+	evictionPolicies		= ['lru', 'lfu']
+	evictionPolicy			= 'lru'		# 'lru' evicts the items used longest ago first, 'lfu' the items used the fewest times
+	
+	pinnedChecksums			= set()		# 'checksumType-checksumValue' strings of items that are never evicted
+	
+	quotaParser				= re.compile('^\s*(?P<amount>\d+(\.\d*)?)\s*(?P<unit>%|[kmgt]?b?)\s*$', re.IGNORECASE)
+	
+	_connection				= None
+	_lock					= threading.RLock()
+	
+	# ------ class methods
+	
+	# ---- setup methods
+	
+	@classmethod
+	def setUsageFolder(myClass, usageFolder):
+		'''Open (creating if necessary) the usage database inside the given folder'''
+		
+		if not hasattr(usageFolder, 'capitalize'):
+			raise ValueError("%s's setUsageFolder requires a path, got: %s" % (myClass.__name__, str(usageFolder)))
+		elif not os.path.isdir(usageFolder):
+			raise ValueError("%s's setUsageFolder given a path that was not a valid directory: %s" % (myClass.__name__, usageFolder))
+		
+		usageFilePath = os.path.join(pathHelpers.normalizePath(usageFolder, followSymlink=True), myClass.usageFileName)
+		
+		myClass._lock.acquire()
+		try:
+			if usageFilePath == myClass.usageFilePath and myClass._connection is not None:
+				return
+			
+			myClass.closeUsage()
+			
+			connection = sqlite3.connect(usageFilePath, timeout=30, check_same_thread=False)
+			connection.text_factory = str # paths are byte strings
+			connection.execute('CREATE TABLE IF NOT EXISTS usage (checksum TEXT NOT NULL PRIMARY KEY, lastUsed REAL NOT NULL, useCount INTEGER NOT NULL)')
+			connection.commit()
+			
+			myClass._connection = connection
+			myClass.usageFilePath = usageFilePath
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def closeUsage(myClass):
+		
+		myClass._lock.acquire()
+		try:
+			if myClass._connection is not None:
+				myClass._connection.close()
+			myClass._connection = None
+			myClass.usageFilePath = None
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def setQuota(myClass, quota):
+		'''Set the limit from a number of bytes, a string with a unit (500M, 20G, 1.5T), or a percentage of the volume (80%). None removes the limit.'''
+		
+		myClass.quotaBytes = None
+		myClass.quotaPercent = None
+		
+		if quota is None:
+			return
+		
+		if isinstance(quota, (int, long)) and quota > 0:
+			myClass.quotaBytes = quota
+			return
+		
+		quotaMatch = None
+		if hasattr(quota, 'capitalize'):
+			quotaMatch = myClass.quotaParser.search(quota)
+		if quotaMatch is None or float(quotaMatch.group('amount')) <= 0:
+			raise ValueError('The cache quota must be a size such as 500M or 20G, or a percentage of the volume such as 80%%, got: %s' % str(quota))
+		
+		amount = float(quotaMatch.group('amount'))
+		unit = quotaMatch.group('unit').lower().rstrip('b')
+		
+		if unit == '%':
+			if amount > 100:
+				raise ValueError('The cache quota can not be more than 100% of the volume, got: ' + str(quota))
+			myClass.quotaPercent = amount
+		else:
+			myClass.quotaBytes = int(amount * 1024 ** ['', 'k', 'm', 'g', 't'].index(unit))
+	
+	@classmethod
+	def setEvictionPolicy(myClass, evictionPolicy):
+		if evictionPolicy not in myClass.evictionPolicies:
+			raise ValueError('The evictionPolicy must be one of %s, got: %s' % (', '.join(myClass.evictionPolicies), str(evictionPolicy)))
+		myClass.evictionPolicy = evictionPolicy
+	
+	@classmethod
+	def hasQuota(myClass):
+		return myClass.quotaBytes is not None or myClass.quotaPercent is not None
+	
+	@classmethod
+	def getQuotaBytes(myClass, folderPath):
+		'''The limit in bytes for a cache folder, or None if there is no limit'''
+		
+		if myClass.quotaBytes is not None:
+			return myClass.quotaBytes
+		
+		if myClass.quotaPercent is not None:
+			volumeStats = os.statvfs(folderPath)
+			return int(volumeStats.f_blocks * volumeStats.f_frsize * myClass.quotaPercent / 100)
+		
+		return None
+	
+	# ---- pinning methods
+	
+	@classmethod
+	def pinChecksums(myClass, checksumStrings):
+		'''Pin the items with these 'checksumType-checksumValue' strings, normally everything the catalog files reference. Returns the number of items pinned.'''
+		
+		if hasattr(checksumStrings, 'capitalize'):
+			checksumStrings = [checksumStrings]
+		
+		for checksumString in checksumStrings:
+			checksumType, checksumValue = checksumString.split('-', 1)
+			myClass.pinnedChecksums.add('%s-%s' % (checksumType.lower(), checksumValue))
+		
+		return len(myClass.pinnedChecksums)
+	
+	# ---- usage methods
+	
+	@classmethod
+	def recordUse(myClass, checksumString, useTime=None):
+		'''Note that the item with this checksum was just used'''
+		
+		if myClass._connection is None:
+			return
+		
+		if useTime is None:
+			useTime = time.time()
+		
+		myClass._lock.acquire()
+		try:
+			myClass._connection.execute('INSERT OR IGNORE INTO usage (checksum, lastUsed, useCount) VALUES (?, ?, 0)', (checksumString, useTime))
+			myClass._connection.execute('UPDATE usage SET lastUsed = max(lastUsed, ?), useCount = useCount + 1 WHERE checksum = ?', (useTime, checksumString))
+			myClass._connection.commit()
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def lookupUses(myClass):
+		'''Return a dict of (lastUsed, useCount) tuples, keyed by checksum string'''
+		
+		if myClass._connection is None:
+			return {}
+		
+		myClass._lock.acquire()
+		try:
+			return dict([(str(checksumString), (lastUsed, useCount)) for checksumString, lastUsed, useCount in myClass._connection.execute('SELECT checksum, lastUsed, useCount FROM usage')])
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def forgetUse(myClass, checksumString):
+		
+		if myClass._connection is None:
+			return
+		
+		myClass._lock.acquire()
+		try:
+			myClass._connection.execute('DELETE FROM usage WHERE checksum = ?', (checksumString,))
+			myClass._connection.commit()
+		finally:
+			myClass._lock.release()
+	
+	# ---- eviction methods
+	
+	@classmethod
+	def chooseEvictions(myClass, cacheItems, quotaBytes, neededBytes=0, protectedChecksums=None):
+		'''Given the items in a cache folder (dicts with 'checksum', 'size', and 'mtime'), and the total size it should be kept under, return the items to evict to make room for neededBytes more, in the order they should go. Items without a checksum, pinned items, and protected ones are never chosen, so the result may not be enough.'''
+		
+		usedBytes = sum([thisItem['size'] for thisItem in cacheItems])
+		if quotaBytes is None or usedBytes + neededBytes <= quotaBytes:
+			return []
+		
+		protectedChecksums = set(protectedChecksums or []) | myClass.pinnedChecksums
+		itemUses = myClass.lookupUses()
+		
+		candidates = []
+		for thisItem in cacheItems:
+			if thisItem['checksum'] is None or thisItem['checksum'] in protectedChecksums:
+				continue
+			
+			# items that were never looked up since being recorded count from when they were written
+			lastUsed, useCount = itemUses.get(thisItem['checksum'], (thisItem['mtime'], 0))
+			
+			if myClass.evictionPolicy == 'lfu':
+				candidates.append(((useCount, lastUsed), thisItem))
+			else:
+				candidates.append(((lastUsed, useCount), thisItem))
+		
+		evictions = []
+		for sortKey, thisItem in sorted(candidates, key=lambda candidate: candidate[0]):
+			if usedBytes + neededBytes <= quotaBytes:
+				break
+			evictions.append(thisItem)
+			usedBytes -= thisItem['size']
+		
+		return evictions
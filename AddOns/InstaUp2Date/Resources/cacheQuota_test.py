@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+import os, time, unittest
+
+from tempFolderManager		import tempFolderManager
+from cacheQuota				import cacheQuota
+
+class cacheQuotaTests(unittest.TestCase):
+	'''Test parsing quotas, recording use, and choosing what to evict'''
+	
+	usageFolderPath			= None
+	
+	def setUp(self):
+		self.usageFolderPath = tempFolderManager.getNewTempFolder()
+		cacheQuota.setUsageFolder(self.usageFolderPath)
+	
+	def tearDown(self):
+		cacheQuota.closeUsage()
+		cacheQuota.setQuota(None)
+		cacheQuota.setEvictionPolicy('lru')
+		cacheQuota.pinnedChecksums = set()
+		tempFolderManager.cleanupForExit()
+	
+	def test_setQuota(self):
+		'''Quotas should be understood as bytes, sizes with units, and percentages of the volume'''
+		
+		for quota, expectedBytes in [(1000, 1000), ('1000', 1000), ('500k', 500 * 1024), ('20G', 20 * 1024 ** 3), ('1.5 TB', int(1.5 * 1024 ** 4))]:
+			cacheQuota.setQuota(quota)
+			self.assertEqual(cacheQuota.getQuotaBytes(self.usageFolderPath), expectedBytes, 'The quota %s was not understood as %i bytes, got: %s' % (str(quota), expectedBytes, str(cacheQuota.getQuotaBytes(self.usageFolderPath))))
+		
+		cacheQuota.setQuota('50%')
+		volumeStats = os.statvfs(self.usageFolderPath)
+		self.assertEqual(cacheQuota.getQuotaBytes(self.usageFolderPath), volumeStats.f_blocks * volumeStats.f_frsize / 2, 'A percentage quota was not worked out from the size of the volume')
+		
+		cacheQuota.setQuota(None)
+		self.assertFalse(cacheQuota.hasQuota(), 'Setting the quota to None did not remove it')
+		
+		for badQuota in ['', 'lots', '-5G', '150%', '0', '10Q']:
+			self.assertRaises(ValueError, cacheQuota.setQuota, badQuota)
+		self.assertRaises(ValueError, cacheQuota.setEvictionPolicy, 'random')
+	
+	def test_chooseEvictions(self):
+		'''The least recently or least often used items should go first, skipping pinned and protected ones'''
+		
+		now = time.time()
+		cacheItems = [{'checksum':'sha1-%s' % thisName, 'size':100, 'mtime':now - 1000} for thisName in ['a', 'b', 'c', 'd']]
+		cacheItems.append({'checksum':None, 'size':100, 'mtime':now}) # a download in progress
+		
+		# a: used long ago but often, b: used recently once, c: never recorded, d: used recently and often
+		for useTime in [now - 500, now - 499, now - 498]:
+			cacheQuota.recordUse('sha1-a', useTime=useTime)
+			cacheQuota.recordUse('sha1-d', useTime=useTime + 400)
+		cacheQuota.recordUse('sha1-b', useTime=now - 10)
+		self.assertEqual(cacheQuota.lookupUses()['sha1-a'], (now - 498, 3), 'The uses of an item were not recorded')
+		
+		self.assertEqual(cacheQuota.chooseEvictions(cacheItems, None), [], 'Items were evicted without a quota')
+		self.assertEqual(cacheQuota.chooseEvictions(cacheItems, 500), [], 'Items were evicted while under the quota')
+		
+		evictedChecksums = lambda evictions: [thisItem['checksum'] for thisItem in evictions]
+		
+		self.assertEqual(evictedChecksums(cacheQuota.chooseEvictions(cacheItems, 500, neededBytes=150)), ['sha1-c', 'sha1-a'], 'The least recently used items were not evicted first')
+		
+		cacheQuota.setEvictionPolicy('lfu')
+		self.assertEqual(evictedChecksums(cacheQuota.chooseEvictions(cacheItems, 500, neededBytes=150)), ['sha1-c', 'sha1-b'], 'The least often used items were not evicted first')
+		
+		cacheQuota.pinnedChecksums.add('sha1-c')
+		self.assertEqual(evictedChecksums(cacheQuota.chooseEvictions(cacheItems, 250, protectedChecksums=['sha1-b'])), ['sha1-a', 'sha1-d'], 'A pinned or protected item was evicted')
+		self.assertEqual(evictedChecksums(cacheQuota.chooseEvictions(cacheItems, 0, protectedChecksums=['sha1-b'])), ['sha1-a', 'sha1-d'], 'Items without a checksum, or pinned, were evicted when the quota could not be met')
+	
+	def test_pinChecksums(self):
+		'''Pinned checksums should be stored with a lower-case checksum type'''
+		
+		self.assertEqual(cacheQuota.pinChecksums(['SHA1-abc123', 'md5-def456']), 2, 'The wrong number of items were pinned')
+		self.assertEqual(cacheQuota.pinChecksums('sha1-abc123'), 2, 'Pinning an item twice counted it twice')
+		self.assertEqual(cacheQuota.pinnedChecksums, set(['sha1-abc123', 'md5-def456']), 'The items were not pinned, got: ' + str(cacheQuota.pinnedChecksums))
+
+if __name__ == "__main__":
+	unittest.main()
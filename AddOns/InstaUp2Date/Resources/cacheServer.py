@@ -0,0 +1,361 @@
+#!/usr/bin/python
+
+import os, re, sys, json, time, threading, urllib, urlparse, email.utils, BaseHTTPServer, SocketServer
+
+import checksum
+from httpClient				import httpClient
+from cacheController		import cacheController
+from downloadLock			import downloadLock
+
+class pullThroughFetch:
+	'''One item being fetched from upstream into the cache folder with cacheController.findItem, shared by every client asking for it'''
+	
+	#--------------------Instance Variables---------------------------
+	
+	checksumString			= None
+	finished				= None		# an Event, set once the item is in the cache folder or the fetch has failed
+	
+	resultPath				= None
+	errorInfo				= None		# sys.exc_info() if the fetch failed
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, checksumString, upstreamItem):
+		
+		self.checksumString = checksumString
+		self.finished = threading.Event()
+		
+		checksumType, checksumValue = checksumString.split('-', 1)
+		
+		def fetchWorker():
+			try:
+				self.resultPath = cacheController.findItem(upstreamItem['url'], checksumType, checksumValue, displayName=upstreamItem.get('name'), progressReporter=False)
+			except Exception:
+				self.errorInfo = sys.exc_info()
+			self.finished.set()
+		
+		fetchThread = threading.Thread(target=fetchWorker)
+		fetchThread.setDaemon(True)
+		fetchThread.start()
+	
+	def openPartial(self):
+		'''Return the partial download for this item opened for reading and its expected length (None if the server did not say), or (None, None) if the fetch finished before there was one to follow or it is not being written in order'''
+		
+		thisLock = downloadLock(cacheController.getCacheFolder(), self.checksumString)
+		
+		while not self.finished.isSet():
+			
+			# the download lock says where the item is being downloaded to, even by another process
+			ownerInfo, lockMtime = thisLock.readOwner()
+			if ownerInfo and ownerInfo.get('targetPath'):
+				targetFilePath = os.path.join(cacheController.getCacheFolder(), os.path.basename(ownerInfo['targetPath']))
+				sidecar = cacheController.readPartialSidecar(targetFilePath + cacheController.partialSidecarSuffix)
+				if sidecar is not None and (sidecar.get('segments') or sidecar.get('preallocated')):
+					return None, None # written out of order, so it can not be followed
+				elif sidecar is not None:
+					try:
+						return open(targetFilePath + cacheController.partialDownloadSuffix, 'rb'), sidecar.get('expectedLength')
+					except IOError:
+						pass # not started, or just finished
+			
+			self.finished.wait(0.05)
+		
+		return None, None
+
+class cacheRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	'''Answer requests for the items in the cache folder, and the manifest listing them'''
+	
+	protocol_version		= 'HTTP/1.1'
+	
+	chunkSize				= 64 * 1024
+	
+	def log_message(self, format, *args):
+		if self.server.logRequests is True:
+			BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+	
+	def do_GET(self):
+		self.answerRequest(sendBody=True)
+	
+	def do_HEAD(self):
+		self.answerRequest(sendBody=False)
+	
+	def sendEmptyResponse(self, responseCode, headers=None):
+		'''Unlike send_error this keeps the connection open'''
+		
+		self.send_response(responseCode)
+		for headerName, headerValue in (headers or {}).items():
+			self.send_header(headerName, headerValue)
+		self.send_header('Content-Length', '0')
+		self.end_headers()
+	
+	def answerRequest(self, sendBody):
+		
+		requestPath = urllib.unquote(urlparse.urlparse(self.path).path).lstrip('/')
+		
+		if requestPath == cacheController.remoteManifestName:
+			manifestData = json.dumps(self.server.generateManifest())
+			self.send_response(200)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(manifestData)))
+			self.end_headers()
+			if sendBody is True:
+				self.wfile.write(manifestData)
+			return
+		
+		# nothing outside of the cache folder, and nothing hidden in it
+		if requestPath == '' or os.path.isabs(requestPath) or [thisPart for thisPart in requestPath.split('/') if thisPart.startswith('.') or thisPart == '']:
+			self.sendEmptyResponse(404)
+			return
+		
+		checksumString = self.server.checksumInName(requestPath)
+		
+		itemPath = self.server.findLocalItem(requestPath, checksumString)
+		if itemPath is not None:
+			self.sendLocalItem(itemPath, checksumString, sendBody)
+			return
+		
+		if checksumString is None or checksumString not in self.server.upstreamItems:
+			self.sendEmptyResponse(404)
+			return
+		
+		# ---- pull through from upstream
+		
+		if sendBody is False:
+			# no need to fetch it just to say how large it is
+			upstreamItem = self.server.upstreamItems[checksumString]
+			itemLength = upstreamItem.get('size')
+			if itemLength is None:
+				try:
+					headFile = httpClient.head(upstreamItem['url'])
+					itemLength = headFile.info().getheader('content-length')
+				except IOError:
+					self.sendEmptyResponse(404)
+					return
+			
+			self.send_response(200)
+			self.send_header('Content-Type', 'application/octet-stream')
+			if itemLength is not None:
+				self.send_header('Content-Length', str(itemLength))
+			self.end_headers()
+			return
+		
+		thisFetch = self.server.getFetch(checksumString)
+		
+		# only whole items are followed while they download, ranges have to wait for them to be verified
+		partialFile = None
+		expectedLength = None
+		if self.headers.getheader('range') is None:
+			partialFile, expectedLength = thisFetch.openPartial()
+		
+		if partialFile is None:
+			thisFetch.finished.wait()
+			itemPath = self.server.findLocalItem(requestPath, checksumString)
+			if itemPath is None:
+				self.sendEmptyResponse(502)
+			else:
+				self.sendLocalItem(itemPath, checksumString, sendBody)
+			return
+		
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/octet-stream')
+		if expectedLength is not None:
+			self.send_header('Content-Length', str(expectedLength))
+		else:
+			self.close_connection = 1 # the end of the connection marks the end of the item
+		self.end_headers()
+		
+		bytesSent = 0
+		try:
+			while expectedLength is None or bytesSent < expectedLength:
+				thisChunk = partialFile.read(self.chunkSize)
+				if thisChunk:
+					self.wfile.write(thisChunk)
+					bytesSent += len(thisChunk)
+				elif thisFetch.finished.isSet():
+					# everything written before it finished has been read once a read comes back empty after it finished
+					thisChunk = partialFile.read(self.chunkSize)
+					if not thisChunk:
+						break
+					self.wfile.write(thisChunk)
+					bytesSent += len(thisChunk)
+				else:
+					thisFetch.finished.wait(0.05)
+		finally:
+			partialFile.close()
+		
+		# the client checks the checksum itself, cutting the connection short tells it something went wrong
+		if thisFetch.errorInfo is not None or (expectedLength is not None and bytesSent < expectedLength):
+			self.close_connection = 1
+	
+	def sendLocalItem(self, itemPath, checksumString, sendBody):
+		'''Send a file from the cache folder, supporting single Range requests'''
+		
+		itemStat = os.stat(itemPath)
+		itemSize = itemStat.st_size
+		itemETag = '"%s"' % (checksumString or '%x-%x' % (int(itemStat.st_mtime * 1000), itemSize))
+		itemLastModified = email.utils.formatdate(itemStat.st_mtime, usegmt=True)
+		
+		startByte = 0
+		endByte = itemSize - 1
+		responseCode = 200
+		
+		rangeHeader = self.headers.getheader('range')
+		ifRangeHeader = self.headers.getheader('if-range')
+		if rangeHeader is not None and ifRangeHeader in [None, itemETag, itemLastModified]:
+			rangeMatch = re.match('^bytes=(?P<start>\d*)-(?P<end>\d*)$', rangeHeader.strip())
+			if rangeMatch is not None and (rangeMatch.group('start') != '' or rangeMatch.group('end') != ''):
+				if rangeMatch.group('start') == '':
+					# the last bytes
+					startByte = max(itemSize - int(rangeMatch.group('end')), 0)
+				else:
+					startByte = int(rangeMatch.group('start'))
+					if rangeMatch.group('end') != '':
+						endByte = min(int(rangeMatch.group('end')), itemSize - 1)
+				
+				if startByte >= itemSize or startByte > endByte:
+					self.sendEmptyResponse(416, {'Content-Range':'bytes */%i' % itemSize})
+					return
+				
+				responseCode = 206
+		
+		self.send_response(responseCode)
+		self.send_header('Content-Type', 'application/octet-stream')
+		self.send_header('Content-Length', str(endByte - startByte + 1))
+		self.send_header('ETag', itemETag)
+		self.send_header('Last-Modified', itemLastModified)
+		self.send_header('Accept-Ranges', 'bytes')
+		if responseCode == 206:
+			self.send_header('Content-Range', 'bytes %i-%i/%i' % (startByte, endByte, itemSize))
+		self.end_headers()
+		
+		if sendBody is False:
+			return
+		
+		bytesToSend = endByte - startByte + 1
+		itemFile = open(itemPath, 'rb')
+		try:
+			itemFile.seek(startByte)
+			while bytesToSend > 0:
+				thisChunk = itemFile.read(min(bytesToSend, self.chunkSize))
+				if not thisChunk:
+					self.close_connection = 1 # the file shrank under us
+					break
+				self.wfile.write(thisChunk)
+				bytesToSend -= len(thisChunk)
+		finally:
+			itemFile.close()
+
+class cacheServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	'''Serve the writeable cache folder over http, so other hosts can add it as a web cache source folder. Items it does not have yet, but that a catalog lists with an upstream url, are fetched into the cache folder while being sent to the client, and only served from the cache folder once verified.'''
+	
+	daemon_threads			= True
+	allow_reuse_address		= True
+	
+	#--------------------Instance Variables---------------------------
+	
+	upstreamItems			= None		# {'checksumType-checksumValue':{'url', 'size', 'name'}}, the name is only used for display
+	logRequests				= True
+	
+	fetches					= None		# pullThroughFetch objects by checksum string, while they run
+	fetchesLock				= None
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, serverAddress, upstreamItems=None, logRequests=True):
+		
+		cacheController.getCacheFolder() # raises if it has not been set
+		
+		self.upstreamItems = dict(upstreamItems or {})
+		self.logRequests = logRequests
+		
+		self.fetches = {}
+		self.fetchesLock = threading.Lock()
+		
+		BaseHTTPServer.HTTPServer.__init__(self, serverAddress, cacheRequestHandler)
+	
+	def handle_error(self, request, client_address):
+		pass # clients dropping connections part way through are expected
+	
+	def checksumInName(self, itemPath):
+		'''The checksum string from the name of an item, or None'''
+		
+		fileNameSearchResults = cacheController.fileNameChecksumRegex.search(os.path.basename(itemPath))
+		if fileNameSearchResults is None or fileNameSearchResults.group('checksumType') is None:
+			return None
+		return '%s-%s' % (fileNameSearchResults.group('checksumType').lower(), fileNameSearchResults.group('checksumValue'))
+	
+	def findLocalItem(self, requestPath, checksumString):
+		'''Return the path of a file in the cache folder for a request, or None. Items with a checksum in their name are only returned if they match it.'''
+		
+		cacheFolder = cacheController.getCacheFolder()
+		
+		candidatePaths = [os.path.join(cacheFolder, *requestPath.split('/'))]
+		if checksumString is not None:
+			candidatePaths.append(cacheController.findInContentStore(cacheFolder, *checksumString.split('-', 1)))
+			
+			# pulled through items are named after their upstream url, which may not be the name asked for
+			verifiedPath = cacheController.verifiedFiles.get(checksumString)
+			if verifiedPath is not None and verifiedPath.startswith(cacheFolder.rstrip(os.sep) + os.sep):
+				candidatePaths.append(verifiedPath)
+		
+		for thisPath in candidatePaths:
+			if thisPath is None or not os.path.isfile(thisPath) or thisPath.endswith(cacheController.partialDownloadSuffix) or thisPath.endswith(cacheController.partialSidecarSuffix):
+				continue
+			
+			# the checksum index makes this a stat after the first time
+			if checksumString is not None:
+				checksumType, checksumValue = checksumString.split('-', 1)
+				if checksumValue != checksum.checksum(thisPath, checksumType=checksumType, progressReporter=None)['checksum']:
+					continue
+			
+			return thisPath
+		
+		return None
+	
+	def getFetch(self, checksumString):
+		'''Return the fetch for an item, starting one if it is not already running'''
+		
+		self.fetchesLock.acquire()
+		try:
+			thisFetch = self.fetches.get(checksumString)
+			if thisFetch is None:
+				thisFetch = pullThroughFetch(checksumString, self.upstreamItems[checksumString])
+				self.fetches[checksumString] = thisFetch
+				
+				def forgetFetch():
+					thisFetch.finished.wait()
+					self.fetchesLock.acquire()
+					try:
+						if self.fetches.get(checksumString) is thisFetch:
+							del self.fetches[checksumString]
+					finally:
+						self.fetchesLock.release()
+				
+				forgetThread = threading.Thread(target=forgetFetch)
+				forgetThread.setDaemon(True)
+				forgetThread.start()
+			
+			return thisFetch
+		finally:
+			self.fetchesLock.release()
+	
+	def generateManifest(self):
+		'''A manifest of the files in the cache folder, and the items that can be fetched from upstream, in the format cacheController.getRemoteManifest reads'''
+		
+		items = {}
+		
+		for thisChecksum, upstreamItem in self.upstreamItems.items():
+			upstreamName = os.path.basename(urllib.unquote(urlparse.urlparse(upstreamItem['url']).path))
+			items[thisChecksum] = {'path':os.path.splitext(upstreamName)[0] + ' ' + thisChecksum + os.path.splitext(upstreamName)[1], 'size':upstreamItem.get('size')}
+		
+		# what is already here is served from here, under its own name
+		cacheFolder = cacheController.getCacheFolder()
+		for thisItem in cacheController.listCacheItems(cacheFolder):
+			if thisItem['checksum'] is None:
+				continue
+			for thisPath in sorted(thisItem['paths']):
+				if os.path.isfile(thisPath) and os.path.dirname(thisPath) == cacheFolder:
+					items[thisItem['checksum']] = {'path':os.path.basename(thisPath), 'size':thisItem['size']}
+					break
+		
+		return {'version':1, 'items':items}
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+import os, json, hashlib, threading, unittest, urllib2
+
+from tempFolderManager		import tempFolderManager
+from testingHelpers			import startTestHTTPServer
+
+from httpClient				import httpClient
+from cacheController		import cacheController
+from cacheServer			import cacheServer
+
+class cacheServerTests(unittest.TestCase):
+	'''Test serving the cache folder over http, pulling items through from an upstream server'''
+	
+	cacheFolderPath			= None
+	upstreamFolderPath		= None
+	upstream				= None
+	server					= None
+	serverURL				= None
+	
+	sampleContents			= None
+	sampleChecksum			= None
+	
+	def setUp(self):
+		self.cacheFolderPath = tempFolderManager.getNewTempFolder()
+		cacheController.setCacheFolder(self.cacheFolderPath)
+		
+		self.upstreamFolderPath = tempFolderManager.getNewTempFolder()
+		self.sampleContents = os.urandom(300 * 1024)
+		self.sampleChecksum = 'sha1-' + hashlib.sha1(self.sampleContents).hexdigest()
+		sampleFile = open(os.path.join(self.upstreamFolderPath, 'sample.dmg'), 'wb')
+		sampleFile.write(self.sampleContents)
+		sampleFile.close()
+		
+		self.upstream = startTestHTTPServer(self.upstreamFolderPath)
+		
+		self.server = cacheServer(('127.0.0.1', 0), {self.sampleChecksum:{'url':self.upstream.baseURL + 'sample.dmg', 'size':len(self.sampleContents)}}, logRequests=False)
+		self.serverURL = 'http://127.0.0.1:%i/' % self.server.server_address[1]
+		
+		serverThread = threading.Thread(target=self.server.serve_forever)
+		serverThread.setDaemon(True)
+		serverThread.start()
+	
+	def tearDown(self):
+		httpClient.closeAll()
+		self.server.shutdown()
+		self.server.server_close()
+		self.upstream.shutdown()
+		self.upstream.server_close()
+		
+		cacheController.verifiedFiles = {}
+		if cacheController.writeableCacheFolder == self.cacheFolderPath:
+			cacheController.removeCacheFolder()
+		tempFolderManager.cleanupForExit()
+	
+	def fetch(self, itemPath, headers=None):
+		'''Return the status code and body for a request to the cache server'''
+		
+		try:
+			readFile = urllib2.urlopen(urllib2.Request(self.serverURL + itemPath, headers=headers or {}))
+		except urllib2.HTTPError, error:
+			return error.code, None
+		try:
+			return readFile.getcode(), readFile.read()
+		finally:
+			readFile.close()
+	
+	def test_pullThrough(self):
+		'''Clients asking for an item at the same time should all get it, from a single upstream download that then stays in the cache folder'''
+		
+		self.upstream.chunkDelay = 0.1 # slow enough that the clients overlap
+		itemPath = 'sample %s.dmg' % self.sampleChecksum
+		
+		results = []
+		def clientWorker():
+			results.append(self.fetch(itemPath.replace(' ', '%20')))
+		
+		clientThreads = [threading.Thread(target=clientWorker) for i in range(3)]
+		for thisThread in clientThreads:
+			thisThread.start()
+		for thisThread in clientThreads:
+			thisThread.join()
+		
+		self.assertEqual(len(results), 3, 'Not every client got an answer')
+		for responseCode, responseBody in results:
+			self.assertEqual(responseCode, 200, 'A client got the wrong status code: %s' % str(responseCode))
+			self.assertTrue(responseBody == self.sampleContents, 'A client got the wrong contents for a pulled through item (%i bytes)' % len(responseBody or ''))
+		
+		upstreamRequests = [thisRequest for thisRequest in self.upstream.requestLog if thisRequest[0] == 'GET']
+		self.assertEqual(len(upstreamRequests), 1, 'The item was requested from upstream more than once: %s' % str(upstreamRequests))
+		self.assertTrue(os.path.isfile(os.path.join(self.cacheFolderPath, itemPath)), 'The pulled through item was not left in the cache folder')
+		
+		# now from the cache folder, by range
+		responseCode, responseBody = self.fetch(itemPath.replace(' ', '%20'), {'Range':'bytes=100-199'})
+		self.assertEqual(responseCode, 206, 'A range request for a cached item did not get a partial response, got: %s' % str(responseCode))
+		self.assertTrue(responseBody == self.sampleContents[100:200], 'A range request for a cached item got the wrong bytes')
+		self.assertEqual(len(self.upstream.requestLog), 1, 'A cached item was requested from upstream again')
+	
+	def test_missingItems(self):
+		'''Items that are not in the cache folder or upstream, or that are outside of the cache folder, should not be found'''
+		
+		self.assertEqual(self.fetch('other%20sha1-0000000000000000000000000000000000000000.dmg')[0], 404, 'An unknown item was found')
+		self.assertEqual(self.fetch('unnamed.dmg')[0], 404, 'An unknown item without a checksum was found')
+		self.assertEqual(self.fetch('../' + os.path.basename(self.upstreamFolderPath) + '/sample.dmg')[0], 404, 'An item outside of the cache folder was served')
+		self.assertEqual(self.fetch('.downloadLocks/')[0], 404, 'A hidden item was served')
+		
+		# an item with the wrong checksum in its name is never served
+		wrongFile = open(os.path.join(self.cacheFolderPath, 'wrong sha1-0000000000000000000000000000000000000000.dmg'), 'wb')
+		wrongFile.write('wrong contents')
+		wrongFile.close()
+		self.assertEqual(self.fetch('wrong%20sha1-0000000000000000000000000000000000000000.dmg')[0], 404, 'An item that did not match the checksum in its name was served')
+	
+	def test_manifest(self):
+		'''The manifest should list both the cached items and the ones that can be pulled through'''
+		
+		cachedContents = 'a' * 400
+		cachedFile = open(os.path.join(self.cacheFolderPath, 'aFile sha1-f475597b627a4d580ec1619a94c7afb9cc75abe4.txt'), 'w')
+		cachedFile.write(cachedContents)
+		cachedFile.close()
+		
+		responseCode, responseBody = self.fetch(cacheController.remoteManifestName)
+		self.assertEqual(responseCode, 200, 'The manifest was not served, got: %s' % str(responseCode))
+		
+		manifest = json.loads(responseBody)
+		self.assertEqual(manifest['items']['sha1-f475597b627a4d580ec1619a94c7afb9cc75abe4'], {'path':'aFile sha1-f475597b627a4d580ec1619a94c7afb9cc75abe4.txt', 'size':400}, 'The manifest entry for a cached item was wrong: %s' % str(manifest['items'].get('sha1-f475597b627a4d580ec1619a94c7afb9cc75abe4')))
+		self.assertEqual(manifest['items'][self.sampleChecksum], {'path':'sample %s.dmg' % self.sampleChecksum, 'size':len(self.sampleContents)}, 'The manifest entry for an upstream item was wrong: %s' % str(manifest['items'].get(self.sampleChecksum)))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+import os, json
+
+from checksumIndex import checksumIndex
+
+class catalogLock:
+	'''Where the items in a catalog were found on the last successful run, with a stat fingerprint (size, mtime, inode) of each, so unchanged items do not have to be looked for again'''
+	
+	#---------------------Class Variables-----------------------------
+	
+	lockFileSuffix			= '.lock'	# added to the catalog file's path
+	lockFileVersion			= 1
+	
+	#--------------------Instance Variables---------------------------
+	
+	lockFilePath			= None
+	lockedItems				= None		# {'checksumType-checksumValue':{'source':catalog location, 'path':found at, 'fingerprint':[size, mtime, inode]}}
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, catalogFilePath, readExisting=True):
+		
+		if not hasattr(catalogFilePath, 'capitalize'):
+			raise ValueError('%s requires the path to a catalog file, got: %s' % (self.__class__.__name__, str(catalogFilePath)))
+		
+		self.lockFilePath = catalogFilePath + self.lockFileSuffix
+		self.lockedItems = {}
+		
+		if readExisting is True and os.path.isfile(self.lockFilePath):
+			lockFile = open(self.lockFilePath)
+			try:
+				try:
+					lockData = json.load(lockFile)
+				except ValueError:
+					lockData = None # a damaged lock file is treated as missing, and re-written at the end of the run
+			finally:
+				lockFile.close()
+			
+			if isinstance(lockData, dict) and lockData.get('version') == self.lockFileVersion and isinstance(lockData.get('items'), dict):
+				self.lockedItems = lockData['items']
+	
+	def lookupItem(self, checksumType, checksumValue):
+		'''Return the recorded path for this checksum if the item there is unchanged, otherwise None'''
+		
+		# "full" verification means never trusting a fingerprint
+		if checksumIndex.verifyMode == 'full':
+			return None
+		
+		lockedItem = self.lockedItems.get('%s-%s' % (checksumType, checksumValue))
+		if not isinstance(lockedItem, dict) or not hasattr(lockedItem.get('path'), 'capitalize'):
+			return None
+		
+		itemPath = lockedItem['path']
+		if isinstance(itemPath, unicode):
+			itemPath = itemPath.encode('utf-8') # json hands back unicode, but paths are byte strings
+		
+		try:
+			if list(checksumIndex.getFingerprint(itemPath)) != lockedItem.get('fingerprint'):
+				return None
+		except OSError:
+			return None # the item is gone
+		
+		return itemPath
+	
+	def recordItem(self, checksumType, checksumValue, source, itemPath, fingerprint=None):
+		'''Record where an item was found, along with its current fingerprint'''
+		
+		if fingerprint is None:
+			fingerprint = checksumIndex.getFingerprint(itemPath)
+		
+		self.lockedItems['%s-%s' % (checksumType, checksumValue)] = {'source':source, 'path':itemPath, 'fingerprint':list(fingerprint)}
+	
+	def save(self):
+		'''Write out the lock file, replacing the old one only once the new one is complete'''
+		
+		temporaryPath = self.lockFilePath + '.tmp'
+		lockFile = open(temporaryPath, 'w')
+		try:
+			json.dump({'version':self.lockFileVersion, 'items':self.lockedItems}, lockFile, indent=1, sort_keys=True)
+		finally:
+			lockFile.close()
+		os.rename(temporaryPath, self.lockFilePath)
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+
+import os, unittest
+
+from tempFolderManager import tempFolderManager
+
+from checksumIndex import checksumIndex
+from catalogLock import catalogLock
+
+class catalogLockTests(unittest.TestCase):
+	'''Test that catalog lock files trust unchanged items and forget changed ones'''
+	
+	testFolder			= None
+	catalogFilePath		= None
+	sampleFilePath		= None
+	
+	def setUp(self):
+		self.testFolder = tempFolderManager.getNewTempFolder()
+		
+		self.catalogFilePath = os.path.join(self.testFolder, 'test.catalog')
+		open(self.catalogFilePath, 'w').close()
+		
+		# sample file consisting of the letter 'a' four hundred times
+		self.sampleFilePath = os.path.join(self.testFolder, 'aFile')
+		myFile = open(self.sampleFilePath, 'w')
+		myFile.write("a" * 400) # sha1 checksum: f475597b627a4d580ec1619a94c7afb9cc75abe4
+		myFile.close()
+	
+	def tearDown(self):
+		checksumIndex.setVerifyMode('stat')
+		tempFolderManager.cleanupForExit()
+	
+	def savedLock(self):
+		newLock = catalogLock(self.catalogFilePath, readExisting=False)
+		newLock.recordItem('sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4', 'aFile', self.sampleFilePath)
+		newLock.save()
+		
+		return catalogLock(self.catalogFilePath)
+	
+	def test_recordAndLookup(self):
+		'''An item recorded in a saved lock file should be found when it has not changed'''
+		
+		self.assertEqual(catalogLock(self.catalogFilePath).lookupItem('sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4'), None, 'A missing lock file returned an item')
+		
+		savedLock = self.savedLock()
+		self.assertEqual(savedLock.lockFilePath, self.catalogFilePath + catalogLock.lockFileSuffix, 'The lock file was not next to the catalog file: ' + savedLock.lockFilePath)
+		self.assertEqual(savedLock.lookupItem('sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4'), self.sampleFilePath, 'An unchanged item was not found in the lock file')
+		self.assertEqual(savedLock.lookupItem('md5', 'f475597b627a4d580ec1619a94c7afb9cc75abe4'), None, 'An item recorded with sha1 was found with md5')
+	
+	def test_changedItem(self):
+		'''Changed, missing, or "full" verify mode items should not be trusted'''
+		
+		savedLock = self.savedLock()
+		
+		checksumIndex.setVerifyMode('full')
+		self.assertEqual(savedLock.lookupItem('sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4'), None, 'The lock file was trusted in "full" verify mode')
+		checksumIndex.setVerifyMode('stat')
+		
+		myFile = open(self.sampleFilePath, 'a')
+		myFile.write("a")
+		myFile.close()
+		self.assertEqual(savedLock.lookupItem('sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4'), None, 'A changed item was found in the lock file')
+		
+		os.unlink(self.sampleFilePath)
+		self.assertEqual(savedLock.lookupItem('sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4'), None, 'A missing item was found in the lock file')
+	
+	def test_damagedLockFile(self):
+		'''A lock file that can not be read should be treated as empty'''
+		
+		lockFile = open(self.catalogFilePath + catalogLock.lockFileSuffix, 'w')
+		lockFile.write('{"version": 1, "items": ')
+		lockFile.close()
+		
+		self.assertEqual(catalogLock(self.catalogFilePath).lockedItems, {}, 'A damaged lock file did not come back empty')
+
+if __name__ == "__main__":
+	unittest.main()
@@ -1,12 +1,190 @@
 #!/usr/bin/env python
 
-import os, time, hashlib, urllib, urllib2, urlparse, stat, tempfile, shutil
+import os, time, hashlib, urllib, urllib2, urlparse, stat, tempfile, shutil, threading, Queue, multiprocessing, mmap
 
 import pathHelpers
 from displayTools import bytesToRedableSize, secondsToReadableTime, statusHandler
 from tempFolderManager import tempFolderManager
+from checksumIndex import checksumIndex
+from httpClient import httpClient
+from commonExceptions import SizeMismatchException
 
-def checksumFileObject(hashFileObject, targetFileObject, targetFileName, expectedLength, chunkSize=None, copyToPath=None, progressReporter=None):
+treeDigestVersions		= [1, 2]	# 1 is the original serial digest, 2 hashes files in parallel and folds their digests in sorted order
+defaultTreeWorkerCount	= min(multiprocessing.cpu_count(), 8)
+
+pipelineDepth			= 3			# buffers in flight between the reader and the hasher when copying local files
+
+class multiHash(object):
+	'''Feed several hashlib objects from a single pass over the data. Acts like a hashlib object for the first (primary) checksum type.'''
+	
+	checksumTypes		= None
+	hashGenerators		= None
+	
+	def __init__(self, checksumTypes):
+		
+		if hasattr(checksumTypes, 'capitalize'):
+			checksumTypes = [checksumTypes]
+		
+		self.checksumTypes = []
+		self.hashGenerators = {}
+		
+		for thisChecksumType in checksumTypes:
+			if thisChecksumType in self.checksumTypes:
+				continue
+			
+			try:
+				self.hashGenerators[thisChecksumType] = hashlib.new(thisChecksumType)
+			except ValueError:
+				raise Exception("Hash type: %s is not supported by hashlib" % thisChecksumType)
+			
+			self.checksumTypes.append(thisChecksumType)
+		
+		if len(self.checksumTypes) == 0:
+			raise ValueError('multiHash requires at least one checksum type')
+	
+	def update(self, data):
+		for thisChecksumType in self.checksumTypes:
+			self.hashGenerators[thisChecksumType].update(data)
+	
+	def hexdigest(self):
+		'''The digest for the primary checksum type'''
+		return self.hashGenerators[self.checksumTypes[0]].hexdigest()
+	
+	def hexdigests(self):
+		'''A dict of all of the digests, keyed by checksum type'''
+		return dict([(thisChecksumType, self.hashGenerators[thisChecksumType].hexdigest()) for thisChecksumType in self.checksumTypes])
+
+
+def newHashGenerator(checksumType, additionalChecksumTypes=None):
+	'''Return a multiHash for checksumType, also computing any additional types and the types the checksum index records'''
+	
+	checksumTypes = [checksumType]
+	if additionalChecksumTypes is not None:
+		checksumTypes += list(additionalChecksumTypes)
+	if checksumIndex.isEnabled():
+		checksumTypes += checksumIndex.recordedChecksumTypes
+	
+	return multiHash(checksumTypes)
+
+
+def isLocalFileObject(targetFileObject):
+	'''Return True if this file object is backed by a regular local file, and so can use the fast paths'''
+	
+	if hasattr(targetFileObject, "geturl") or not hasattr(targetFileObject, "fileno"):
+		return False
+	
+	try:
+		return stat.S_ISREG(os.fstat(targetFileObject.fileno()).st_mode)
+	except (AttributeError, EnvironmentError, ValueError):
+		return False
+
+
+def hashLocalFile(hashFileObject, targetFileObject, chunkSize, progressReporter=None):
+	'''Hash the remainder of a local file from a memory map, falling back to a reused readinto buffer if the file can not be mapped'''
+	
+	fileDescriptor = targetFileObject.fileno()
+	startOffset = targetFileObject.tell()
+	fileLength = os.fstat(fileDescriptor).st_size
+	
+	if fileLength <= startOffset:
+		return 0
+	
+	try:
+		mappedFile = mmap.mmap(fileDescriptor, 0, access=mmap.ACCESS_READ)
+	except (EnvironmentError, ValueError, OverflowError):
+		mappedFile = None
+	
+	processedLength = 0
+	if mappedFile is not None:
+		try:
+			offset = startOffset
+			while offset < fileLength:
+				thisChunkSize = min(chunkSize, fileLength - offset)
+				hashFileObject.update(buffer(mappedFile, offset, thisChunkSize))
+				
+				offset += thisChunkSize
+				processedLength += thisChunkSize
+				
+				if progressReporter is not None:
+					progressReporter.update(value=processedLength)
+		finally:
+			mappedFile.close()
+		
+		# leave the file object where a read() loop would have
+		targetFileObject.seek(fileLength)
+	
+	else:
+		chunkBuffer = bytearray(chunkSize)
+		while True:
+			thisChunkSize = targetFileObject.readinto(chunkBuffer)
+			if not thisChunkSize:
+				break
+			
+			hashFileObject.update(buffer(chunkBuffer, 0, thisChunkSize))
+			processedLength += thisChunkSize
+			
+			if progressReporter is not None:
+				progressReporter.update(value=processedLength)
+	
+	return processedLength
+
+
+def hashAndCopyLocalFile(hashFileObject, targetFileObject, writeFileObject, chunkSize, progressReporter=None):
+	'''Hash the remainder of a local file while copying it into writeFileObject, with the reading and the hashing/copying overlapping'''
+	
+	# a reader thread fills a small set of reused buffers while this thread hashes and writes them
+	freeBuffers = Queue.Queue()
+	for i in range(pipelineDepth):
+		freeBuffers.put(bytearray(chunkSize))
+	filledBuffers = Queue.Queue()
+	readerErrors = []
+	
+	def readWorker():
+		try:
+			while True:
+				thisBuffer = freeBuffers.get()
+				if thisBuffer is None:
+					return # told to stop
+				
+				thisChunkSize = targetFileObject.readinto(thisBuffer)
+				filledBuffers.put((thisBuffer, thisChunkSize or 0))
+				if not thisChunkSize:
+					return
+		except Exception, error:
+			readerErrors.append(error)
+			filledBuffers.put((None, 0))
+	
+	readerThread = threading.Thread(target=readWorker)
+	readerThread.setDaemon(True)
+	readerThread.start()
+	
+	processedLength = 0
+	try:
+		while True:
+			thisBuffer, thisChunkSize = filledBuffers.get()
+			if thisBuffer is None:
+				raise Exception('Unable to read from %s: %s' % (getattr(targetFileObject, 'name', 'the file'), str(readerErrors[0])))
+			if thisChunkSize == 0:
+				break
+			
+			thisChunk = buffer(thisBuffer, 0, thisChunkSize)
+			hashFileObject.update(thisChunk)
+			writeFileObject.write(thisChunk)
+			
+			processedLength += thisChunkSize
+			freeBuffers.put(thisBuffer)
+			
+			if progressReporter is not None:
+				progressReporter.update(value=processedLength)
+	finally:
+		freeBuffers.put(None)
+		readerThread.join()
+	
+	return processedLength
+
+
+def checksumFileObject(hashFileObject, targetFileObject, targetFileName, expectedLength, chunkSize=None, copyToPath=None, progressReporter=None, useFastPath=True, appendToCopy=False, maxLength=None, preallocateLength=None):
+	'''Feed the contents of targetFileObject into hashFileObject, optionally copying it to copyToPath (added to the end of it if appendToCopy is True). Local files use a memory map or reused buffers unless useFastPath is False. Streams raise a SizeMismatchException as soon as they pass maxLength bytes, and a new copy is given preallocateLength bytes up front, then trimmed to what was written.'''
 	
 	# todo: sanity check the input
 	assert hasattr(targetFileObject, "read"), "The target file object does not look useable"
@@ -18,7 +196,13 @@ def checksumFileObject(hashFileObject, targetFileObject, targetFileName, expecte
 		
 	writeFileObject = None
 	if copyToPath != None:
-		writeFileObject = open(copyToPath, 'wb')
+		if appendToCopy is True:
+			writeFileObject = open(copyToPath, 'ab')
+		else:
+			writeFileObject = open(copyToPath, 'wb')
+			if preallocateLength is not None:
+				# claim the space in one go, rather than growing the file a chunk at a time
+				writeFileObject.truncate(preallocateLength)
 		if writeFileObject == None:
 			raise Exception("Unable to open file for writing: %s" % writeTarget)
 	
@@ -41,27 +225,173 @@ def checksumFileObject(hashFileObject, targetFileObject, targetFileName, expecte
 		else:
 			progressReporter.update(progressTemplate='%(progressPercentage)i%% (%(recentRateInBytes)s)', expectedLength=expectedLength, value=0)
 	
-	while thisChunkSize > 0:
-		thisChunk = targetFileObject.read(chunkSize)
-		thisChunkSize = len(thisChunk)
-		hashFileObject.update(thisChunk)
+	if useFastPath is True and isLocalFileObject(targetFileObject):
+		try:
+			if writeFileObject is None:
+				processedLength = hashLocalFile(hashFileObject, targetFileObject, chunkSize, progressReporter=progressReporter)
+			else:
+				processedLength = hashAndCopyLocalFile(hashFileObject, targetFileObject, writeFileObject, chunkSize, progressReporter=progressReporter)
+		finally:
+			if writeFileObject != None:
+				if preallocateLength is not None and appendToCopy is False:
+					writeFileObject.truncate(processedLength)
+				writeFileObject.close()
+		
+		return (processedLength, time.time() - startReportTime)
+	
+	try:
+		while thisChunkSize > 0:
+			readLength = chunkSize
+			if maxLength is not None:
+				readLength = min(chunkSize, maxLength - processedLength + 1) # one byte more is enough to tell
+			
+			thisChunk = targetFileObject.read(readLength)
+			thisChunkSize = len(thisChunk)
+			
+			if maxLength is not None and processedLength + thisChunkSize > maxLength:
+				raise SizeMismatchException('%s is larger than the %i bytes expected' % (targetFileName, maxLength))
+			
+			hashFileObject.update(thisChunk)
+			
+			processedLength += thisChunkSize
+			
+			if progressReporter is not None:
+				progressReporter.update(value=processedLength)
+			
+			if writeFileObject != None:
+				writeFileObject.write(thisChunk)
+	
+	finally:
+		if writeFileObject != None:
+			if preallocateLength is not None and appendToCopy is False:
+				# only what actually arrived, so a resumed download picks up in the right place
+				writeFileObject.truncate(processedLength)
+			writeFileObject.close()
+	
+	return (processedLength, time.time() - startReportTime)
+
+
+def treeIndexChecksumType(checksumType, treeDigestVersion):
+	'''The checksum type a folder's digest is recorded under in the checksum index, so v1 and v2 tree digests never get mixed up'''
+	
+	if treeDigestVersion == 1:
+		return checksumType
+	return '%s-tree%i' % (checksumType, treeDigestVersion)
+
+
+def listTreeItems(location, treeDigestVersion=1, progressReporter=None):
+	'''Walk a folder once, returning a list of (itemType, itemPath, relativeItemPath) tuples in the order they are folded into the tree digest. itemType is one of 'file', 'softlink', or 'folder'.'''
+	
+	treeItems = []
+	for thisFolder, subFolders, subFiles in os.walk(location):
 		
-		processedLength += thisChunkSize
+		if treeDigestVersion != 1:
+			# v2 digests sort explicitly so they do not depend on the order the filesystem returns things in
+			subFolders.sort()
+			subFiles.sort()
 		
-		if progressReporter is not None:
-			progressReporter.update(value=processedLength)
+		relativeFolderPath = thisFolder.replace(location, '', 1)
+		if os.path.isabs(relativeFolderPath):
+			relativeFolderPath = relativeFolderPath[1:]
 		
-		if writeFileObject != None:
-			writeFileObject.write(thisChunk)
+		for thisFile in subFiles:
+			thisFilePath = os.path.join(thisFolder, thisFile)
+			
+			if os.path.islink(thisFilePath):
+				treeItems.append(('softlink', thisFilePath, os.path.join(relativeFolderPath, thisFile)))
+			elif os.path.isfile(thisFilePath):
+				treeItems.append(('file', thisFilePath, os.path.join(relativeFolderPath, thisFile)))
+			# note: we skip anything that is not a link or a file (ie: /dev)
+		
+		for thisSubFolder in subFolders:
+			thisSubFolderPath = os.path.join(thisFolder, thisSubFolder)
+			
+			if os.path.islink(thisSubFolderPath):
+				treeItems.append(('softlink', thisSubFolderPath, os.path.join(relativeFolderPath, thisSubFolder)))
+			else:
+				treeItems.append(('folder', thisSubFolderPath, os.path.join(relativeFolderPath, thisSubFolder)))
+		
+		if progressReporter is not None:
+			progressReporter.update(value=len(treeItems))
 	
-	if writeFileObject != None:
-		writeFileObject.close()
+	return treeItems
+
+
+def checksumTreeFiles(fileItems, checksumTypes, chunkSize=None, workerCount=None, localCopyPath=None, progressReporter=None, startingCount=0):
+	'''Checksum a list of (filePath, relativeFilePath) items on a pool of threads, returning a dict of hexdigests dicts keyed by relativeFilePath'''
 	
-	return (processedLength, time.time() - startReportTime)
+	if len(fileItems) == 0:
+		return {}
+	
+	if workerCount is None:
+		workerCount = defaultTreeWorkerCount
+	workerCount = max(1, min(int(workerCount), len(fileItems)))
+	
+	workQueue = Queue.Queue()
+	for thisItem in fileItems:
+		workQueue.put(thisItem)
+	resultsQueue = Queue.Queue()
+	stopEvent = threading.Event()
+	
+	def checksumWorker():
+		# hashlib releases the GIL while hashing large buffers, so threads are enough to keep several cores busy
+		while not stopEvent.isSet():
+			try:
+				thisFilePath, relativeFilePath = workQueue.get_nowait()
+			except Queue.Empty:
+				return
+			
+			try:
+				writeTarget = None
+				if localCopyPath is not None:
+					writeTarget = os.path.join(localCopyPath, relativeFilePath)
+				
+				fileHashGenerator = multiHash(checksumTypes)
+				readFile = open(thisFilePath, 'rb')
+				try:
+					checksumFileObject(fileHashGenerator, readFile, os.path.basename(thisFilePath), os.stat(thisFilePath)[stat.ST_SIZE], chunkSize, copyToPath=writeTarget)
+				finally:
+					readFile.close()
+				
+				resultsQueue.put((relativeFilePath, fileHashGenerator.hexdigests(), None))
+			
+			except Exception, error:
+				stopEvent.set()
+				resultsQueue.put((relativeFilePath, None, error))
+				return
+	
+	workers = []
+	for i in range(workerCount):
+		thisWorker = threading.Thread(target=checksumWorker)
+		thisWorker.setDaemon(True)
+		thisWorker.start()
+		workers.append(thisWorker)
+	
+	results = {}
+	try:
+		while len(results) < len(fileItems):
+			try:
+				# a timeout keeps the wait interruptible
+				relativeFilePath, fileChecksums, error = resultsQueue.get(True, 0.5)
+			except Queue.Empty:
+				continue
+			
+			if error is not None:
+				raise Exception('Unable to checksum the file %s: %s' % (relativeFilePath, str(error)))
+			
+			results[relativeFilePath] = fileChecksums
+			if progressReporter is not None:
+				progressReporter.update(value=startingCount + len(results))
+	finally:
+		stopEvent.set()
+		for thisWorker in workers:
+			thisWorker.join()
+	
+	return results
 
 
-def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", displayName=None, outputFolder=None, checksumInFileName=True, chunkSize=None, progressReporter=True):
-	'''Return the checksum of a given file or folder'''
+def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", displayName=None, outputFolder=None, checksumInFileName=True, chunkSize=None, progressReporter=True, additionalChecksumTypes=None, treeDigestVersion=1, treeWorkerCount=None):
+	'''Return the checksum of a given file or folder, additionalChecksumTypes are computed in the same pass and returned in 'checksums'. Folders use treeDigestVersion to pick the digest format.'''
 	
 	startReportTime = time.time()
 	
@@ -72,6 +402,8 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 		raise Exception('Checksum called with a empty checksum type')
 	if outputFolder is not None and not os.path.isdir(outputFolder):
 		raise Exception('The output folder given does not exist, or is not a folder: ' + outputFolder)
+	if treeDigestVersion not in treeDigestVersions:
+		raise ValueError('The treeDigestVersion must be one of %s, got: %s' % (', '.join([str(x) for x in treeDigestVersions]), str(treeDigestVersion)))
 	
 	# make sure that the location is a string
 	location = str(location)
@@ -85,12 +417,19 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 	# if a local copy is made, this will house the location
 	localCopyPath = None
 	
+	# the size of files, folders do not get one
+	itemSize = None
+	
 	if outputFolder is not None:
 		# make sure we have an absolute path to it
 		outputFolder = pathHelpers.normalizePath(outputFolder, followSymlink=True)
 	
 	# warm up the checksummer
-	hashGenerator = hashlib.new(checksumType)
+	hashGenerator = newHashGenerator(checksumType, additionalChecksumTypes)
+	
+	requestedChecksumTypes = [checksumType]
+	if additionalChecksumTypes is not None:
+		requestedChecksumTypes += [thisChecksumType for thisChecksumType in additionalChecksumTypes if thisChecksumType != checksumType]
 	
 	# get rid of file:// urls
 	if location.startswith('file://'):
@@ -129,7 +468,28 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 		if not os.path.exists(location):
 			raise Exception('Checksum called with a file location that does not exist: %s' % location)
 		
-		elif os.path.isdir(location):
+		# files only have one digest format, folders are recorded seperately for each tree digest version
+		indexDigestVersion = 1
+		if os.path.isdir(location):
+			indexDigestVersion = treeDigestVersion
+		
+		# if the item has not changed since it was last hashed, trust the recorded value
+		indexFingerprint = None
+		if checksumIndex.isEnabled():
+			indexFingerprint = checksumIndex.getFingerprint(location)
+			
+			if outputFolder is None:
+				indexedChecksums = checksumIndex.lookupChecksums(location, [treeIndexChecksumType(thisChecksumType, indexDigestVersion) for thisChecksumType in requestedChecksumTypes], fingerprint=indexFingerprint)
+				if len(indexedChecksums) == len(requestedChecksumTypes):
+					if progressReporter is not None:
+						progressReporter.update(statusMessage=' checksum taken from the index')
+					indexedChecksums = dict([(thisChecksumType, indexedChecksums[treeIndexChecksumType(thisChecksumType, indexDigestVersion)]) for thisChecksumType in requestedChecksumTypes])
+					itemSize = None
+					if os.path.isfile(location):
+						itemSize = indexFingerprint[0]
+					return {'name':fileName, 'checksum':indexedChecksums[checksumType], 'checksumType':checksumType, 'checksums':indexedChecksums, 'size':itemSize}
+		
+		if os.path.isdir(location):
 			
 			if outputFolder is not None:
 				# validate outputFolder if there is one
@@ -148,21 +508,9 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 			if progressReporter is not None:
 				progressReporter.update(statusMessage="building file list ", progressTemplate="%(value)i items", value=0)
 			
-			# get a quick count
-			itemCount = 0
-			for thisFolder, subFolders, subFiles in os.walk(location):
-				
-				for thisFile in subFiles:
-					thisFilePath = os.path.join(thisFolder, thisFile)
-					# note: we skip anything that is not a link or a file (ie: /dev)
-					if os.path.islink(thisFilePath) or os.path.isfile(thisFilePath):
-						itemCount += 1
-				
-				for thisFolder in subFolders:
-					itemCount += 1
-				
-				if progressReporter is not None:
-					progressReporter.update(value=itemCount)
+			# build the list of items in a single walk, in the order they are folded into the checksum
+			treeItems = listTreeItems(location, treeDigestVersion=treeDigestVersion, progressReporter=progressReporter)
+			itemCount = len(treeItems)
 			
 			# change the status message
 			if progressReporter is not None:
@@ -170,67 +518,76 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 			
 			# process the items
 			processedCount = 0
-			for processFolder, subFolders, subFiles in os.walk(location):
-				
-				for thisFile in subFiles:
-					thisFilePath = os.path.join(processFolder, thisFile)
-					relativeFilePath = os.path.join(processFolder.replace(location, '', 1), thisFile)
-					if os.path.isabs(relativeFilePath):
-						relativeFilePath = relativeFilePath[1:]
+			if treeDigestVersion == 1:
+				for itemType, thisItemPath, relativeItemPath in treeItems:
 					
-					if os.path.islink(thisFilePath):
+					if itemType == 'softlink':
 						if localCopyPath is not None:
-							os.symlink(os.readlink(thisFilePath), os.path.join(localCopyPath, relativeFilePath))
-						
-						hashGenerator.update("softlink %s to %s" % (os.readlink(thisFilePath), relativeFilePath))
+							os.symlink(os.readlink(thisItemPath), os.path.join(localCopyPath, relativeItemPath))
 						
-					elif os.path.isfile(thisFilePath):
+						hashGenerator.update("softlink %s to %s" % (os.readlink(thisItemPath), relativeItemPath))
+					
+					elif itemType == 'file':
 						
-						readFile = open(thisFilePath)
+						readFile = open(thisItemPath)
 						if readFile == None:
-							raise Exception("Unable to open file for checksumming: " + thisFilePath)
+							raise Exception("Unable to open file for checksumming: " + thisItemPath)
 						
-						targetLength = os.stat(thisFilePath)[stat.ST_SIZE]
+						targetLength = os.stat(thisItemPath)[stat.ST_SIZE]
 						writeTarget = None
 						if localCopyPath is not None:
-							writeTarget = os.path.join(localCopyPath, relativeFilePath)
+							writeTarget = os.path.join(localCopyPath, relativeItemPath)
 						
 						# add the path to the checksum
-						hashGenerator.update("file " + relativeFilePath)
+						hashGenerator.update("file " + relativeItemPath)
 						
-						checksumFileObject(hashGenerator, readFile, thisFile, targetLength, chunkSize, copyToPath=writeTarget)
+						checksumFileObject(hashGenerator, readFile, os.path.basename(thisItemPath), targetLength, chunkSize, copyToPath=writeTarget)
 						readFile.close()
-												
-					else:
-						continue # skip anything that is not a link or a file (ie: /dev)
-					
-					processedCount += 1
-					if progressReporter is not None:
-						progressReporter.update(value=processedCount)
-				
-				for thisFolder in subFolders:
-					thisFolderPath = os.path.join(processFolder, thisFolder)
-					relativeFolderPath = os.path.join(processFolder.replace(location, '', 1), thisFolder)
-					if os.path.isabs(relativeFolderPath):
-						relativeFolderPath = relativeFolderPath[1:]
-					
-					if os.path.islink(thisFolderPath):
-						if localCopyPath is not None:
-							os.symlink(os.readlink(thisFolderPath), os.path.join(localCopyPath, relativeFolderPath))
-						
-						hashGenerator.update("softlink %s to %s" % (os.readlink(thisFolderPath), relativeFolderPath))
 					
 					else:
 						if localCopyPath != None:
-							os.mkdir( os.path.join(localCopyPath, relativeFolderPath) )
+							os.mkdir( os.path.join(localCopyPath, relativeItemPath) )
 						
 						# add this to the hash
-						hashGenerator.update("folder %s" % relativeFolderPath)
+						hashGenerator.update("folder %s" % relativeItemPath)
 					
 					processedCount += 1
 					if progressReporter is not None:
 						progressReporter.update(value=processedCount)
 			
+			else:
+				# the folders and softlinks have to be in place before the workers start copying files into them
+				fileItems = []
+				for itemType, thisItemPath, relativeItemPath in treeItems:
+					if itemType == 'file':
+						fileItems.append((thisItemPath, relativeItemPath))
+						continue
+					
+					if localCopyPath is not None:
+						if itemType == 'softlink':
+							os.symlink(os.readlink(thisItemPath), os.path.join(localCopyPath, relativeItemPath))
+						else:
+							os.mkdir(os.path.join(localCopyPath, relativeItemPath))
+					
+					processedCount += 1
+				
+				if progressReporter is not None:
+					progressReporter.update(value=processedCount)
+				
+				fileChecksums = checksumTreeFiles(fileItems, hashGenerator.checksumTypes, chunkSize=chunkSize, workerCount=treeWorkerCount, localCopyPath=localCopyPath, progressReporter=progressReporter, startingCount=processedCount)
+				processedCount += len(fileItems)
+				
+				# fold everything into the tree digest in the same order as the list, so the result does not depend on which worker finished first
+				hashGenerator.update("tree digest v2\n")
+				for itemType, thisItemPath, relativeItemPath in treeItems:
+					if itemType == 'softlink':
+						hashGenerator.update("softlink %s to %s\n" % (os.readlink(thisItemPath), relativeItemPath))
+					elif itemType == 'file':
+						for thisChecksumType in hashGenerator.checksumTypes:
+							hashGenerator.hashGenerators[thisChecksumType].update("file %s %s\n" % (relativeItemPath, fileChecksums[relativeItemPath][thisChecksumType]))
+					else:
+						hashGenerator.update("folder %s\n" % relativeItemPath)
+			
 			if progressReporter is not None:
 				progressReporter.update(statusMessage='checksummed %i items in %s' % (processedCount, secondsToReadableTime(time.time() - startReportTime)))
 			
@@ -249,6 +606,8 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 				# unregister it from tempFolderManager
 				tempFolderManager.removeManagedItem(localCopyPath)
 				
+				checksumIndex.recordChecksums(targetOutputPath, dict([(treeIndexChecksumType(thisChecksumType, treeDigestVersion), thisChecksum) for thisChecksumType, thisChecksum in hashGenerator.hexdigests().items()]))
+				
 				# change the localCopyPath to reflect the new location
 				localCopyPath = os.path.basename(targetOutputPath)
 			
@@ -272,6 +631,7 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 				progressReporter.update(statusMessage=" checksumming: ", progressTemplate='%(progressPercentage)i%% (%(recentRateInBytes)s)', expectedLength=targetLength, value=0)
 			
 			processedBytes, processSeconds = checksumFileObject(hashGenerator, readFile, os.path.basename(location), targetLength, chunkSize=chunkSize, copyToPath=localCopyPath, progressReporter=progressReporter)
+			itemSize = processedBytes
 			
 			if progressReporter is not None:
 				progressReporter.update(statusMessage=' checksummed (%s) in %s (%s/sec)' % (bytesToRedableSize(processedBytes), secondsToReadableTime(processSeconds), bytesToRedableSize(processedBytes/processSeconds)))
@@ -293,11 +653,17 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 				# unregister it from tempFolderManager
 				tempFolderManager.removeManagedItem(localCopyPath)
 				
+				checksumIndex.recordChecksums(realFilePath, hashGenerator.hexdigests())
+				
 				# change the localCopyPath to reflect the new location, and that it will now be pulled from the cache
 				localCopyPath = os.path.basename(realFilePath)
 			
 		else:
 			raise Exception('Checksum called on a location that is neither a file or folder: %s' % location)
+		
+		# record the result, unless the item changed while we were reading it
+		if indexFingerprint is not None and checksumIndex.getFingerprint(location) == indexFingerprint:
+			checksumIndex.recordChecksums(location, dict([(treeIndexChecksumType(thisChecksumType, indexDigestVersion), thisChecksum) for thisChecksumType, thisChecksum in hashGenerator.hexdigests().items()]), fingerprint=indexFingerprint)
 	
 	elif locationURL.scheme in ['http', 'https']:
 		
@@ -305,7 +671,7 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 			chunkSize = 1024*100 # 100KiB for urls
 		
 		try:
-			readFile = urllib2.urlopen(location)
+			readFile = httpClient.urlopen(location)
 		except IOError, error:
 			if hasattr(error, 'reason'):
 				raise Exception('Unable to connect to remote url: %s got error: %s' % (location, error.reason))
@@ -347,6 +713,7 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 				progressReporter.update(statusMessage="downloading: ", progressTemplate='%(valueInBytes)s (%(recentRateInBytes)s)', value=0)
 		
 		processedBytes, processSeconds = checksumFileObject(hashGenerator, readFile, fileName, targetLength, copyToPath=localCopyPath, chunkSize=chunkSize, progressReporter=progressReporter)
+		itemSize = processedBytes
 		
 		if progressReporter is not None:
 			progressReporter.update(statusMessage=" downloaded %s (%s) in %s (%s/sec)" % (fileName, bytesToRedableSize(processedBytes), secondsToReadableTime(processSeconds), bytesToRedableSize(processedBytes/processSeconds)))
@@ -365,6 +732,8 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 			# unregister it from tempFolderManager
 			tempFolderManager.removeManagedItem(localCopyPath)
 			
+			checksumIndex.recordChecksums(realFilePath, hashGenerator.hexdigests())
+			
 			# change the localCopyPath to reflect the new location
 			localCopyPath = realFilePath
 		
@@ -373,7 +742,8 @@ def checksum(location, tempFolderPrefix="InstaDMGtemp", checksumType="sha1", dis
 	else:
 		raise Exception('Checksum called with a location that does not support: %s' % location)
 	
-	returnValues = {'name':fileName, 'checksum':hashGenerator.hexdigest(), 'checksumType':checksumType}
+	allChecksums = hashGenerator.hexdigests()
+	returnValues = {'name':fileName, 'checksum':hashGenerator.hexdigest(), 'checksumType':checksumType, 'checksums':dict([(thisChecksumType, allChecksums[thisChecksumType]) for thisChecksumType in requestedChecksumTypes]), 'size':itemSize}
 	
 	# Return the location of the local copy if we were asked to
 	if outputFolder is not None:
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+import os, stat, sqlite3, threading
+
+import pathHelpers
+
+class checksumIndex:
+	'''A persistent record of checksums, keyed by path and a stat fingerprint (size, mtime, inode), so unchanged items do not have to be re-read'''
+	
+	# ------ class variables
+	
+	indexFileName			= '.checksumIndex.sqlite'
+	indexFilePath			= None		# the database in use, normally inside the writeable cache folder
+	
+	verifyModes				= ['stat', 'full']
+	verifyMode				= 'stat'	# 'stat' trusts a matching fingerprint, 'full' always re-hashes
+	
+	recordedChecksumTypes	= ['sha1', 'sha256', 'md5']	# computed alongside whatever was asked for, so later lookups by any of them need no re-read
+	
+	_connection				= None
+	_lock					= threading.RLock()
+	
+	# ------ class methods
+	
+	# ---- setup methods
+	
+	@classmethod
+	def setIndexFolder(myClass, indexFolder):
+		'''Open (creating if necessary) the index database inside the given folder'''
+		
+		if not hasattr(indexFolder, 'capitalize'):
+			raise ValueError("%s's setIndexFolder requires a path, got: %s" % (myClass.__name__, str(indexFolder)))
+		elif not os.path.isdir(indexFolder):
+			raise ValueError("%s's setIndexFolder given a path that was not a valid directory: %s" % (myClass.__name__, indexFolder))
+		
+		indexFilePath = os.path.join(pathHelpers.normalizePath(indexFolder, followSymlink=True), myClass.indexFileName)
+		
+		myClass._lock.acquire()
+		try:
+			if indexFilePath == myClass.indexFilePath and myClass._connection is not None:
+				return
+			
+			myClass.closeIndex()
+			
+			connection = sqlite3.connect(indexFilePath, timeout=30, check_same_thread=False)
+			connection.text_factory = str # paths are byte strings
+			connection.execute('CREATE TABLE IF NOT EXISTS checksums (path TEXT NOT NULL, checksumType TEXT NOT NULL, checksumValue TEXT NOT NULL, size INTEGER, mtime REAL, inode INTEGER, PRIMARY KEY (path, checksumType))')
+			connection.commit()
+			
+			myClass._connection = connection
+			myClass.indexFilePath = indexFilePath
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def closeIndex(myClass):
+		
+		myClass._lock.acquire()
+		try:
+			if myClass._connection is not None:
+				myClass._connection.close()
+			myClass._connection = None
+			myClass.indexFilePath = None
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def isEnabled(myClass):
+		return myClass._connection is not None
+	
+	@classmethod
+	def setVerifyMode(myClass, verifyMode):
+		if verifyMode not in myClass.verifyModes:
+			raise ValueError('The verifyMode must be one of %s, got: %s' % (', '.join(myClass.verifyModes), str(verifyMode)))
+		myClass.verifyMode = verifyMode
+	
+	# ---- fingerprint methods
+	
+	@classmethod
+	def getFingerprint(myClass, itemPath):
+		'''Return a (size, mtime, inode) tuple for a file, or an aggregate over the whole tree for a folder'''
+		
+		itemStat = os.stat(itemPath)
+		
+		if not stat.S_ISDIR(itemStat.st_mode):
+			return (int(itemStat.st_size), float(itemStat.st_mtime), int(itemStat.st_ino))
+		
+		# for folders add up the sizes and take the newest mtime of everything inside, this is much cheaper than reading the files
+		totalSize = int(itemStat.st_size)
+		newestMtime = float(itemStat.st_mtime)
+		for thisFolder, subFolders, subFiles in os.walk(itemPath):
+			for thisItem in subFolders + subFiles:
+				try:
+					thisStat = os.lstat(os.path.join(thisFolder, thisItem))
+				except OSError:
+					continue
+				totalSize += int(thisStat.st_size)
+				if thisStat.st_mtime > newestMtime:
+					newestMtime = float(thisStat.st_mtime)
+		
+		return (totalSize, newestMtime, int(itemStat.st_ino))
+	
+	# ---- lookup methods
+	
+	@classmethod
+	def lookupChecksum(myClass, itemPath, checksumType, fingerprint=None):
+		'''Return the recorded checksum for this item if its fingerprint is unchanged, otherwise None'''
+		
+		return myClass.lookupChecksums(itemPath, [checksumType], fingerprint=fingerprint).get(checksumType)
+	
+	@classmethod
+	def lookupChecksums(myClass, itemPath, checksumTypes, fingerprint=None):
+		'''Return a dict of the recorded checksums of the given types for this item, leaving out any that are missing or whose fingerprint has changed'''
+		
+		if myClass._connection is None or myClass.verifyMode == 'full':
+			return {}
+		
+		if fingerprint is None:
+			fingerprint = myClass.getFingerprint(itemPath)
+		
+		myClass._lock.acquire()
+		try:
+			rows = myClass._connection.execute('SELECT checksumType, checksumValue, size, mtime, inode FROM checksums WHERE path = ?', (itemPath,)).fetchall()
+		finally:
+			myClass._lock.release()
+		
+		results = {}
+		for checksumType, checksumValue, size, mtime, inode in rows:
+			if checksumType in checksumTypes and (size, mtime, inode) == tuple(fingerprint):
+				results[checksumType] = str(checksumValue)
+		
+		return results
+	
+	@classmethod
+	def recordChecksum(myClass, itemPath, checksumType, checksumValue, fingerprint=None):
+		'''Store the checksum for this item along with the fingerprint it had when it was hashed'''
+		
+		myClass.recordChecksums(itemPath, {checksumType:checksumValue}, fingerprint=fingerprint)
+	
+	@classmethod
+	def recordChecksums(myClass, itemPath, checksums, fingerprint=None):
+		'''Store a dict of checksums (keyed by checksum type) for this item along with the fingerprint it had when it was hashed'''
+		
+		if myClass._connection is None:
+			return
+		
+		if fingerprint is None:
+			fingerprint = myClass.getFingerprint(itemPath)
+		
+		myClass._lock.acquire()
+		try:
+			# entries for other checksum types with a different fingerprint are no longer valid
+			myClass._connection.execute('DELETE FROM checksums WHERE path = ? AND NOT (size = ? AND mtime = ? AND inode = ?)', (itemPath,) + tuple(fingerprint))
+			for checksumType, checksumValue in checksums.items():
+				myClass._connection.execute('INSERT OR REPLACE INTO checksums (path, checksumType, checksumValue, size, mtime, inode) VALUES (?, ?, ?, ?, ?, ?)', (itemPath, checksumType, checksumValue) + tuple(fingerprint))
+			myClass._connection.commit()
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def forgetItem(myClass, itemPath):
+		'''Remove all entries for this path'''
+		
+		if myClass._connection is None:
+			return
+		
+		myClass._lock.acquire()
+		try:
+			myClass._connection.execute('DELETE FROM checksums WHERE path = ?', (itemPath,))
+			myClass._connection.commit()
+		finally:
+			myClass._lock.release()
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+import os, unittest
+
+from tempFolderManager import tempFolderManager
+
+from checksumIndex import checksumIndex
+from checksum import checksum
+
+class checksumIndexTests(unittest.TestCase):
+	'''Test that the checksum index trusts unchanged items and forgets changed ones'''
+	
+	indexFolder			= None
+	sampleFilePath		= None
+	
+	def setUp(self):
+		self.indexFolder = tempFolderManager.getNewTempFolder()
+		checksumIndex.setIndexFolder(self.indexFolder)
+		
+		# sample file consisting of the letter 'a' four hundred times
+		self.sampleFilePath = os.path.join(self.indexFolder, 'aFile')
+		myFile = open(self.sampleFilePath, 'w')
+		myFile.write("a" * 400) # sha1 checksum: f475597b627a4d580ec1619a94c7afb9cc75abe4
+		myFile.close()
+	
+	def tearDown(self):
+		checksumIndex.closeIndex()
+		checksumIndex.setVerifyMode('stat')
+		tempFolderManager.cleanupForExit()
+	
+	def test_recordAndLookup(self):
+		'''Values recorded for an item should come back while the item is unchanged'''
+		
+		self.assertEqual(checksumIndex.lookupChecksum(self.sampleFilePath, 'sha1'), None, 'An item that was never recorded returned a value from the index')
+		
+		checksumIndex.recordChecksum(self.sampleFilePath, 'sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4')
+		self.assertEqual(checksumIndex.lookupChecksum(self.sampleFilePath, 'sha1'), 'f475597b627a4d580ec1619a94c7afb9cc75abe4', 'A recorded item did not return its value from the index')
+		self.assertEqual(checksumIndex.lookupChecksum(self.sampleFilePath, 'md5'), None, 'An item recorded with sha1 returned a value for md5')
+		
+		# the database should survive being re-opened
+		checksumIndex.closeIndex()
+		checksumIndex.setIndexFolder(self.indexFolder)
+		self.assertEqual(checksumIndex.lookupChecksum(self.sampleFilePath, 'sha1'), 'f475597b627a4d580ec1619a94c7afb9cc75abe4', 'A recorded item was not in the index after it was re-opened')
+	
+	def test_changedItem(self):
+		'''Changing the size or mtime of an item should invalidate the recorded value'''
+		
+		checksumIndex.recordChecksum(self.sampleFilePath, 'sha1', 'f475597b627a4d580ec1619a94c7afb9cc75abe4')
+		
+		myFile = open(self.sampleFilePath, 'a')
+		myFile.write("a")
+		myFile.close()
+		
+		self.assertEqual(checksumIndex.lookupChecksum(self.sampleFilePath, 'sha1'), None, 'The index returned a value for an item that had changed')
+	
+	def test_checksumUsesIndex(self):
+		'''checksum should trust the index in "stat" mode, and re-read the item in "full" mode'''
+		
+		result = checksum(self.sampleFilePath, checksumType='sha1', progressReporter=None)
+		self.assertEqual(result['checksum'], 'f475597b627a4d580ec1619a94c7afb9cc75abe4', 'checksum returned the wrong value for the sample file: ' + result['checksum'])
+		self.assertEqual(checksumIndex.lookupChecksum(self.sampleFilePath, 'sha1'), 'f475597b627a4d580ec1619a94c7afb9cc75abe4', 'checksum did not record its result in the index')
+		
+		# plant a different value, it should be trusted since the file has not changed
+		checksumIndex.recordChecksum(self.sampleFilePath, 'sha1', 'planted')
+		self.assertEqual(checksum(self.sampleFilePath, checksumType='sha1', progressReporter=None)['checksum'], 'planted', 'checksum did not use the value from the index for an unchanged file')
+		
+		# in full mode the file should be read again
+		checksumIndex.setVerifyMode('full')
+		self.assertEqual(checksum(self.sampleFilePath, checksumType='sha1', progressReporter=None)['checksum'], 'f475597b627a4d580ec1619a94c7afb9cc75abe4', 'checksum used the index while in "full" verify mode')
+	
+	def test_recordedChecksumTypes(self):
+		'''Hashing for one checksum type should record all of the recordedChecksumTypes'''
+		
+		checksum(self.sampleFilePath, checksumType='sha1', progressReporter=None)
+		
+		indexedChecksums = checksumIndex.lookupChecksums(self.sampleFilePath, checksumIndex.recordedChecksumTypes)
+		self.assertEqual(sorted(indexedChecksums.keys()), sorted(checksumIndex.recordedChecksumTypes), 'Not all of the recordedChecksumTypes were recorded, got: ' + str(indexedChecksums))
+		self.assertEqual(indexedChecksums['md5'], 'f4347bb35af679911623327c74b7d732', 'The md5 recorded along with a sha1 checksum was not correct: ' + indexedChecksums['md5'])
+		
+		result = checksum(self.sampleFilePath, checksumType='md5', additionalChecksumTypes=['sha256'], progressReporter=None)
+		self.assertEqual(result['checksums'], {'md5':indexedChecksums['md5'], 'sha256':indexedChecksums['sha256']}, 'checksum did not return the indexed values for md5 and sha256, got: ' + str(result['checksums']))
+	
+	def test_folderFingerprint(self):
+		'''Changing a file inside a folder should change the fingerprint of the folder'''
+		
+		innerFolder = os.path.join(self.indexFolder, 'innerFolder')
+		os.mkdir(innerFolder)
+		innerFile = os.path.join(innerFolder, 'innerFile')
+		open(innerFile, 'w').close()
+		
+		startingFingerprint = checksumIndex.getFingerprint(innerFolder)
+		
+		myFile = open(innerFile, 'w')
+		myFile.write("b" * 20)
+		myFile.close()
+		
+		self.assertNotEqual(startingFingerprint, checksumIndex.getFingerprint(innerFolder), 'Changing a file inside a folder did not change the fingerprint of the folder')
+	
+	def test_badVerifyMode(self):
+		'''setVerifyMode should reject unknown modes'''
+		
+		self.assertRaises(ValueError, checksumIndex.setVerifyMode, 'sometimes')
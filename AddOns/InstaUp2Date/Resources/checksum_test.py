@@ -1,11 +1,12 @@
 #!/usr/bin/python
 
-import os, unittest, tempfile
+import os, unittest, tempfile, shutil, hashlib, StringIO
 
 from displayTools import statusHandler
 from tempFolderManager import tempFolderManager
+from commonExceptions import SizeMismatchException
 
-from checksum import checksumFileObject, checksum
+from checksum import checksumFileObject, checksum, hashLocalFile, hashAndCopyLocalFile
 
 class checksumTests(unittest.TestCase):
 	'''Test the checksum system to make sure it gives proper results'''
@@ -16,6 +17,7 @@ class checksumTests(unittest.TestCase):
 	def setUp(self):
 		# setup a folder to hold our temporary items
 		self.sampleFolder = tempFolderManager.getNewTempFolder()
+		self.sampleFiles = []
 		
 		# sample file consisting of the letter 'a' four hundred times
 		myFile = open(os.path.join(self.sampleFolder, 'aFile'), 'w')
@@ -81,3 +83,116 @@ class checksumTests(unittest.TestCase):
 				result = checksum(thisFile['filePath'], checksumType=thisChecksumType, progressReporter=None)
 				self.assertTrue(result is not None, 'Checksumming %s with %s returned None' % (thisFile['description'], thisChecksumType))
 				self.assertEqual(result['checksum'], thisFile[thisChecksumType], 'Checksumming %s using %s did not give the expected result (%s) rather: %s' % (thisFile['description'], thisChecksumType, thisFile[thisChecksumType], result['checksum']))
+				
+				expectedSize = None
+				if os.path.isfile(thisFile['filePath']):
+					expectedSize = os.path.getsize(thisFile['filePath'])
+				self.assertEqual(result['size'], expectedSize, 'Checksumming %s gave a size of %s rather than: %s' % (thisFile['description'], result['size'], expectedSize))
+	
+	def test_multipleChecksums(self):
+		'''Checksumming with additionalChecksumTypes should give the same results as individual runs'''
+		
+		for thisFile in self.sampleFiles:
+			result = checksum(thisFile['filePath'], checksumType='sha1', additionalChecksumTypes=['md5'], progressReporter=None)
+			
+			self.assertEqual(result['checksum'], thisFile['sha1'], 'Checksumming %s with an additional md5 changed the sha1 result to: %s' % (thisFile['description'], result['checksum']))
+			self.assertEqual(result['checksums'], {'sha1':thisFile['sha1'], 'md5':thisFile['md5']}, 'Checksumming %s with sha1 and md5 together did not give the expected results, rather: %s' % (thisFile['description'], result['checksums']))
+	
+	def test_treeDigestV2(self):
+		'''Tree digest v2 should not depend on the number of workers, and copies made with it should have the same digest'''
+		
+		for thisFile in self.sampleFiles:
+			if not os.path.isdir(thisFile['filePath']):
+				continue
+			
+			serialResult = checksum(thisFile['filePath'], checksumType='sha1', additionalChecksumTypes=['md5'], progressReporter=None, treeDigestVersion=2, treeWorkerCount=1)
+			parallelResult = checksum(thisFile['filePath'], checksumType='sha1', additionalChecksumTypes=['md5'], progressReporter=None, treeDigestVersion=2, treeWorkerCount=4)
+			
+			self.assertEqual(serialResult['checksums'], parallelResult['checksums'], 'Tree digest v2 of %s changed with the number of workers: %s vs. %s' % (thisFile['description'], serialResult['checksums'], parallelResult['checksums']))
+			self.assertNotEqual(parallelResult['checksum'], thisFile['sha1'], 'Tree digest v2 of %s was the same as the v1 digest' % thisFile['description'])
+			
+			# the output folder can not be a managed temp folder, as the copy is managed on its own while in progress
+			outputFolder = tempfile.mkdtemp(prefix='checksumTest.')
+			try:
+				copyResult = checksum(thisFile['filePath'], checksumType='sha1', outputFolder=outputFolder, progressReporter=None, treeDigestVersion=2)
+				self.assertEqual(copyResult['checksum'], parallelResult['checksum'], 'Copying %s with tree digest v2 gave a different digest: %s' % (thisFile['description'], copyResult['checksum']))
+				
+				copiedPath = os.path.join(outputFolder, copyResult['cacheLocation'])
+				self.assertEqual(checksum(copiedPath, checksumType='sha1', progressReporter=None)['checksum'], thisFile['sha1'], 'The copy of %s made with tree digest v2 did not match the original' % thisFile['description'])
+			finally:
+				shutil.rmtree(outputFolder)
+	
+	def test_badTreeDigestVersion(self):
+		'''checksum should reject unknown tree digest versions'''
+		
+		self.assertRaises(ValueError, checksum, self.sampleFolder, progressReporter=None, treeDigestVersion=3)
+	
+	def test_fastPath(self):
+		'''The local file fast paths should give the same results as plain reads, with and without a copy'''
+		
+		for thisFile in self.sampleFiles:
+			if not os.path.isfile(thisFile['filePath']):
+				continue
+			
+			# a small chunk size so the buffers get reused
+			for useFastPath in [True, False]:
+				hashGenerator = hashlib.new('sha1')
+				readFile = open(thisFile['filePath'], 'rb')
+				copyPath = os.path.join(self.sampleFolder, 'copiedFile')
+				checksumFileObject(hashGenerator, readFile, os.path.basename(thisFile['filePath']), None, chunkSize=64, copyToPath=copyPath, useFastPath=useFastPath)
+				readFile.close()
+				
+				self.assertEqual(hashGenerator.hexdigest(), thisFile['sha1'], 'Checksumming %s with useFastPath=%s gave: %s rather than: %s' % (thisFile['description'], useFastPath, hashGenerator.hexdigest(), thisFile['sha1']))
+				self.assertEqual(open(copyPath, 'rb').read(), open(thisFile['filePath'], 'rb').read(), 'The copy of %s made with useFastPath=%s did not match the original' % (thisFile['description'], useFastPath))
+				os.unlink(copyPath)
+	
+	def test_fastPathStartingOffset(self):
+		'''The fast paths should start from the current position in the file, like read() does'''
+		
+		readFile = open(self.sampleFiles[0]['filePath'], 'rb')
+		readFile.seek(100)
+		hashGenerator = hashlib.new('sha1')
+		self.assertEqual(hashLocalFile(hashGenerator, readFile, 64), 300, 'hashLocalFile did not start at the current position in the file')
+		self.assertEqual(hashGenerator.hexdigest(), hashlib.sha1("a" * 300).hexdigest(), 'hashLocalFile gave the wrong checksum when starting part way through a file')
+		
+		readFile.seek(100)
+		hashGenerator = hashlib.new('sha1')
+		writeFile = open(os.path.join(self.sampleFolder, 'copiedFile'), 'wb')
+		self.assertEqual(hashAndCopyLocalFile(hashGenerator, readFile, writeFile, 64), 300, 'hashAndCopyLocalFile did not start at the current position in the file')
+		writeFile.close()
+		readFile.close()
+		
+		self.assertEqual(hashGenerator.hexdigest(), hashlib.sha1("a" * 300).hexdigest(), 'hashAndCopyLocalFile gave the wrong checksum when starting part way through a file')
+		self.assertEqual(open(os.path.join(self.sampleFolder, 'copiedFile'), 'rb').read(), "a" * 300, 'hashAndCopyLocalFile did not copy the right part of the file')
+	
+	def test_fastPathAppend(self):
+		'''Appending to a copy, as resumed downloads do, should keep what was already in it'''
+		
+		copyPath = os.path.join(self.sampleFolder, 'copiedFile')
+		for useFastPath in [True, False]:
+			copyFile = open(copyPath, 'wb')
+			copyFile.write('b' * 100)
+			copyFile.close()
+			
+			readFile = open(self.sampleFiles[0]['filePath'], 'rb')
+			readFile.seek(100)
+			checksumFileObject(hashlib.new('sha1'), readFile, 'copiedFile', None, chunkSize=64, copyToPath=copyPath, useFastPath=useFastPath, appendToCopy=True)
+			readFile.close()
+			
+			self.assertEqual(open(copyPath, 'rb').read(), 'b' * 100 + 'a' * 300, 'Appending to a copy with useFastPath=%s did not keep what was already in it' % useFastPath)
+			os.unlink(copyPath)
+	
+	def test_sizeLimits(self):
+		'''Streams should be given up as soon as they pass maxLength, and preallocated copies trimmed to what was written'''
+		
+		copyPath = os.path.join(self.sampleFolder, 'copiedFile')
+		
+		hashGenerator = hashlib.new('sha1')
+		self.assertRaises(SizeMismatchException, checksumFileObject, hashGenerator, StringIO.StringIO("a" * 400), 'aFile', None, chunkSize=64, copyToPath=copyPath, maxLength=399, preallocateLength=399)
+		self.assertTrue(os.path.getsize(copyPath) < 400, 'A stream past its maxLength was copied in full')
+		self.assertEqual(open(copyPath, 'rb').read(), "a" * os.path.getsize(copyPath), 'A stream past its maxLength left a copy with more than was written')
+		
+		hashGenerator = hashlib.new('sha1')
+		self.assertEqual(checksumFileObject(hashGenerator, StringIO.StringIO("a" * 400), 'aFile', None, chunkSize=64, copyToPath=copyPath, maxLength=400, preallocateLength=1000)[0], 400, 'A stream of exactly maxLength was not read in full')
+		self.assertEqual(hashGenerator.hexdigest(), self.sampleFiles[0]['sha1'], 'A stream of exactly maxLength gave the wrong checksum')
+		self.assertEqual(open(copyPath, 'rb').read(), "a" * 400, 'A preallocated copy was not trimmed to what was written')
@@ -6,6 +6,15 @@ class FileNotFoundException(Exception):
 class CatalogNotFoundException(FileNotFoundException):
 	pass
 
+class SizeMismatchException(Exception):
+	pass
+
+class ProcessTimeoutException(RuntimeError):
+	pass
+
+class ProcessCancelledException(RuntimeError):
+	pass
+
 class InstallerChoicesFileException(Exception):
 	choicesFile	= None
 	lineNumber	= None
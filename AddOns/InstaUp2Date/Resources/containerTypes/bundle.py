@@ -7,6 +7,10 @@ import file
 class bundle(file.file):
 	'''Class to handle bundles'''
 	
+	# ---- class properties
+	
+	scoreItemMatchCost		= 2
+	
 	# ---- class methods
 	
 	@classmethod
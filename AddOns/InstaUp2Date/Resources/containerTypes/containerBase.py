@@ -24,6 +24,7 @@ class containerBase(object):
 	itemAlreadySetup		= False		# keep existing items from being re-setup
 	
 	matchScoreIncrement		= 5
+	scoreItemMatchCost		= 1			# relative cost of scoreItemMatch: 1 for a stat, 10 or more for running a command
 	
 	# ------ instance methods
 	
@@ -135,6 +136,11 @@ class containerBase(object):
 		'''All classes should impliment this method to help figure out which type should be used for each item'''
 		raise NotImplementedError('This method is virtual, and should be implimented in the subclasses')
 	
+	@classmethod
+	def couldMatchItem(myClass, inputItem, **kwargs):
+		'''A check cheaper than scoreItemMatch, returning False if this class can not match the item'''
+		return True
+	
 	@classmethod
 	def getType(myClass):
 		return myClass.__name__
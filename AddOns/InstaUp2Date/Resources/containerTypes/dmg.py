@@ -6,11 +6,13 @@ from volume		import volume
 
 try:
 	from .managedSubprocess					import managedSubprocess
+	from .mountTable						import mountTable
 	from .tempFolderManager					import tempFolderManager
 	from .pathHelpers						import normalizePath, pathInsideFolder
 	
 except ImportError:
 	from ..managedSubprocess		import managedSubprocess
+	from ..mountTable				import mountTable
 	from ..tempFolderManager		import tempFolderManager
 	from ..pathHelpers				import normalizePath, pathInsideFolder
 
@@ -32,6 +34,10 @@ class dmg(volume):
 	wholeDiskRegEx			= re.compile('^(?P<bsdPath>/dev/(?P<bsdName>disk\d+))$')
 	volumeSliceRegEx		= re.compile('^(?P<bsdPath>/dev/(?P<bsdName>disk\d+s\d+))$')
 	
+	scoreItemMatchCost		= 20		# runs hdiutil and diskutil
+	
+	flatPackageSignature	= 'xar!'	# flat packages are xar archives, and never images
+	
 	# ------ instance methods
 	def classInit(self, itemPath, processInformation, shadowFile=None):
 		
@@ -173,7 +179,7 @@ class dmg(volume):
 		
 		# -- run the command
 		
-		process = managedSubprocess(command, processAsPlist=True)
+		process = mountTable.runCommand(command, processAsPlist=True)
 		mountInfo = process.getPlistObject()
 		
 		actualMountedPath = None
@@ -243,10 +249,8 @@ class dmg(volume):
 	def getMountedImages(myClass):
 		'''Get a list of mounted images'''
 		
-		command = ['/usr/bin/hdiutil', 'info', '-plist']
-		process = managedSubprocess(command, processAsPlist=True)
 		# note: if there was an error it will already send up a RuntimeError
-		hdiutilOutput = process.getPlistObject()
+		hdiutilOutput = mountTable.hdiutilInfo()
 		
 		imageList = []
 		if 'images' in hdiutilOutput:
@@ -330,6 +334,34 @@ class dmg(volume):
 		
 		return result
 	
+	@classmethod
+	def couldMatchItem(myClass, itemPath, **kwargs):
+		'''Rule out the folders and packages that can not be images without running hdiutil'''
+		
+		if not hasattr(itemPath, 'capitalize'):
+			return False
+		
+		if itemPath.startswith('/dev/') or os.sep not in itemPath or os.path.ismount(os.path.realpath(itemPath)):
+			return True
+		
+		if os.path.isdir(itemPath):
+			return os.path.splitext(itemPath)[1].lower() == '.sparsebundle'
+		
+		if not os.path.isfile(itemPath):
+			return False
+		
+		if os.path.splitext(itemPath)[1].lower() in ['.pkg', '.mpkg']:
+			return False
+		
+		try:
+			itemFile = open(itemPath, 'rb')
+			try:
+				return itemFile.read(len(myClass.flatPackageSignature)) != myClass.flatPackageSignature
+			finally:
+				itemFile.close()
+		except IOError:
+			return True # let hdiutil decide
+	
 	@classmethod
 	def scoreItemMatch(myClass, itemPath, processInformation, **kwargs):
 		
@@ -131,3 +131,27 @@ class dmg_test(unittest.TestCase):
 		actualStripedItemList = [os.path.basename(itemPath) for itemPath in duplicateItem.getTopLevelItems()]
 		self.assertEqual(strippedItemList, actualStripedItemList, 'Expected results of getTopLevelItems on mounted dmg "%s" to be "%s", but got: %s' % (testItemPath, strippedItemList, actualStripedItemList))
 		self.assertFalse(duplicateItem.isMounted(), 'The dmg was not auto-unmounted after checking for the top level items')
+	
+	def test_couldMatchItem(self):
+		'''Folders and flat packages should be ruled out without running hdiutil'''
+		
+		testFolder = tempFolderManager.getNewTempFolder()
+		
+		flatPackagePath = os.path.join(testFolder, 'flatPackage')
+		flatPackage = open(flatPackagePath, 'wb')
+		flatPackage.write('xar!' + '\x00' * 24)
+		flatPackage.close()
+		
+		bundlePath = os.path.join(testFolder, 'sample.pkg')
+		os.makedirs(os.path.join(bundlePath, 'Contents'))
+		
+		for itemPath in [flatPackagePath, bundlePath, testFolder, os.path.join(testFolder, 'missing.dmg')]:
+			self.assertFalse(dmg.dmg.couldMatchItem(itemPath), 'couldMatchItem did not rule out: ' + itemPath)
+		
+		sparseBundlePath = os.path.join(testFolder, 'sample.sparsebundle')
+		os.mkdir(sparseBundlePath)
+		
+		for itemPath in ['/', '/dev/disk2', 'disk2s1', sparseBundlePath]:
+			self.assertTrue(dmg.dmg.couldMatchItem(itemPath), 'couldMatchItem ruled out: ' + itemPath)
+		
+		tempFolderManager.cleanupForExit()
@@ -1,18 +1,20 @@
 #!/usr/bin/python
 
-import os, Foundation
+import os
 
 from folder					import folder
 
 try:
 	from .volumeTools			import getDiskutilInfo
-	from .managedSubprocess				import managedSubprocess
+	from .mountTable					import mountTable
+	from .plistBackend					import plistBackend
 	from .tempFolderManager				import tempFolderManager
 	from .volumeTools			import unmountVolume
 	from .pathHelpers			import pathInsideFolder
 except ImportError:
 	from ..volumeTools			import getDiskutilInfo
-	from ..managedSubprocess			import managedSubprocess
+	from ..mountTable					import mountTable
+	from ..plistBackend					import plistBackend
 	from ..tempFolderManager			import tempFolderManager
 	from ..volumeTools			import unmountVolume
 	from ..pathHelpers			import pathInsideFolder
@@ -45,6 +47,8 @@ class volume(folder):
 	
 	volumeTypesHandled		= []
 	
+	scoreItemMatchCost		= 10		# runs diskutil
+	
 	# ------ instance methods
 	
 	def classInit(self, itemPath, processInformation):
@@ -192,7 +196,7 @@ class volume(folder):
 		
 		# -- run the command
 		
-		managedSubprocess(command)
+		mountTable.runCommand(command)
 		
 		# -- find and return the mount point
 		
@@ -302,9 +306,9 @@ class volume(folder):
 			self.testedForMacOS = True
 			return None
 		
-		plistNSData = Foundation.NSData.dataWithContentsOfFile_(systemVersionFile)
-		plistData, format, error = Foundation.NSPropertyListSerialization.propertyListFromData_mutabilityOption_format_errorDescription_(plistNSData, Foundation.NSPropertyListMutableContainersAndLeaves, None, None)
-		if error:
+		try:
+			plistData = plistBackend.readPlist(systemVersionFile)
+		except ValueError, error:
 			raise RuntimeError('Unable to get ther version of MacOS on: "%s". Error was: %s' % (self.getStoragePath(), str(error)))
 		
 		if not ("ProductBuildVersion" in plistData and "ProductUserVisibleVersion" in plistData):
@@ -347,9 +351,7 @@ class volume(folder):
 	@classmethod
 	def getMountedVolumes(myClass, excludeRoot=True):
 		
-		diskutilArguments = ['/usr/sbin/diskutil', 'list', '-plist']
-		diskutilProcess = managedSubprocess(diskutilArguments, processAsPlist=True)
-		diskutilOutput = diskutilProcess.getPlistObject()
+		diskutilOutput = mountTable.diskutilList()
 		
 		if not "AllDisks" in diskutilOutput or not hasattr(diskutilOutput["AllDisks"], '__iter__'):
 			raise RuntimeError('Error: The output from diksutil list does not look right:\n%s\n' % str(diskutilOutput))  
@@ -383,12 +385,10 @@ class volume(folder):
 		if not hasattr(identifier, 'capitalize'):
 			raise ValueError('getVolumeInfo requires a path, bsd name, or a dev path. Got: ' + str(identifier))
 		
-		command = ['/usr/sbin/diskutil', 'info', '-plist', str(identifier)]
 		try:
-			process = managedSubprocess(command, processAsPlist=True)
+			diskutilInfo = mountTable.diskutilInfo(identifier)
 		except RuntimeError, error:
 			raise ValueError('The input to getVolumeInfo does not look like it was valid: ' + str(identifier) + "\nError:\n" + str(error))
-		diskutilInfo = process.getPlistObject()
 		
 		result = {}
 		
@@ -447,6 +447,15 @@ class volume(folder):
 		
 		return result
 	
+	@classmethod
+	def couldMatchItem(myClass, itemPath, **kwargs):
+		'''Volumes are only ever a mount point, a bsd path, or a bsd name'''
+		
+		if not hasattr(itemPath, 'capitalize'):
+			return False
+		
+		return itemPath.startswith('/dev/') or os.sep not in itemPath or os.path.ismount(os.path.realpath(itemPath))
+	
 	@classmethod
 	def scoreItemMatch(myClass, itemPath, processInformation, **kwargs):
 		
@@ -1,14 +1,10 @@
 #!/usr/bin/python
 
-import os, sys, time, math, curses, atexit
+import os, sys, time, math, atexit
 
-try:
-	curses.setupterm()
-	cursesAvailable = True
-	eraseToLineEndChar		= curses.tigetstr('el')
-	gotoLineBeginingChar	= curses.tigetstr('cr')
-except:
-	cursesAvailable = False
+cursesAvailable			= None # None until setupCurses has been called
+eraseToLineEndChar		= None
+gotoLineBeginingChar	= None
 tabLength				= 8 # ToDo: figure out how to get this from the terminal
 
 # global list of exitHandlers
@@ -27,6 +23,23 @@ def finishLinesAtExit():
 
 atexit.register(finishLinesAtExit)
 
+def setupCurses():
+	'''Setup curses the first time a terminal is written to, rather than on import. Returns True if it is available.'''
+	
+	global cursesAvailable, eraseToLineEndChar, gotoLineBeginingChar
+	
+	if cursesAvailable is None:
+		try:
+			import curses
+			curses.setupterm()
+			eraseToLineEndChar		= curses.tigetstr('el')
+			gotoLineBeginingChar	= curses.tigetstr('cr')
+			cursesAvailable = True
+		except:
+			cursesAvailable = False
+	
+	return cursesAvailable
+
 
 class statusHandler:
 	'''Display dynamic status messages. A taskMessage is followed by a
@@ -127,7 +140,7 @@ class statusHandler:
 		'''Check if we're on a tty with curses setup.'''
 		
 		if self.outputChannel is not None:
-			return self.outputChannel.isatty() and cursesAvailable
+			return self.outputChannel.isatty() and setupCurses()
 		return False
 	
 	def update(self, taskMessage=None, statusMessage=None, progressTemplate=None, value=None, expectedLength=None, forceUpdate=False):
@@ -227,10 +240,10 @@ class statusHandler:
 	def finishLine(self):
 		'''Finish the line... adding a newline'''
 		
-		# Remove this object from the atexit handler
-		removeAtExit(self)
-		
 		if self._lineFinished is False:
+			# Remove this object from the atexit handler
+			removeAtExit(self)
+			
 			if not self.useCurses():
 				if self.lastTaskMessage:
 					self.outputChannel.write(self.lastTaskMessage)
@@ -7,7 +7,6 @@ import os, sys
 import pathHelpers
 from volumeManager		import dmgManager
 from tempFolderManager	import tempFolderManager
-from managedSubprocess	import managedSubprocess
 
 if __name__ == '__main__':
 	import optparse
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+
+import os, errno, json, socket, time, threading
+
+class downloadLock:
+	'''An advisory lock on downloading one item into a cache folder, shared by every process using that folder, including ones on other hosts over NFS. The lock file says who holds it and where they are downloading to, and is touched regularly while the download runs, so the locks of crashed processes can be recognized and broken.'''
+	
+	#---------------------Class Variables-----------------------------
+	
+	lockFolderName			= '.downloadLocks'	# inside the cache folder
+	
+	heartbeatInterval		= 10		# seconds between touches of a held lock
+	staleSeconds			= 120		# a lock not touched in this long is from a process that is gone
+	pollInterval			= 0.5		# seconds between checks while waiting
+	
+	hostName				= socket.gethostname()
+	
+	#--------------------Instance Variables---------------------------
+	
+	lockFilePath			= None
+	ownerInfo				= None		# {'host', 'pid', 'started', 'targetPath'} while this lock is held
+	
+	heartbeatThread			= None
+	heartbeatStop			= None
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, cacheFolder, checksumString):
+		
+		if not hasattr(cacheFolder, 'capitalize') or not os.path.isdir(cacheFolder):
+			raise ValueError('%s requires an existing cache folder, got: %s' % (self.__class__.__name__, str(cacheFolder)))
+		
+		if not hasattr(checksumString, 'capitalize') or checksumString == '' or os.sep in checksumString:
+			raise ValueError('%s requires a checksum string, got: %s' % (self.__class__.__name__, str(checksumString)))
+		
+		self.lockFilePath = os.path.join(cacheFolder, self.lockFolderName, checksumString + '.lock')
+	
+	def readOwner(self, lockFilePath=None):
+		'''Return the information in the lock file and its mtime, or (None, None) if there is no lock file'''
+		
+		if lockFilePath is None:
+			lockFilePath = self.lockFilePath
+		
+		try:
+			lockFile = open(lockFilePath)
+			try:
+				lockMtime = os.fstat(lockFile.fileno()).st_mtime
+				lockData = lockFile.read()
+			finally:
+				lockFile.close()
+		except IOError, error:
+			if error.errno == errno.ENOENT:
+				return None, None
+			raise
+		
+		try:
+			ownerInfo = json.loads(lockData)
+		except ValueError:
+			ownerInfo = None # a process that died while writing it, or one still writing it
+		
+		if not isinstance(ownerInfo, dict):
+			ownerInfo = {}
+		
+		return ownerInfo, lockMtime
+	
+	def isStale(self, ownerInfo, lockMtime):
+		'''True if the process that holds the lock is known to be gone'''
+		
+		# on this host we can just ask
+		if ownerInfo.get('host') == self.hostName and isinstance(ownerInfo.get('pid'), int):
+			try:
+				os.kill(ownerInfo['pid'], 0)
+			except OSError, error:
+				if error.errno == errno.ESRCH:
+					return True
+		
+		# otherwise go by the heartbeat
+		return time.time() - lockMtime > self.staleSeconds
+	
+	def breakStaleLock(self, staleOwnerInfo):
+		'''Remove a stale lock, making sure that it is the same lock that was found to be stale and not a new one from another process that got there first'''
+		
+		setAsidePath = '%s.stale.%s.%i.%i' % (self.lockFilePath, self.hostName, os.getpid(), threading.currentThread().ident or 0)
+		try:
+			os.rename(self.lockFilePath, setAsidePath)
+		except OSError, error:
+			if error.errno == errno.ENOENT:
+				return # someone else already broke it
+			raise
+		
+		setAsideOwnerInfo, setAsideMtime = self.readOwner(setAsidePath)
+		if setAsideOwnerInfo != staleOwnerInfo:
+			# a fresh lock replaced the stale one before we moved it, so put it back unless yet another has been taken
+			try:
+				os.link(setAsidePath, self.lockFilePath)
+			except OSError:
+				pass
+		
+		os.unlink(setAsidePath)
+	
+	def acquire(self, targetPath=None, blocking=True, timeout=None, waitCallback=None):
+		'''Take the lock, recording targetPath as where the item is being downloaded to. If another process holds it: with blocking False return False right away, otherwise wait (calling waitCallback with the holder's information each time around) until it is released or timeout seconds have passed. Returns True once the lock is held. The information from the last holder waited on is left in lastOwnerInfo, which is None if there was no wait.'''
+		
+		if self.ownerInfo is not None:
+			raise RuntimeError('The download lock is already held: ' + self.lockFilePath)
+		
+		if not os.path.isdir(os.path.dirname(self.lockFilePath)):
+			try:
+				os.mkdir(os.path.dirname(self.lockFilePath))
+			except OSError, error:
+				if error.errno != errno.EEXIST:
+					raise
+		
+		startTime = time.time()
+		self.lastOwnerInfo = None
+		
+		while True:
+			ownerInfo = {'host':self.hostName, 'pid':os.getpid(), 'started':time.time(), 'targetPath':targetPath}
+			
+			# O_EXCL creation is atomic, on NFS as well from version 3
+			try:
+				lockDescriptor = os.open(self.lockFilePath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0644)
+			except OSError, error:
+				if error.errno != errno.EEXIST:
+					raise
+				lockDescriptor = None
+			
+			if lockDescriptor is not None:
+				try:
+					os.write(lockDescriptor, json.dumps(ownerInfo))
+				finally:
+					os.close(lockDescriptor)
+				
+				self.ownerInfo = ownerInfo
+				self.startHeartbeat()
+				return True
+			
+			# someone else has it
+			currentOwnerInfo, lockMtime = self.readOwner()
+			if currentOwnerInfo is None:
+				continue # released in the meantime
+			
+			if self.isStale(currentOwnerInfo, lockMtime):
+				self.breakStaleLock(currentOwnerInfo)
+				continue
+			
+			self.lastOwnerInfo = currentOwnerInfo
+			
+			if blocking is False or (timeout is not None and time.time() - startTime >= timeout):
+				return False
+			
+			if waitCallback is not None:
+				waitCallback(currentOwnerInfo)
+			
+			time.sleep(self.pollInterval)
+	
+	def release(self):
+		'''Give up the lock, if it is still ours'''
+		
+		if self.ownerInfo is None:
+			return
+		
+		self.heartbeatStop.set()
+		self.heartbeatThread.join()
+		
+		currentOwnerInfo, lockMtime = self.readOwner()
+		if currentOwnerInfo == self.ownerInfo:
+			os.unlink(self.lockFilePath)
+		
+		self.ownerInfo = None
+	
+	def startHeartbeat(self):
+		'''Touch the lock file regularly while it is held, so other processes can tell we are still alive'''
+		
+		self.heartbeatStop = threading.Event()
+		
+		def heartbeatWorker():
+			while not self.heartbeatStop.isSet():
+				self.heartbeatStop.wait(self.heartbeatInterval)
+				if self.heartbeatStop.isSet():
+					return
+				try:
+					os.utime(self.lockFilePath, None)
+				except OSError:
+					pass # broken by someone else, release will notice it is not ours
+		
+		self.heartbeatThread = threading.Thread(target=heartbeatWorker)
+		self.heartbeatThread.setDaemon(True)
+		self.heartbeatThread.start()
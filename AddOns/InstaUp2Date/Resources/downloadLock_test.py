@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+import os, sys, time, json, unittest, subprocess
+
+from tempFolderManager		import tempFolderManager
+from downloadLock			import downloadLock
+
+class downloadLockTests(unittest.TestCase):
+	'''Test that download locks are exclusive between processes, and that the locks of processes that are gone are broken'''
+	
+	cacheFolderPath			= None
+	
+	def setUp(self):
+		self.cacheFolderPath = tempFolderManager.getNewTempFolder()
+	
+	def tearDown(self):
+		tempFolderManager.cleanupForExit()
+	
+	def writeLockFile(self, ownerInfo, lockMtime=None):
+		'''Leave a lock file behind as another process would'''
+		
+		thisLock = downloadLock(self.cacheFolderPath, 'sha1-abc')
+		if not os.path.isdir(os.path.dirname(thisLock.lockFilePath)):
+			os.mkdir(os.path.dirname(thisLock.lockFilePath))
+		
+		lockFile = open(thisLock.lockFilePath, 'w')
+		json.dump(ownerInfo, lockFile)
+		lockFile.close()
+		
+		if lockMtime is not None:
+			os.utime(thisLock.lockFilePath, (lockMtime, lockMtime))
+		
+		return thisLock
+	
+	def test_exclusive(self):
+		'''Only one process should hold the lock at a time, and the others should see who has it'''
+		
+		childScript = 'import sys, time; from downloadLock import downloadLock; thisLock = downloadLock(sys.argv[1], "sha1-abc"); thisLock.acquire(targetPath="/some/target"); sys.stdout.write("locked\\n"); sys.stdout.flush(); sys.stdin.readline(); thisLock.release()'
+		childProcess = subprocess.Popen([sys.executable, '-c', childScript, self.cacheFolderPath], cwd=os.path.dirname(os.path.abspath(__file__)), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+		try:
+			self.assertEqual(childProcess.stdout.readline().strip(), 'locked', 'The other process did not get the lock')
+			
+			thisLock = downloadLock(self.cacheFolderPath, 'sha1-abc')
+			self.assertFalse(thisLock.acquire(blocking=False), 'The lock was taken while another process held it')
+			self.assertEqual(thisLock.lastOwnerInfo['pid'], childProcess.pid, 'The other process was not reported as the holder, got: ' + str(thisLock.lastOwnerInfo))
+			self.assertEqual(thisLock.lastOwnerInfo['targetPath'], '/some/target', 'The target path of the other process was not recorded')
+			
+			startTime = time.time()
+			self.assertFalse(thisLock.acquire(timeout=0.5), 'The lock was taken while another process held it')
+			self.assertTrue(time.time() - startTime >= 0.5, 'Acquiring with a timeout did not wait')
+			
+			waitedOn = []
+			childProcess.stdin.write('\n')
+			childProcess.stdin.flush()
+			self.assertTrue(thisLock.acquire(timeout=10, waitCallback=waitedOn.append), 'The lock was not taken after the other process released it')
+		finally:
+			childProcess.stdin.close()
+			childProcess.wait()
+		
+		self.assertTrue(len(waitedOn) > 0, 'The wait callback was not called')
+		self.assertEqual(thisLock.readOwner()[0], thisLock.ownerInfo, 'The lock file does not say who holds it')
+		
+		thisLock.release()
+		self.assertFalse(os.path.exists(thisLock.lockFilePath), 'Releasing the lock left the lock file')
+		
+		self.assertRaises(ValueError, downloadLock, self.cacheFolderPath, 'sha1/abc')
+		self.assertRaises(ValueError, downloadLock, os.path.join(self.cacheFolderPath, 'missing'), 'sha1-abc')
+	
+	def test_staleLocks(self):
+		'''Locks from dead processes on this host, and ones that have not been touched in a long time, should be broken'''
+		
+		# a process on this host that has exited
+		deadProcess = subprocess.Popen([sys.executable, '-c', 'pass'])
+		deadProcess.wait()
+		
+		thisLock = self.writeLockFile({'host':downloadLock.hostName, 'pid':deadProcess.pid, 'started':time.time(), 'targetPath':None})
+		self.assertTrue(thisLock.acquire(blocking=False), 'The lock of a process that has exited was not broken')
+		self.assertEqual(thisLock.readOwner()[0]['pid'], os.getpid(), 'The broken lock was not replaced with ours')
+		thisLock.release()
+		
+		# a process on another host that has not touched the lock in a long time
+		thisLock = self.writeLockFile({'host':'someOtherHost', 'pid':1, 'started':time.time()}, lockMtime=time.time() - downloadLock.staleSeconds - 10)
+		self.assertTrue(thisLock.acquire(blocking=False), 'A lock that had not been touched in a long time was not broken')
+		thisLock.release()
+		
+		# but not one that is still being touched
+		thisLock = self.writeLockFile({'host':'someOtherHost', 'pid':1, 'started':time.time()})
+		self.assertFalse(thisLock.acquire(blocking=False), 'A lock that is still being touched was broken')
+		
+		# and a stale lock that has been replaced by a fresh one is put back
+		freshOwnerInfo = {'host':'someOtherHost', 'pid':2, 'started':time.time()}
+		self.writeLockFile(freshOwnerInfo)
+		thisLock.breakStaleLock({'host':'someOtherHost', 'pid':1})
+		self.assertEqual(thisLock.readOwner()[0], freshOwnerInfo, 'A fresh lock was broken in place of the stale one')
+		self.assertEqual(os.listdir(os.path.dirname(thisLock.lockFilePath)), [os.path.basename(thisLock.lockFilePath)], 'Breaking a lock left files behind')
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,242 @@
+#!/usr/bin/python
+
+import re, socket, threading, urllib, urllib2, urlparse, httplib
+
+class pooledResponse:
+	'''A response from httpClient, it acts like the responses from urllib2.urlopen. Once the body has been read the connection goes back into the pool.'''
+	
+	#--------------------Instance Variables---------------------------
+	
+	response			= None
+	connection			= None
+	poolKey				= None
+	url					= None
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, response, connection, poolKey, url):
+		self.response		= response
+		self.connection		= connection
+		self.poolKey		= poolKey
+		self.url			= url
+		
+		# HEAD requests and empty bodies are already finished with
+		if response.length == 0:
+			response.read()
+		
+		if response.isclosed():
+			self.releaseConnection()
+	
+	def read(self, amt=None):
+		if self.response is None:
+			return ''
+		
+		if amt is None:
+			data = self.response.read()
+		else:
+			data = self.response.read(amt)
+		
+		if self.response.isclosed():
+			self.releaseConnection()
+		
+		return data
+	
+	def info(self):
+		return self.response.msg
+	
+	def geturl(self):
+		return self.url
+	
+	def getcode(self):
+		return self.response.status
+	
+	def releaseConnection(self):
+		'''Hand the connection back to the pool if it can be used again'''
+		
+		if self.connection is None:
+			return
+		
+		if self.response.will_close:
+			self.connection.close()
+		else:
+			httpClient.returnConnection(self.poolKey, self.connection)
+		self.connection = None
+	
+	def close(self):
+		if self.connection is not None:
+			if self.response.isclosed():
+				self.releaseConnection()
+			else:
+				# unread data would confuse the next request, so this connection can not be reused
+				self.connection.close()
+				self.connection = None
+		
+		self.response.close()
+
+class httpClient:
+	'''A shared http/https client that keeps connections open and reuses them for later requests to the same host'''
+	
+	# ------ class variables
+	
+	maxIdleConnectionsPerHost	= 4			# idle connections kept for each host
+	timeout						= None		# seconds, None uses the socket default
+	maxRedirects				= 10
+	userAgent					= 'InstaUp2Date'
+	
+	idleConnections				= {}		# lists of idle connections keyed by (scheme, host, port)
+	poolLock					= threading.Lock()
+	
+	connectionsOpened			= 0			# for reporting and testing
+	
+	# ------ class methods
+	
+	# ---- pool methods
+	
+	@classmethod
+	def getConnection(myClass, poolKey):
+		'''Return an idle connection to this host, or a new one, along with whether it was reused'''
+		
+		myClass.poolLock.acquire()
+		try:
+			if len(myClass.idleConnections.get(poolKey, [])) > 0:
+				return myClass.idleConnections[poolKey].pop(), True
+			myClass.connectionsOpened += 1
+		finally:
+			myClass.poolLock.release()
+		
+		scheme, host, port = poolKey
+		connectionClass = httplib.HTTPConnection
+		if scheme == 'https':
+			connectionClass = httplib.HTTPSConnection
+		
+		if myClass.timeout is None:
+			return connectionClass(host, port), False
+		return connectionClass(host, port, timeout=myClass.timeout), False
+	
+	@classmethod
+	def returnConnection(myClass, poolKey, connection):
+		
+		myClass.poolLock.acquire()
+		try:
+			idleList = myClass.idleConnections.setdefault(poolKey, [])
+			if len(idleList) < myClass.maxIdleConnectionsPerHost:
+				idleList.append(connection)
+				return
+		finally:
+			myClass.poolLock.release()
+		
+		connection.close()
+	
+	@classmethod
+	def closeAll(myClass):
+		'''Close all of the idle connections'''
+		
+		myClass.poolLock.acquire()
+		try:
+			for idleList in myClass.idleConnections.values():
+				for thisConnection in idleList:
+					thisConnection.close()
+			myClass.idleConnections = {}
+		finally:
+			myClass.poolLock.release()
+	
+	# ---- request methods
+	
+	@classmethod
+	def request(myClass, method, url, headers=None):
+		'''Make a request, following redirects, and return a pooledResponse. Errors are raised as urllib2.HTTPError or urllib2.URLError, like urllib2.urlopen does.'''
+		
+		requestHeaders = {'User-Agent':myClass.userAgent}
+		if headers is not None:
+			requestHeaders.update(headers)
+		
+		for redirectCount in range(myClass.maxRedirects + 1):
+			
+			parsedURL = urlparse.urlparse(url)
+			if parsedURL.scheme not in ['http', 'https']:
+				raise ValueError('httpClient can only process http and https urls, got: ' + str(url))
+			
+			# urllib2 already knows how to deal with proxies
+			if parsedURL.scheme in urllib.getproxies():
+				return myClass.requestThroughUrllib2(method, url, requestHeaders)
+			
+			defaultPort = httplib.HTTP_PORT
+			if parsedURL.scheme == 'https':
+				defaultPort = httplib.HTTPS_PORT
+			poolKey = (parsedURL.scheme, parsedURL.hostname, parsedURL.port or defaultPort)
+			
+			requestPath = parsedURL.path or '/'
+			if parsedURL.query:
+				requestPath += '?' + parsedURL.query
+			
+			# httplib would refuse these part way into the request, spoiling the connection
+			if re.search('[\x00-\x20\x7f]', requestPath) is not None:
+				raise urllib2.URLError('The url can not contain spaces or control characters: ' + url)
+			
+			response, connection = myClass.sendRequest(poolKey, method, requestPath, requestHeaders)
+			thisResponse = pooledResponse(response, connection, poolKey, url)
+			
+			if response.status in [301, 302, 303, 307, 308] and response.getheader('location') is not None:
+				# drain the body so the connection can be reused
+				thisResponse.read()
+				thisResponse.close()
+				url = urlparse.urljoin(url, response.getheader('location'))
+				if response.status == 303:
+					method = 'GET'
+				continue
+			
+			if response.status >= 400:
+				thisResponse.read()
+				thisResponse.close()
+				raise urllib2.HTTPError(url, response.status, response.reason, response.msg, None)
+			
+			return thisResponse
+		
+		raise urllib2.URLError('Too many redirects while trying to get: ' + url)
+	
+	@classmethod
+	def sendRequest(myClass, poolKey, method, requestPath, requestHeaders):
+		'''Send the request on a pooled connection, retrying once on a new one if a reused connection turns out to have been closed by the server'''
+		
+		while True:
+			connection, reused = myClass.getConnection(poolKey)
+			try:
+				connection.request(method, requestPath, headers=requestHeaders)
+				return connection.getresponse(), connection
+			
+			except (httplib.HTTPException, socket.error), error:
+				connection.close()
+				if reused is True:
+					continue # the server probably closed an idle connection
+				
+				errorReason = error
+				if isinstance(error, socket.error) and len(error.args) > 1:
+					errorReason = error.args[1]
+				raise urllib2.URLError(errorReason)
+	
+	@classmethod
+	def requestThroughUrllib2(myClass, method, url, requestHeaders):
+		
+		thisRequest = urllib2.Request(url, headers=requestHeaders)
+		thisRequest.get_method = lambda: method
+		return urllib2.urlopen(thisRequest)
+	
+	@classmethod
+	def urlopen(myClass, url, headers=None):
+		'''GET a url, a replacement for urllib2.urlopen that reuses connections'''
+		
+		return myClass.request('GET', url, headers=headers)
+	
+	@classmethod
+	def head(myClass, url, headers=None):
+		'''Check that a url exists without downloading it, returning the closed response so its headers can be read. Servers that do not allow HEAD get a GET that is then closed.'''
+		
+		try:
+			response = myClass.request('HEAD', url, headers=headers)
+		except urllib2.HTTPError, error:
+			if error.code not in [405, 501]:
+				raise
+			response = myClass.request('GET', url, headers=headers)
+		
+		response.close()
+		return response
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+import os, unittest, urllib2
+
+from tempFolderManager		import tempFolderManager
+from testingHelpers			import startTestHTTPServer
+
+from httpClient				import httpClient
+
+class httpClientTests(unittest.TestCase):
+	'''Test that the shared http client reuses its connections'''
+	
+	servedFolderPath		= None
+	server					= None
+	
+	def setUp(self):
+		self.servedFolderPath = tempFolderManager.getNewTempFolder()
+		for fileName, contents in [('aFile.txt', 'a' * 400), ('bFile.txt', 'b' * 150)]:
+			sampleFile = open(os.path.join(self.servedFolderPath, fileName), 'w')
+			sampleFile.write(contents)
+			sampleFile.close()
+		
+		self.server = startTestHTTPServer(self.servedFolderPath)
+	
+	def tearDown(self):
+		httpClient.closeAll()
+		self.server.shutdown()
+		self.server.server_close()
+		tempFolderManager.cleanupForExit()
+	
+	def test_connectionReuse(self):
+		'''Several requests to the same host should share one connection'''
+		
+		for fileName, contents in [('aFile.txt', 'a' * 400), ('bFile.txt', 'b' * 150), ('aFile.txt', 'a' * 400)]:
+			readFile = httpClient.urlopen(self.server.baseURL + fileName)
+			self.assertEqual(readFile.getcode(), 200, 'A request for an existing file did not get a 200 response')
+			self.assertEqual(readFile.info().getheader('content-length'), str(len(contents)), 'A response did not have the right content-length header')
+			self.assertEqual(readFile.read(), contents, 'A response did not have the right contents for: ' + fileName)
+			readFile.close()
+		
+		self.assertEqual(self.server.connectionCount, 1, 'Three requests to the same host used %i connections rather than 1' % self.server.connectionCount)
+	
+	def test_head(self):
+		'''head should send a HEAD request, and raise an HTTPError for missing items without losing the connection'''
+		
+		response = httpClient.head(self.server.baseURL + 'aFile.txt')
+		self.assertEqual(response.info().getheader('content-length'), '400', 'A HEAD response did not have the content-length header')
+		self.assertEqual(self.server.requestLog[-1][0], 'HEAD', 'head did not send a HEAD request, sent: ' + self.server.requestLog[-1][0])
+		
+		try:
+			httpClient.head(self.server.baseURL + 'missingFile.txt')
+			self.fail('head did not raise an error for a missing item')
+		except urllib2.HTTPError, error:
+			self.assertEqual(error.code, 404, 'head raised the wrong code for a missing item: %i' % error.code)
+		
+		self.assertEqual(httpClient.urlopen(self.server.baseURL + 'bFile.txt').read(), 'b' * 150, 'A request after a 404 did not get the right contents')
+		self.assertEqual(self.server.connectionCount, 1, 'A 404 response caused a new connection to be opened')
+	
+	def test_staleConnection(self):
+		'''A pooled connection that has been closed underneath us should be replaced'''
+		
+		httpClient.urlopen(self.server.baseURL + 'aFile.txt').read()
+		
+		for idleList in httpClient.idleConnections.values():
+			for thisConnection in idleList:
+				thisConnection.sock.close()
+		
+		self.assertEqual(httpClient.urlopen(self.server.baseURL + 'bFile.txt').read(), 'b' * 150, 'A request on a stale connection did not get the right contents')
+		self.assertEqual(self.server.connectionCount, 2, 'A stale connection was not replaced with a new one')
+	
+	def test_partialRead(self):
+		'''A response that is closed before being fully read should not put its connection back in the pool'''
+		
+		readFile = httpClient.urlopen(self.server.baseURL + 'aFile.txt')
+		readFile.read(10)
+		readFile.close()
+		
+		self.assertEqual(httpClient.urlopen(self.server.baseURL + 'bFile.txt').read(), 'b' * 150, 'A request after a partial read did not get the right contents')
+		self.assertEqual(self.server.connectionCount, 2, 'A connection with unread data was reused')
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+
+import sys, time, __builtin__
+
+class importTimer:
+	'''Times every import made while it is installed, and reports them in the same form as python 3's "-X importtime": the microseconds spent in each module itself, the microseconds including the modules it imported, and the module name indented by how deeply it was imported'''
+	
+	# ------ class variables
+	
+	_originalImport			= None
+	
+	_timings				= []		# [selfMicroseconds, cumulativeMicroseconds, depth, moduleName] in the order they finished
+	_stack					= []		# [moduleName, startTime, microseconds in nested imports] for the imports in progress
+	
+	# ------ class methods
+	
+	@classmethod
+	def install(myClass):
+		'''Start timing imports'''
+		
+		if myClass._originalImport is not None:
+			return
+		
+		myClass._timings = []
+		myClass._stack = []
+		myClass._originalImport = __builtin__.__import__
+		__builtin__.__import__ = myClass.timedImport
+	
+	@classmethod
+	def uninstall(myClass):
+		'''Stop timing imports'''
+		
+		if myClass._originalImport is None:
+			return
+		
+		__builtin__.__import__ = myClass._originalImport
+		myClass._originalImport = None
+	
+	@classmethod
+	def getCandidateNames(myClass, name, globals, level):
+		'''The names in sys.modules this import could load, the package-relative one first'''
+		
+		candidateNames = []
+		
+		if level != 0 and globals is not None and globals.get('__name__'):
+			package = globals['__name__']
+			if '__path__' not in globals:
+				package = package.rpartition('.')[0]
+			if level > 1:
+				package = '.'.join(package.split('.')[:1 - level])
+			if package != '':
+				candidateNames.append(package + '.' + name)
+		
+		if level <= 0:
+			candidateNames.append(name)
+		
+		return candidateNames
+	
+	@classmethod
+	def timedImport(myClass, name, globals=None, locals=None, fromlist=None, level=-1):
+		
+		thisImport = [name, time.time(), 0]
+		
+		# implicit relative imports leave None placeholders in sys.modules, so only real modules count as loaded
+		candidateNames = myClass.getCandidateNames(name, globals, level)
+		alreadyLoaded = [sys.modules.get(candidateName) is not None for candidateName in candidateNames]
+		
+		myClass._stack.append(thisImport)
+		try:
+			return myClass._originalImport(name, globals, locals, fromlist, level)
+		finally:
+			myClass._stack.pop()
+			# only imports that loaded something are reported, the rest just found a module already loaded
+			for candidateName, wasLoaded in zip(candidateNames, alreadyLoaded):
+				if not wasLoaded and sys.modules.get(candidateName) is not None:
+					cumulativeMicroseconds = int((time.time() - thisImport[1]) * 1000000)
+					myClass._timings.append([cumulativeMicroseconds - thisImport[2], cumulativeMicroseconds, len(myClass._stack), name])
+					if len(myClass._stack) > 0:
+						myClass._stack[-1][2] += cumulativeMicroseconds
+					break
+	
+	@classmethod
+	def getTimings(myClass):
+		'''Return a list of (selfMicroseconds, cumulativeMicroseconds, depth, moduleName) for the imports timed'''
+		
+		return [tuple(thisTiming) for thisTiming in myClass._timings]
+	
+	@classmethod
+	def report(myClass, outputChannel=sys.stderr):
+		'''Write the timings in the form of "-X importtime"'''
+		
+		outputChannel.write('import time: self [us] | cumulative | imported package\n')
+		for selfMicroseconds, cumulativeMicroseconds, depth, moduleName in myClass._timings:
+			outputChannel.write('import time: %9i | %10i | %s%s\n' % (selfMicroseconds, cumulativeMicroseconds, '  ' * depth, moduleName))
+
+if __name__ == '__main__':
+	import os
+	
+	# optparse is not used here, so that it is timed when the script imports it
+	usage = 'Usage: importTimer.py [-b/--budget SECONDS] script.py [script arguments]\n'
+	arguments = sys.argv[1:]
+	
+	budget = None
+	if len(arguments) > 0 and arguments[0] in ['-b', '--budget']:
+		try:
+			budget = float(arguments[1])
+		except (IndexError, ValueError):
+			sys.stderr.write(usage + 'importTimer.py: error: the -b/--budget option requires a number of seconds\n')
+			sys.exit(2)
+		arguments = arguments[2:]
+	
+	if len(arguments) < 1:
+		sys.stderr.write(usage + 'importTimer.py: error: a python script to run is required\n')
+		sys.exit(2)
+	scriptPath = arguments[0]
+	if not os.path.isfile(scriptPath):
+		sys.stderr.write(usage + 'importTimer.py: error: the script given does not exist, or is not a file: %s\n' % scriptPath)
+		sys.exit(2)
+	
+	# run the script as if it had been called directly
+	sys.argv = arguments
+	sys.path[0] = os.path.dirname(os.path.abspath(scriptPath))
+	
+	exitCode = 0
+	importTimer.install()
+	try:
+		try:
+			execfile(scriptPath, {'__name__':'__main__', '__file__':scriptPath})
+		except SystemExit, error:
+			exitCode = error.code
+	finally:
+		importTimer.uninstall()
+		
+		importTimer.report()
+		totalMicroseconds = sum([cumulativeMicroseconds for selfMicroseconds, cumulativeMicroseconds, depth, moduleName in importTimer.getTimings() if depth == 0])
+		sys.stderr.write('import time: %i modules imported in %.1f ms\n' % (len(importTimer.getTimings()), totalMicroseconds / 1000.0))
+	
+	if budget is not None and totalMicroseconds > budget * 1000000:
+		sys.stderr.write('Error: the imports took %.1f ms, over the budget of %.1f ms\n' % (totalMicroseconds / 1000.0, budget * 1000))
+		sys.exit(1)
+	
+	sys.exit(exitCode)
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+import os, re, sys, unittest, subprocess
+
+from tempFolderManager		import tempFolderManager
+
+from importTimer			import importTimer
+
+class importTimerTests(unittest.TestCase):
+	'''Test timing imports'''
+
+	def tearDown(self):
+		importTimer.uninstall()
+		tempFolderManager.cleanupForExit()
+
+	def test_timings(self):
+		'''Each module loaded should be timed once, nested under the module that imported it'''
+
+		moduleFolder = tempFolderManager.getNewTempFolder()
+		for moduleName, moduleContents in [('importTimerOuter', 'import time, importTimerInner\ntime.sleep(0.1)\n'), ('importTimerInner', 'import time\ntime.sleep(0.2)\n')]:
+			moduleFile = open(os.path.join(moduleFolder, moduleName + '.py'), 'w')
+			moduleFile.write(moduleContents)
+			moduleFile.close()
+
+		sys.path.insert(0, moduleFolder)
+		try:
+			importTimer.install()
+			import importTimerOuter
+			import importTimerOuter, importTimerInner # already loaded, so not timed
+			importTimer.uninstall()
+		finally:
+			sys.path.remove(moduleFolder)
+			for moduleName in ['importTimerOuter', 'importTimerInner']:
+				if moduleName in sys.modules:
+					del sys.modules[moduleName]
+
+		timings = dict([(moduleName, (selfMicroseconds, cumulativeMicroseconds, depth)) for selfMicroseconds, cumulativeMicroseconds, depth, moduleName in importTimer.getTimings()])
+		self.assertEqual(len(importTimer.getTimings()), 2, 'The imports were not timed once each, got: ' + str(importTimer.getTimings()))
+		self.assertEqual((timings['importTimerOuter'][2], timings['importTimerInner'][2]), (0, 1), 'The nested import was not nested, got: ' + str(timings))
+		self.assertTrue(timings['importTimerInner'][1] >= 200000 and timings['importTimerOuter'][1] >= 300000, 'The cumulative times did not include the nested import, got: ' + str(timings))
+		self.assertTrue(100000 <= timings['importTimerOuter'][0] < 200000, 'The self time of the outer module included the nested import, got: ' + str(timings))
+
+		self.assertTrue(__import__ is not importTimer.timedImport, 'uninstall did not put back the original __import__')
+	
+	def test_relativePlaceholders(self):
+		'''The None placeholders left by implicit relative imports should not be reported as loads'''
+		
+		moduleFolder = tempFolderManager.getNewTempFolder()
+		os.mkdir(os.path.join(moduleFolder, 'importTimerPackage'))
+		for modulePath, moduleContents in [('importTimerPackage/__init__.py', ''), ('importTimerPackage/importTimerUser.py', 'import importTimerLoaded\n'), ('importTimerLoaded.py', '')]:
+			moduleFile = open(os.path.join(moduleFolder, modulePath), 'w')
+			moduleFile.write(moduleContents)
+			moduleFile.close()
+		
+		sys.path.insert(0, moduleFolder)
+		try:
+			import importTimerLoaded
+			importTimer.install()
+			import importTimerPackage.importTimerUser
+			importTimer.uninstall()
+		finally:
+			sys.path.remove(moduleFolder)
+			for moduleName in ['importTimerLoaded', 'importTimerPackage', 'importTimerPackage.importTimerUser', 'importTimerPackage.importTimerLoaded']:
+				if moduleName in sys.modules:
+					del sys.modules[moduleName]
+		
+		timedNames = [moduleName for selfMicroseconds, cumulativeMicroseconds, depth, moduleName in importTimer.getTimings()]
+		self.assertEqual(timedNames, ['importTimerPackage.importTimerUser'], 'Only the package import should have been timed, got: ' + str(importTimer.getTimings()))
+
+class startupBudgetTests(unittest.TestCase):
+	'''The command line entry points should start without loading the modules they do not need'''
+
+	startupBudget			= 1.0		# seconds of imports allowed for each entry point, generous as this has to hold on a busy machine without .pyc files
+
+	instaUp2DateFolder		= os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	importTimerPath			= os.path.join(instaUp2DateFolder, 'Resources', 'importTimer.py')
+
+	timingParser			= re.compile('^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<indent> *)(?P<moduleName>\S+)$')
+
+	def timeEntryPoint(self, arguments):
+		'''Run a script under importTimer, returning the names of the modules it imported and the seconds the imports took'''
+
+		process = subprocess.Popen([sys.executable, self.importTimerPath] + arguments, cwd=self.instaUp2DateFolder, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		stdout, stderr = process.communicate()
+		self.assertEqual(process.returncode, 0, 'Running "%s" failed with: %s\n%s' % (' '.join(arguments), process.returncode, stderr))
+
+		moduleNames = []
+		importSeconds = 0
+		for thisLine in stderr.splitlines():
+			thisTiming = self.timingParser.search(thisLine)
+			if thisTiming is None:
+				continue
+			moduleNames.append(thisTiming.group('moduleName').split('.')[-1])
+			if thisTiming.group('indent') == '':
+				importSeconds += int(thisTiming.group('cumulative')) / 1000000.0
+
+		return moduleNames, importSeconds
+
+	def test_instaUp2Date(self):
+		'''--version and --help should not load the container types, the catalog processing, or curses'''
+
+		for thisArgument in ['--version', '--help']:
+			moduleNames, importSeconds = self.timeEntryPoint(['instaUp2Date.py', thisArgument])
+			for thisModule in ['container', 'containerTypes', 'installerPackage', 'findInstallerDisc', 'catalogLock', 'buildPipeline', 'cacheServer', 'mountTable', 'plistBackend', 'curses', 'Foundation']:
+				self.assertFalse(thisModule in moduleNames, 'instaUp2Date.py %s imported %s' % (thisArgument, thisModule))
+			self.assertTrue(importSeconds < self.startupBudget, 'instaUp2Date.py %s took %.3f seconds of imports, over the budget of %.3f' % (thisArgument, importSeconds, self.startupBudget))
+
+	def test_helpers(self):
+		'''The helpers that instadmg.bash runs for each path should start quickly'''
+
+		moduleNames, importSeconds = self.timeEntryPoint(['Resources/pathHelpers.py', '--normalize-path', '--supress-return', '/tmp'])
+		self.assertTrue(importSeconds < self.startupBudget / 4, 'pathHelpers.py took %.3f seconds of imports, over the budget of %.3f' % (importSeconds, self.startupBudget / 4))
+
+		moduleNames, importSeconds = self.timeEntryPoint(['Resources/dmgMountHelper.py', '--help'])
+		for thisModule in ['containerTypes', 'cacheController', 'curses', 'Foundation']:
+			self.assertFalse(thisModule in moduleNames, 'dmgMountHelper.py imported ' + thisModule)
+		self.assertTrue(importSeconds < self.startupBudget, 'dmgMountHelper.py took %.3f seconds of imports, over the budget of %.3f' % (importSeconds, self.startupBudget))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -86,6 +86,7 @@ class installerPackage:
 	
 	checksumValue			= None
 	checksumType			= None
+	fileSize				= None		# optional, in bytes
 	
 	source					= None
 	filePath				= None		# a local location to link to
@@ -93,7 +94,7 @@ class installerPackage:
 	
 	#-------------------- Instance Methods ---------------------------
 	
-	def __init__(self, sourceLocation, checksumString, displayName=None, installerChoices=None):	
+	def __init__(self, sourceLocation, checksumString, displayName=None, installerChoices=None, fileSize=None):	
 		
 		# ---- validate input and set instance variables
 		
@@ -138,6 +139,14 @@ class installerPackage:
 		else:
 			raise ValueError('Recieved an empty or invalid checksumString: ' + str(checksumString))
 		
+		# -- fileSize
+		if hasattr(fileSize, 'capitalize') and fileSize.isdigit():
+			fileSize = int(fileSize)
+		if fileSize is None or (isinstance(fileSize, (int, long)) and fileSize >= 0):
+			self.fileSize = fileSize
+		else:
+			raise ValueError('Recieved an invalid fileSize: ' + str(fileSize))
+		
 		# -- installerChoices
 		if installerChoices is not None and os.path.isfile(installerChoices):
 			self.installerChoicesPath = pathHelpers.normalizePath(installerChoices, followSymlink=True)
@@ -155,4 +164,4 @@ class installerPackage:
 		elif progressReporter is False:
 			progressReporter = None
 		
-		self.filePath = cacheController.findItem(self.source, self.checksumType, self.checksumValue, self.displayName, additionalSourceFolders, progressReporter)
+		self.filePath = cacheController.findItem(self.source, self.checksumType, self.checksumValue, self.displayName, additionalSourceFolders, progressReporter, expectedSize=self.fileSize)
@@ -2,6 +2,8 @@
 
 import os, stat, subprocess, tempfile
 
+from plistBackend		import plistBackend
+
 class managedSubprocess(subprocess.Popen):
 	'''Subprocess wrapper'''
 	
@@ -10,6 +12,15 @@ class managedSubprocess(subprocess.Popen):
 	stdoutLen			= None
 	stderrLen			= None
 	
+	@classmethod
+	def plistFromOutput(myClass, command, output):
+		'''Convert the output of a command into a plist object, raising a RuntimeError if it is not one'''
+		
+		try:
+			return plistBackend.readPlistFromString(output)
+		except ValueError, error:
+			raise RuntimeError('Unable to convert the "%s" output into a plist, got error: %s\nOutput was:\n%s\n' % (' '.join(command), error, output))
+	
 	def __init__(self, command, processAsPlist=False, **kwargs):
 		
 		if 'stdout' in kwargs or 'stderr' in kwargs:
@@ -45,16 +56,7 @@ class managedSubprocess(subprocess.Popen):
 			raise RuntimeError(errorString)
 		
 		if processAsPlist is True:
-			output = stdout.read()
-			import Foundation
-			
-			plistNSData = Foundation.NSString.stringWithString_(output).dataUsingEncoding_(Foundation.NSUTF8StringEncoding)
-			plistData, format, error = Foundation.NSPropertyListSerialization.propertyListFromData_mutabilityOption_format_errorDescription_(plistNSData, Foundation.NSPropertyListMutableContainersAndLeaves, None, None)
-			
-			if error is not None or plistData is None:
-				raise RuntimeError('Unable to convert the "%s" output into a plist, got error: %s\nOutput was:\n%s\n' % (' '.join(command), error, output))
-			
-			self._plistObject = plistData # ToDo: evaluate converting this all to python objects
+			self._plistObject = self.plistFromOutput(command, stdout.read())
 			return
 		
 		self.stdout = stdout
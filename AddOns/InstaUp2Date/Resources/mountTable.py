@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+import time, threading
+
+from managedSubprocess		import managedSubprocess
+from asyncSubprocess		import asyncSubprocess
+
+class mountTable:
+	'''A shared snapshot of what hdiutil and diskutil say about the attached images and the disks, so that asking the same question about the mounts many times only runs the command once. Snapshots are taken when first asked for, are trusted for maxAge seconds in case something else changes the mounts, and are all thrown away whenever a command that changes the mounts is run through runCommand. Errors are kept as well, so asking diskutil about something that is not a disk is only done once.'''
+	
+	# ------ class variables
+	
+	hdiutilPath				= '/usr/bin/hdiutil'
+	diskutilPath			= '/usr/sbin/diskutil'
+	
+	maxAge					= 5			# seconds a snapshot is trusted for
+	maxConcurrent			= 8			# diskutil processes run at once by prefetchDiskutilInfo
+	
+	processCount			= 0			# processes run to take snapshots or through runCommand, to see what the snapshots save
+	
+	_snapshots				= {}		# (time taken, plist object, error) by command tuple
+	_generation				= 0			# counts invalidations, a snapshot started before one is not kept
+	_lock					= threading.RLock()
+	
+	# ------ class methods
+	
+	@classmethod
+	def invalidate(myClass):
+		'''Throw away all of the snapshots'''
+		
+		myClass._lock.acquire()
+		try:
+			myClass._snapshots = {}
+			myClass._generation += 1
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def countProcesses(myClass, processCount):
+		
+		myClass._lock.acquire()
+		try:
+			myClass.processCount += processCount
+			return myClass._generation
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def storeSnapshot(myClass, command, generation, takenAt, plistObject=None, error=None):
+		
+		myClass._lock.acquire()
+		try:
+			if generation == myClass._generation:
+				myClass._snapshots[command] = (takenAt, plistObject, error)
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def cachedSnapshot(myClass, command):
+		'''Return the snapshot (time taken, plist object, error) for a command if there is a current one, otherwise None'''
+		
+		myClass._lock.acquire()
+		try:
+			thisSnapshot = myClass._snapshots.get(command)
+			if thisSnapshot is not None and time.time() - thisSnapshot[0] > myClass.maxAge:
+				del myClass._snapshots[command]
+				thisSnapshot = None
+			return thisSnapshot
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def getSnapshot(myClass, command):
+		'''Return the plist output of a command that reports on the mounts, running it only if there is no current snapshot of it. Raises the RuntimeError from managedSubprocess if the command failed.'''
+		
+		command = tuple(command)
+		
+		thisSnapshot = myClass.cachedSnapshot(command)
+		if thisSnapshot is None:
+			takenAt = time.time() # a change while it runs should not be trusted for longer
+			generation = myClass.countProcesses(1)
+			try:
+				plistObject = managedSubprocess(list(command), processAsPlist=True).getPlistObject()
+			except RuntimeError, error:
+				myClass.storeSnapshot(command, generation, takenAt, error=error)
+				raise
+			myClass.storeSnapshot(command, generation, takenAt, plistObject=plistObject)
+			return plistObject
+		
+		takenAt, plistObject, error = thisSnapshot
+		if error is not None:
+			raise error
+		return plistObject
+	
+	@classmethod
+	def hdiutilInfo(myClass):
+		'''The output of "hdiutil info -plist", the attached images'''
+		
+		return myClass.getSnapshot([myClass.hdiutilPath, 'info', '-plist'])
+	
+	@classmethod
+	def diskutilList(myClass):
+		'''The output of "diskutil list -plist", the disks and their partitions'''
+		
+		return myClass.getSnapshot([myClass.diskutilPath, 'list', '-plist'])
+	
+	@classmethod
+	def diskutilInfo(myClass, identifier):
+		'''The output of "diskutil info -plist" for a mount point, bsd name, or dev path'''
+		
+		return myClass.getSnapshot([myClass.diskutilPath, 'info', '-plist', str(identifier)])
+	
+	@classmethod
+	def prefetchDiskutilInfo(myClass, identifiers):
+		'''Take the diskutil info snapshots for the identifiers that do not have a current one, running maxConcurrent diskutil processes at a time'''
+		
+		commands = []
+		for thisIdentifier in identifiers:
+			thisCommand = (myClass.diskutilPath, 'info', '-plist', str(thisIdentifier))
+			if thisCommand not in commands and myClass.cachedSnapshot(thisCommand) is None:
+				commands.append(thisCommand)
+		
+		if len(commands) == 0:
+			return
+		
+		takenAt = time.time()
+		generation = myClass.countProcesses(len(commands))
+		for thisCommand, thisResult in zip(commands, asyncSubprocess.gather([list(thisCommand) for thisCommand in commands], maxConcurrent=myClass.maxConcurrent, returnExceptions=True, processAsPlist=True)):
+			if isinstance(thisResult, RuntimeError):
+				myClass.storeSnapshot(thisCommand, generation, takenAt, error=thisResult)
+			elif isinstance(thisResult, Exception):
+				raise thisResult
+			else:
+				myClass.storeSnapshot(thisCommand, generation, takenAt, plistObject=thisResult.getPlistObject())
+	
+	@classmethod
+	def runCommand(myClass, command, processAsPlist=False):
+		'''Run a command that changes the mounts (attach, eject, mount, unmount) with managedSubprocess, throwing away the snapshots afterwards even if it failed'''
+		
+		myClass.countProcesses(1)
+		try:
+			return managedSubprocess(command, processAsPlist=processAsPlist)
+		finally:
+			myClass.invalidate()
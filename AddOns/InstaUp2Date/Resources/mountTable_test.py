@@ -0,0 +1,165 @@
+#!/usr/bin/python
+
+import os, stat, time, plistlib, unittest
+
+from tempFolderManager		import tempFolderManager
+
+from mountTable				import mountTable
+from managedSubprocess		import managedSubprocess
+from volumeManager			import volumeManager, dmgManager
+
+class mountTableTests(unittest.TestCase):
+	'''Test that the mount snapshots save processes without going stale, using stub hdiutil and diskutil executables that log each time they are run'''
+	
+	stubFolderPath			= None
+	logPath					= None
+	
+	plistOutput				= '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n<plist version="1.0">\n<dict>\n\t<key>Identifier</key>\n\t<string>$3</string>\n</dict>\n</plist>'
+	
+	def setUp(self):
+		self.stubFolderPath = tempFolderManager.getNewTempFolder()
+		self.logPath = os.path.join(self.stubFolderPath, 'log')
+		
+		mountTable.hdiutilPath = self.makeStub('hdiutil', 'if [ "$1" = "info" ]; then echo "hdiutil: info failed" 1>&2; exit 1; fi')
+		mountTable.diskutilPath = self.makeStub('diskutil', 'case "$3" in disk*) cat <<EOF\n' + self.plistOutput + '\nEOF\n;; *) echo "Could not find disk: $3" 1>&2; exit 1;; esac')
+		mountTable.invalidate()
+		mountTable.processCount = 0
+	
+	def tearDown(self):
+		mountTable.hdiutilPath = '/usr/bin/hdiutil'
+		mountTable.diskutilPath = '/usr/sbin/diskutil'
+		mountTable.maxAge = 5
+		mountTable.invalidate()
+		mountTable.processCount = 0
+		tempFolderManager.cleanupForExit()
+	
+	def makeStub(self, name, script):
+		'''Write a shell script to stand in for a real executable that logs its arguments, returning its path'''
+		
+		stubPath = os.path.join(self.stubFolderPath, name)
+		stubFile = open(stubPath, 'w')
+		stubFile.write('#!/bin/sh\necho "%s $*" >> "%s"\n%s\n' % (name, self.logPath, script))
+		stubFile.close()
+		os.chmod(stubPath, stat.S_IRWXU)
+		
+		return stubPath
+	
+	def runCount(self):
+		'''The number of times the stubs have been run'''
+		
+		if not os.path.exists(self.logPath):
+			return 0
+		
+		logFile = open(self.logPath)
+		runCount = len(logFile.readlines())
+		logFile.close()
+		return runCount
+	
+	def test_errorsKept(self):
+		'''A failing query should only be run once, and raise the same error each time it is asked'''
+		
+		for i in range(3):
+			self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+			self.assertRaises(RuntimeError, mountTable.diskutilInfo, '/not/a/disk')
+		
+		self.assertEqual(self.runCount(), 2, 'The failing queries were run more than once each, %i processes were run' % self.runCount())
+		self.assertEqual(mountTable.processCount, 2, 'The processCount did not match the processes run, got: ' + str(mountTable.processCount))
+	
+	def test_runCommandInvalidates(self):
+		'''Running a command that changes the mounts should throw away the snapshots, even when it fails'''
+		
+		self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+		
+		mountTable.runCommand([mountTable.hdiutilPath, 'eject', '/not/a/mount'])
+		self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+		self.assertEqual(self.runCount(), 3, 'hdiutil info was not run again after an eject')
+		
+		self.assertRaises(RuntimeError, mountTable.runCommand, [mountTable.diskutilPath, 'unmount', 'force', '/not/a/mount'])
+		self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+		self.assertEqual(self.runCount(), 5, 'hdiutil info was not run again after a failed unmount')
+		self.assertEqual(mountTable.processCount, 5, 'The processCount did not match the processes run, got: ' + str(mountTable.processCount))
+	
+	def test_maxAge(self):
+		'''Snapshots should not be trusted once they are older than maxAge'''
+		
+		mountTable.maxAge = 0.5
+		
+		self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+		self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+		self.assertEqual(self.runCount(), 1, 'hdiutil info was run again before maxAge')
+		
+		time.sleep(1)
+		self.assertRaises(RuntimeError, mountTable.hdiutilInfo)
+		self.assertEqual(self.runCount(), 2, 'hdiutil info was not run again after maxAge')
+	
+	def requirePlistParser(self):
+		'''Skip the tests that read what the stubs output when plists can not be parsed here'''
+		
+		try:
+			managedSubprocess.plistFromOutput(['diskutil'], self.plistOutput)
+		except Exception, error:
+			self.skipTest('plists can not be parsed here: ' + str(error))
+	
+	def test_prefetch(self):
+		'''prefetchDiskutilInfo should take a snapshot of each identifier once, keeping the errors, so that later queries run nothing'''
+		
+		identifiers = ['disk0', 'disk0s1', 'disk0', '/not/a/disk']
+		mountTable.prefetchDiskutilInfo(identifiers)
+		self.assertEqual(self.runCount(), 3, 'prefetchDiskutilInfo did not run diskutil once for each identifier, it was run %i times' % self.runCount())
+		
+		for thisIdentifier in identifiers:
+			self.assertTrue(mountTable.cachedSnapshot((mountTable.diskutilPath, 'info', '-plist', thisIdentifier)) is not None, 'prefetchDiskutilInfo did not keep a snapshot for ' + thisIdentifier)
+		
+		mountTable.prefetchDiskutilInfo(identifiers)
+		self.assertEqual(self.runCount(), 3, 'Queries with current snapshots were run again')
+		self.assertEqual(mountTable.processCount, 3, 'The processCount did not match the processes run, got: ' + str(mountTable.processCount))
+	
+	def test_prefetchOutput(self):
+		'''The snapshots taken by prefetchDiskutilInfo should answer later queries with the output, or the error'''
+		
+		self.requirePlistParser()
+		
+		mountTable.prefetchDiskutilInfo(['disk0s1', '/not/a/disk'])
+		self.assertEqual(mountTable.diskutilInfo('disk0s1')['Identifier'], 'disk0s1', 'The snapshot for disk0s1 did not have its output')
+		self.assertRaises(RuntimeError, mountTable.diskutilInfo, '/not/a/disk')
+		self.assertEqual(self.runCount(), 2, 'Queries answered by the snapshots were run again')
+	
+	def test_volumeManagerQueries(self):
+		'''Listing the volumes and images over and over should only ask diskutil and hdiutil about each thing once, where without the snapshots they are asked every time'''
+		
+		self.requirePlistParser()
+		
+		diskInfo = {
+			'disk0':{'DeviceNode':'/dev/disk0', 'ParentWholeDisk':'disk0', 'TotalSize':2000, 'BusProtocol':'SATA'},
+			'disk0s1':{'DeviceNode':'/dev/disk0s1', 'ParentWholeDisk':'disk0', 'TotalSize':1000, 'BusProtocol':'SATA', 'MountPoint':'/', 'VolumeName':'Macintosh HD'},
+			'disk0s2':{'DeviceNode':'/dev/disk0s2', 'ParentWholeDisk':'disk0', 'TotalSize':1000, 'BusProtocol':'SATA', 'MountPoint':'/Volumes/Data', 'VolumeName':'Data'}
+		}
+		diskutilScript = 'case "$1 $3" in\n"list ") cat <<EOF\n%s\nEOF\n;;\n' % plistlib.writePlistToString({'AllDisks':sorted(diskInfo.keys())})
+		for thisDisk in sorted(diskInfo.keys()):
+			diskutilScript += '"info %s") cat <<EOF\n%s\nEOF\n;;\n' % (thisDisk, plistlib.writePlistToString(diskInfo[thisDisk]))
+		diskutilScript += '*) echo "Could not find disk: $3" 1>&2; exit 1;;\nesac'
+		
+		mountTable.diskutilPath = self.makeStub('diskutil', diskutilScript)
+		mountTable.hdiutilPath = self.makeStub('hdiutil', 'cat <<EOF\n%s\nEOF' % plistlib.writePlistToString({'images':[]}))
+		
+		def queryVolumes():
+			for i in range(3):
+				self.assertEqual(volumeManager.getMountedVolumes(), ['/Volumes/Data'], 'getMountedVolumes did not find the stub volume')
+				self.assertEqual(volumeManager.getVolumeInfo('disk0s2')['mountPath'], '/Volumes/Data', 'getVolumeInfo did not find the stub volume')
+				self.assertEqual(dmgManager.getDMGMountPoints(self.logPath), None, 'getDMGMountPoints found a stub image')
+			
+			processCount = mountTable.processCount
+			mountTable.invalidate()
+			mountTable.processCount = 0
+			return processCount
+		
+		# the same queries, with the snapshots never trusted
+		mountTable.maxAge = -1
+		unsharedCount = queryVolumes()
+		mountTable.maxAge = 5
+		sharedCount = queryVolumes()
+		
+		self.assertEqual((unsharedCount, sharedCount), (27, 5), 'Expected 27 processes without the snapshots and 5 with them, got: %i and %i' % (unsharedCount, sharedCount))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,360 @@
+#!/usr/bin/python
+
+import datetime, plistlib, struct, cStringIO
+
+from xml.parsers.expat	import ExpatError
+
+class plistBackend:
+	'''Reads and writes plists. The default backend is plistlib, with binaryPlistReader for binary plists, as importing PyObjC's Foundation is slow and it is only there on a Mac. Foundation can still be chosen with setBackend.'''
+	
+	# ------ class variables
+	
+	backend					= 'plistlib'
+	backends				= ['plistlib', 'Foundation']
+	
+	# ------ class methods
+	
+	@classmethod
+	def setBackend(myClass, backend):
+		'''Choose the backend used to read plists, raising an ImportError if it is not available here'''
+		
+		if backend not in myClass.backends:
+			raise ValueError('setBackend requires one of %s as the backend, got: %s' % (', '.join(myClass.backends), str(backend)))
+		
+		if backend == 'Foundation':
+			import Foundation
+		
+		myClass.backend = backend
+	
+	@classmethod
+	def readPlistFromString(myClass, data):
+		'''Return the object in a string holding an xml or binary plist, raising a ValueError if it does not hold one'''
+		
+		if myClass.backend == 'Foundation':
+			return myClass.readPlistWithFoundation(data)
+		
+		return myClass.readPlistFromFile(cStringIO.StringIO(data))
+	
+	@classmethod
+	def readPlist(myClass, filePath):
+		'''Return the object in an xml or binary plist file, raising a ValueError if it does not hold one'''
+		
+		plistFile = open(filePath, 'rb')
+		try:
+			if myClass.backend == 'Foundation':
+				return myClass.readPlistWithFoundation(plistFile.read())
+			return myClass.readPlistFromFile(plistFile)
+		finally:
+			plistFile.close()
+	
+	@classmethod
+	def readPlistFromFile(myClass, fileObject):
+		
+		if fileObject.read(8) == binaryPlistReader.header:
+			return binaryPlistReader(fileObject).parse()
+		fileObject.seek(0)
+		
+		try:
+			result = plistlib.readPlist(fileObject)
+		except (ExpatError, ValueError, TypeError, AttributeError), error:
+			raise ValueError('Unable to read the plist, got error: ' + str(error))
+		
+		if result is None:
+			raise ValueError('Unable to read the plist, there was no plist element in it')
+		
+		return result
+	
+	@classmethod
+	def readPlistWithFoundation(myClass, data):
+		
+		import Foundation
+		
+		plistNSData = Foundation.NSData.dataWithBytes_length_(data, len(data))
+		plistData, format, error = Foundation.NSPropertyListSerialization.propertyListFromData_mutabilityOption_format_errorDescription_(plistNSData, Foundation.NSPropertyListMutableContainersAndLeaves, None, None)
+		
+		if error is not None or plistData is None:
+			raise ValueError('Unable to read the plist, got error: ' + str(error))
+		
+		return plistData
+	
+	@classmethod
+	def writePlistToString(myClass, rootObject, binary=False):
+		'''Return a string holding the object as an xml plist, or a binary one if binary is True'''
+		
+		if binary is True:
+			return binaryPlistWriter(rootObject).getData()
+		
+		return plistlib.writePlistToString(rootObject)
+
+class binaryPlistReader(object):
+	'''Reads a binary plist (bplist00) from a file object, seeking to each object as it is needed rather than reading the whole file in'''
+	
+	#---------------------Class Variables-----------------------------
+	
+	header					= 'bplist00'
+	trailerFormat			= '>6xBBQQQ'
+	trailerLength			= struct.calcsize(trailerFormat)
+	
+	referenceDate			= datetime.datetime(2001, 1, 1) # dates are stored as seconds from this
+	
+	#--------------------Instance Variables---------------------------
+	
+	fileObject				= None
+	
+	offsets					= None		# where each object starts in the file, by reference
+	objectRefSize			= None
+	topObject				= None
+	
+	_readingRefs			= None		# the containers being read, to catch ones that contain themselves
+	
+	#-------------------- Instance Methods ---------------------------
+	
+	def __init__(self, fileObject):
+		
+		self.fileObject = fileObject
+		self._readingRefs = set()
+		
+		fileObject.seek(0, 2)
+		fileSize = fileObject.tell()
+		if fileSize < len(self.header) + self.trailerLength:
+			raise ValueError('The binary plist is too short to have a trailer')
+		
+		fileObject.seek(0)
+		if fileObject.read(len(self.header)) != self.header:
+			raise ValueError('The file is not a binary plist')
+		
+		fileObject.seek(fileSize - self.trailerLength)
+		offsetSize, self.objectRefSize, objectCount, self.topObject, offsetTableOffset = struct.unpack(self.trailerFormat, self.read(self.trailerLength))
+		
+		if offsetSize not in range(1, 9) or self.objectRefSize not in range(1, 9):
+			raise ValueError('The binary plist trailer has unusable sizes: offsets %i, references %i' % (offsetSize, self.objectRefSize))
+		if self.topObject >= objectCount or offsetTableOffset + objectCount * offsetSize > fileSize - self.trailerLength:
+			raise ValueError('The binary plist trailer does not fit the file')
+		
+		fileObject.seek(offsetTableOffset)
+		self.offsets = self.unpackIntegers(self.read(objectCount * offsetSize), offsetSize)
+	
+	def read(self, length):
+		
+		data = self.fileObject.read(length)
+		if len(data) != length:
+			raise ValueError('The binary plist ended part way through an object')
+		
+		return data
+	
+	def unpackIntegers(self, data, size):
+		'''Split the data into unsigned big-endian integers of size bytes'''
+		
+		if size in (1, 2, 4, 8):
+			return struct.unpack('>%i%s' % (len(data) / size, {1:'B', 2:'H', 4:'L', 8:'Q'}[size]), data)
+		
+		result = []
+		for position in range(0, len(data), size):
+			thisInteger = 0
+			for thisCharacter in data[position:position + size]:
+				thisInteger = (thisInteger << 8) | ord(thisCharacter)
+			result.append(thisInteger)
+		return result
+	
+	def parse(self):
+		'''Return the top object of the plist'''
+		
+		return self.readObject(self.topObject)
+	
+	def readLength(self, objectInfo):
+		'''The length of a container, which is either in the marker, or in an integer object following it'''
+		
+		if objectInfo != 0x0F:
+			return objectInfo
+		
+		marker = ord(self.read(1))
+		if marker >> 4 != 0x1:
+			raise ValueError('The binary plist had a length that was not an integer')
+		
+		return self.readInteger(marker & 0x0F)
+	
+	def readInteger(self, objectInfo):
+		
+		if objectInfo == 3:
+			return struct.unpack('>q', self.read(8))[0]
+		elif objectInfo == 4:
+			high, low = struct.unpack('>qQ', self.read(16))
+			return (high << 64) | low
+		elif objectInfo > 4:
+			raise ValueError('The binary plist had an integer of an unsupported size: %i bytes' % (1 << objectInfo))
+		
+		return self.unpackIntegers(self.read(1 << objectInfo), 1 << objectInfo)[0]
+	
+	def readObject(self, ref):
+		
+		if ref >= len(self.offsets):
+			raise ValueError('The binary plist had a reference to an object that does not exist: %i' % ref)
+		
+		self.fileObject.seek(self.offsets[ref])
+		marker = ord(self.read(1))
+		objectType, objectInfo = marker >> 4, marker & 0x0F
+		
+		if marker == 0x00:
+			return None
+		elif marker == 0x08:
+			return False
+		elif marker == 0x09:
+			return True
+		
+		elif objectType == 0x1:
+			return self.readInteger(objectInfo)
+		
+		elif objectType == 0x2:
+			if objectInfo == 2:
+				return struct.unpack('>f', self.read(4))[0]
+			elif objectInfo == 3:
+				return struct.unpack('>d', self.read(8))[0]
+			raise ValueError('The binary plist had a real of an unsupported size: %i bytes' % (1 << objectInfo))
+		
+		elif marker == 0x33:
+			return self.referenceDate + datetime.timedelta(seconds=struct.unpack('>d', self.read(8))[0])
+		
+		elif objectType == 0x4:
+			return plistlib.Data(self.read(self.readLength(objectInfo)))
+		
+		elif objectType == 0x5:
+			return self.read(self.readLength(objectInfo))
+		
+		elif objectType == 0x6:
+			result = self.read(self.readLength(objectInfo) * 2).decode('utf-16-be')
+			# plistlib also hands back plain strings when it can
+			try:
+				return result.encode('ascii')
+			except UnicodeError:
+				return result
+		
+		elif objectType == 0x8:
+			return self.unpackIntegers(self.read(objectInfo + 1), objectInfo + 1)[0]
+		
+		elif objectType in (0xA, 0xC, 0xD):
+			length = self.readLength(objectInfo)
+			if objectType == 0xD:
+				childRefs = self.unpackIntegers(self.read(length * 2 * self.objectRefSize), self.objectRefSize)
+			else:
+				childRefs = self.unpackIntegers(self.read(length * self.objectRefSize), self.objectRefSize)
+			
+			if ref in self._readingRefs:
+				raise ValueError('The binary plist had a container that contains itself')
+			self._readingRefs.add(ref)
+			try:
+				children = [self.readObject(thisRef) for thisRef in childRefs]
+			finally:
+				self._readingRefs.remove(ref)
+			
+			if objectType == 0xD:
+				return dict(zip(children[:length], children[length:]))
+			return children
+		
+		raise ValueError('The binary plist had an object of an unknown type: 0x%02x' % marker)
+
+class binaryPlistWriter(object):
+	'''Serializes an object as a binary plist (bplist00), without sharing repeated values'''
+	
+	objects					= None		# every object to be written, by reference
+	childRefs				= None		# the references of the contents of each container, by reference
+	
+	def __init__(self, rootObject):
+		
+		self.objects = []
+		self.childRefs = {}
+		self.flatten(rootObject)
+	
+	def flatten(self, thisObject):
+		'''Add the object and everything in it to objects, returning its reference'''
+		
+		ref = len(self.objects)
+		self.objects.append(thisObject)
+		
+		if isinstance(thisObject, dict):
+			keys = sorted(thisObject.keys())
+			for thisKey in keys:
+				if not hasattr(thisKey, 'capitalize'):
+					raise TypeError('Plist dictionary keys must be strings, got: ' + str(thisKey))
+			self.childRefs[ref] = [self.flatten(thisKey) for thisKey in keys] + [self.flatten(thisObject[thisKey]) for thisKey in keys]
+		elif isinstance(thisObject, (list, tuple)):
+			self.childRefs[ref] = [self.flatten(thisItem) for thisItem in thisObject]
+		
+		return ref
+	
+	def packInteger(self, value, size):
+		return struct.pack({1:'>B', 2:'>H', 4:'>L', 8:'>Q'}[size], value)
+	
+	def sizeFor(self, value):
+		'''The number of bytes needed to hold an unsigned integer'''
+		
+		for size in (1, 2, 4):
+			if value < 1 << (size * 8):
+				return size
+		return 8
+	
+	def encodeMarker(self, objectType, length):
+		
+		if length < 0x0F:
+			return chr((objectType << 4) | length)
+		return chr((objectType << 4) | 0x0F) + self.encodeInteger(length)
+	
+	def encodeInteger(self, value):
+		
+		if value < 0 or value >= 1 << 32:
+			if not -(1 << 63) <= value < 1 << 63:
+				raise OverflowError('Integers in a plist must fit in 64 bits, got: ' + str(value))
+			return '\x13' + struct.pack('>q', value)
+		
+		size = self.sizeFor(value)
+		return chr(0x10 | {1:0, 2:1, 4:2}[size]) + self.packInteger(value, size)
+	
+	def encodeObject(self, ref, refSize):
+		
+		thisObject = self.objects[ref]
+		
+		if thisObject is True:
+			return '\x09'
+		elif thisObject is False:
+			return '\x08'
+		elif isinstance(thisObject, (int, long)):
+			return self.encodeInteger(thisObject)
+		elif isinstance(thisObject, float):
+			return '\x23' + struct.pack('>d', thisObject)
+		elif isinstance(thisObject, datetime.datetime):
+			timeDifference = thisObject - binaryPlistReader.referenceDate
+			return '\x33' + struct.pack('>d', timeDifference.days * 86400 + timeDifference.seconds + timeDifference.microseconds / 1000000.0)
+		elif isinstance(thisObject, plistlib.Data):
+			return self.encodeMarker(0x4, len(thisObject.data)) + thisObject.data
+		elif hasattr(thisObject, 'capitalize'):
+			try:
+				asciiString = thisObject.encode('ascii')
+			except UnicodeError:
+				unicodeString = unicode(thisObject).encode('utf-16-be')
+				return self.encodeMarker(0x6, len(unicodeString) / 2) + unicodeString
+			return self.encodeMarker(0x5, len(asciiString)) + asciiString
+		elif isinstance(thisObject, dict):
+			return self.encodeMarker(0xD, len(thisObject)) + ''.join([self.packInteger(thisRef, refSize) for thisRef in self.childRefs[ref]])
+		elif isinstance(thisObject, (list, tuple)):
+			return self.encodeMarker(0xA, len(thisObject)) + ''.join([self.packInteger(thisRef, refSize) for thisRef in self.childRefs[ref]])
+		
+		raise TypeError('Unable to write a %s into a plist: %s' % (type(thisObject).__name__, str(thisObject)))
+	
+	def getData(self):
+		'''Return the binary plist as a string'''
+		
+		refSize = self.sizeFor(len(self.objects))
+		
+		output = [binaryPlistReader.header]
+		offsets = []
+		position = len(binaryPlistReader.header)
+		for ref in range(len(self.objects)):
+			offsets.append(position)
+			encodedObject = self.encodeObject(ref, refSize)
+			output.append(encodedObject)
+			position += len(encodedObject)
+		
+		offsetSize = self.sizeFor(position)
+		output += [self.packInteger(thisOffset, offsetSize) for thisOffset in offsets]
+		output.append(struct.pack(binaryPlistReader.trailerFormat, offsetSize, refSize, len(self.objects), 0, position))
+		
+		return ''.join(output)
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+
+import os, datetime, plistlib, unittest
+
+from tempFolderManager		import tempFolderManager
+
+from plistBackend			import plistBackend, binaryPlistReader
+
+class plistBackendTests(unittest.TestCase):
+	'''Test reading xml and binary plists without Foundation'''
+	
+	samplePlist				= {
+		'Backing Store Information':{'URL':'file://localhost/tmp/sample.dmg', 'Class Name':'CBSDBackingStore'},
+		'Checksum Value':'$0F6A1C3B',
+		'Format':'UDZO',
+		'Partitions':{'partitions':[{'partition-name':'disk image %i' % i, 'partition-start':i * 409640, 'partition-length':409600} for i in range(20)], 'block-size':512},
+		'Properties':{'Encrypted':False, 'Compressed':True, 'Software License Agreement':False},
+		'Size Information':{'Total Bytes':(1 << 40) + 7, 'Compressed Ratio':0.4215, 'Offset':-2},
+		'Volume Name':u'Disque d\'\xe9t\xe9',
+		'Created':datetime.datetime(2010, 4, 2, 13, 47, 21),
+		'Resource Fork':plistlib.Data('\x00\x01\x02' * 100)
+	}
+	
+	def tearDown(self):
+		plistBackend.backend = 'plistlib'
+		tempFolderManager.cleanupForExit()
+	
+	def test_readXML(self):
+		'''xml plists should be read with plistlib'''
+		
+		result = plistBackend.readPlistFromString(plistlib.writePlistToString(self.samplePlist))
+		self.assertEqual(result, self.samplePlist, 'The xml plist was not read back as it was written')
+	
+	def test_readBinary(self):
+		'''Binary plists should come back the same as the xml version of them, from a string or a file'''
+		
+		binaryData = plistBackend.writePlistToString(self.samplePlist, binary=True)
+		self.assertTrue(binaryData.startswith('bplist00'), 'writePlistToString did not write a binary plist')
+		self.assertEqual(plistBackend.readPlistFromString(binaryData), self.samplePlist, 'The binary plist was not read back as it was written')
+		
+		plistPath = os.path.join(tempFolderManager.getNewTempFolder(), 'sample.plist')
+		plistFile = open(plistPath, 'wb')
+		plistFile.write(binaryData)
+		plistFile.close()
+		
+		result = plistBackend.readPlist(plistPath)
+		self.assertEqual(result, self.samplePlist, 'The binary plist file was not read back as it was written')
+		self.assertEqual(type(result['Format']), str, 'An ascii string was not read as a str')
+		self.assertEqual(type(result['Volume Name']), unicode, 'A non-ascii string was not read as unicode')
+	
+	def test_largeBinary(self):
+		'''Containers with more than 14 items and plists with more than 255 objects need longer lengths and references'''
+		
+		largePlist = {'images':[{'image-path':'/tmp/image%i.dmg' % i, 'system-entities':[{'dev-entry':'/dev/disk%is%i' % (i, j)} for j in range(3)]} for i in range(100)]}
+		self.assertEqual(plistBackend.readPlistFromString(plistBackend.writePlistToString(largePlist, binary=True)), largePlist, 'A large binary plist was not read back as it was written')
+	
+	def test_badPlists(self):
+		'''Data that is not a plist should raise a ValueError'''
+		
+		for thisData in ['', 'not a plist', '<html><body></body></html>', 'bplist00', 'bplist00' + '\x00' * 40]:
+			self.assertRaises(ValueError, plistBackend.readPlistFromString, thisData)
+		
+		# a truncated binary plist
+		binaryData = plistBackend.writePlistToString(self.samplePlist, binary=True)
+		self.assertRaises(ValueError, plistBackend.readPlistFromString, binaryData[:len(binaryData) / 2] + binaryData[-binaryPlistReader.trailerLength:])
+	
+	def test_setBackend(self):
+		'''Only known backends should be accepted'''
+		
+		self.assertRaises(ValueError, plistBackend.setBackend, 'notABackend')
+		
+		plistBackend.setBackend('plistlib')
+		self.assertEqual(plistBackend.backend, 'plistlib', 'setBackend did not set the backend')
+
+if __name__ == "__main__":
+	unittest.main()
@@ -2,7 +2,7 @@
 
 import os, sys, stat, atexit, tempfile, subprocess
 
-import pathHelpers, volumeTools
+import pathHelpers
 
 class tempFolderManager(object):
 	
@@ -209,6 +209,7 @@ class tempFolderManager(object):
 		
 		# -- if this is a mount, unmount it
 		if os.path.ismount(targetPath):
+			import volumeTools # only needed for mounts, and it brings in the hdiutil and diskutil tools
 			volumeTools.unmountVolume(targetPath)
 		
 		# -- if this is in controlled space, wipe it
@@ -234,6 +235,7 @@ class tempFolderManager(object):
 					
 					# unmount the directory if it is a volume
 					if os.path.ismount(root):
+						import volumeTools
 						volumeTools.unmountVolume(root) # ToDo: log this
 						dirs = [] # make sure we don't try to decend into folders that are no longer there
 						continue
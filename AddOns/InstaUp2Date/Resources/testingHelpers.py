@@ -31,3 +31,135 @@ def generateSomeContent(containerFolder, maxFilesInFolders=10, maxSizeofFiles=10
 	if maxSubFolderDepth > 0 and maxSubFolders > 0:
 		for i in range(random.randint(1, maxSubFolders)):
 			generateSomeContent(tempfile.mkdtemp(dir=containerFolder, prefix='tmpdir-'), maxFilesInFolders=maxFilesInFolders, maxSizeofFiles=maxSizeofFiles, maxSubFolders=maxSubFolders, maxSubFolderDepth=maxSubFolderDepth - 1)
+
+def startTestHTTPServer(servedFolder, supportRanges=True):
+	'''Serve the contents of a folder over http on localhost from a background thread, with support for Range/If-Range, If-None-Match, and If-Modified-Since requests. Returns the server, which has a baseURL, and can be changed while running with: supportRanges, advertiseRanges (send Accept-Ranges even when not supporting them), failAfterBytes (cut off each response after this many bytes), chunkDelay (seconds to pause after each 64KB sent, to slow downloads down), redirects (a dict of request paths to the paths they redirect to), requestLog (a list of (method, path, headers) tuples), and bytesSent (the body bytes written so far). Connections are kept alive (HTTP/1.1), connectionCount is the number that have been opened. Call shutdown() and server_close() on it when done.'''
+	
+	import os, re, time, threading, urllib, urlparse, email.utils, BaseHTTPServer, SocketServer
+	
+	if servedFolder is None or not os.path.isdir(servedFolder):
+		raise ValueError('startTestHTTPServer was given a bad servedFolder (should be a directory): ' + str(servedFolder))
+	
+	class testRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+		
+		protocol_version = 'HTTP/1.1'
+		
+		def setup(self):
+			BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+			self.server.connectionCount += 1
+		
+		def log_message(self, format, *args):
+			pass # keep test output clean
+		
+		def do_GET(self):
+			self.sendItem(sendBody=True)
+		
+		def do_HEAD(self):
+			self.sendItem(sendBody=False)
+		
+		def sendItem(self, sendBody):
+			self.server.requestLog.append((self.command, self.path, dict(self.headers.items())))
+			
+			if self.path in self.server.redirects:
+				self.send_response(302)
+				self.send_header('Location', self.server.redirects[self.path])
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+				return
+			
+			itemPath = os.path.join(self.server.servedFolder, urllib.unquote(urlparse.urlparse(self.path).path).lstrip('/'))
+			if not os.path.isfile(itemPath):
+				# unlike send_error this keeps the connection open, folders can not be listed
+				self.send_response(os.path.isdir(itemPath) and 403 or 404)
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+				return
+			
+			itemStat = os.stat(itemPath)
+			itemSize = itemStat.st_size
+			itemETag = '"%x-%x"' % (int(itemStat.st_mtime * 1000), itemSize)
+			itemLastModified = email.utils.formatdate(itemStat.st_mtime, usegmt=True)
+			
+			if self.headers.getheader('if-none-match') == itemETag or (self.headers.getheader('if-none-match') is None and self.headers.getheader('if-modified-since') == itemLastModified):
+				self.send_response(304)
+				self.send_header('ETag', itemETag)
+				self.end_headers()
+				return
+			
+			startByte = 0
+			endByte = itemSize - 1
+			responseCode = 200
+			
+			rangeHeader = self.headers.getheader('range')
+			ifRangeHeader = self.headers.getheader('if-range')
+			if self.server.supportRanges and rangeHeader is not None and ifRangeHeader in [None, itemETag, itemLastModified]:
+				rangeMatch = re.match('^bytes=(?P<start>\d+)-(?P<end>\d*)$', rangeHeader.strip())
+				if rangeMatch is not None:
+					startByte = int(rangeMatch.group('start'))
+					if rangeMatch.group('end') != '':
+						endByte = min(int(rangeMatch.group('end')), itemSize - 1)
+					
+					if startByte >= itemSize or startByte > endByte:
+						self.send_response(416)
+						self.send_header('Content-Range', 'bytes */%i' % itemSize)
+						self.send_header('Content-Length', '0')
+						self.end_headers()
+						return
+					
+					responseCode = 206
+			
+			self.send_response(responseCode)
+			self.send_header('Content-Type', 'application/octet-stream')
+			self.send_header('Content-Length', str(endByte - startByte + 1))
+			self.send_header('ETag', itemETag)
+			self.send_header('Last-Modified', itemLastModified)
+			if self.server.supportRanges or self.server.advertiseRanges:
+				self.send_header('Accept-Ranges', 'bytes')
+			if responseCode == 206:
+				self.send_header('Content-Range', 'bytes %i-%i/%i' % (startByte, endByte, itemSize))
+			self.end_headers()
+			
+			if sendBody is False:
+				return
+			
+			bytesToSend = endByte - startByte + 1
+			if self.server.failAfterBytes is not None:
+				bytesToSend = min(bytesToSend, self.server.failAfterBytes)
+				self.close_connection = 1 # otherwise the client would wait for the rest
+			
+			itemFile = open(itemPath, 'rb')
+			itemFile.seek(startByte)
+			while bytesToSend > 0:
+				thisChunk = itemFile.read(min(bytesToSend, 64*1024))
+				if not thisChunk:
+					break
+				self.wfile.write(thisChunk)
+				self.server.bytesSent += len(thisChunk)
+				bytesToSend -= len(thisChunk)
+				if self.server.chunkDelay:
+					time.sleep(self.server.chunkDelay)
+			itemFile.close()
+	
+	class testHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+		daemon_threads = True
+		
+		def handle_error(self, request, client_address):
+			pass # clients dropping kept-alive connections are expected
+	
+	server = testHTTPServer(('127.0.0.1', 0), testRequestHandler)
+	server.servedFolder = servedFolder
+	server.supportRanges = supportRanges
+	server.advertiseRanges = False
+	server.failAfterBytes = None
+	server.chunkDelay = None
+	server.redirects = {}
+	server.requestLog = []
+	server.bytesSent = 0
+	server.connectionCount = 0
+	server.baseURL = 'http://127.0.0.1:%i/' % server.server_address[1]
+	
+	serverThread = threading.Thread(target=server.serve_forever)
+	serverThread.setDaemon(True)
+	serverThread.start()
+	
+	return server
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+import threading
+
+class typeRegistry:
+	'''Finds the subclass of a type (containerBase, actionBase) that scores highest for an item. The subclasses are gathered once per type and probed cheapest first by their scoreItemMatchCost, and since scoreItemMatch only ever returns 0 or getMatchScore() the classes that could not beat the best score found so far are never probed. The class found for each item is remembered for the life of the process.'''
+	
+	# ------ class variables
+	
+	_probes					= {}		# parentClass -> [(cost, position, maxScore, thisClass)], cheapest first
+	_matches				= {}		# getItemKey -> the class that matched
+	_lock					= threading.RLock()
+	
+	probeCount				= 0			# the number of scoreItemMatch calls made
+	
+	# ------ class methods
+	
+	@classmethod
+	def reset(myClass):
+		'''Forget the subclasses and matches, so subclasses defined since are picked up'''
+		
+		myClass._lock.acquire()
+		try:
+			myClass._probes = {}
+			myClass._matches = {}
+			myClass.probeCount = 0
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def getProbes(myClass, parentClass):
+		'''Return the (cost, position, maxScore, thisClass) of the subclasses of parentClass, cheapest first, and in getSubclasses order when the costs are the same'''
+		
+		myClass._lock.acquire()
+		try:
+			if parentClass not in myClass._probes:
+				probes = []
+				for position, thisClass in enumerate(parentClass.getSubclasses()):
+					if thisClass in [parentClass, object]:
+						continue
+					
+					# if this class does not impliment its own scoreItemMatch method, fail
+					if 'scoreItemMatch' not in thisClass.__dict__:
+						raise NotImplementedError('The %s class does not impliment its own scoreItemMatch function as required' % thisClass.__name__)
+					
+					probes.append((thisClass.scoreItemMatchCost, position, thisClass.getMatchScore(), thisClass))
+				
+				probes.sort()
+				myClass._probes[parentClass] = probes
+			
+			return myClass._probes[parentClass]
+		finally:
+			myClass._lock.release()
+	
+	@classmethod
+	def getItemKey(myClass, parentClass, inputItem, kwargs):
+		'''The key the match for this item is remembered under, or None if it can not be remembered'''
+		
+		itemKey = inputItem
+		if hasattr(inputItem, 'getInstanceKey'):
+			itemKey = (inputItem.__class__, inputItem.getInstanceKey())
+		
+		itemKey = (parentClass, itemKey, tuple(sorted(kwargs.items())))
+		try:
+			hash(itemKey)
+		except TypeError:
+			return None
+		
+		return itemKey
+	
+	@classmethod
+	def scoreItem(myClass, thisClass, inputItem, processInformation, kwargs):
+		'''Return the score thisClass gives the item, with 0 for classes that error out'''
+		
+		myClass.probeCount += 1
+		try:
+			return thisClass.scoreItemMatch(inputItem, processInformation, **kwargs)
+		except Exception:
+			# ToDo: log this
+			return 0
+	
+	@classmethod
+	def findMatch(myClass, parentClass, inputItem, processInformation, **kwargs):
+		'''Return the subclass of parentClass that gives the highest score for inputItem, or None if none match. processInformation is filled in by the scoreItemMatch methods for the init of the class'''
+		
+		itemKey = myClass.getItemKey(parentClass, inputItem, kwargs)
+		
+		# -- a remembered match only needs its own probe, to setup processInformation for the item as it is now
+		
+		myClass._lock.acquire()
+		try:
+			topScorer = myClass._matches.get(itemKey)
+		finally:
+			myClass._lock.release()
+		
+		if topScorer is not None:
+			if myClass.scoreItem(topScorer, inputItem, processInformation, kwargs) > 0:
+				return topScorer
+			
+			# the item has changed since, so look again
+			myClass._lock.acquire()
+			try:
+				myClass._matches.pop(itemKey, None)
+			finally:
+				myClass._lock.release()
+		
+		# -- probe cheapest first, skipping the classes that can not beat the best so far
+		
+		topScorer			= None
+		topScore			= 0
+		topPosition			= None
+		
+		for cost, position, maxScore, thisClass in myClass.getProbes(parentClass):
+			
+			# the earlier class in getSubclasses wins a tie, as it always has
+			if topScorer is not None and (maxScore < topScore or (maxScore == topScore and position > topPosition)):
+				continue
+			
+			if not thisClass.couldMatchItem(inputItem, **kwargs):
+				continue
+			
+			thisScore = myClass.scoreItem(thisClass, inputItem, processInformation, kwargs)
+			if thisScore > topScore or (thisScore > 0 and thisScore == topScore and position < topPosition):
+				topScorer = thisClass
+				topScore = thisScore
+				topPosition = position
+		
+		if topScorer is not None and itemKey is not None:
+			myClass._lock.acquire()
+			try:
+				myClass._matches[itemKey] = topScorer
+			finally:
+				myClass._lock.release()
+		
+		return topScorer
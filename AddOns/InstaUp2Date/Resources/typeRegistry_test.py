@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+import unittest
+
+from typeRegistry			import typeRegistry
+
+class probeBase(object):
+	'''A stand-in for containerBase, with scoreItemMatch recording the classes probed'''
+	
+	matchScoreIncrement		= 5
+	scoreItemMatchCost		= 1
+	
+	probed					= []		# the names of the classes scoreItemMatch was called on, in order
+	matches					= {}		# class name -> the items it matches
+	
+	@classmethod
+	def getSubclasses(myClass):
+		classList = myClass.__subclasses__()
+		for thisClass in myClass.__subclasses__():
+			classList += thisClass.getSubclasses()
+		return classList
+	
+	@classmethod
+	def getMatchScore(myClass):
+		if myClass is not probeBase:
+			return myClass.__mro__[1].getMatchScore() + myClass.matchScoreIncrement
+		return myClass.matchScoreIncrement
+	
+	@classmethod
+	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+		raise NotImplementedError('This method is virtual, and should be implimented in the subclasses')
+	
+	@classmethod
+	def couldMatchItem(myClass, inputItem, **kwargs):
+		return True
+	
+	@classmethod
+	def probe(myClass, inputItem, processInformation):
+		probeBase.probed.append(myClass.__name__)
+		processInformation[myClass.__name__] = True
+		if inputItem in probeBase.matches.get(myClass.__name__, []):
+			return myClass.getMatchScore()
+		return 0
+
+class cheapItem(probeBase):					# scores 10
+	@classmethod
+	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+		return myClass.probe(inputItem, processInformation)
+
+class otherCheapItem(probeBase):			# scores 10, and loses ties to cheapItem
+	@classmethod
+	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+		return myClass.probe(inputItem, processInformation)
+
+class costlyItem(cheapItem):				# scores 15
+	scoreItemMatchCost		= 10
+	
+	@classmethod
+	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+		return myClass.probe(inputItem, processInformation)
+
+class costliestItem(costlyItem):			# scores 20, but never for items starting with "plain"
+	scoreItemMatchCost		= 20
+	
+	@classmethod
+	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+		return myClass.probe(inputItem, processInformation)
+	
+	@classmethod
+	def couldMatchItem(myClass, inputItem, **kwargs):
+		return not inputItem.startswith('plain')
+
+class brokenItem(probeBase):				# errors out, so should be passed over
+	scoreItemMatchCost		= 2
+	
+	@classmethod
+	def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+		probeBase.probed.append(myClass.__name__)
+		raise RuntimeError('this probe always fails')
+
+class typeRegistryTests(unittest.TestCase):
+	'''Test that the type registry probes cheapest first and remembers the matches'''
+	
+	def setUp(self):
+		typeRegistry.reset()
+		probeBase.probed = []
+		probeBase.matches = {}
+	
+	def tearDown(self):
+		typeRegistry.reset()
+	
+	def findMatch(self, inputItem, **kwargs):
+		'''Return the name of the class matched and the names of the classes probed'''
+		
+		probeBase.probed = []
+		processInformation = { 'instanceKeys':{} }
+		matchedClass = typeRegistry.findMatch(probeBase, inputItem, processInformation, **kwargs)
+		
+		for thisClass in probeBase.probed:
+			self.assertTrue(thisClass in processInformation or thisClass == 'brokenItem', 'processInformation was not passed to the %s probe' % thisClass)
+		
+		if matchedClass is None:
+			return None, probeBase.probed
+		return matchedClass.__name__, probeBase.probed
+	
+	def test_cheapestFirst(self):
+		'''The classes should be probed cheapest first, with the costly ones only run when they could win'''
+		
+		probeBase.matches = {'cheapItem':['a', 'b'], 'otherCheapItem':['a'], 'costlyItem':['b'], 'costliestItem':['b']}
+		
+		# the classes that can only tie are passed over, the costly classes could still win
+		self.assertEqual(self.findMatch('a'), ('cheapItem', ['cheapItem', 'costlyItem', 'costliestItem']))
+		self.assertEqual(self.findMatch('b'), ('costliestItem', ['cheapItem', 'costlyItem', 'costliestItem']))
+		
+		# classes ruled out by couldMatchItem are not probed
+		probeBase.matches = {'cheapItem':['plainItem']}
+		self.assertEqual(self.findMatch('plainItem'), ('cheapItem', ['cheapItem', 'costlyItem']))
+		
+		# with nothing matching everything is probed, and the broken class passed over
+		probeBase.matches = {'costliestItem':['c']}
+		self.assertEqual(self.findMatch('c'), ('costliestItem', ['cheapItem', 'otherCheapItem', 'brokenItem', 'costlyItem', 'costliestItem']))
+		
+		self.assertEqual(self.findMatch('noMatch'), (None, ['cheapItem', 'otherCheapItem', 'brokenItem', 'costlyItem', 'costliestItem']))
+	
+	def test_ties(self):
+		'''When scores are the same the class earlier in getSubclasses should win, whatever the costs'''
+		
+		otherCheapItem.scoreItemMatchCost = 0
+		try:
+			probeBase.matches = {'cheapItem':['a'], 'otherCheapItem':['a']}
+			self.assertEqual(self.findMatch('a')[0], 'cheapItem')
+		finally:
+			del otherCheapItem.scoreItemMatchCost
+	
+	def test_memoized(self):
+		'''A remembered match should only probe the class that matched, until it stops matching'''
+		
+		probeBase.matches = {'cheapItem':['a'], 'costliestItem':['b']}
+		self.findMatch('a')
+		self.findMatch('b')
+		
+		self.assertEqual(self.findMatch('a'), ('cheapItem', ['cheapItem']))
+		self.assertEqual(self.findMatch('b'), ('costliestItem', ['costliestItem']))
+		
+		# different kwargs are remembered seperately
+		self.assertEqual(self.findMatch('a', shadowFile='/tmp/shadow'), ('cheapItem', ['cheapItem', 'costlyItem', 'costliestItem']))
+		
+		# the item changed, so the match has to be found again
+		probeBase.matches = {'otherCheapItem':['a']}
+		self.assertEqual(self.findMatch('a'), ('otherCheapItem', ['cheapItem', 'cheapItem', 'otherCheapItem', 'costlyItem', 'costliestItem']))
+		self.assertEqual(self.findMatch('a'), ('otherCheapItem', ['otherCheapItem']))
+	
+	def test_notImplemented(self):
+		'''A subclass without its own scoreItemMatch should be an error'''
+		
+		class unscoredBase(object):
+			@classmethod
+			def getSubclasses(myClass):
+				return myClass.__subclasses__()
+			
+			@classmethod
+			def scoreItemMatch(myClass, inputItem, processInformation, **kwargs):
+				raise NotImplementedError('This method is virtual, and should be implimented in the subclasses')
+		
+		class unscoredItem(unscoredBase):
+			scoreItemMatchCost		= 1
+		
+		self.assertRaises(NotImplementedError, typeRegistry.findMatch, unscoredBase, 'a', {})
+
+if __name__ == "__main__":
+	unittest.main()
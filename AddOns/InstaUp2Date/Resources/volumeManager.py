@@ -1,11 +1,13 @@
 #!/usr/bin/python
 
-import os, subprocess, Foundation
+import os, subprocess
 
 import pathHelpers
 import volumeTools
 
 from managedSubprocess import managedSubprocess
+from mountTable import mountTable
+from plistBackend import plistBackend
 from tempFolderManager import tempFolderManager
 
 class volumeManager(object):
@@ -44,12 +46,16 @@ class volumeManager(object):
 		if not hasattr(identifier, 'capitalize'):
 			raise ValueError('getVolumeInfo requires a path, bsd name, or a dev path. Got: ' + str(identifier))
 		
-		command = ['/usr/sbin/diskutil', 'info', '-plist', str(identifier)]
 		try:
-			process = managedSubprocess(command, processAsPlist=True)
+			volumeProperties = mountTable.diskutilInfo(identifier)
 		except RuntimeError, error:
 			raise ValueError('The input to getVolumeInfo does not look like it was valid: ' + str(identifier) + "\nError:\n" + str(error))
-		volumeProperties = process.getPlistObject()
+		
+		return myClass.volumeInfoFromPlist(volumeProperties)
+	
+	@classmethod
+	def volumeInfoFromPlist(myClass, volumeProperties):
+		'''Convert the output of "diskutil info -plist" into the information returned by getVolumeInfo'''
 		
 		# ToDo: validate things
 		
@@ -101,15 +107,16 @@ class volumeManager(object):
 	@classmethod
 	def getMountedVolumes(myClass, excludeRoot=True):
 		
-		diskutilArguments = ['/usr/sbin/diskutil', 'list', '-plist']
-		diskutilProcess = managedSubprocess(diskutilArguments, processAsPlist=True)
-		diskutilOutput = diskutilProcess.getPlistObject()
+		diskutilOutput = mountTable.diskutilList()
 		
 		if not "AllDisks" in diskutilOutput or not hasattr(diskutilOutput["AllDisks"], '__iter__'):
 			raise RuntimeError('Error: The output from diksutil list does not look right:\n%s\n' % str(diskutilOutput))  
 		
 		possibleDisks = []
 		
+		# diskutil is slow to answer, so ask about every disk at once
+		mountTable.prefetchDiskutilInfo(diskutilOutput["AllDisks"])
+		
 		for thisDisk in diskutilOutput["AllDisks"]:
 			
 			# get the mount
@@ -138,9 +145,9 @@ class volumeManager(object):
 		if not os.path.isfile(os.path.join(mountPoint, "System/Library/CoreServices/SystemVersion.plist")):
 			raise ValueError('The item given does not seem to be a MacOS X volume: ' + mountPoint)
 		
-		plistNSData = Foundation.NSData.dataWithContentsOfFile_(os.path.join(mountPoint, "System/Library/CoreServices/SystemVersion.plist"))
-		plistData, format, error = Foundation.NSPropertyListSerialization.propertyListFromData_mutabilityOption_format_errorDescription_(plistNSData, Foundation.NSPropertyListMutableContainersAndLeaves, None, None)
-		if error:
+		try:
+			plistData = plistBackend.readPlist(os.path.join(mountPoint, "System/Library/CoreServices/SystemVersion.plist"))
+		except ValueError, error:
 			raise RuntimeError('Unable to get ther version of MacOS on volume: "%s". Error was: %s' % (mountPoint, str(error)))
 		
 		if not ("ProductBuildVersion" in plistData and "ProductUserVisibleVersion" in plistData):
@@ -368,9 +375,7 @@ class dmgManager(volumeManager):
 		if not os.path.exists(dmgFilePath):
 			raise ValueError('getDMGMountPoint called with a dmgFilePath that does not exist: ' + dmgFilePath)
 		
-		hdiutilArguments = ['/usr/bin/hdiutil', 'info', '-plist']
-		hdiutilProcess = managedSubprocess(hdiutilArguments, processAsPlist=True)
-		hdiutilOutput = hdiutilProcess.getPlistObject()
+		hdiutilOutput = mountTable.hdiutilInfo()
 		
 		if 'images' in hdiutilOutput:
 			for thisDMG in hdiutilOutput['images']:
@@ -483,7 +488,7 @@ class dmgManager(volumeManager):
 		
 		# -- run the command
 		
-		process = managedSubprocess(command, processAsPlist=True)
+		process = mountTable.runCommand(command, processAsPlist=True)
 		mountInfo = process.getPlistObject()
 		
 		actualMountedPath = None
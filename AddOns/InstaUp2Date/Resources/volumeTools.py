@@ -1,9 +1,9 @@
 #!/usr/bin/python
 
-import os, subprocess
+import os
 
 import pathHelpers
-from managedSubprocess	import managedSubprocess
+from mountTable			import mountTable
 
 def getDiskutilInfo(identifier):
 	'''Return the following information about the mount point, bsd name, or dev path provided: mountPath, volumeName, bsdPath, volumeFormat, diskType, bsdName, diskBsdName, volumeSizeInBytes, volumeUuid'''
@@ -11,12 +11,15 @@ def getDiskutilInfo(identifier):
 	if not hasattr(identifier, 'capitalize'):
 		raise ValueError('getVolumeInfo requires a path, bsd name, or a dev path. Got: ' + str(identifier))
 	
-	command = ['/usr/sbin/diskutil', 'info', '-plist', str(identifier)]
 	try:
-		process = managedSubprocess(command, processAsPlist=True)
+		volumeProperties = mountTable.diskutilInfo(identifier)
 	except RuntimeError, error:
 		raise ValueError('The input to getVolumeInfo does not look like it was valid: ' + str(identifier) + "\nError:\n" + str(error))
-	volumeProperties = process.getPlistObject()
+	
+	return diskutilInfoFromPlist(volumeProperties)
+
+def diskutilInfoFromPlist(volumeProperties):
+	'''Convert the output of "diskutil info -plist" into the information returned by getDiskutilInfo'''
 	
 	# ToDo: validate things
 	
@@ -67,15 +70,16 @@ def getDiskutilInfo(identifier):
 
 def getMountedVolumes(excludeRoot=True):
 		
-	diskutilArguments = ['/usr/sbin/diskutil', 'list', '-plist']
-	diskutilProcess = managedSubprocess(diskutilArguments, processAsPlist=True)
-	diskutilOutput = diskutilProcess.getPlistObject()
+	diskutilOutput = mountTable.diskutilList()
 	
 	if not "AllDisks" in diskutilOutput or not hasattr(diskutilOutput["AllDisks"], '__iter__'):
 		raise RuntimeError('Error: The output from diksutil list does not look right:\n%s\n' % str(diskutilOutput))  
 	
 	mountedVolumes = []
 	
+	# diskutil is slow to answer, so ask about every disk at once
+	mountTable.prefetchDiskutilInfo(diskutilOutput["AllDisks"])
+	
 	for thisVolume in diskutilOutput["AllDisks"]:
 		
 		# get the mount
@@ -106,17 +110,15 @@ def unmountVolume(targetPath):
 	
 	# check to see if this is a disk image
 	isMountedDMG = False
-	command = ['/usr/bin/hdiutil', 'info', '-plist']
-	process = managedSubprocess(command, processAsPlist=True)
-	plistData = process.getPlistObject()
+	plistData = mountTable.hdiutilInfo()
 	
 	if not hasattr(plistData, 'has_key') or not plistData.has_key('images') or not hasattr(plistData['images'], '__iter__'):
-		raise RuntimeError('The "%s" output does not have an "images" array as expected. Output was:\n%s' % (' '.join(command), output))
+		raise RuntimeError('The "hdiutil info" output does not have an "images" array as expected. Output was:\n%s' % str(plistData))
 	
 	for thisImage in plistData['images']:
 	
 		if not hasattr(thisImage, '__iter__') or not thisImage.has_key('system-entities') or not hasattr(thisImage['system-entities'], '__iter__'):
-			raise RuntimeError('The "%s" output had an image entry that was not formed as expected. Output was:\n%s' % (' '.join(command), output))
+			raise RuntimeError('The "hdiutil info" output had an image entry that was not formed as expected. Output was:\n%s' % str(plistData))
 		
 		for thisEntry in thisImage['system-entities']:
 			if thisEntry.has_key('mount-point') and os.path.samefile(thisEntry['mount-point'], targetPath):
@@ -127,24 +129,26 @@ def unmountVolume(targetPath):
 	if isMountedDMG is True:
 		# ToDo: log this
 		command = ['/usr/bin/hdiutil', 'eject', targetPath]
-		process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		
-		if process.wait() != 0 and os.path.ismount(targetPath):
-			# try again with a bit more force
-			# ToDo: log this
-			
-			command = ['/usr/bin/hdiutil', 'eject', '-force', targetPath]
-			managedSubprocess(command)
+		try:
+			mountTable.runCommand(command)
+		except RuntimeError:
+			if os.path.ismount(targetPath):
+				# try again with a bit more force
+				# ToDo: log this
+				
+				command = ['/usr/bin/hdiutil', 'eject', '-force', targetPath]
+				mountTable.runCommand(command)
 	
 	else:
 		# a non dmg mount point
 		# ToDo: log this
 		command = ['/usr/sbin/diskutil', 'unmount', targetPath]
-		process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		
-		if process.wait() != 0 and os.path.ismount(targetPath):
-			# try again with a bit more force
-			# ToDo: log this
-			
-			command = ['/usr/sbin/diskutil', 'unmount', 'force', targetPath]
-			managedSubprocess(command)
+		try:
+			mountTable.runCommand(command)
+		except RuntimeError:
+			if os.path.ismount(targetPath):
+				# try again with a bit more force
+				# ToDo: log this
+				
+				command = ['/usr/sbin/diskutil', 'unmount', 'force', targetPath]
+				mountTable.runCommand(command)
@@ -6,6 +6,7 @@ from containerTypes		import *
 from actionTypes		import *
 
 from cacheController	import cacheController
+from typeRegistry		import typeRegistry
 
 class workItem(object):
 	
@@ -44,32 +45,11 @@ class workItem(object):
 		
 		# --
 		
-		topScorer			= None
-		topScore			= 0
-		
 		processInformation	= { 'instanceKeys':{} }
 			# information to be passed along between scoreItemMatch methods and finally the init
 		
-		for thisClass in parentClass.getSubclasses():
-			if thisClass in [parentClass, object]:
-				continue
-			
-			# if this class does not impliment its own scoreItemMatch method, fail
-			if thisClass.scoreItemMatch == thisClass.__mro__[1].scoreItemMatch:
-				raise NotImplementedError('The % class does not impliment its own scoreItemMatch function as required' % thisClass.__name__)
-			
-			thisScore = 0
-			try:
-				thisScore = thisClass.scoreItemMatch(inputItem, processInformation, **kwargs)
-			except Exception, e:
-				# ToDo: log this
-				# print thisClass, e, traceback.print_exc()
-				continue
-			
-			if thisScore > topScore:
-				topScore = thisScore
-				topScorer = thisClass
-			
+		topScorer = typeRegistry.findMatch(parentClass, inputItem, processInformation, **kwargs)
+		
 		if topScorer is None:
 			sourcePath = inputItem
 			if hasattr(inputItem, 'getStoragePath'):
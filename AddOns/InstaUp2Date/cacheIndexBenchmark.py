@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import os, sys, optparse, hashlib, random, time
+
+from Resources.cacheController			import cacheController
+from Resources.tempFolderManager		import tempFolderManager
+from Resources.displayTools				import secondsToReadableTime
+
+def generateSampleCache(cacheFolder, fileCount, filesPerFolder):
+	'''Fill a folder with small files spread over subfolders, returning (name, checksum, path) for each. Every other file has its checksum in its name, like the files downloaded into a cache.'''
+	
+	sampleItems = []
+	for i in range(fileCount):
+		if i % filesPerFolder == 0:
+			currentFolder = os.path.join(cacheFolder, 'folder %i' % (i / filesPerFolder))
+			os.mkdir(currentFolder)
+		
+		contents = 'sample item %i' % i
+		checksumValue = hashlib.sha1(contents).hexdigest()
+		
+		itemName = 'item %i' % i
+		if i % 2 == 0:
+			fileName = '%s sha1-%s.dmg' % (itemName, checksumValue)
+		else:
+			fileName = itemName + '.pkg'
+		
+		itemPath = os.path.join(currentFolder, fileName)
+		sampleFile = open(itemPath, 'w')
+		sampleFile.write(contents)
+		sampleFile.close()
+		
+		sampleItems.append((itemName, checksumValue, itemPath))
+	
+	return sampleItems
+
+def timeLookups(lookups, useFolderIndex):
+	'''Find each of the items, returning the seconds it took for all of them'''
+	
+	cacheController.forgetFolderIndexes()
+	cacheController.useFolderIndex = useFolderIndex
+	
+	startTime = time.time()
+	for itemName, checksumValue, itemPath in lookups:
+		resultPath, waste = cacheController.findItemInCaches(itemName, 'sha1', checksumValue, progressReporter=None)
+		if resultPath != itemPath:
+			raise Exception('Looking for %s found: %s rather than: %s' % (itemName, resultPath, itemPath))
+	
+	return time.time() - startTime
+
+#------------------------------MAIN------------------------------
+
+if __name__ == "__main__":
+	
+	optionParser = optparse.OptionParser()
+	optionParser.add_option("-n", "--file-count", default=50000, action="store", type="int", dest="fileCount", help="The number of files in the generated cache (default 50000)")
+	optionParser.add_option("-p", "--files-per-folder", default=500, action="store", type="int", dest="filesPerFolder", help="The number of files in each subfolder of the generated cache (default 500)")
+	optionParser.add_option("-l", "--lookups", default=20, action="store", type="int", dest="lookups", help="The number of items to look up (default 20)")
+	
+	(options, args) = optionParser.parse_args()
+	
+	if options.fileCount < 1 or options.filesPerFolder < 1 or options.lookups < 1:
+		optionParser.error('The file count, files per folder, and lookups must all be at least 1')
+	
+	cacheFolder = tempFolderManager.getNewTempFolder()
+	
+	try:
+		sys.stdout.write('Generating a cache of %i files... ' % options.fileCount)
+		sys.stdout.flush()
+		startTime = time.time()
+		sampleItems = generateSampleCache(cacheFolder, options.fileCount, options.filesPerFolder)
+		print('done in %s' % secondsToReadableTime(time.time() - startTime))
+		
+		cacheController.addSourceFolders(cacheFolder)
+		
+		# a mix of items found by the checksum in their names and by name alone
+		lookups = random.sample(sampleItems, min(options.lookups, len(sampleItems)))
+		
+		# warm the filesystem cache so the first case is not penalized
+		timeLookups(lookups[:1], False)
+		
+		walkSeconds = timeLookups(lookups, False)
+		print('%-32s %10.3f seconds (%.4f per item)' % ('walking the folders each time', walkSeconds, walkSeconds / len(lookups)))
+		
+		indexSeconds = timeLookups(lookups, True)
+		print('%-32s %10.3f seconds (%.4f per item)' % ('folder index', indexSeconds, indexSeconds / len(lookups)))
+		
+		print('')
+		print('folder index speedup for %i lookups: %.1fx' % (len(lookups), walkSeconds / max(indexSeconds, 0.000001)))
+	
+	finally:
+		cacheController.useFolderIndex = True
+		cacheController.forgetFolderIndexes()
+		tempFolderManager.cleanupForExit()
+	
+	sys.exit(0)
@@ -4,7 +4,7 @@ import os, sys, optparse, hashlib, urlparse
 
 import Resources.pathHelpers			as pathHelpers
 import Resources.commonConfiguration	as commonConfiguration
-from Resources.checksum					import checksum
+from Resources.checksum					import checksum, treeDigestVersions
 from Resources.displayTools				import statusHandler	
 
 #------------------------------MAIN------------------------------
@@ -18,6 +18,9 @@ if __name__ == "__main__":
 	else:
 		optionParser.add_option("-a", "--checksum-algorithm", default="sha1", action="store", dest="checksumAlgorithm", help="Disable progress notifications")
 	
+	optionParser.add_option("", "--tree-digest-version", default=1, action="store", type="choice", dest="treeDigestVersion", choices=[str(x) for x in treeDigestVersions], help="The digest format to use for folders, 2 checksums the files in parallel (default 1)")
+	optionParser.add_option("-j", "--jobs", default=None, action="store", type="int", dest="treeWorkerCount", help="The number of files to checksum at once when using --tree-digest-version 2")
+	
 	optionParser.add_option("-d", "--disable-progress", default=True, action="store_false", dest="reportProgress", help="Disable progress notifications")
 	optionParser.add_option("-s", "--chunk-size", default=None, action="store", type="int", dest="chunkSize", help="The size in bytes to use as a buffer")
 	
@@ -71,21 +74,26 @@ if __name__ == "__main__":
 			else:
 				progressReporter = statusHandler(taskMessage=os.path.basename(location) + " ")
 			
-		data = checksum(location, checksumType=options.checksumAlgorithm, progressReporter=progressReporter, outputFolder=thisOutputLocation, checksumInFileName=options.checksumInFileName)
+		data = checksum(location, checksumType=options.checksumAlgorithm, progressReporter=progressReporter, outputFolder=thisOutputLocation, checksumInFileName=options.checksumInFileName, treeDigestVersion=int(options.treeDigestVersion), treeWorkerCount=options.treeWorkerCount)
+		
+		# the size column only applies to files
+		sizeColumn = []
+		if data.get('size') is not None:
+			sizeColumn = ['size=' + str(data['size'])]
 		
 		dataLine = ""
 		normalizedPath = pathHelpers.normalizePath(location)
 		
 		# in the standardCacheFolder
 		if parsedURL.scheme is '' and pathHelpers.pathInsideFolder(location, commonConfiguration.standardCacheFolder) and hasattr(os.path, 'relpath'): # relpath is python 2.6
-			dataLine = "\t".join(["", os.path.splitext(data['name'])[0], os.path.relpath(normalizedPath, commonConfiguration.standardCacheFolder), data['checksumType'] + ":" + data['checksum']])
+			dataLine = "\t".join(["", os.path.splitext(data['name'])[0], os.path.relpath(normalizedPath, commonConfiguration.standardCacheFolder), data['checksumType'] + ":" + data['checksum']] + sizeColumn)
 		
 		# in the standardUserItemsFolder
 		if parsedURL.scheme is '' and pathHelpers.pathInsideFolder(location, commonConfiguration.standardUserItemsFolder) and hasattr(os.path, 'relpath'): # relpath is python 2.6
-			dataLine = "\t".join(["", os.path.splitext(data['name'])[0], os.path.relpath(normalizedPath, commonConfiguration.standardUserItemsFolder), data['checksumType'] + ":" + data['checksum']])
+			dataLine = "\t".join(["", os.path.splitext(data['name'])[0], os.path.relpath(normalizedPath, commonConfiguration.standardUserItemsFolder), data['checksumType'] + ":" + data['checksum']] + sizeColumn)
 			
 		else:
-			dataLine = "\t".join(["", os.path.splitext(data['name'])[0], location, data['checksumType'] + ":" + data['checksum']])
+			dataLine = "\t".join(["", os.path.splitext(data['name'])[0], location, data['checksumType'] + ":" + data['checksum']] + sizeColumn)
 		
 		if progressReporter is not None:
 			progressReporter.update(taskMessage=dataLine)
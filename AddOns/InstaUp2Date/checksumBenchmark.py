@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import os, sys, optparse, hashlib, time
+
+from Resources.checksum					import checksumFileObject
+from Resources.tempFolderManager		import tempFolderManager
+from Resources.displayTools				import bytesToRedableSize, secondsToReadableTime
+
+def generateSampleFile(filePath, sizeInMiB):
+	'''Write a file of the given size, repeating a block of random data so that generating it is quick'''
+	
+	sampleBlock = os.urandom(1024*1024)
+	
+	sampleFile = open(filePath, 'wb')
+	for i in range(sizeInMiB):
+		sampleFile.write(sampleBlock)
+	sampleFile.close()
+
+def timeChecksum(filePath, checksumType, chunkSize, copyToPath, useFastPath):
+	'''Checksum the file once, returning the number of bytes processed and the seconds it took'''
+	
+	hashGenerator = hashlib.new(checksumType)
+	readFile = open(filePath, 'rb')
+	
+	startTime = time.time()
+	processedBytes, processSeconds = checksumFileObject(hashGenerator, readFile, os.path.basename(filePath), os.path.getsize(filePath), chunkSize=chunkSize, copyToPath=copyToPath, useFastPath=useFastPath)
+	
+	readFile.close()
+	if copyToPath is not None:
+		os.unlink(copyToPath)
+	
+	return (processedBytes, time.time() - startTime)
+
+#------------------------------MAIN------------------------------
+
+if __name__ == "__main__":
+	
+	optionParser = optparse.OptionParser()
+	optionParser.add_option("-s", "--size", default=2048, action="store", type="int", dest="sizeInMiB", help="The size of the generated file in MiB (default 2048)")
+	optionParser.add_option("-c", "--chunk-size", default=1024*1024, action="store", type="int", dest="chunkSize", help="The size in bytes to use as a buffer (default 1 MiB, what checksum uses for local files)")
+	optionParser.add_option("-a", "--checksum-algorithm", default="sha1", action="store", dest="checksumAlgorithm", help="The checksum type to use (default sha1)")
+	optionParser.add_option("-r", "--repeat", default=3, action="store", type="int", dest="repeat", help="Run each case this many times and report the best (default 3)")
+	optionParser.add_option("-f", "--folder", default=None, action="store", type="string", dest="folder", help="Generate the sample file in this folder rather than a temporary one")
+	
+	(options, args) = optionParser.parse_args()
+	
+	try:
+		hashlib.new(options.checksumAlgorithm)
+	except ValueError:
+		optionParser.error("Hash type: %s is not supported by hashlib" % options.checksumAlgorithm)
+	
+	if options.folder is not None and not os.path.isdir(options.folder):
+		optionParser.error('The folder given does not exist, or is not a folder: ' + str(options.folder))
+	
+	workFolder = options.folder or tempFolderManager.getNewTempFolder()
+	sampleFilePath = os.path.join(workFolder, 'checksumBenchmark.sample')
+	copyFilePath = os.path.join(workFolder, 'checksumBenchmark.copy')
+	
+	try:
+		sys.stdout.write('Generating a %s sample file... ' % bytesToRedableSize(options.sizeInMiB * 1024 * 1024))
+		sys.stdout.flush()
+		startTime = time.time()
+		generateSampleFile(sampleFilePath, options.sizeInMiB)
+		print('done in %s' % secondsToReadableTime(time.time() - startTime))
+		
+		# warm the cache so the first case is not penalized
+		timeChecksum(sampleFilePath, options.checksumAlgorithm, options.chunkSize, None, True)
+		
+		results = {}
+		for caseName, copyToPath, useFastPath in [('checksum (read)', None, False), ('checksum (fast path)', None, True), ('checksum and copy (read)', copyFilePath, False), ('checksum and copy (fast path)', copyFilePath, True)]:
+			bestSeconds = None
+			for i in range(max(1, options.repeat)):
+				processedBytes, processSeconds = timeChecksum(sampleFilePath, options.checksumAlgorithm, options.chunkSize, copyToPath, useFastPath)
+				if bestSeconds is None or processSeconds < bestSeconds:
+					bestSeconds = processSeconds
+			
+			results[caseName] = (processedBytes / (1024.0 * 1024.0)) / max(bestSeconds, 0.000001)
+			print('%-32s %10.1f MB/s' % (caseName, results[caseName]))
+		
+		print('')
+		print('fast path speedup: checksum %.2fx, checksum and copy %.2fx' % (results['checksum (fast path)'] / results['checksum (read)'], results['checksum and copy (fast path)'] / results['checksum and copy (read)']))
+	
+	finally:
+		for thisPath in [sampleFilePath, copyFilePath]:
+			if os.path.exists(thisPath):
+				os.unlink(thisPath)
+		tempFolderManager.cleanupForExit()
+	
+	sys.exit(0)
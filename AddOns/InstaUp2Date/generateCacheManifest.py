@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import os, sys, optparse, hashlib, json
+
+from Resources.cacheController			import cacheController
+from Resources.displayTools				import statusHandler
+
+#------------------------------MAIN------------------------------
+
+if __name__ == "__main__":
+	
+	optionParser = optparse.OptionParser(usage="usage: %prog [options] CACHE_FOLDER", description="Write a manifest (%s) listing the items in a folder by checksum, so that InstaUp2Date can find them without guessing their names when the folder is served as a web cache" % cacheController.remoteManifestName)
+	
+	optionParser.add_option("-a", "--checksum-algorithm", default=None, action="append", dest="checksumAlgorithms", help="A checksum type to list the items by, can be given more than once (default sha1)")
+	optionParser.add_option("-o", "--output", default=None, action="store", dest="outputPath", type="string", help="Where to write the manifest (default %s inside the folder)" % cacheController.remoteManifestName)
+	optionParser.add_option("-d", "--disable-progress", default=True, action="store_false", dest="reportProgress", help="Disable progress notifications")
+	
+	(options, args) = optionParser.parse_args()
+	
+	if len(args) != 1:
+		optionParser.error('A single cache folder is required')
+	
+	cacheFolder = args[0]
+	if not os.path.isdir(cacheFolder):
+		optionParser.error('The cache folder given does not exist, or is not a folder: ' + str(cacheFolder))
+	
+	checksumAlgorithms = options.checksumAlgorithms or ['sha1']
+	for thisAlgorithm in checksumAlgorithms:
+		try:
+			hashlib.new(thisAlgorithm)
+		except ValueError:
+			optionParser.error("Hash type: %s is not supported by hashlib" % thisAlgorithm)
+	
+	outputPath = options.outputPath or os.path.join(cacheFolder, cacheController.remoteManifestName)
+	
+	progressReporter = None
+	if options.reportProgress is True:
+		progressReporter = statusHandler(taskMessage='Generating manifest for %s' % cacheFolder)
+	
+	manifest = cacheController.generateManifest(cacheFolder, checksumTypes=checksumAlgorithms, progressReporter=progressReporter)
+	
+	# write next to the final location then move into place, so a server never hands out a half written manifest
+	temporaryPath = outputPath + '.tmp'
+	outputFile = open(temporaryPath, 'w')
+	try:
+		json.dump(manifest, outputFile, indent=1, sort_keys=True)
+	finally:
+		outputFile.close()
+	os.rename(temporaryPath, outputPath)
+	
+	itemCount = len(set([thisItem['path'] for thisItem in manifest['items'].values()]))
+	if progressReporter is not None:
+		progressReporter.update(statusMessage=' listed %i items in %s' % (itemCount, outputPath))
+		progressReporter.finishLine()
+	else:
+		print('Listed %i items in %s' % (itemCount, outputPath))
+	
+	sys.exit(0)
@@ -7,18 +7,18 @@
 __version__		= 414 # hasn't changed since Jan 2011, killing svn-based revision expansion - formerly: int('$Revision$'.split(" ")[1])
 
 import os, sys, re
-import hashlib, urlparse, subprocess, datetime
+import hashlib, urllib, urlparse, subprocess, datetime, threading, Queue, StringIO, time, socket
 
 import Resources.pathHelpers			as pathHelpers
 import Resources.commonConfiguration	as commonConfiguration
 import Resources.displayTools			as displayTools
-import Resources.findInstallerDisc		as findInstallerDisc
 import Resources.commonExceptions		as commonExceptions
-from Resources.container				import container
-from Resources.managedSubprocess		import managedSubprocess
 from Resources.tempFolderManager		import tempFolderManager
-from Resources.installerPackage			import installerPackage
 from Resources.cacheController			import cacheController
+from Resources.checksumIndex			import checksumIndex
+from Resources.cacheQuota				import cacheQuota
+
+# the rest of Resources (the container types, installerPackage, catalogLock, buildPipeline, cacheServer...) is imported where it is used, so that --help and --version do not have to load it
 
 #------------------------------SETTINGS------------------------------
 
@@ -44,7 +44,7 @@ class instaUpToDate:
 	#---------------------Class Variables-----------------------------
 	
 	sectionStartParser			= re.compile('^(?P<sectionName>[^\t]+):\s*(#.*)?$')
-	packageLineParser			= re.compile('^\t(?P<displayName>[^\t]*)\t(?P<fileLocation>[^\t]+)\t(?P<fileChecksum>(?P<checksumType>\S+):(?P<checksumValue>\S+))(\t(?P<installerChoicesFile>[^\t\n]+))?\s*(#.*)?$')
+	packageLineParser			= re.compile('^\t(?P<displayName>[^\t]*)\t(?P<fileLocation>[^\t]+)\t(?P<fileChecksum>(?P<checksumType>\S+):(?P<checksumValue>\S+))(\tsize=(?P<fileSize>\d+))?(\t(?P<installerChoicesFile>[^\t\n]+))?\s*(#.*)?$')
 	emptyLineParser				= re.compile('^\s*(?P<comment>#.*)?$')
 	settingLineParser			= re.compile('^(?P<variableName>%s)\s*[=:]\s*(?P<variableValue>.*)' % "|".join(allowedCatalogFileSettings))
 	settingLineChecksumParser	= re.compile('^(?P<variableName>%s)\s*[=:]\s*(?P<variableValue>.*)(\t(?P<fileChecksum>(?P<checksumType>\S+):(?P<checksumValue>\S+)))' % "|".join(allowedCatalogChecksumFileSettings))
@@ -75,6 +75,9 @@ class instaUpToDate:
 	
 	supportingDiscPath			= None
 	
+	lookupItems					= True	# False only collects what the catalog files reference, without looking for any of it
+	settingChecksums			= None	# an Array, of 'checksumType-checksumValue' strings from settings lines, when not looking for items
+	
 	# defaults
 	outputVolumeNameDefault		= 'Macintosh HD'
 
@@ -83,7 +86,8 @@ class instaUpToDate:
 	@classmethod
 	def getCatalogFullPath(myClass, catalogFileInput, catalogFolders):
 		'''Classmethod to translate input to a abs-path from one of the accepted formats (checked in this order):
-			- ToDo: http or https reference (will be downloaded and temporary filepath returned)
+			- http or https reference (copied into the cache folder, or revalidated if already there, and that path returned)
+			- file url
 			- absolute path to a file
 			- catalog file name within the CatalogFiles folder, with or without the .catalog extension
 			- relative path from CatalogFiles folder, with or without the .catalog extension
@@ -106,9 +110,12 @@ class instaUpToDate:
 		
 		
 		# http/https url
-		if urlparse.urlparse(catalogFileInput).scheme in ["http", "https"]:
-			raise Exception("URL catalog files are not done yet")
-			# ToDo: download the files, then return the path
+		if urlparse.urlparse(catalogFileInput).scheme.lower() in ["http", "https"]:
+			return cacheController.getRemoteCatalog(catalogFileInput)
+		
+		# file url
+		if urlparse.urlparse(catalogFileInput).scheme.lower() == "file":
+			catalogFileInput = urllib.url2pathname(urlparse.urlparse(catalogFileInput).path)
 		
 		# try it as an absolute or relative file path
 		if os.path.isfile(catalogFileInput):
@@ -129,9 +136,76 @@ class instaUpToDate:
 		
 		raise commonExceptions.CatalogNotFoundException("The file input is not one that getCatalogFullPath understands, or can find: %s" % catalogFileInput)
 		
+	@classmethod
+	def findReferencedItems(myClass, catalogFolders, catalogFiles=None):
+		'''Parse every catalog file in the catalog folders, and any other catalog files or urls given, following their include-file lines, without looking for any of the items. Returns a dict of what they reference by 'checksumType-checksumValue' string, with the installerPackage for items, or None for items from settings lines.'''
+		
+		if hasattr(catalogFolders, 'capitalize'):
+			catalogFolders = [catalogFolders]
+		
+		# nothing is put in the section folders, but every section has to have one
+		sectionFolders = [{"folderPath":tempFolderManager.getNewTempFolder(prefix='gc-'), "sections":systemSectionTypes + addedSectionTypes}]
+		
+		catalogFilePaths = []
+		for thisCatalogFolder in catalogFolders:
+			for currentFolder, dirs, files in os.walk(thisCatalogFolder):
+				for thisFileName in sorted(files):
+					if os.path.splitext(thisFileName)[1] in myClass.fileExtensions:
+						catalogFilePaths.append(os.path.join(currentFolder, thisFileName))
+		
+		if catalogFiles is not None:
+			for thisCatalogFile in catalogFiles:
+				catalogFilePaths.append(myClass.getCatalogFullPath(thisCatalogFile, catalogFolders))
+		
+		referencedItems = {}
+		for thisCatalogFilePath in catalogFilePaths:
+			thisController = myClass(thisCatalogFilePath, sectionFolders, catalogFolders, lookupItems=False)
+			thisController.parseCatalogFile()
+			
+			for checksumString in thisController.settingChecksums:
+				referencedItems.setdefault(checksumString, None)
+			for thisPackageGroup in thisController.packageGroups.values():
+				for thisItem in thisPackageGroup:
+					referencedItems['%s-%s' % (thisItem.checksumType.lower(), thisItem.checksumValue)] = thisItem
+		
+		return referencedItems
+	
+	@classmethod
+	def collectGarbage(myClass, catalogFolders, folders, removeItems=False):
+		'''Find the items in the folders (at their top level and in their content stores) that no catalog file in the catalog folders references, and remove them if removeItems is True. All of the catalog files are read before anything is removed. Items are judged by the checksum in their name and any in the checksum index, ones with neither are left alone. Returns the unreferenced items, and the number of items that could not be judged.'''
+		
+		referencedChecksums = set(myClass.findReferencedItems(catalogFolders).keys())
+		
+		unreferencedItems = []
+		unjudgedCount = 0
+		for thisFolder in folders:
+			if not os.path.isdir(thisFolder):
+				continue # web caches
+			
+			for thisItem in cacheController.listCacheItems(thisFolder):
+				itemPath = thisItem['paths'][0]
+				if itemPath.endswith(cacheController.partialDownloadSuffix) or itemPath.endswith(cacheController.partialSidecarSuffix):
+					continue
+				
+				# a catalog could use another checksum type than the one in the name
+				itemChecksums = set(['%s-%s' % (checksumType, checksumValue) for checksumType, checksumValue in checksumIndex.lookupChecksums(itemPath, checksumIndex.recordedChecksumTypes).items()])
+				if thisItem['checksum'] is not None:
+					itemChecksums.add(thisItem['checksum'])
+				
+				if len(itemChecksums) == 0:
+					unjudgedCount += 1
+				elif referencedChecksums.isdisjoint(itemChecksums):
+					unreferencedItems.append(thisItem)
+		
+		if removeItems is True:
+			for thisItem in unreferencedItems:
+				cacheController.removeCacheItem(thisItem)
+		
+		return unreferencedItems, unjudgedCount
+	
 	#------------------------Functions--------------------------------
 	
-	def __init__(self, catalogFilePath, sectionFolders, catalogFolders):
+	def __init__(self, catalogFilePath, sectionFolders, catalogFolders, lookupItems=True):
 		
 		# set up section folders structure
 		self.sectionFolders 		= []
@@ -140,6 +214,9 @@ class instaUpToDate:
 		self.parsedFiles			= []
 		
 		self.supportingDiscPath		= []
+		self.settingChecksums		= []
+		
+		self.lookupItems			= lookupItems
 				
 		# catalogFilePath
 		if not os.path.exists(catalogFilePath):
@@ -197,6 +274,8 @@ class instaUpToDate:
 	
 	def parseCatalogFile(self, fileLocation=None):
 		
+		from Resources.installerPackage		import installerPackage
+		
 		if fileLocation is None:
 			fileLocation = self.catalogFilePath
 		
@@ -257,6 +336,10 @@ class instaUpToDate:
 				checksumType	= settingLineMatch.group('checksumType')
 				checksumValue	= settingLineMatch.group('checksumValue')
 				
+				if self.lookupItems is False:
+					self.settingChecksums.append('%s-%s' % (checksumType.lower(), checksumValue))
+					continue
+				
 				# find this item in the caches by name/checksum
 				progressReporter = displayTools.statusHandler(taskMessage='\t%s: %s -' % (settingLineMatch.group("variableName"), settingLineMatch.group("variableValue")))
 				itemPath = None
@@ -283,7 +366,17 @@ class instaUpToDate:
 			# ---- file includes lines
 			includeLineMatch = self.includeLineParser.search(line)
 			if includeLineMatch:
-				self.parseCatalogFile( self.getCatalogFullPath(includeLineMatch.group("location"), self.catalogFolders) )
+				includeLocation = includeLineMatch.group("location").strip()
+				
+				# relative includes in a remote catalog are first looked for next to it on the server
+				catalogURL = cacheController.getRemoteCatalogURL(fileLocation)
+				if catalogURL is not None and urlparse.urlparse(includeLocation).scheme == '' and not os.path.isabs(includeLocation):
+					try:
+						includeLocation = self.getCatalogFullPath(urlparse.urljoin(catalogURL, includeLocation), self.catalogFolders)
+					except commonExceptions.CatalogNotFoundException:
+						pass # fall back to the catalog folders
+				
+				self.parseCatalogFile( self.getCatalogFullPath(includeLocation, self.catalogFolders) )
 				continue
 			
 			# ---- section lines
@@ -306,10 +399,12 @@ class instaUpToDate:
 					displayName				= packageLineMatch.group("displayName"),
 					sourceLocation			= packageLineMatch.group("fileLocation"),
 					checksumString			= packageLineMatch.group("fileChecksum"),
-					installerChoices		= packageLineMatch.group("installerChoicesFile")
+					installerChoices		= packageLineMatch.group("installerChoicesFile"),
+					fileSize				= packageLineMatch.group("fileSize")
 				)
 				
-				print('\t' + packageLineMatch.group("displayName"))
+				if self.lookupItems is True:
+					print('\t' + packageLineMatch.group("displayName"))
 				
 				self.packageGroups[currentSection].append(thisPackage)
 				
@@ -320,14 +415,189 @@ class instaUpToDate:
 			
 		inputfile.close()
 	
-	def findItems(self):
-		'''Find all the items verify their checksums, and download anything that is missing'''
+	def findItems(self, jobs=1, useLockFile=True):
+		'''Find all the items verify their checksums, and download anything that is missing. Items that share a checksum are only looked for once, and with jobs above 1 that many items are looked for at the same time. Items found on the last run that are unchanged since are taken from the catalog's lock file, which is re-written once everything has been found.'''
 		
-		for thisSectionName in self.packageGroups:
-			for thisItem in self.packageGroups[thisSectionName]:
+		self.findItemsForControllers([self], jobs=jobs, useLockFiles=useLockFile)
+	
+	@classmethod
+	def findItemsForControllers(myClass, controllers, jobs=1, useLockFiles=True, itemsByChecksum=None, findSeconds=None):
+		'''Find the items for all of the controllers as one plan keyed by checksum, so that an item in several catalogs is only looked for, downloaded, and verified once. Passing the same itemsByChecksum and findSeconds dicts to later calls carries the plan over to controllers found one at a time.'''
+		
+		from Resources.catalogLock			import catalogLock
+		
+		lockFiles = []
+		if useLockFiles is True:
+			lockFiles = [catalogLock(thisController.catalogFilePath) for thisController in controllers]
+		
+		# the first item with each checksum stands in for the rest
+		itemsToFind = []
+		lockedItems = []
+		duplicateItems = []			# (item, its controller, the item standing in for it, that item's controller)
+		controllerItems = {}		# per controller, the first item for each checksum string, for the lock files
+		if itemsByChecksum is None:
+			itemsByChecksum = {}	# checksum string: (item, controller)
+		for thisController in controllers:
+			thisControllerItems = {}
+			controllerItems[thisController] = thisControllerItems
+			
+			for thisSectionName in thisController.packageGroups:
+				for thisItem in thisController.packageGroups[thisSectionName]:
+					checksumString = '%s-%s' % (thisItem.checksumType, thisItem.checksumValue)
+					if checksumString not in thisControllerItems:
+						thisControllerItems[checksumString] = thisItem
+					
+					if checksumString in itemsByChecksum:
+						duplicateItems.append((thisItem, thisController) + itemsByChecksum[checksumString])
+						continue
+					
+					itemsByChecksum[checksumString] = (thisItem, thisController)
+					
+					lockedPath = None
+					for thisLockFile in lockFiles:
+						lockedPath = thisLockFile.lookupItem(thisItem.checksumType, thisItem.checksumValue)
+						if lockedPath is not None:
+							break
+					
+					if lockedPath is not None:
+						thisItem.filePath = lockedPath
+						lockedItems.append(thisItem)
+					else:
+						itemsToFind.append(thisItem)
+		
+		for thisItem in lockedItems:
+			cacheController.addItemToVerifiedFiles('%s-%s' % (thisItem.checksumType, thisItem.checksumValue), thisItem.filePath)
+			displayTools.statusHandler(taskMessage='	' + thisItem.displayName + ' -', statusMessage=' unchanged since the last run').finishLine()
+		
+		if findSeconds is None:
+			findSeconds = {}
+		if len(itemsToFind) == 0:
+			pass # everything was in the lock files
+		elif jobs is None or jobs <= 1 or len(itemsToFind) < 2:
+			for thisItem in itemsToFind:
 				# progressReporter
 				progressReporter = displayTools.statusHandler(taskMessage='	' + thisItem.displayName + ' -')
+				startTime = time.time()
 				thisItem.findItem(progressReporter=progressReporter)
+				findSeconds[thisItem] = time.time() - startTime
+		else:
+			controllers[0].findItemsInParallel(itemsToFind, jobs, findSeconds=findSeconds)
+		
+		# items shared between catalogs, counting each item once per catalog
+		sharedCount = 0
+		sharedBytes = 0
+		sharedSeconds = 0
+		
+		for thisItem, thisController, sourceItem, sourceController in duplicateItems:
+			thisItem.filePath = sourceItem.filePath
+			
+			if thisController is sourceController:
+				displayTools.statusHandler(taskMessage='	' + thisItem.displayName + ' -', statusMessage=' same checksum as ' + sourceItem.displayName).finishLine()
+				continue
+			
+			displayTools.statusHandler(taskMessage='	' + thisItem.displayName + ' -', statusMessage=' same checksum as %s in %s' % (sourceItem.displayName, sourceController.getMainCatalogName())).finishLine()
+			
+			if controllerItems[thisController]['%s-%s' % (thisItem.checksumType, thisItem.checksumValue)] is thisItem:
+				sharedCount += 1
+				sharedBytes += checksumIndex.getFingerprint(thisItem.filePath)[0]
+				sharedSeconds += findSeconds.get(sourceItem, 0)
+		
+		if sharedCount > 0:
+			print('\tFound %i items shared between catalogs only once, saving %s of verification and downloads (%s)' % (sharedCount, displayTools.bytesToRedableSize(sharedBytes), displayTools.secondsToReadableTime(sharedSeconds)))
+		
+		# record where everything was found for the next run
+		for thisController in controllers:
+			newLockFile = catalogLock(thisController.catalogFilePath, readExisting=False)
+			for thisItem in controllerItems[thisController].values():
+				newLockFile.recordItem(thisItem.checksumType, thisItem.checksumValue, thisItem.source, thisItem.filePath)
+			try:
+				newLockFile.save()
+			except (IOError, OSError), error:
+				print('\tUnable to write the lock file %s: %s' % (newLockFile.lockFilePath, str(error)))
+	
+	def findItemsInParallel(self, itemsToFind, jobs, findSeconds=None):
+		'''Find the items on a pool of worker threads, writing out each item's report once it is done so the lines do not get mixed together. The seconds each item took are recorded in findSeconds if it is given.'''
+		
+		workQueue = Queue.Queue()
+		for thisItem in itemsToFind:
+			workQueue.put(thisItem)
+		resultsQueue = Queue.Queue()
+		stopEvent = threading.Event()
+		
+		def findWorker():
+			while not stopEvent.isSet():
+				try:
+					thisItem = workQueue.get_nowait()
+				except Queue.Empty:
+					return
+				
+				outputBuffer = StringIO.StringIO()
+				progressReporter = displayTools.statusHandler(outputChannel=outputBuffer, taskMessage='	' + thisItem.displayName + ' -')
+				try:
+					startTime = time.time()
+					thisItem.findItem(progressReporter=progressReporter)
+					if findSeconds is not None:
+						findSeconds[thisItem] = time.time() - startTime
+					progressReporter.finishLine()
+					resultsQueue.put((outputBuffer.getvalue(), None))
+				except Exception:
+					# stop handing out work, the items already being looked for are allowed to finish
+					stopEvent.set()
+					progressReporter.finishLine()
+					resultsQueue.put((outputBuffer.getvalue(), sys.exc_info()))
+					return
+		
+		workers = []
+		for i in range(min(jobs, len(itemsToFind))):
+			thisWorker = threading.Thread(target=findWorker)
+			thisWorker.setDaemon(True)
+			thisWorker.start()
+			workers.append(thisWorker)
+		
+		firstError = None
+		reportedCount = 0
+		while reportedCount < len(itemsToFind):
+			try:
+				# a timeout keeps the wait interruptible
+				itemOutput, errorInfo = resultsQueue.get(True, 0.5)
+			except Queue.Empty:
+				if True in [thisWorker.isAlive() for thisWorker in workers]:
+					continue
+				if resultsQueue.empty():
+					break
+				continue
+			
+			sys.stdout.write(itemOutput)
+			sys.stdout.flush()
+			reportedCount += 1
+			
+			if errorInfo is not None and firstError is None:
+				firstError = errorInfo
+		
+		for thisWorker in workers:
+			thisWorker.join()
+		
+		if firstError is not None:
+			raise firstError[0], firstError[1], firstError[2]
+	
+	def findInstallerDiscs(self):
+		'''Find the OS installer disc, and any supporting discs, for this catalog'''
+		
+		import Resources.findInstallerDisc	as findInstallerDisc
+		
+		foundInstallerDiscs = None
+		if self.installerDiscBuilds is not None:
+			foundInstallerDiscs = findInstallerDisc.findInstallerDisc(allowedBuilds=self.installerDiscBuilds)
+		else:
+			foundInstallerDiscs = findInstallerDisc.findInstallerDisc()
+		
+		self.installerDiscPath = foundInstallerDiscs['InstallerDisc'].getStoragePath()
+		print('\tFound Installer Disc:\t' + self.installerDiscPath)
+		
+		for thisDisc in foundInstallerDiscs['SupportingDiscs']:
+			thisDiscPath = thisDisc.getStoragePath()
+			print('\tFound Supporting Disc:\t' + thisDiscPath)
+			self.supportingDiscPath.append(thisDiscPath)
 	
 	def arrangeFolders(self):
 		"Create the folder structure for InstaDMG, and pop in soft-links to the items in the cache folder"
@@ -474,6 +744,8 @@ class instaUpToDate:
 	
 	def restoreImageToVolume(self, targetVolume):
 		
+		from Resources.managedSubprocess	import managedSubprocess
+		
 		# ---- validate input and sanity check
 		
 		# targetVolume should be a container of type volume (not dmg)
@@ -504,6 +776,44 @@ class instaUpToDate:
 		rebootCommand = ['/usr/bin/osascript', '-e', 'tell application "System Events" to restart']
 		managedSubprocess(rebootCommand)
 	
+	@classmethod
+	def processControllers(myClass, controllers, jobs=1, useLockFiles=True, processWithInstaDMG=False, scratchFolder=None, outputFolder=None, restoreTarget=None):
+		'''Find the items and installer disc for each of the parsed controllers in turn on a background thread, setting up (and running InstaDMG for) each one as soon as its own are found. Items in several catalogs are only found once.'''
+		
+		from Resources.buildPipeline			import buildPipeline
+		
+		itemsByChecksum = {}	# shared between the catalogs so that items in several are only found once
+		findSeconds = {}
+		
+		def resolveController(thisController):
+			print('\nFinding and validating the sources for ' + thisController.getMainCatalogName())
+			myClass.findItemsForControllers([thisController], jobs=jobs, useLockFiles=useLockFiles, itemsByChecksum=itemsByChecksum, findSeconds=findSeconds)
+			
+			print('\nFinding the Installer disc for ' + thisController.getMainCatalogName())
+			thisController.findInstallerDiscs()
+		
+		def buildController(thisController):
+			print('\nSetting up for ' + thisController.getMainCatalogName())
+			
+			if processWithInstaDMG is False:
+				# empty the folders
+				print('\tCleaning InstaDMG folders')
+				thisController.cleanInstaDMGFolders()
+			
+			# create the folder strucutres needed
+			print('\tSetting up InstaDMG folders')
+			thisController.arrangeFolders()
+			
+			if processWithInstaDMG is True:
+				# the run succeded, and it has been requested to run InstaDMG
+				thisController.runInstaDMG(scratchFolder=scratchFolder, outputFolder=outputFolder)
+				
+				if restoreTarget is not None:
+					print('\nRestoring to volume' + restoreTarget.getDisplayName())
+					thisController.restoreImageToVolume(restoreTarget)
+		
+		buildPipeline(resolveController, buildController).run(controllers)
+	
 #--------------------------------MAIN--------------------------------
 
 def main ():
@@ -539,6 +849,18 @@ def main ():
 	optionsParser.add_option('', '--add-catalog-folder', action='append', default=None, type='string', dest='catalogFolders', help='Set the folders searched for catalog files', metavar="FILE_PATH")
 	optionsParser.add_option('', '--set-cache-folder', action='store', default=None, type='string', dest='cacheFolder', help='Set the folder used to store downloaded files', metavar="FILE_PATH")
 	optionsParser.add_option('', '--add-source-folder', action='append', default=[], type='string', dest='searchFolders', help='Set the folders searched for items to install', metavar="FILE_PATH")
+	optionsParser.add_option('-j', '--jobs', action='store', default=1, type='int', dest='jobs', help='Look for and download up to this many items at the same time (default 1)', metavar="COUNT")
+	optionsParser.add_option('', '--connections-per-host', action='store', default=cacheController.maxConnectionsPerHost, type='int', dest='connectionsPerHost', help='Limit the number of simultaneous downloads from any one server when using --jobs (default %i)' % cacheController.maxConnectionsPerHost, metavar="COUNT")
+	optionsParser.add_option('', '--download-segments', action='store', default=cacheController.downloadSegmentCount, type='int', dest='downloadSegments', help='Download large items from servers that support it as this many ranges (default %i, a single connection), over as many connections as --connections-per-host leaves free' % cacheController.downloadSegmentCount, metavar="COUNT")
+	optionsParser.add_option('', '--ignore-lock-files', action='store_false', default=True, dest='useLockFiles', help='Look for every item again rather than trusting the items recorded in each catalog\'s lock file by the last run, the lock files are still re-written')
+	optionsParser.add_option('', '--cache-quota', action='store', default=None, type='string', dest='cacheQuota', help='Keep the cache folder under this size, as a size such as 20G or a percentage of its volume such as 80%, evicting items that no catalog in the catalog folders uses before downloading', metavar="SIZE")
+	optionsParser.add_option('', '--eviction-policy', action='store', default=cacheQuota.evictionPolicy, type='choice', choices=cacheQuota.evictionPolicies, dest='evictionPolicy', help='Which items are evicted first to stay under the --cache-quota: "lru" the ones used longest ago, "lfu" the ones used the fewest times (default %s)' % cacheQuota.evictionPolicy, metavar="lru|lfu")
+	optionsParser.add_option('', '--gc', action='store_true', default=False, dest='garbageCollect', help='Instead of processing catalog files, list the items in the cache folder that no catalog file in the catalog folders uses, and how much space they take')
+	optionsParser.add_option('', '--gc-source-folders', action='store_true', default=False, dest='gcSourceFolders', help='With --gc also list the unused items in the source folders')
+	optionsParser.add_option('', '--gc-remove', action='store_true', default=False, dest='gcRemove', help='With --gc remove the unused items rather than just listing them')
+	optionsParser.add_option('', '--serve-cache', action='store', default=None, type='int', dest='serveCachePort', help='Instead of processing catalog files, serve the cache folder over http on this port, for other hosts to use with --add-source-folder. Items the catalog files in the catalog folders download from http servers are fetched into the cache folder the first time they are asked for.', metavar="PORT")
+	optionsParser.add_option('', '--serve-address', action='store', default='', type='string', dest='serveAddress', help='With --serve-cache only listen on this address (default all addresses)', metavar="ADDRESS")
+	optionsParser.add_option('', '--verify-cache', action='store', default='stat', type='choice', choices=checksumIndex.verifyModes, dest='verifyCache', help='How cached items are verified: "stat" trusts the checksum index when size, mtime, and inode are unchanged, "full" always re-reads the item', metavar="full|stat")
 	
 	# post-processing
 	
@@ -551,9 +873,38 @@ def main ():
 	# ---- police options
 	
 	# catalogFiles
-	if len(catalogFiles) < 1:
+	if options.garbageCollect is True:
+		if len(catalogFiles) > 0:
+			optionsParser.error("The --gc option uses every catalog file in the catalog folders, and does not take any catalog files")
+		if options.processWithInstaDMG is True:
+			optionsParser.error("The --gc option can not be used with the -p/--process option")
+	elif options.serveCachePort is not None:
+		if len(catalogFiles) > 0:
+			optionsParser.error("The --serve-cache option uses every catalog file in the catalog folders, and does not take any catalog files")
+		if options.processWithInstaDMG is True:
+			optionsParser.error("The --serve-cache option can not be used with the -p/--process option")
+	elif len(catalogFiles) < 1:
 		optionsParser.error("At least one catalog file is required")
 	
+	if options.garbageCollect is False and (options.gcSourceFolders is True or options.gcRemove is True):
+		optionsParser.error("The --gc-source-folders and --gc-remove options require the --gc option to also be enabled")
+	
+	# serveCachePort and serveAddress
+	if options.serveCachePort is not None and options.garbageCollect is True:
+		optionsParser.error("The --serve-cache option can not be used with the --gc option")
+	if options.serveCachePort is not None and not 0 < options.serveCachePort < 65536:
+		optionsParser.error("The --serve-cache option requires a port number, got: %i" % options.serveCachePort)
+	if options.serveCachePort is None and options.serveAddress != '':
+		optionsParser.error("The --serve-address option requires the --serve-cache option to also be enabled")
+	
+	# jobs and connectionsPerHost
+	if options.jobs < 1:
+		optionsParser.error("The -j/--jobs option requires a number that is 1 or more, got: %i" % options.jobs)
+	if options.connectionsPerHost < 1:
+		optionsParser.error("The --connections-per-host option requires a number that is 1 or more, got: %i" % options.connectionsPerHost)
+	if options.downloadSegments < 1:
+		optionsParser.error("The --download-segments option requires a number that is 1 or more, got: %i" % options.downloadSegments)
+	
 	if options.processWithInstaDMG is True:
 		
 		# check that we are running as root
@@ -574,6 +925,8 @@ def main ():
 			if len(catalogFiles) > 1:
 				optionsParser.error('When using the --restore-onto-volume option option only a single catalog file can be processed')
 			
+			from Resources.container			import container
+			
 			try:
 				options.restoreTarget = container(options.restoreTarget)
 			except:
@@ -598,23 +951,6 @@ def main ():
 	if options.catalogFolders is None:
 		options.catalogFolders = commonConfiguration.standardCatalogFolder
 		
-	baseCatalogFiles = []
-	for thisCatalogFile in catalogFiles:
-		try:
-			baseCatalogFiles.append(instaUpToDate.getCatalogFullPath(thisCatalogFile, options.catalogFolders))
-			
-		except commonExceptions.CatalogNotFoundException:
-			optionsParser.error("There does not seem to be a catalog file at: %s" % thisCatalogFile)
-	
-	addOnCatalogFiles = []
-	if options.addOnCatalogFiles is not None:
-		for thisCatalogFile in options.addOnCatalogFiles:
-			try:
-				addOnCatalogFiles.append(instaUpToDate.getCatalogFullPath(thisCatalogFile, options.catalogFolders))
-			
-			except commonExceptions.CatalogNotFoundException:
-				optionsParser.error("There does not seem to be a catalog file at: %s" % thisCatalogFile)
-	
 	if options.cacheFolder is None:
 		options.cacheFolder = commonConfiguration.standardCacheFolder
 	
@@ -635,6 +971,99 @@ def main ():
 	except ValueError, error:
 		optionsParser.error(error)	
 	
+	checksumIndex.setVerifyMode(options.verifyCache)
+	
+	try:
+		cacheQuota.setQuota(options.cacheQuota)
+	except ValueError, error:
+		optionsParser.error(error)
+	cacheQuota.setEvictionPolicy(options.evictionPolicy)
+	if cacheQuota.hasQuota():
+		# items are only evicted when every catalog, including the ones being built, has been read for the items to pin
+		try:
+			cacheQuota.pinChecksums(instaUpToDate.findReferencedItems(options.catalogFolders, catalogFiles + (options.addOnCatalogFiles or [])).keys())
+		except Exception, error:
+			sys.stderr.write('Warning: unable to read every catalog file, so nothing will be evicted to stay under the --cache-quota: %s\n' % str(error))
+			cacheQuota.setQuota(None)
+	
+	cacheController.maxConnectionsPerHost = options.connectionsPerHost
+	cacheController.downloadSegmentCount = options.downloadSegments
+	
+	# ----- garbage collection ----
+	
+	if options.garbageCollect is True:
+		gcFolders = [cacheController.getCacheFolder()]
+		if options.gcSourceFolders is True:
+			gcFolders += [thisFolder for thisFolder in cacheController.getSourceFolders() if thisFolder not in gcFolders]
+		
+		try:
+			unreferencedItems, unjudgedCount = instaUpToDate.collectGarbage(options.catalogFolders, gcFolders, removeItems=options.gcRemove)
+		except Exception, error:
+			sys.stderr.write('Unable to read every catalog file, so nothing was removed: %s\n' % str(error))
+			sys.exit(1)
+		
+		for thisItem in sorted(unreferencedItems, key=lambda thisItem: thisItem['paths'][0]):
+			print('\t%s\t%s' % (displayTools.bytesToRedableSize(thisItem['size']), thisItem['paths'][0]))
+		
+		totalBytes = sum([thisItem['size'] for thisItem in unreferencedItems])
+		if options.gcRemove is True:
+			print('Removed %i items that no catalog file uses, freeing %s' % (len(unreferencedItems), displayTools.bytesToRedableSize(totalBytes)))
+		else:
+			print('%i items that no catalog file uses would free %s, use --gc-remove to remove them' % (len(unreferencedItems), displayTools.bytesToRedableSize(totalBytes)))
+		if unjudgedCount > 0:
+			print('%i items without a checksum in their name or in the checksum index were left alone' % unjudgedCount)
+		
+		sys.exit(0)
+	
+	# ----- cache server ----
+	
+	if options.serveCachePort is not None:
+		try:
+			referencedItems = instaUpToDate.findReferencedItems(options.catalogFolders)
+		except Exception, error:
+			sys.stderr.write('Unable to read every catalog file: %s\n' % str(error))
+			sys.exit(1)
+		
+		# only items with an http source can be pulled through, the rest are served if they are already in the cache folder
+		upstreamItems = {}
+		for checksumString, thisItem in referencedItems.items():
+			if thisItem is not None and urlparse.urlparse(thisItem.source).scheme in ['http', 'https']:
+				upstreamItems[checksumString] = {'url':thisItem.source, 'size':thisItem.fileSize, 'name':thisItem.displayName}
+		
+		from Resources.cacheServer			import cacheServer
+		
+		try:
+			server = cacheServer((options.serveAddress, options.serveCachePort), upstreamItems)
+		except socket.error, error:
+			optionsParser.error("Unable to serve the cache folder on port %i: %s" % (options.serveCachePort, str(error)))
+		
+		print('Serving %s on port %i, with %i items that can be fetched from upstream' % (cacheController.getCacheFolder(), options.serveCachePort, len(upstreamItems)))
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		server.server_close()
+		
+		sys.exit(0)
+	
+	# remote catalog files are copied into the cache folder, so this has to wait until it is set
+	baseCatalogFiles = []
+	for thisCatalogFile in catalogFiles:
+		try:
+			baseCatalogFiles.append(instaUpToDate.getCatalogFullPath(thisCatalogFile, options.catalogFolders))
+			
+		except commonExceptions.CatalogNotFoundException:
+			optionsParser.error("There does not seem to be a catalog file at: %s" % thisCatalogFile)
+	
+	addOnCatalogFiles = []
+	if options.addOnCatalogFiles is not None:
+		for thisCatalogFile in options.addOnCatalogFiles:
+			try:
+				addOnCatalogFiles.append(instaUpToDate.getCatalogFullPath(thisCatalogFile, options.catalogFolders))
+			
+			except commonExceptions.CatalogNotFoundException:
+				optionsParser.error("There does not seem to be a catalog file at: %s" % thisCatalogFile)
+	
 	# ----- run process -----
 	
 	controllers = []
@@ -665,48 +1094,8 @@ def main ():
 		for addOnCatalogFile in addOnCatalogFiles:
 			thisController.parseCatalogFile(addOnCatalogFile)
 	
-	# find all of the items
-	for thisController in controllers:
-		print('\nFinding and validating the sources for ' + thisController.getMainCatalogName())
-		thisController.findItems()
-	
-	# find the os installer disc
-	for thisController in controllers:
-		print('\nFinding the Installer disc for ' + thisController.getMainCatalogName())
-		foundInstallerDiscs = None
-		if thisController.installerDiscBuilds is not None:
-			foundInstallerDiscs = findInstallerDisc.findInstallerDisc(allowedBuilds=thisController.installerDiscBuilds)
-		else:
-			foundInstallerDiscs = findInstallerDisc.findInstallerDisc()
-		
-		thisController.installerDiscPath = foundInstallerDiscs['InstallerDisc'].getStoragePath()
-		print('\tFound Installer Disc:\t' + thisController.installerDiscPath)
-		
-		for thisDisc in foundInstallerDiscs['SupportingDiscs']:
-			thisDiscPath = thisDisc.getStoragePath()
-			print('\tFound Supporting Disc:\t' + thisDiscPath)
-			thisController.supportingDiscPath.append(thisDiscPath)
-	
-	# run the job
-	for thisController in controllers:
-		print('\nSetting up for ' + thisController.getMainCatalogName())
-		
-		if options.processWithInstaDMG is False:
-			# empty the folders
-			print('\tCleaning InstaDMG folders')
-			thisController.cleanInstaDMGFolders()
-		
-		# create the folder strucutres needed
-		print('\tSetting up InstaDMG folders')
-		thisController.arrangeFolders()
-		
-		if options.processWithInstaDMG is True:
-			# the run succeded, and it has been requested to run InstaDMG
-			thisController.runInstaDMG(scratchFolder=options.instadmgScratchFolder, outputFolder=options.instadmgOutputFolder)
-			
-			if options.restoreTarget is not None:
-				print('\nRestoring to volume' + options.restoreTarget.getDisplayName())
-				thisController.restoreImageToVolume(options.restoreTarget)
+	# find each catalog's items and installer disc in turn, starting on each catalog as soon as its own are found while the later ones are still being looked for
+	instaUpToDate.processControllers(controllers, jobs=options.jobs, useLockFiles=options.useLockFiles, processWithInstaDMG=options.processWithInstaDMG, scratchFolder=options.instadmgScratchFolder, outputFolder=options.instadmgOutputFolder, restoreTarget=options.restoreTarget)
 	
 	print('\nDone')
 		
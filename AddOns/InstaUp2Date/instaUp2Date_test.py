@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+import os, sys, time, threading, unittest, StringIO
+
+from instaUp2Date						import instaUpToDate
+from Resources.tempFolderManager		import tempFolderManager
+
+class recordingController(instaUpToDate):
+	'''An instaUpToDate that records when it is resolved and built, with stand-ins for the installer disc search and the InstaDMG folders'''
+	
+	eventLog				= None		# (event name, catalog name), shared by every instance
+	eventLock				= threading.Lock()
+	failingCatalog			= None		# the catalog name whose installer disc can not be found
+	
+	def logEvent(self, eventName):
+		self.eventLock.acquire()
+		try:
+			self.eventLog.append((eventName, self.getMainCatalogName()))
+		finally:
+			self.eventLock.release()
+	
+	def findInstallerDiscs(self):
+		if self.getMainCatalogName() != 'first':
+			# give the first catalog's build time to start, as finding a disc would take
+			startTime = time.time()
+			while ('build started', 'first') not in self.eventLog and time.time() - startTime < 5:
+				time.sleep(0.01)
+		
+		if self.getMainCatalogName() == self.failingCatalog:
+			raise ValueError('Unable to find an installer disc for: ' + self.getMainCatalogName())
+		self.logEvent('resolved')
+	
+	def cleanInstaDMGFolders(self):
+		self.logEvent('build started')
+		time.sleep(0.2)
+	
+	def arrangeFolders(self):
+		self.logEvent('built')
+
+class packageLineParserTests(unittest.TestCase):
+	'''Test that item lines are split into the right columns'''
+	
+	def parseLine(self, line):
+		'''Return the columns the packageLineParser finds in a line, or None if it does not match'''
+		
+		packageLineMatch = instaUpToDate.packageLineParser.search(line)
+		if packageLineMatch is None:
+			return None
+		return (packageLineMatch.group('displayName'), packageLineMatch.group('fileLocation'), packageLineMatch.group('fileChecksum'), packageLineMatch.group('fileSize'), packageLineMatch.group('installerChoicesFile'))
+	
+	def test_optionalColumns(self):
+		'''The size and the choices file should each be found with or without the other'''
+		
+		self.assertEqual(self.parseLine('\tItem\titem.dmg\tsha1:abc'), ('Item', 'item.dmg', 'sha1:abc', None, None))
+		self.assertEqual(self.parseLine('\tItem\titem.dmg\tsha1:abc\tsize=1024'), ('Item', 'item.dmg', 'sha1:abc', '1024', None))
+		self.assertEqual(self.parseLine('\tItem\titem.dmg\tsha1:abc\tchoices.xml'), ('Item', 'item.dmg', 'sha1:abc', None, 'choices.xml'))
+		self.assertEqual(self.parseLine('\tItem\titem.dmg\tsha1:abc\tsize=1024\tchoices.xml'), ('Item', 'item.dmg', 'sha1:abc', '1024', 'choices.xml'))
+	
+	def test_numericChoicesFile(self):
+		'''A choices file named with only digits should not be taken for a size'''
+		
+		self.assertEqual(self.parseLine('\tItem\titem.dmg\tsha1:abc\t2011'), ('Item', 'item.dmg', 'sha1:abc', None, '2011'))
+		self.assertEqual(self.parseLine('\tItem\titem.dmg\tsha1:abc\tsize=1024\t2011'), ('Item', 'item.dmg', 'sha1:abc', '1024', '2011'))
+
+class processControllersTests(unittest.TestCase):
+	'''Test that each catalog is set up as soon as its own items and disc are found, while the later catalogs are still being looked for'''
+	
+	controllers				= None
+	savedStdout				= None
+	
+	def setUp(self):
+		catalogFolder = tempFolderManager.getNewTempFolder()
+		sectionFolder = tempFolderManager.getNewTempFolder()
+		
+		recordingController.eventLog = []
+		recordingController.failingCatalog = None
+		
+		self.controllers = []
+		for catalogName in ['first', 'second', 'third']:
+			catalogFilePath = os.path.join(catalogFolder, catalogName + '.catalog')
+			open(catalogFilePath, 'w').write('Output Volume Name = %s\n' % catalogName)
+			
+			thisController = recordingController(catalogFilePath, [{'folderPath':sectionFolder, 'sections':['OS Updates']}], catalogFolder)
+			thisController.parseCatalogFile()
+			self.controllers.append(thisController)
+		
+		# keep the progress messages out of the test output
+		self.savedStdout = sys.stdout
+		sys.stdout = StringIO.StringIO()
+	
+	def tearDown(self):
+		sys.stdout = self.savedStdout
+		tempFolderManager.cleanupForExit()
+	
+	def test_pipelined(self):
+		'''The first catalog should be built before the second is resolved, and the catalogs built in order'''
+		
+		recordingController.processControllers(self.controllers, useLockFiles=False)
+		
+		eventLog = recordingController.eventLog
+		self.assertTrue(eventLog.index(('build started', 'first')) < eventLog.index(('resolved', 'second')), 'The first catalog was not built until the second was resolved: %s' % eventLog)
+		self.assertEqual([catalogName for eventName, catalogName in eventLog if eventName == 'built'], ['first', 'second', 'third'], 'The catalogs were not all built in order: %s' % eventLog)
+	
+	def test_resolveError(self):
+		'''An error resolving a catalog should be raised, with no later catalog resolved or built'''
+		
+		recordingController.failingCatalog = 'second'
+		
+		self.assertRaises(ValueError, recordingController.processControllers, self.controllers, useLockFiles=False)
+		
+		eventLog = recordingController.eventLog
+		self.assertTrue(('built', 'first') in eventLog, 'The catalog resolved before the error was not built: %s' % eventLog)
+		self.assertEqual([thisEvent for thisEvent in eventLog if thisEvent[1] != 'first'], [], 'A catalog was resolved or built after the error: %s' % eventLog)
+
+if __name__ == "__main__":
+	unittest.main()
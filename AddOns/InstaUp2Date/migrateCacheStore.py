@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+import os, sys, optparse
+
+from Resources.cacheController			import cacheController
+from Resources.displayTools				import statusHandler
+
+#------------------------------MAIN------------------------------
+
+if __name__ == "__main__":
+	
+	optionParser = optparse.OptionParser(usage="usage: %prog [options] CACHE_FOLDER", description="Move the items in a cache folder into a content store (%s inside it) where InstaUp2Date can find them by checksum without searching, leaving links to them under their old names. Only items with the checksum in their name are moved, and each is verified first." % cacheController.contentStoreFolder)
+	
+	optionParser.add_option("-d", "--disable-progress", default=True, action="store_false", dest="reportProgress", help="Disable progress notifications")
+	
+	(options, args) = optionParser.parse_args()
+	
+	if len(args) != 1:
+		optionParser.error('A single cache folder is required')
+	
+	cacheFolder = args[0]
+	if not os.path.isdir(cacheFolder):
+		optionParser.error('The cache folder given does not exist, or is not a folder: ' + str(cacheFolder))
+	
+	if not os.access(cacheFolder, os.W_OK):
+		optionParser.error('The cache folder given is not writeable: ' + str(cacheFolder))
+	
+	progressReporter = None
+	if options.reportProgress is True:
+		progressReporter = statusHandler(taskMessage='Migrating %s' % cacheFolder)
+	
+	storedPaths, skippedPaths = cacheController.migrateToContentStore(cacheFolder, progressReporter=progressReporter)
+	
+	if progressReporter is not None:
+		progressReporter.update(statusMessage=' moved %i items into the content store' % len(storedPaths))
+		progressReporter.finishLine()
+	else:
+		print('Moved %i items into the content store' % len(storedPaths))
+	
+	for thisPath in skippedPaths:
+		print('\tLeft in place, no checksum in its name or it did not match: %s' % os.path.basename(thisPath))
+	
+	sys.exit(0)
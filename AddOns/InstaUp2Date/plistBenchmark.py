@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import os, sys, optparse, subprocess, time
+
+from Resources.plistBackend				import plistBackend
+from Resources.displayTools				import bytesToRedableSize
+
+def generateImageInfo(partitionCount):
+	'''Return an object shaped like the output of "hdiutil imageinfo -plist" for an image with the given number of partitions'''
+	
+	partitions = []
+	for i in range(partitionCount):
+		partitions.append({
+			'partition-number':i + 1,
+			'partition-name':'Apple_HFS : %i' % (i + 1),
+			'partition-hint':'Apple_HFS',
+			'partition-start':i * 2097192 + 64,
+			'partition-length':2097128,
+			'partition-synthesized':False,
+			'partition-filesystems':{'HFS+':'Macintosh HD %i' % (i + 1)},
+			'checksum-type':'CRC32',
+			'checksum-value':'$%08X' % (i * 2654435761 % (1 << 32))
+		})
+	
+	return {
+		'Backing Store Information':{'URL':'file://localhost/Volumes/Images/sample.dmg', 'Name':'sample.dmg', 'Class Name':'CBSDBackingStore'},
+		'Class Name':'CUDIFDiskImage',
+		'Checksum Type':'CRC32',
+		'Checksum Value':'$3A5F1C0B',
+		'Format':'UDZO',
+		'Format Description':'UDIF read-only compressed (zlib)',
+		'Partitions':{'partition-scheme':'Apple', 'block-size':512, 'burnable':False, 'appendable':False, 'partitions':partitions},
+		'Properties':{'Partitioned':True, 'Software License Agreement':False, 'Compressed':True, 'Kernel Compatible':True, 'Encrypted':False, 'Checksummed':True},
+		'Size Information':{'Total Bytes':partitionCount * 2097192 * 512, 'Compressed Ratio':0.4215, 'Sector Count':partitionCount * 2097192, 'Total Non-Empty Bytes':partitionCount * 1048576 * 512, 'Compressed Bytes':partitionCount * 441966 * 512, 'Total Empty Bytes':partitionCount * 1048616 * 512}
+	}
+
+def timeParse(backend, plistData, repeat):
+	'''Parse the plist data repeat times with the backend, returning the best time in seconds'''
+	
+	plistBackend.setBackend(backend)
+	
+	bestSeconds = None
+	for i in range(max(1, repeat)):
+		startTime = time.time()
+		plistBackend.readPlistFromString(plistData)
+		parseSeconds = time.time() - startTime
+		if bestSeconds is None or parseSeconds < bestSeconds:
+			bestSeconds = parseSeconds
+	
+	return bestSeconds
+
+def timeImport(moduleName):
+	'''The seconds a fresh interpreter takes to import the module, or None if it can not'''
+	
+	startTime = time.time()
+	if subprocess.call([sys.executable, '-c', 'import ' + moduleName], stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT) != 0:
+		return None
+	return time.time() - startTime
+
+#------------------------------MAIN------------------------------
+
+if __name__ == "__main__":
+	
+	optionParser = optparse.OptionParser()
+	optionParser.add_option("-p", "--partitions", default=5000, action="store", type="int", dest="partitionCount", help="The number of partitions in the generated imageinfo plist (default 5000)")
+	optionParser.add_option("-r", "--repeat", default=5, action="store", type="int", dest="repeat", help="Parse each plist this many times and report the best (default 5)")
+	optionParser.add_option("-f", "--fixture", default=[], action="append", type="string", dest="fixtures", help="Also time the output of a real \"hdiutil imageinfo -plist\" saved in this file, can be given more than once")
+	
+	(options, args) = optionParser.parse_args()
+	
+	for thisFixture in options.fixtures:
+		if not os.path.isfile(thisFixture):
+			optionParser.error('The fixture given does not exist, or is not a file: ' + str(thisFixture))
+	
+	backends = ['plistlib']
+	try:
+		plistBackend.setBackend('Foundation')
+		backends.append('Foundation')
+	except ImportError:
+		print('Foundation is not available, only timing plistlib')
+	plistBackend.setBackend('plistlib')
+	
+	generatedPlist = generateImageInfo(options.partitionCount)
+	fixtures = [
+		('generated xml (%i partitions)' % options.partitionCount, plistBackend.writePlistToString(generatedPlist)),
+		('generated binary (%i partitions)' % options.partitionCount, plistBackend.writePlistToString(generatedPlist, binary=True))
+	]
+	for thisFixture in options.fixtures:
+		fixtureFile = open(thisFixture, 'rb')
+		fixtures.append((os.path.basename(thisFixture), fixtureFile.read()))
+		fixtureFile.close()
+	
+	for fixtureName, plistData in fixtures:
+		print('%s, %s:' % (fixtureName, bytesToRedableSize(len(plistData))))
+		for thisBackend in backends:
+			parseSeconds = timeParse(thisBackend, plistData, options.repeat)
+			print('	%-12s %10.1f ms %10.1f MB/s' % (thisBackend, parseSeconds * 1000, (len(plistData) / (1024.0 * 1024.0)) / max(parseSeconds, 0.000001)))
+	
+	# the interpreter starting is included, so compare these to each other
+	print('')
+	for moduleName in ['plistlib', 'Foundation']:
+		importSeconds = timeImport(moduleName)
+		if importSeconds is None:
+			print('import %-12s unavailable' % moduleName)
+		else:
+			print('import %-12s %10.1f ms' % (moduleName, importSeconds * 1000))
+	
+	sys.exit(0)